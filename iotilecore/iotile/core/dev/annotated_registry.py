@@ -104,6 +104,9 @@ class AnnotatedRegistry(object):
         method in situations where you know the extension list is static
         and you need the speedup benefits.
 
+        Since extensions are automatically indexed in a single file that is
+        rebuilt whenever installed packages change, freezing is rarely needed.
+
         You can undo this by calling unfreeze().
         """
 
@@ -0,0 +1,401 @@
+# This file is copyright Arch Systems, Inc.
+# Except as otherwise provided in the relevant LICENSE file, all rights are reserved.
+
+"""A persistent index of installed extensions that invalidates itself."""
+
+import os
+import sys
+import json
+import logging
+import platform
+import entrypoints
+from future.utils import viewitems
+from .iotileobj import IOTile
+
+
+def dump_entry_points(prefix="iotile."):
+    """Find the declarations of all installed entry points.
+
+    Args:
+        prefix (str): Only include groups starting with this prefix.  If
+            None, all groups are included.
+
+    Returns:
+        dict: A map of group names to a list of dicts with name, object and
+            distribution keys for each entry point in the group.
+    """
+
+    extensions = {}
+
+    for config, distro in entrypoints.iter_files_distros():
+        if distro is None:
+            distro_info = None
+        else:
+            distro_info = (distro.name, distro.version)
+
+        for group in config:
+            if prefix is not None and not group.startswith(prefix):
+                continue
+
+            if group not in extensions:
+                extensions[group] = []
+
+            for name, epstr in config[group].items():
+                extensions[group].append(dict(name=name, object=epstr, distribution=distro_info))
+
+    return extensions
+
+
+def entry_points_from_dump(extensions):
+    """Convert a dump of entry point declarations into EntryPoint objects.
+
+    Args:
+        extensions (dict): A map of group names to a list of dicts with name,
+            object and distribution keys, as produced by dump_entry_points().
+
+    Returns:
+        dict: A map of group names to lists of entrypoints.EntryPoint objects.
+    """
+
+    groups = {}
+    for group, ext_infos in viewitems(extensions):
+        groups[group] = []
+
+        for ext_info in ext_infos:
+            distro_info = ext_info['distribution']
+
+            distro = None
+            if distro_info is not None:
+                distro = entrypoints.Distribution(*distro_info)
+
+            entry = entrypoints.EntryPoint.from_string(ext_info['object'], ext_info['name'], distro=distro)
+            groups[group].append(entry)
+
+    return groups
+
+
+def distribution_fingerprint(path=None):
+    """Summarize the set of installed python distributions.
+
+    The fingerprint contains the modification time of every folder on the
+    python path that contains distributions and of the entry_points.txt file
+    of every distribution inside of them, as well as every zip file or egg on
+    the path.  Installing, upgrading or removing a distribution changes the
+    folder it is installed in and reinstalling a development mode package
+    rewrites its entry_points.txt file, so any change to the installed entry
+    points changes the fingerprint.  Computing it only requires listing
+    folders and stat calls, which is much faster than reading and parsing
+    every entry_points.txt.
+
+    Folders that do not contain any distributions, like the current working
+    directory, are left out so that they do not needlessly change the
+    fingerprint from one process to the next.
+
+    Args:
+        path (list of str): The folders to check.  Defaults to sys.path.
+
+    Returns:
+        list: The fingerprint, which only contains json serializable types.
+    """
+
+    if path is None:
+        path = sys.path
+
+    fingerprint = []
+    for folder in path:
+        try:
+            mtime = os.stat(folder or '.').st_mtime
+        except OSError:
+            continue
+
+        if not os.path.isdir(folder or '.') or folder.rstrip('/\\').endswith('.egg'):
+            fingerprint.append([folder, mtime])
+            continue
+
+        distributions = []
+        for name in sorted(os.listdir(folder or '.')):
+            if not (name.endswith('.dist-info') or name.endswith('.egg-info')):
+                continue
+
+            try:
+                distributions.append([name, os.stat(os.path.join(folder, name, 'entry_points.txt')).st_mtime])
+            except OSError:
+                distributions.append([name, None])
+
+        if len(distributions) > 0:
+            fingerprint.append([folder, mtime])
+            fingerprint.extend(distributions)
+
+    return fingerprint
+
+
+class IndexedComponent(object):
+    """The python products of a registered IOTile component.
+
+    This stores just enough information to find and import the python
+    extensions declared by a component without parsing its
+    module_settings.json file.  It can be passed in place of an IOTile object
+    to ComponentRegistry.load_extension.  Products that are not indexed are
+    looked up by loading the full IOTile object on demand.
+
+    Args:
+        folder (str): The folder containing the component.
+        info (dict): The indexed information about the component.
+    """
+
+    INDEXED_PRODUCTS = IOTile.PYTHON_PRODUCTS | frozenset(['support_package'])
+
+    def __init__(self, folder, info):
+        self.folder = folder
+        self.name = info['name']
+        self.support_distribution = info['support_distribution']
+        self.products = info['products']
+        self._tile = None
+
+    @classmethod
+    def FromTile(cls, tile):
+        """Index the python products of an IOTile component.
+
+        Args:
+            tile (IOTile): The component to index.
+
+        Returns:
+            dict: The information to store in the index for this component.
+        """
+
+        products = {x: tile.find_products(x) for x in cls.INDEXED_PRODUCTS}
+        products = {key: value for key, value in viewitems(products) if len(value) > 0}
+
+        return {
+            'name': tile.name,
+            'support_distribution': tile.support_distribution,
+            'products': products
+        }
+
+    def find_products(self, product_type):
+        """Find the products of a given type, see IOTile.find_products."""
+
+        if product_type in self.INDEXED_PRODUCTS:
+            return list(self.products.get(product_type, []))
+
+        if self._tile is None:
+            self._tile = IOTile(self.folder)
+
+        return self._tile.find_products(product_type)
+
+    def path(self):
+        """The path to this component."""
+        return self.folder
+
+    def __str__(self):
+        return self.name
+
+
+class ExtensionIndex(object):
+    """A persistent, automatically invalidated index of extensions.
+
+    Finding extensions normally requires reading and parsing the
+    entry_points.txt file of every installed python distribution and the
+    module_settings.json file of every registered IOTile component.  The
+    index stores the result of that work in a single file so that it only
+    needs to be redone when something changes.
+
+    Entry points are checked against distribution_fingerprint() the first
+    time they are needed in each process and the entire set is rebuilt if it
+    changed.  Each component is checked by the modification time and size of
+    its module_settings.json file every time it is looked up and only that
+    component is reindexed if it changed.
+
+    The index also caches tags, like the module names of proxy objects, that
+    describe extensions but are only known after importing them.  See
+    get_tags().
+
+    Args:
+        path (str): The file to persist the index in.  If None, the index is
+            only kept in memory.
+        prefix (str): Only entry point groups starting with this prefix are
+            indexed.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, path=None, prefix="iotile."):
+        self.path = path
+        self.prefix = prefix
+
+        self._loaded = False
+        self._fingerprint = None
+        self._extensions = None
+        self._entry_points = None
+        self._components = {}
+        self._tags = {}
+        self._logger = logging.getLogger(__name__)
+
+    def indexes_group(self, group):
+        """Check if an entry point group is stored in this index."""
+
+        return group.startswith(self.prefix)
+
+    def entry_points(self, group):
+        """Get all of the installed entry points in a group.
+
+        Args:
+            group (str): The entry point group, which must start with prefix.
+
+        Returns:
+            list of entrypoints.EntryPoint: The entry points in the group.
+        """
+
+        self._ensure_loaded()
+
+        if self._entry_points is None:
+            fingerprint = distribution_fingerprint()
+            if self._extensions is None or fingerprint != self._fingerprint:
+                self._logger.debug("Rebuilding extension index entry points since installed distributions changed")
+                self._extensions = dump_entry_points(self.prefix)
+                self._fingerprint = fingerprint
+                self._save()
+
+            self._entry_points = entry_points_from_dump(self._extensions)
+
+        return self._entry_points.get(group, [])
+
+    def component(self, folder):
+        """Get the indexed python products of a registered component.
+
+        Args:
+            folder (str): The folder containing the component.
+
+        Returns:
+            IndexedComponent: The indexed component.
+        """
+
+        self._ensure_loaded()
+
+        stamp = self._component_stamp(folder)
+        info = self._components.get(folder)
+
+        if info is None or info['stamp'] != stamp:
+            info = IndexedComponent.FromTile(IOTile(folder))
+            info['stamp'] = stamp
+
+            self._components[folder] = info
+            self._save()
+
+        return IndexedComponent(folder, info)
+
+    def get_tags(self, kind, key, stamp):
+        """Get the cached tags of an extension.
+
+        Tags are arbitrary json serializable values that describe an
+        extension, like the module name of a proxy object, and that can only
+        be determined by importing it.  Caching them lets callers import only
+        the extensions with the tag they need.
+
+        Args:
+            kind (str): The kind of tag, e.g. 'proxy_module_name'.
+            key (str): A unique identifier for the extension.
+            stamp (object): A json serializable value that changes whenever
+                the extension changes.
+
+        Returns:
+            list: The cached tags or None if they are not known or the
+                extension changed since they were cached.
+        """
+
+        self._ensure_loaded()
+
+        info = self._tags.get(kind, {}).get(key)
+        if info is None or info['stamp'] != stamp:
+            return None
+
+        return info['tags']
+
+    def set_tags(self, kind, key, stamp, tags):
+        """Cache the tags of an extension.
+
+        The tags are not saved until save() is called so that many
+        extensions can be tagged at once.  See get_tags().
+        """
+
+        self._ensure_loaded()
+        self._tags.setdefault(kind, {})[key] = {'stamp': stamp, 'tags': list(tags)}
+
+    def save(self):
+        """Save any changes to the index to its file."""
+
+        self._save()
+
+    def invalidate(self):
+        """Forget everything in the index and remove its file."""
+
+        self._loaded = True
+        self._fingerprint = None
+        self._extensions = None
+        self._entry_points = None
+        self._components = {}
+        self._tags = {}
+
+        if self.path is not None and os.path.isfile(self.path):
+            os.remove(self.path)
+
+    @classmethod
+    def _component_stamp(cls, folder):
+        try:
+            info = os.stat(os.path.join(folder, 'module_settings.json'))
+        except OSError:
+            return None
+
+        return [info.st_mtime, info.st_size]
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+
+        self._loaded = True
+        if self.path is None or not os.path.isfile(self.path):
+            return
+
+        try:
+            with open(self.path, "r") as infile:
+                data = json.load(infile)
+        except (IOError, OSError, ValueError):
+            self._logger.warning("Could not load extension index from %s, it will be rebuilt", self.path, exc_info=True)
+            return
+
+        if not isinstance(data, dict) or data.get('format') != self.FORMAT_VERSION or data.get('prefix') != self.prefix:
+            return
+
+        self._fingerprint = data.get('fingerprint')
+        self._extensions = data.get('extensions')
+        self._components = data.get('components', {})
+        self._tags = data.get('tags', {})
+
+    def _save(self):
+        if self.path is None:
+            return
+
+        data = {
+            'format': self.FORMAT_VERSION,
+            'prefix': self.prefix,
+            'fingerprint': self._fingerprint,
+            'extensions': self._extensions,
+            'components': self._components,
+            'tags': self._tags
+        }
+
+        # The index is only a cache so failing to save it must never stop
+        # extensions from loading, e.g. in a read-only environment.
+        try:
+            if platform.system() == 'Windows':
+                with open(self.path, "w") as outfile:
+                    json.dump(data, outfile)
+            else:
+                newpath = self.path + '.new'
+
+                with open(newpath, "w") as outfile:
+                    json.dump(data, outfile)
+
+                os.rename(os.path.realpath(newpath), os.path.realpath(self.path))
+        except (IOError, OSError):
+            self._logger.debug("Could not save extension index to %s", self.path, exc_info=True)
@@ -7,6 +7,7 @@ import logging
 import imp
 import inspect
 import json
+import functools
 from types import ModuleType
 from future.utils import itervalues
 
@@ -16,11 +17,12 @@ if sys.version_info >= (3, 0):
 import entrypoints
 
 from iotile.core.utilities.kvstore_sqlite import SQLiteKVStore
-from iotile.core.utilities.kvstore_json import JSONKVStore
+from iotile.core.utilities.kvstore_json import CachedJSONKVStore
 from iotile.core.utilities.kvstore_mem import InMemoryKVStore
 from iotile.core.exceptions import ArgumentError, ExternalError
 from iotile.core.utilities.paths import settings_directory
 from .iotileobj import IOTile
+from .extension_index import ExtensionIndex, dump_entry_points, entry_points_from_dump
 
 MISSING = object()
 
@@ -35,10 +37,12 @@ class ComponentRegistry(object):
 
     BackingType = SQLiteKVStore
     BackingFileName = 'component_registry.db'
+    IndexFileName = 'extension_index.json'
 
     _registered_extensions = {}
     _component_overlays = {}
     _frozen_extensions = None
+    _extension_index = None
 
     def __init__(self):
         self._kvstore = None
@@ -61,6 +65,23 @@ class ComponentRegistry(object):
 
         return self._kvstore
 
+    @property
+    def extension_index(self):
+        """The persistent index of extensions shared by all registries.
+
+        The index is stored next to the registry's backing store, or only in
+        memory if the registry itself is only in memory.
+        """
+
+        if ComponentRegistry._extension_index is None:
+            path = None
+            if self.BackingFileName is not None:
+                path = os.path.join(_registry_folder(), self.IndexFileName)
+
+            ComponentRegistry._extension_index = ExtensionIndex(path)
+
+        return ComponentRegistry._extension_index
+
     @property
     def plugins(self):
         """Lazily load iotile plugins only on demand.
@@ -141,32 +162,24 @@ class ComponentRegistry(object):
         found_extensions = []
 
         if product_name is not None:
-            for comp in self.iter_components():
-                if comp_filter is not None and comp.name != comp_filter:
+            for comp_name, folder in self._iter_component_folders():
+                if comp_filter is not None and comp_name != comp_filter:
                     continue
 
+                comp = self.extension_index.component(folder)
                 products = comp.find_products(product_name)
                 for product in products:
-                    try:
-                        entries = self.load_extension(product, name_filter=name_filter, class_filter=class_filter,
-                                                      component=comp)
-                        if len(entries) == 0 and name_filter is None:  # Don't warn if we're filtering by name since most extensions won't match
-                            self._logger.warn("Found no valid extensions in product %s of component %s", product, comp.path)
-                            continue
+                    # Check the name before importing the product since most won't match
+                    if name_filter is not None and _extension_name(product) != name_filter:
+                        continue
 
-                        found_extensions.extend(entries)
-                    except:  #pylint:disable=bare-except;We don't want a broken extension to take down the whole system
-                        self._logger.exception("Unable to load extension %s from local component %s at path %s", product_name, comp, product)
+                    found_extensions.extend(self._load_product(comp, product, product_name, name_filter, class_filter))
 
         for entry in self._iter_entrypoint_group(group):
-            name = entry.name
-
-            if name_filter is not None and name != name_filter:
+            if name_filter is not None and entry.name != name_filter:
                 continue
 
-            ext = entry.load()
-
-            found_extensions.extend((name, x) for x in self._filter_subclasses(ext, class_filter))
+            found_extensions.extend(self._load_entry_point(entry, class_filter))
 
         for (name, ext) in self._registered_extensions.get(group, []):
             if name_filter is not None and name != name_filter:
@@ -186,6 +199,66 @@ class ComponentRegistry(object):
 
         return found_extensions
 
+    def load_tagged_extensions(self, group, tag, tag_kind, tagger, class_filter=None, product_name=None):
+        """Load only the extensions in a group that have a given tag.
+
+        Some extensions are looked up by a property that is only known after
+        importing them, like the module name of a proxy object.  Rather than
+        importing every extension to check that property, the tags of each
+        extension are cached in the extension index and only the extensions
+        whose cached tags include ``tag`` are imported.  Extensions that
+        changed since they were tagged are imported and tagged again.
+
+        If no extension has the tag according to the cache, every extension
+        is imported and tagged again before giving up, so a stale cache never
+        hides an extension.
+
+        Args:
+            group (str): The extension type, see load_extensions.
+            tag (object): The tag that the extensions must have.
+            tag_kind (str): A unique name for the kind of tags returned by
+                tagger, used to cache them persistently.
+            tagger (callable): A function that takes an extension object and
+                returns a list of json serializable tags for it.
+            class_filter (type): Only return subclasses of this type, see
+                load_extensions.
+            product_name (str): The product type that can provide this
+                extension in registered components, see load_extensions.
+
+        Returns:
+            list of (str, object): The loaded extensions that have the tag.
+        """
+
+        for refresh in (False, True):
+            found = []
+            for tags, loader in self._iter_tagged_extensions(group, tag_kind, tagger, class_filter, product_name, refresh):
+                if tag not in tags:
+                    continue
+
+                found.extend((name, obj) for name, obj in loader() if tag in self._tag_extension(obj, tagger))
+
+            if len(found) > 0:
+                break
+
+        return found
+
+    def list_extension_tags(self, group, tag_kind, tagger, class_filter=None, product_name=None):
+        """List the tags of all extensions in a group.
+
+        Only extensions that changed since they were last tagged are
+        imported.  See load_tagged_extensions for a description of the
+        arguments.
+
+        Returns:
+            set: All of the tags of all of the extensions in the group.
+        """
+
+        found = set()
+        for tags, _loader in self._iter_tagged_extensions(group, tag_kind, tagger, class_filter, product_name):
+            found.update(tags)
+
+        return found
+
     def register_extension(self, group, name, extension):
         """Register an extension.
 
@@ -220,7 +293,9 @@ class ComponentRegistry(object):
 
         Freezing extensions can speed up the extension loading process on
         machines with slow file systems since it requires only a single file
-        to store all of the extensions.
+        to store all of the extensions.  This is rarely needed anymore since
+        the automatically updated extension index provides the same speedup
+        while still finding newly installed extensions.
 
         Calling this method will save a file into the current virtual
         environment that stores a list of all currently found extensions that
@@ -298,30 +373,128 @@ class ComponentRegistry(object):
         with open(frozen_path, "r") as infile:
             extensions = json.load(infile)
 
-        ComponentRegistry._frozen_extensions = {}
-        for group in extensions:
-            ComponentRegistry._frozen_extensions[group] = []
+        ComponentRegistry._frozen_extensions = entry_points_from_dump(extensions)
 
-            for ext_info in extensions.get(group, []):
-                name = ext_info['name']
-                obj_path = ext_info['object']
-                distro_info = ext_info['distribution']
+    def _iter_entrypoint_group(self, group):
+        if self.frozen:
+            if self._frozen_extensions is None:
+                self._load_frozen_extensions()
 
-                distro = None
-                if distro_info is not None:
-                    distro = entrypoints.Distribution(*distro_info)
+            return self._frozen_extensions.get(group, [])
 
-                entry = entrypoints.EntryPoint.from_string(obj_path, name, distro=distro)
-                ComponentRegistry._frozen_extensions[group].append(entry)
+        if self.extension_index.indexes_group(group):
+            return self.extension_index.entry_points(group)
 
-    def _iter_entrypoint_group(self, group):
-        if not self.frozen:
-            return entrypoints.get_group_all(group)
+        return entrypoints.get_group_all(group)
+
+    def _load_product(self, comp, product, product_name, name_filter, class_filter):
+        try:
+            entries = self.load_extension(product, name_filter=name_filter, class_filter=class_filter,
+                                          component=comp)
+            if len(entries) == 0 and name_filter is None:  # Don't warn if we're filtering by name since most extensions won't match
+                self._logger.warn("Found no valid extensions in product %s of component %s", product, comp.folder)
+
+            return entries
+        except:  #pylint:disable=bare-except;We don't want a broken extension to take down the whole system
+            self._logger.exception("Unable to load extension %s from local component %s at path %s", product_name, comp, product)
+            return []
+
+    def _load_entry_point(self, entry, class_filter):
+        ext = entry.load()
+
+        found = [(entry.name, x) for x in self._filter_subclasses(ext, class_filter)]
+        return [(name, x) for name, x in found if self._filter_nonextensions(x)]
+
+    def _iter_extension_sources(self, group, product_name):
+        """Iterate over every place that an extension could be loaded from.
+
+        Yields:
+            (str, object, callable): A key identifying the source, a stamp
+                that changes when the source changes and a function that
+                takes a class_filter and loads the extensions in the source.
+        """
+
+        if product_name is not None:
+            for _comp_name, folder in self._iter_component_folders():
+                comp = self.extension_index.component(folder)
+
+                for product in comp.find_products(product_name):
+                    loader = functools.partial(self._load_product, comp, product, product_name, None)
+                    yield "product:" + product, _file_stamp(product), loader
+
+        for entry in self._iter_entrypoint_group(group):
+            stamp = None
+            if entry.distro is not None:
+                stamp = [entry.distro.name, entry.distro.version]
+
+            key = "entry_point:{}:{}={}:{}".format(group, entry.name, entry.module_name, entry.object_name)
+            yield key, stamp, functools.partial(self._load_entry_point, entry)
+
+    def _iter_tagged_extensions(self, group, tag_kind, tagger, class_filter, product_name, refresh=False):
+        """Iterate over the tags of every extension source in a group.
+
+        Yields:
+            (list, callable): The tags of the extensions in a source and a
+                function with no arguments that loads them.
+        """
 
-        if self._frozen_extensions is None:
-            self._load_frozen_extensions()
+        index = self.extension_index
+        changed = False
 
-        return self._frozen_extensions.get(group, [])
+        for key, stamp, loader in self._iter_extension_sources(group, product_name):
+            loader = _memoize(functools.partial(loader, class_filter))
+
+            tags = None
+            if not refresh:
+                tags = index.get_tags(tag_kind, key, stamp)
+
+            if tags is None:
+                tags = set()
+                for _name, obj in loader():
+                    tags.update(self._tag_extension(obj, tagger))
+
+                tags = list(tags)
+                index.set_tags(tag_kind, key, stamp, tags)
+                changed = True
+
+            yield tags, loader
+
+        if changed:
+            index.save()
+
+        for (name, ext) in self._registered_extensions.get(group, []):
+            found = [(name, x) for x in self._filter_subclasses(ext, class_filter) if self._filter_nonextensions(x)]
+
+            tags = set()
+            for _name, obj in found:
+                tags.update(self._tag_extension(obj, tagger))
+
+            yield list(tags), functools.partial(list, found)
+
+    def _tag_extension(self, obj, tagger):
+        try:
+            return tagger(obj)
+        except Exception:  #pylint:disable=broad-except;We don't want a misbehaving extension to take down the whole system
+            self._logger.exception("Error getting tags of misbehaving extension %s, skipping.", obj)
+            return []
+
+    def _iter_component_folders(self):
+        """Iterate over the name and folder of all registered components.
+
+        Unlike iter_components, this does not load each component.  A
+        temporary component takes the place of a permanent one with the same
+        name, just like in get_component.
+        """
+
+        overlays = dict(self._component_overlays)
+        for name, folder in overlays.items():
+            yield name, folder
+
+        for name, folder in self.kvstore.get_all():
+            if name.startswith('config:') or name in overlays:
+                continue
+
+            yield name, folder
 
     @classmethod
     def _filter_nonextensions(cls, obj):
@@ -348,25 +521,7 @@ class ComponentRegistry(object):
 
     @classmethod
     def _dump_extensions(cls, prefix="iotile."):
-        extensions = {}
-
-        for config, distro in entrypoints.iter_files_distros():
-            if distro is None:
-                distro_info = None
-            else:
-                distro_info = (distro.name, distro.version)
-
-            for group in config:
-                if prefix is not None and not group.startswith(prefix):
-                    continue
-
-                if group not in extensions:
-                    extensions[group] = []
-
-                for name, epstr in config[group].items():
-                    extensions[group].append(dict(name=name, object=epstr, distribution=distro_info))
-
-        return extensions
+        return dump_entry_points(prefix)
 
     def _filter_subclasses(self, obj, class_filter):
         if class_filter is None:
@@ -392,8 +547,10 @@ class ComponentRegistry(object):
         if backing not in ['json', 'sqlite', 'memory']:
             raise ArgumentError("Unknown backing store type that is not json or sqlite", backing=backing)
 
+        cls._extension_index = None
+
         if backing == 'json':
-            cls.BackingType = JSONKVStore
+            cls.BackingType = CachedJSONKVStore
             cls.BackingFileName = 'component_registry.json'
         elif backing == 'memory':
             cls.BackingType = InMemoryKVStore
@@ -471,8 +628,9 @@ class ComponentRegistry(object):
 
         ComponentRegistry._component_overlays = {}
 
-        for key in self.list_components():
-            self.remove_component(key)
+        with self.kvstore.batch():
+            for key in self.list_components():
+                self.remove_component(key)
 
     def clear(self):
         """Clear all data from the registry
@@ -637,6 +795,48 @@ def _ensure_package_loaded(path, component):
     return "{}.{}".format(support_distro, relative_path)
 
 
+def _file_stamp(path):
+    """Get a value that changes whenever the python file at path changes."""
+
+    if len(path) > 2 and ':' in path[2:]:  # Don't flag windows C: type paths
+        path, _, _ = path.rpartition(":")
+
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+
+    return [info.st_mtime, info.st_size]
+
+
+def _memoize(func):
+    """Wrap a function with no arguments so that it is only called once."""
+
+    result = []
+
+    def _call():
+        if len(result) == 0:
+            result.append(func())
+
+        return result[0]
+
+    return _call
+
+
+def _extension_name(path):
+    """Get the name that an extension loaded from path will have.
+
+    This is the basename of the module without its extension and without any
+    :<name> suffix, see _try_load_module.
+    """
+
+    if len(path) > 2 and ':' in path[2:]:  # Don't flag windows C: type paths
+        path, _, _ = path.rpartition(":")
+
+    basename, _ext = os.path.splitext(os.path.basename(path))
+    return basename
+
+
 def _try_load_module(path, import_name=None):
     """Try to programmatically load a python module by path.
 
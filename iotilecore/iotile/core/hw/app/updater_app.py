@@ -64,7 +64,7 @@ class DeviceUpdater(IOTileApp):
             print("Please type y for yes or n for no.")
 
     @docannotate
-    def load_script(self, script_path, confirm=True, no_reboot=False):
+    def load_script(self, script_path, confirm=True, no_reboot=False, compress=False):
         """Load a script from a file and run it.
 
         This function will load a binary update script from the file given in
@@ -85,12 +85,12 @@ class DeviceUpdater(IOTileApp):
                 You typically want to reboot so this defaults to False.  If you know
                 what you are doing, you can set this to True to not do a sanity reboot
                 after running the script.
+            compress (bool): Send the script in a compressed container to reduce
+                the amount of data transferred.  Only use this with devices that
+                support compressed scripts.
         """
 
-        with open(script_path, "rb") as infile:
-            indata = infile.read()
-
-        script = UpdateScript.FromBinary(indata)
+        script = UpdateScript.FromFile(script_path)
 
         print("Loaded script with %d actions from file %s" % (len(script.records), script_path))
         print("Running script on device 0x%X with app info (%d %s) and os_info (%d %s)" % (self._device_id, self._app_tag, self._app_version, self._os_tag, self._os_version))
@@ -134,9 +134,9 @@ class DeviceUpdater(IOTileApp):
             print("The device is currently running a script, you must wait for it to finish.")
             return
 
-        self.run_script(script)
+        self.run_script(script, compress=compress)
 
-    def run_script(self, script, force=False, no_reboot=False):
+    def run_script(self, script, force=False, no_reboot=False, compress=False):
         """Run a script on the connected IOTile device.
 
         The script must an UpdateScript object.  If you are looking for an
@@ -158,9 +158,19 @@ class DeviceUpdater(IOTileApp):
                 You typically want to reboot so this defaults to False.  If you know
                 what you are doing, you can set this to True to not do a sanity reboot
                 after running the script.
+            compress (bool): Send the script in a compressed container to reduce
+                the amount of data transferred, unless that would make it larger.
+                Only use this with devices that support compressed scripts.
         """
 
         raw_data = script.encode()
+        if compress:
+            compressed = UpdateScript.CompressBinary(raw_data)
+            self._logger.info("Compressed script from %d to %d bytes", len(raw_data), len(compressed))
+
+            # Small scripts can get larger because of the container header
+            if len(compressed) < len(raw_data):
+                raw_data = compressed
 
         status, _err = self._query_status()
         if status == self.ReceivedScript and force:
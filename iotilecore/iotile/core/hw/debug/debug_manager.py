@@ -121,6 +121,24 @@ class DebugManager(object):
 
         self._stream.debug_command('restore_state', {'snapshot': snapshot})
 
+    @docannotate
+    def advance_time(self, seconds):
+        """Move the clock of an emulated device forward.
+
+        This debug routine is only supported for emulated devices that run
+        in virtual time.  All timer events that would have happened during
+        the given number of seconds happen, as fast as the device can
+        process them.
+
+        Args:
+            seconds (int): The number of seconds to advance.
+
+        Returns:
+            int: The device's uptime after advancing.
+        """
+
+        return self._stream.debug_command('advance_time', {'seconds': seconds})
+
     @docannotate
     def open_scenario(self, scenario_path):
         """Load a test scenario from a file into an emulated device.
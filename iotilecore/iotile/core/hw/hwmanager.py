@@ -16,7 +16,7 @@ from typedargs.annotate import annotated, param, return_type, finalizer, docanno
 
 from iotile.core.dev.semver import SemanticVersion
 from iotile.core.hw.transport import CMDStream
-from iotile.core.hw.exceptions import UnknownModuleTypeError
+from iotile.core.hw.exceptions import UnknownModuleTypeError, UnsupportedCommandError
 from iotile.core.exceptions import ArgumentError, HardwareError, ValidationError, TimeoutExpiredError, ExternalError
 from iotile.core.dev.registry import ComponentRegistry
 from iotile.core.hw.transport.adapterstream import AdapterCMDStream
@@ -95,53 +95,63 @@ class HardwareManager(object):
         self._known_apps = {}
         self._named_apps = {}
 
-        self._setup_proxies()
-        self._setup_apps()
+        self._tiles = {}
+        self._tiles_generation = None
 
-    def _setup_proxies(self):
-        """Load in proxy module objects for all of the registered components on this system."""
+    def _find_proxies(self, short_name):
+        """Find and import the proxy objects for a given tile name.
+
+        Proxy modules are only imported the first time a tile with a matching
+        name is seen.  The module names of all installed proxies are cached
+        by the ComponentRegistry so only the matching proxy modules need to be
+        imported.
+        """
 
-        # Find all of the registered IOTile components and see if we need to add any proxies for them
         reg = ComponentRegistry()
-        proxy_classes = reg.load_extensions('iotile.proxy', class_filter=TileBusProxyObject, product_name="proxy_module")
+        proxy_classes = reg.load_tagged_extensions('iotile.proxy', short_name, 'proxy_module_name', _proxy_names,
+                                                   class_filter=TileBusProxyObject, product_name="proxy_module")
 
+        matches = []
         for _name, obj in proxy_classes:
-            if obj.__name__ in self._proxies:
-                continue
+            self._proxies.setdefault(obj.__name__, obj)
 
-            self._proxies[obj.__name__] = obj
+            if obj not in matches:
+                matches.append(obj)
 
-            #Check if this object matches a specific shortened name so that we can
-            #automatically match a hw module to a proxy without user intervention
-            try:
-                short_name = obj.ModuleName()
-                if short_name in self._name_map:
-                    self._name_map[short_name].append(obj)
-                else:
-                    self._name_map[short_name] = [obj]
-            except Exception:  #pylint: disable=broad-except;We don't want this to die if someone loads a misbehaving plugin
-                self.logger.exception("Error importing misbehaving proxy object %s, skipping.", obj)
+        # Don't remember misses so that proxies registered later are found
+        if len(matches) > 0:
+            self._name_map[short_name] = matches
 
-    def _setup_apps(self):
-        """Load in all iotile app objects for all registered or installed components on this system."""
+        return matches
+
+    def _find_apps(self, app_tag=None, name=None):
+        """Find and import the iotile apps matching an app tag or name.
+
+        Like proxy objects, app modules are only imported when an app with
+        a matching tag or name is needed.
+        """
 
         reg = ComponentRegistry()
-        app_classes = reg.load_extensions('iotile.app', class_filter=IOTileApp, product_name="app_module")
+        if name is not None:
+            app_classes = reg.load_tagged_extensions('iotile.app', name, 'app_name', _app_names,
+                                                     class_filter=IOTileApp, product_name="app_module")
+        else:
+            app_classes = reg.load_tagged_extensions('iotile.app', app_tag, 'app_tag', _app_tags,
+                                                     class_filter=IOTileApp, product_name="app_module")
 
         for _name, app in app_classes:
             try:
                 matches = app.MatchInfo()
-                name = app.AppName()
+                app_name = app.AppName()
                 for tag, ver_range, quality in matches:
-                    if tag not in self._known_apps:
-                        self._known_apps[tag] = []
+                    known = self._known_apps.setdefault(tag, [])
+                    if not any(x[2] is app for x in known):
+                        known.append((ver_range, quality, app))
 
-                    self._known_apps[tag].append((ver_range, quality, app))
+                if app_name in self._named_apps and self._named_apps[app_name] is not app:
+                    self.logger.warning("Added an app module with an existing name, overriding previous app, name=%s", app_name)
 
-                if name in self._named_apps:
-                    self.logger.warning("Added an app module with an existing name, overriding previous app, name=%s", name)
-
-                self._named_apps[name] = app
+                self._named_apps[app_name] = app
             except Exception:  #pylint: disable=broad-except;We don't want this to die if someone loads a misbehaving plugin
                 self.logger.exception("Error importing misbehaving app module %s, skipping.", app)
 
@@ -149,13 +159,22 @@ class HardwareManager(object):
     @param("basic", "bool", desc="return a basic global proxy rather than a specialized one")
     @param("force", "str", desc="Explicitly set the 6-character ID to match against")
     @param("uuid", "integer", desc="UUID of the device we would like to connect to")
-    def get(self, address, basic=False, force=None, uuid=None):
+    @param("refresh", "bool", desc="ask the tile for its name again even if it is cached")
+    def get(self, address, basic=False, force=None, uuid=None, refresh=False):
         """Create a proxy object for a tile by address.
 
         The correct proxy object is determined by asking the tile for its
         status information and looking up the appropriate proxy in our list of
         installed proxy objects.  If you want to send raw RPCs, you can get a
         basic TileBusProxyObject by passing basic=True.
+
+        The name and version of each tile, and the proxy object they resolve
+        to, are cached for as long as we stay connected to the same device
+        so that repeated calls do not send any RPCs.  The cache is cleared
+        whenever the device is connected, disconnected or reset, or when a
+        proxy object's reset() method is called.  Pass refresh=True or call
+        clear_tile_cache() if a tile may have changed in some other way, for
+        example after it was reflashed.
         """
 
         if basic is True and force is not None:
@@ -167,27 +186,127 @@ class HardwareManager(object):
         if uuid is not None:
             self.connect(uuid)
 
-        tile = self._create_proxy('TileBusProxyObject', address)
-
         if basic:
-            return tile
+            return self._create_proxy('TileBusProxyObject', address)
 
-        name = tile.tile_name()
-        _version = tile.tile_version()
+        info = self._get_tile_info(address, refresh)
 
+        # Now create the appropriate proxy object based on the name and version of the tile
         if force is not None:
             name = force
+            tile_type = self.get_proxy(name)
+        else:
+            name = info['name']
+            if info.get('proxy') is None:
+                info['proxy'] = self.get_proxy(name)
+
+            tile_type = info['proxy']
 
-        # Now create the appropriate proxy object based on the name and version of the tile
-        tile_type = self.get_proxy(name)
         if tile_type is None:
-            raise HardwareError("Could not find proxy object for tile", name="'{}'".format(name), known_names=self._name_map.keys())
+            known_names = ComponentRegistry().list_extension_tags('iotile.proxy', 'proxy_module_name', _proxy_names,
+                                                                  class_filter=TileBusProxyObject, product_name="proxy_module")
+            known_names.add(TileBusProxyObject.ModuleName())
+            raise HardwareError("Could not find proxy object for tile", name="'{}'".format(name), known_names=sorted(known_names))
 
         tile = tile_type(self.stream, address)
         tile._hwmanager = self
 
         return tile
 
+    @return_type("list(basic_dict)")
+    @param("uuid", "integer", desc="UUID of the device we would like to connect to")
+    def discover_tiles(self, uuid=None):
+        """List every tile on the connected device.
+
+        The list of tiles is read from the controller's tile manager, which
+        describes every tile that has registered with it, so discovering all
+        of the tiles takes one RPC per tile rather than probing each address.
+        The name and version of each tile are cached so that subsequent calls
+        to get() for any of them do not need to send any RPCs.
+
+        The controller always describes itself first and is at address 8.
+        Peripheral tiles are at address 10 plus their slot number.
+
+        Args:
+            uuid (int): Optional uuid of device to directly connect to.
+                Passing this parameter is equivalent to calling ``connect``
+                before calling this method
+
+        Returns:
+            list of dict: One dict per tile with its address, name, version
+                (major, minor, patch), slot, hw_type, api_version,
+                executive_version and unique_id.
+        """
+
+        if uuid is not None:
+            self.connect(uuid)
+
+        con = self._create_proxy('TileBusProxyObject', 8)
+
+        try:
+            count, = con.rpc(0x2a, 0x01, result_format="H")
+        except UnsupportedCommandError:
+            raise HardwareError("The controller does not support listing its tiles",
+                                suggestion="Use get(address) for each tile instead")
+
+        self._check_tile_cache()
+
+        tiles = []
+        for i in range(0, count):
+            described = con.rpc(0x2a, 0x02, i, result_format="3B6s6BBL")
+            hw_type, api_major, api_minor, name, fw_major, fw_minor, fw_patch = described[:7]
+            exec_major, exec_minor, exec_patch, slot, unique_id = described[7:]
+
+            address = 8 if i == 0 else 10 + slot
+            name = name.decode('utf-8')
+            version = (fw_major, fw_minor, fw_patch)
+
+            self._tiles[address] = {'name': name, 'version': version}
+            tiles.append({
+                'address': address,
+                'name': name,
+                'version': version,
+                'slot': slot,
+                'hw_type': hw_type,
+                'api_version': (api_major, api_minor),
+                'executive_version': (exec_major, exec_minor, exec_patch),
+                'unique_id': unique_id
+            })
+
+        return tiles
+
+    @annotated
+    def clear_tile_cache(self):
+        """Forget the cached name and version of every tile.
+
+        The next call to get() for each tile will ask it for its name and
+        version again.  This happens automatically when the device is
+        connected, disconnected or reset.
+        """
+
+        self._tiles = {}
+
+    def _check_tile_cache(self):
+        """Clear the tile cache if the connection changed since it was filled."""
+
+        generation = getattr(self.stream, 'connection_generation', None)
+        if generation is None or generation != self._tiles_generation:
+            self._tiles = {}
+            self._tiles_generation = generation
+
+    def _get_tile_info(self, address, refresh=False):
+        """Get the cached name and version of a tile, asking it if needed."""
+
+        self._check_tile_cache()
+
+        info = self._tiles.get(address)
+        if info is None or refresh:
+            status = self._create_proxy('TileBusProxyObject', address).status()
+            info = {'name': status['name'], 'version': status['version']}
+            self._tiles[address] = info
+
+        return info
+
     @docannotate
     def app(self, name=None, path=None, uuid=None):
         """Find the best IOTileApp for the device we are connected to.
@@ -235,8 +354,14 @@ class HardwareManager(object):
         if name is None and path is not None:
             _name, app_class = ComponentRegistry().load_extension(path, class_filter=IOTileApp, unique=True)
         elif name is not None:
+            if name not in self._named_apps:
+                self._find_apps(name=name)
+
             app_class = self._named_apps.get(name)
         else:
+            if app_tag not in self._known_apps:
+                self._find_apps(app_tag=app_tag)
+
             best_match = None
             matching_tags = self._known_apps.get(app_tag, [])
 
@@ -251,7 +376,9 @@ class HardwareManager(object):
                 app_class = best_match[1]
 
         if app_class is None:
-            raise HardwareError("Could not find matching application for device", app_tag=app_tag, explicit_app=name, installed_apps=[x for x in self._named_apps])
+            installed_apps = ComponentRegistry().list_extension_tags('iotile.app', 'app_name', _app_names,
+                                                                     class_filter=IOTileApp, product_name="app_module")
+            raise HardwareError("Could not find matching application for device", app_tag=app_tag, explicit_app=name, installed_apps=sorted(installed_apps))
 
         app = app_class(self, (app_tag, app_version), (os_tag, os_version), device_id)
         return app
@@ -791,10 +918,14 @@ class HardwareManager(object):
         If no proxy type is found, return None.
         """
 
-        if short_name not in self._name_map:
+        matches = self._name_map.get(short_name)
+        if matches is None:
+            matches = self._find_proxies(short_name)
+
+        if len(matches) == 0:
             return None
 
-        return self._name_map[short_name][0]
+        return matches[0]
 
     def _create_proxy(self, proxy, address):
         """
@@ -806,7 +937,10 @@ class HardwareManager(object):
             raise UnknownModuleTypeError("unknown proxy module specified", module_type=proxy, known_types=self._proxies.keys())
 
         proxy_class = self._proxies[proxy]
-        return proxy_class(self.stream, address)
+        tile = proxy_class(self.stream, address)
+        tile._hwmanager = self
+
+        return tile
 
     def _create_stream(self, force_adapter=None):
         conn_string = None
@@ -837,3 +971,15 @@ class HardwareManager(object):
             return AdapterCMDStream(adapter_factory(port), port, conn_string, record=self._record)
 
         raise HardwareError("Could not find transport object registered to handle passed transport type", transport=self.transport)
+
+
+def _proxy_names(proxy_class):
+    return [proxy_class.ModuleName()]
+
+
+def _app_names(app_class):
+    return [app_class.AppName()]
+
+
+def _app_tags(app_class):
+    return [tag for tag, _ver_range, _quality in app_class.MatchInfo()]
@@ -247,6 +247,9 @@ class TileBusProxyObject(object):
         """
         Immediately reset this tile.
         """
+        if self._hwmanager is not None:
+            self._hwmanager.clear_tile_cache()
+
         try:
             self.rpc(0x00, 0x01)
         except ModuleNotFoundError:
@@ -7,5 +7,6 @@
 # are copyright Arch Systems Inc.
 
 from .cmdstream import CMDStream
+from .recording import RPCRecording, RecordedRPC, BinaryRPCRecorder, CSVRPCRecorder
 
-__all__ = ['CMDStream']
+__all__ = ['CMDStream', 'RPCRecording', 'RecordedRPC', 'BinaryRPCRecorder', 'CSVRPCRecorder']
@@ -72,6 +72,7 @@ class AdapterCMDStream(CMDStream):
         """
 
         self.connection_interrupted = True
+        self.connection_generation += 1
 
     def _scan(self, wait=None):
         """Return the devices that have been found for this device adapter.
@@ -0,0 +1,278 @@
+"""Shared decoding of IOTile BLE advertisements.
+
+BLE device adapters can receive hundreds of advertisements per second in a
+dense deployment, so decoding uses precompiled structs and formats each
+sender's address only once.  AdvertisementCache lets adapters skip scan
+callbacks and broadcast reports when a device's advertisement has not
+changed since it was last reported.
+"""
+
+from __future__ import unicode_literals, absolute_import
+import binascii
+import struct
+
+# Offsets inside the 31 byte advertisement and scan response payloads
+V1_ADVERT_MANU_OFFSET = 25
+V1_SCAN_RESPONSE_MANU_OFFSET = 4
+V2_ADVERT_OFFSET = 7
+
+# Manufacturer specific data in v1 advertisements: device uuid, flags
+V1_ADVERT = struct.Struct("<LH")
+
+# Manufacturer specific data in v1 scan responses:
+# voltage, broadcast stream, broadcast value, reading time, current time
+V1_SCAN_RESPONSE = struct.Struct("<HHLLL")
+
+# Service data in v2 advertisements
+V2_ADVERT = struct.Struct("<LHBBLBBHLL")
+
+_V2_INVALID_STREAM = 0xFFFF & ((1 << 15) - 1)
+
+
+# Fields of a scan result that are compared to decide if a device's advertisement
+# changed.  Signal strength and device clocks change with every packet so they
+# are left out.
+_SCAN_CONTENT_KEYS = ('uuid', 'pending_data', 'low_voltage', 'user_connected', 'voltage',
+                      'reboot_counter', 'battery', 'advertising_version')
+
+
+def scan_content(info):
+    """Get the parts of a scan result that matter for deciding if it changed.
+
+    Args:
+        info (dict): A scan result from decode_v1_advertisement or
+            decode_v2_advertisement.
+
+    Returns:
+        tuple: The values of the stable fields in info.
+    """
+
+    return tuple(info.get(key) for key in _SCAN_CONTENT_KEYS)
+
+
+def format_address(raw_address):
+    """Format a 6 byte little endian BLE address as XX:XX:XX:XX:XX:XX.
+
+    Args:
+        raw_address (bytes): The address as sent over the air.
+
+    Returns:
+        str: The formatted address.
+    """
+
+    hexed = binascii.hexlify(bytes(bytearray(raw_address)[::-1])).decode('ascii').upper()
+    return ':'.join((hexed[0:2], hexed[2:4], hexed[4:6], hexed[6:8], hexed[8:10], hexed[10:12]))
+
+
+def decode_v1_advertisement(manu_data, connection_string, rssi, offset=0):
+    """Decode the manufacturer data of a v1 IOTile advertisement.
+
+    Flags for version 1 are:
+      bit 0: whether we have pending data
+      bit 1: whether we are in a low voltage state
+      bit 2: whether another user is connected
+      bit 3: whether we support robust reports
+      bit 4: whether we allow fast writes
+
+    Args:
+        manu_data (bytearray): The buffer containing the manufacturer data.
+        connection_string (str): The connection string to report for the device.
+        rssi (int): The signal strength of the advertisement.
+        offset (int): The offset of the manufacturer data inside manu_data.
+
+    Returns:
+        dict: The scan info for the device.
+    """
+
+    device_uuid, flags = V1_ADVERT.unpack_from(manu_data, offset)
+
+    return {'connection_string': connection_string,
+            'uuid': device_uuid,
+            'pending_data': bool(flags & (1 << 0)),
+            'low_voltage': bool(flags & (1 << 1)),
+            'user_connected': bool(flags & (1 << 2)),
+            'signal_strength': rssi,
+            'advertising_version': 1}
+
+
+def decode_v1_scan_response(manu_data, offset=0):
+    """Decode the manufacturer data of a v1 IOTile scan response.
+
+    Args:
+        manu_data (bytearray): The buffer containing the manufacturer data.
+        offset (int): The offset of the manufacturer data inside manu_data.
+
+    Returns:
+        (float, int, int, int, int): The voltage, the broadcast stream, the
+            broadcast value, the broadcast reading's timestamp and the device's
+            current time.  The stream is 0xFFFF if there is no broadcast reading.
+    """
+
+    voltage, stream, value, reading_time, curr_time = V1_SCAN_RESPONSE.unpack_from(manu_data, offset)
+    return voltage / 256.0, stream, value, reading_time, curr_time
+
+
+def decode_v2_advertisement(data, connection_string, rssi, offset=V2_ADVERT_OFFSET):
+    """Decode a v2 IOTile advertisement.
+
+    Flags for version 2 are:
+      bit 0: Has pending data to stream
+      bit 1: Low voltage indication
+      bit 2: User connected
+      bit 3: Broadcast data is encrypted
+      bit 4: Encryption key is device key
+      bit 5: Encryption key is user key
+      bit 6: broadcast data is time synchronized to avoid leaking
+      information about when it changes
+
+    Args:
+        data (bytearray): The advertisement data.
+        connection_string (str): The connection string to report for the device.
+        rssi (int): The signal strength of the advertisement.
+        offset (int): The offset of the IOTile service data inside data.
+
+    Returns:
+        (dict, tuple): The scan info for the device and the broadcast reading
+            as (stream, value, multiplex channel), or None if there is no
+            broadcast reading.
+    """
+
+    device_id, reboot_low, reboot_high_packed, flags, timestamp, \
+    battery, counter_packed, broadcast_stream_packed, broadcast_value, \
+    _mac = V2_ADVERT.unpack_from(data, offset)
+
+    broadcast_stream = broadcast_stream_packed & ((1 << 15) - 1)
+
+    info = {'connection_string': connection_string,
+            'uuid': device_id,
+            'pending_data': bool(flags & (1 << 0)),
+            'low_voltage': bool(flags & (1 << 1)),
+            'user_connected': bool(flags & (1 << 2)),
+            'signal_strength': rssi,
+            'reboot_counter': (reboot_high_packed & 0xF) << 16 | reboot_low,
+            'sequence': counter_packed & ((1 << 5) - 1),
+            'broadcast_toggle': broadcast_stream_packed >> 15,
+            'timestamp': timestamp,
+            'battery': battery / 32.0,
+            'advertising_version': 2}
+
+    broadcast = None
+    if broadcast_stream != _V2_INVALID_STREAM:
+        broadcast = (broadcast_stream, broadcast_value, counter_packed >> 5)
+
+    return info, broadcast
+
+
+class AdvertisementCache(object):
+    """Remember what each BLE sender last advertised.
+
+    Scan results are only worth reporting when something about the device
+    changes, or periodically so that the device does not expire from the
+    list of visible devices.  Broadcast readings are only worth reporting
+    when they are new.  The cache also holds the formatted address of each
+    sender so that it is only computed once.
+
+    The cache is not thread-safe, it should only be used from the thread that
+    processes advertisements.
+
+    Args:
+        refresh_interval (float): The maximum time in seconds between scan
+            results for a device whose advertisement has not changed.  If this
+            is 0, every advertisement is reported.
+        max_age (float): Scan results for devices that have not been heard
+            from in this many seconds are forgotten.
+    """
+
+    MaxAddresses = 4096
+
+    def __init__(self, refresh_interval=5.0, max_age=120.0):
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._addresses = {}
+        self._scans = {}
+        self._broadcasts = {}
+        self._last_prune = 0.0
+
+    def address(self, raw_address):
+        """Get the formatted address for a raw 6 byte address.
+
+        Args:
+            raw_address (bytes): The address as sent over the air.
+
+        Returns:
+            str: The address formatted as XX:XX:XX:XX:XX:XX.
+        """
+
+        address = self._addresses.get(raw_address)
+        if address is None:
+            address = format_address(raw_address)
+            self._addresses[raw_address] = address
+
+        return address
+
+    def scan_changed(self, sender, content, now):
+        """Check if a scan result should be reported.
+
+        Args:
+            sender (str): The address of the device.
+            content (tuple): The parts of the advertisement that matter, i.e.
+                excluding things like signal strength that change constantly.
+            now (float): The current time in seconds.
+
+        Returns:
+            bool: True if the content changed or was last reported more than
+                refresh_interval seconds ago.
+        """
+
+        if (now - self._last_prune) > self.max_age:
+            self.prune(now)
+
+        last = self._scans.get(sender)
+        if last is not None and last[0] == content and (now - last[1]) < self.refresh_interval:
+            return False
+
+        self._scans[sender] = (content, now)
+        return True
+
+    def broadcast_changed(self, sender, channel, content):
+        """Check if a broadcast reading is new.
+
+        Args:
+            sender (str): The address of the device.
+            channel (int): The multiplexed broadcast channel.
+            content (tuple): Enough information to tell readings apart.
+
+        Returns:
+            bool: True if this is a different reading than the last one seen
+                on this channel of this device.
+        """
+
+        key = (sender, channel)
+        if self._broadcasts.get(key) == content:
+            return False
+
+        self._broadcasts[key] = content
+        return True
+
+    def prune(self, now):
+        """Forget devices that have not been reported for max_age seconds.
+
+        This is called automatically from scan_changed.
+
+        Args:
+            now (float): The current time in seconds.
+        """
+
+        expired = [sender for sender, (_content, last) in self._scans.items() if (now - last) > self.max_age]
+        for sender in expired:
+            del self._scans[sender]
+
+        expired = [key for key in self._broadcasts if key[0] not in self._scans]
+        for key in expired:
+            del self._broadcasts[key]
+
+        # Non-IOTile devices and random addresses would otherwise grow this forever
+        if len(self._addresses) > self.MaxAddresses:
+            self._addresses = {}
+
+        self._last_prune = now
@@ -7,48 +7,11 @@
 # are copyright Arch Systems Inc.
 
 import atexit
-import binascii
-from io import open
-from datetime import datetime
+import time
 from monotonic import monotonic
 from iotile.core.hw.exceptions import StreamOperationNotSupportedError, ModuleBusyError, ModuleNotFoundError
 from iotile.core.exceptions import HardwareError
-
-class _RecordedRPC(object):
-    """Internal helper class for saving recorded RPCs to csv files."""
-
-    def __init__(self, connection, start, runtime, address, rpc_id, call, response=None, status=None, error=None):
-
-        if isinstance(connection, bytes):
-            connection = connection.decode('utf-8')
-
-        self.connection = connection
-        self.start = start
-        self.runtime = runtime
-        self.address = address
-        self.rpc_id = rpc_id
-        self.call = binascii.hexlify(call).decode('utf-8')
-
-        self.response = u""
-        if response is not None:
-            self.response = binascii.hexlify(response).decode('utf-8')
-
-        if status is None:
-            status = -1
-
-        self.status = status
-
-        if error is None:
-            error = u""
-
-        self.error = error
-
-    def serialize(self):
-        """Convert this recorded RPC into a string."""
-
-        return u"{},{: <26},{:2d},{:#06x},{:#04x},{:5.0f},{: <40},{: <40},{}".format(self.connection, self.start.isoformat(), self.address, self.rpc_id,
-                                                                                     self.status, self.runtime * 1000, self.call, self.response, self.error)
-
+from .recording import create_rpc_recorder
 
 open_streams = set()
 
@@ -83,13 +46,19 @@ class CMDStream(object):
         self.connection_string = connection_string
         self.connected = False
         self.port = port
+
+        # Incremented whenever the device we are talking to may have changed
+        # or lost its state, so that callers can invalidate cached information
+        self.connection_generation = 0
         self.record = record
         self.opened = True
 
         open_streams.add(self)
 
+        # RPCs are written to the recording as they finish, see recording.py
+        self._recorder = None
         if self.record is not None:
-            self._recording = []
+            self._recorder = create_rpc_recorder(self.record)
 
         if self.connection_string != None:
             try:
@@ -127,6 +96,7 @@ class CMDStream(object):
         self._connect_direct(connection_string)
         self.connected = True
         self.connection_string = connection_string
+        self.connection_generation += 1
 
     def connect(self, uuid_value, wait=None):
         """Connect to a specific device by its uuid
@@ -150,6 +120,7 @@ class CMDStream(object):
 
         self.connected = True
         self.connection_string = connection_string
+        self.connection_generation += 1
 
     def disconnect(self):
         """Disconnect from the device that we are currently connected to
@@ -162,6 +133,7 @@ class CMDStream(object):
 
         self._disconnect()
         self.connected = False
+        self.connection_generation += 1
 
     def send_rpc(self, address, rpc_id, call_payload, **kwargs):
         if not self.connected:
@@ -170,9 +142,9 @@ class CMDStream(object):
         if not hasattr(self, '_send_rpc'):
             raise StreamOperationNotSupportedError(command="send_rpc")
 
-        if self.record is not None:
+        if self._recorder is not None:
             start_time = monotonic()
-            start_stamp = datetime.utcnow()
+            start_stamp = time.time()
 
         try:
             status = -1
@@ -181,14 +153,12 @@ class CMDStream(object):
             status, payload = self._send_rpc(address, rpc_id, call_payload, **kwargs)
         finally:
             #If we are recording this, save off the call and response
-            if self.record is not None:
+            if self._recorder is not None:
                 end_time = monotonic()
                 duration = end_time - start_time
 
-                recording = _RecordedRPC(self.connection_string, start_stamp, duration, address, rpc_id,
-                                         call_payload, payload, status)
-
-                self._recording.append(recording)
+                self._recorder.record(self.connection_string, start_stamp, duration, address, rpc_id,
+                                      call_payload, payload, status)
 
         if status == 0:
             raise ModuleBusyError(address)
@@ -253,6 +223,7 @@ class CMDStream(object):
             raise StreamOperationNotSupportedError(command="reset")
 
         self._reset()
+        self.connection_generation += 1
 
     def close(self):
         if not self.opened:
@@ -271,16 +242,9 @@ class CMDStream(object):
             open_streams.remove(self)
 
     def _save_recording(self):
-        if not self.record:
+        if self._recorder is None:
             return
 
-        with open(self.record, "w", encoding="utf-8") as outfile:
-            outfile.write(u"# IOTile RPC Recording\n")
-            outfile.write(u"# Format: 1.0\n\n")
-            outfile.write(u"Connection,Timestamp [utc isoformat],Address,RPC ID,Duration [ms],Status,Call,Response,Error\n")
-
-            for recording in self._recording:
-                outfile.write(recording.serialize())
-                outfile.write(u'\n')
-
+        self._recorder.close()
+        self._recorder = None
         self.record = False
@@ -0,0 +1,563 @@
+"""Streaming recordings of the RPCs sent over a CMDStream.
+
+CMDStream writes each RPC to its recording file as soon as it finishes so
+that long soak tests do not need to keep millions of RPCs in memory.  The
+format is chosen by the extension of the recording file:
+
+- .bin: a compact binary format with an index, see BinaryRPCRecorder.
+  Recordings in this format can be loaded with RPCRecording, which can
+  filter them by time, address and rpc id, compute latency statistics and
+  replay them into a virtual device.
+- anything else: the human readable csv format, one line per RPC.
+
+The binary format starts with an 8 byte header: a 4 byte magic number, a
+16-bit format version and a 16-bit index interval.  It is followed by a
+sequence of entries, each starting with a 1 byte type:
+
+- a connection entry (type 1) with a 16-bit length and a utf-8 connection
+  string that applies to all following RPCs.
+- an RPC entry (type 2) with the start time in seconds since the epoch, the
+  duration in seconds, address, rpc id, status (-1 if no status was
+  received) and the lengths of the call and response payloads, followed by
+  the payloads themselves.
+
+When the recording is closed, an index is appended with one block for every
+index interval RPCs.  Each block holds the offset of its first RPC, the
+range of start times of its RPCs, a bitmask of the addresses they were sent
+to and the connection string in effect at its start.  A trailer with the
+offset of the index and a second magic number ends the file.  If the
+recording was not closed, for example because the process crashed, the
+index is rebuilt by scanning the file when it is loaded.
+"""
+
+from __future__ import unicode_literals, absolute_import
+import array
+import logging
+import math
+import struct
+import binascii
+from io import open
+from collections import namedtuple
+from datetime import datetime
+from iotile.core.exceptions import ArgumentError, DataError
+from ..virtual import RPCInvalidIDError, RPCNotFoundError, TileNotFoundError, RPCErrorCode
+
+BINARY_EXTENSION = '.bin'
+BINARY_MAGIC = b'IRPC'
+INDEX_MAGIC = b'IRPX'
+BINARY_VERSION = 1
+DEFAULT_INDEX_INTERVAL = 1024
+
+_FILE_HEADER = struct.Struct("<4sHH")
+_CONNECTION_ENTRY = struct.Struct("<BH")
+_RPC_ENTRY = struct.Struct("<BdfBHhHH")
+_INDEX_HEADER = struct.Struct("<LL")
+_INDEX_BLOCK = struct.Struct("<QLdd32sH")
+_TRAILER = struct.Struct("<Q4s")
+
+_CONNECTION_TYPE = 1
+_RPC_TYPE = 2
+
+_READ_CHUNK = 64*1024
+
+RecordedRPC = namedtuple('RecordedRPC', ['connection', 'start', 'duration', 'address', 'rpc_id', 'call',
+                                         'response', 'status'])
+
+ReplayMismatch = namedtuple('ReplayMismatch', ['rpc', 'status', 'response'])
+
+_IndexBlock = namedtuple('_IndexBlock', ['offset', 'first_rpc', 'min_start', 'max_start', 'addresses',
+                                         'connection'])
+
+
+class _RecordedRPC(object):
+    """Internal helper class for saving recorded RPCs to csv files."""
+
+    def __init__(self, connection, start, runtime, address, rpc_id, call, response=None, status=None, error=None):
+
+        if isinstance(connection, bytes):
+            connection = connection.decode('utf-8')
+
+        self.connection = connection
+        self.start = start
+        self.runtime = runtime
+        self.address = address
+        self.rpc_id = rpc_id
+        self.call = binascii.hexlify(call).decode('utf-8')
+
+        self.response = u""
+        if response is not None:
+            self.response = binascii.hexlify(response).decode('utf-8')
+
+        if status is None:
+            status = -1
+
+        self.status = status
+
+        if error is None:
+            error = u""
+
+        self.error = error
+
+    def serialize(self):
+        """Convert this recorded RPC into a string."""
+
+        return u"{},{: <26},{:2d},{:#06x},{:#04x},{:5.0f},{: <40},{: <40},{}".format(self.connection, self.start.isoformat(), self.address, self.rpc_id,
+                                                                                     self.status, self.runtime * 1000, self.call, self.response, self.error)
+
+
+def create_rpc_recorder(path):
+    """Create a recorder for the format given by a file's extension.
+
+    Args:
+        path (str): The file to record to.  It is overwritten if it exists.
+
+    Returns:
+        BinaryRPCRecorder or CSVRPCRecorder: The recorder.
+    """
+
+    if path.lower().endswith(BINARY_EXTENSION):
+        return BinaryRPCRecorder(path)
+
+    return CSVRPCRecorder(path)
+
+
+class CSVRPCRecorder(object):
+    """Record RPCs to a csv file, one line per RPC.
+
+    Args:
+        path (str): The file to record to.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write(u"# IOTile RPC Recording\n")
+        self._file.write(u"# Format: 1.0\n\n")
+        self._file.write(u"Connection,Timestamp [utc isoformat],Address,RPC ID,Duration [ms],Status,Call,Response,Error\n")
+
+    def record(self, connection, start, duration, address, rpc_id, call, response=None, status=None):
+        """Record a single RPC.
+
+        Args:
+            connection (str): The connection string of the device.
+            start (float): When the RPC was sent in seconds since the epoch.
+            duration (float): How long the RPC took in seconds.
+            address (int): The address of the tile the RPC was sent to.
+            rpc_id (int): The id of the RPC.
+            call (bytes): The call payload.
+            response (bytes): The response payload.
+            status (int): The status code of the RPC or None if the RPC did
+                not finish.
+        """
+
+        recording = _RecordedRPC(connection, datetime.utcfromtimestamp(start), duration, address, rpc_id,
+                                 call, response, status)
+        self._file.write(recording.serialize())
+        self._file.write(u'\n')
+
+    def close(self):
+        """Finish the recording and close its file."""
+
+        self._file.close()
+
+
+class BinaryRPCRecorder(object):
+    """Record RPCs to an indexed binary file.
+
+    See the documentation of this module for a description of the format.
+    Only one index block per index_interval RPCs is kept in memory.
+
+    Args:
+        path (str): The file to record to.
+        index_interval (int): The number of RPCs in each index block.
+    """
+
+    def __init__(self, path, index_interval=DEFAULT_INDEX_INTERVAL):
+        if index_interval <= 0 or index_interval > 0xFFFF:
+            raise ArgumentError("Invalid index interval, must be between 1 and 65535", index_interval=index_interval)
+
+        self._file = open(path, "wb")
+        self._file.write(_FILE_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, index_interval))
+
+        self._offset = _FILE_HEADER.size
+        self._interval = index_interval
+        self._connection = None
+        self._count = 0
+        self._blocks = []
+
+    def record(self, connection, start, duration, address, rpc_id, call, response=None, status=None):
+        """Record a single RPC, see CSVRPCRecorder.record."""
+
+        if isinstance(connection, bytes):
+            connection = connection.decode('utf-8')
+
+        if connection is None:
+            connection = u""
+
+        if connection != self._connection:
+            encoded = connection.encode('utf-8')
+            self._write(_CONNECTION_ENTRY.pack(_CONNECTION_TYPE, len(encoded)) + encoded)
+            self._connection = connection
+
+        if self._count % self._interval == 0:
+            self._blocks.append([self._offset, self._count, start, start, bytearray(32), connection])
+
+        block = self._blocks[-1]
+        block[2] = min(block[2], start)
+        block[3] = max(block[3], start)
+        block[4][address >> 3] |= 1 << (address & 0x7)
+
+        if response is None:
+            response = b''
+
+        if status is None:
+            status = -1
+
+        header = _RPC_ENTRY.pack(_RPC_TYPE, start, duration, address, rpc_id, status, len(call), len(response))
+        self._write(header + bytes(call) + bytes(response))
+        self._count += 1
+
+    def _write(self, data):
+        self._file.write(data)
+        self._offset += len(data)
+
+    def close(self):
+        """Write the index and close the file."""
+
+        index_offset = self._offset
+
+        self._write(_INDEX_HEADER.pack(len(self._blocks), self._count))
+        for offset, first, min_start, max_start, addresses, connection in self._blocks:
+            encoded = connection.encode('utf-8')
+            self._write(_INDEX_BLOCK.pack(offset, first, min_start, max_start, bytes(addresses), len(encoded)) + encoded)
+
+        self._write(_TRAILER.pack(index_offset, INDEX_MAGIC))
+        self._file.close()
+
+
+def _parse_entries(data):
+    """Parse all complete entries at the start of data.
+
+    Yields:
+        (int, tuple): The length of each entry and either (connection,) for
+            a connection entry or (start, duration, address, rpc_id, status,
+            call, response) for an RPC entry.
+    """
+
+    pos = 0
+    while pos < len(data):
+        entry_type = data[pos]
+
+        if entry_type == _CONNECTION_TYPE:
+            if len(data) - pos < _CONNECTION_ENTRY.size:
+                return
+
+            _, length = _CONNECTION_ENTRY.unpack_from(data, pos)
+            end = pos + _CONNECTION_ENTRY.size + length
+            if end > len(data):
+                return
+
+            yield end - pos, (bytes(data[pos + _CONNECTION_ENTRY.size:end]).decode('utf-8'),)
+        elif entry_type == _RPC_TYPE:
+            if len(data) - pos < _RPC_ENTRY.size:
+                return
+
+            _, start, duration, address, rpc_id, status, call_length, response_length = _RPC_ENTRY.unpack_from(data, pos)
+            call_start = pos + _RPC_ENTRY.size
+            response_start = call_start + call_length
+            end = response_start + response_length
+            if end > len(data):
+                return
+
+            yield end - pos, (start, duration, address, rpc_id, status, bytes(data[call_start:response_start]),
+                              bytes(data[response_start:end]))
+        else:
+            raise DataError("Invalid entry type in RPC recording", entry_type=entry_type, offset=pos)
+
+        pos = end
+
+
+def _call_virtual_rpc(device, address, rpc_id, payload):
+    """Call an RPC on a virtual device and compute its status the way VirtualDeviceAdapter does."""
+
+    status = (1 << 6)
+    response = b''
+
+    try:
+        response = device.call_rpc(address, rpc_id, bytes(payload))
+        if len(response) > 0:
+            status |= (1 << 7)
+    except (RPCInvalidIDError, RPCNotFoundError):
+        status = 2
+    except TileNotFoundError:
+        status = 0xFF
+    except RPCErrorCode as exc:
+        status |= exc.params['code'] & ((1 << 6) - 1)
+    except Exception:  # pylint: disable=broad-except; a failing RPC is recorded as a mismatch
+        status = 3
+
+    return status, bytes(response)
+
+
+def _percentile(ordered, fraction):
+    """Get a percentile from a sorted sequence using the nearest rank method."""
+
+    rank = int(math.ceil(fraction * len(ordered)))
+    return ordered[max(rank, 1) - 1]
+
+
+class RPCRecording(object):
+    """A binary RPC recording created by BinaryRPCRecorder.
+
+    The index is used to only read the parts of the file that can contain
+    RPCs matching a filter.  The file is kept open until close() is called,
+    or the with block ends if this is used as a context manager.
+
+    Args:
+        path (str): The path to the recording.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.indexed = True
+        self.truncated = False
+
+        self._logger = logging.getLogger(__name__)
+        self._file = open(path, "rb")
+
+        try:
+            header = self._file.read(_FILE_HEADER.size)
+            if len(header) < _FILE_HEADER.size:
+                raise DataError("File is too short to be an RPC recording", path=path)
+
+            magic, version, self.index_interval = _FILE_HEADER.unpack(header)
+            if magic != BINARY_MAGIC:
+                raise DataError("File is not a binary RPC recording", path=path, magic=magic)
+
+            if version != BINARY_VERSION:
+                raise DataError("Unsupported RPC recording version", path=path, version=version)
+
+            self._load_index()
+        except:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """Close the recording file."""
+
+        self._file.close()
+
+    def _load_index(self):
+        self._file.seek(0, 2)
+        file_size = self._file.tell()
+
+        if file_size >= _FILE_HEADER.size + _INDEX_HEADER.size + _TRAILER.size:
+            self._file.seek(file_size - _TRAILER.size)
+            index_offset, magic = _TRAILER.unpack(self._file.read(_TRAILER.size))
+
+            if magic == INDEX_MAGIC and _FILE_HEADER.size <= index_offset < file_size:
+                self._file.seek(index_offset)
+                index = self._file.read(file_size - _TRAILER.size - index_offset)
+                self._blocks, self._count = self._parse_index(index)
+                self._data_end = index_offset
+                return
+
+        self._logger.warning("RPC recording %s has no index, it was not closed properly, rebuilding it", self.path)
+        self.indexed = False
+        self._data_end = file_size
+        self._scan_index()
+
+    @classmethod
+    def _parse_index(cls, index):
+        if len(index) < _INDEX_HEADER.size:
+            raise DataError("RPC recording index is too short", length=len(index))
+
+        block_count, rpc_count = _INDEX_HEADER.unpack_from(index)
+
+        blocks = []
+        pos = _INDEX_HEADER.size
+        for _i in range(0, block_count):
+            if len(index) - pos < _INDEX_BLOCK.size:
+                raise DataError("RPC recording index is truncated", block_count=block_count, found=len(blocks))
+
+            offset, first, min_start, max_start, addresses, conn_length = _INDEX_BLOCK.unpack_from(index, pos)
+            pos += _INDEX_BLOCK.size
+
+            connection = bytes(index[pos:pos + conn_length]).decode('utf-8')
+            pos += conn_length
+
+            blocks.append(_IndexBlock(offset, first, min_start, max_start, bytearray(addresses), connection))
+
+        return blocks, rpc_count
+
+    def _scan_index(self):
+        blocks = []
+        count = 0
+        connection = u""
+        current = None
+
+        for offset, entry in self._iter_entries(_FILE_HEADER.size, self._data_end):
+            if len(entry) == 1:
+                connection = entry[0]
+                continue
+
+            start, _duration, address = entry[:3]
+
+            if count % self.index_interval == 0:
+                current = [offset, count, start, start, bytearray(32), connection]
+                blocks.append(current)
+
+            current[2] = min(current[2], start)
+            current[3] = max(current[3], start)
+            current[4][address >> 3] |= 1 << (address & 0x7)
+            count += 1
+
+        self._blocks = [_IndexBlock(*block) for block in blocks]
+        self._count = count
+
+    def _iter_entries(self, start, end):
+        """Yield the offset and contents of each complete entry in a range of the file."""
+
+        self._file.seek(start)
+
+        pending = bytearray()
+        offset = start
+        remaining = end - start
+
+        while True:
+            chunk = b''
+            if remaining > 0:
+                chunk = self._file.read(min(_READ_CHUNK, remaining))
+                remaining -= len(chunk)
+
+            pending += chunk
+
+            consumed = 0
+            for length, entry in _parse_entries(pending):
+                yield offset + consumed, entry
+                consumed += length
+
+            del pending[:consumed]
+            offset += consumed
+
+            if len(chunk) == 0:
+                break
+
+        if len(pending) > 0:
+            self.truncated = True
+            self._logger.warning("RPC recording %s ends with a partial entry of %d bytes", self.path, len(pending))
+
+    def iter_rpcs(self, start=None, end=None, address=None, rpc_id=None):
+        """Iterate over the recorded RPCs that match a filter.
+
+        Args:
+            start (float): Only include RPCs sent at or after this time, in
+                seconds since the epoch.
+            end (float): Only include RPCs sent at or before this time.
+            address (int): Only include RPCs sent to this address.
+            rpc_id (int): Only include RPCs with this id.
+
+        Yields:
+            RecordedRPC: Each matching RPC in the order they were recorded.
+        """
+
+        for i, block in enumerate(self._blocks):
+            if start is not None and block.max_start < start:
+                continue
+            if end is not None and block.min_start > end:
+                continue
+            if address is not None and not block.addresses[address >> 3] & (1 << (address & 0x7)):
+                continue
+
+            block_end = self._data_end
+            if i + 1 < len(self._blocks):
+                block_end = self._blocks[i + 1].offset
+
+            connection = block.connection
+            for _offset, entry in self._iter_entries(block.offset, block_end):
+                if len(entry) == 1:
+                    connection = entry[0]
+                    continue
+
+                rpc_start, duration, rpc_address, rpc_rpc_id, status, call, response = entry
+                if start is not None and rpc_start < start:
+                    continue
+                if end is not None and rpc_start > end:
+                    continue
+                if address is not None and rpc_address != address:
+                    continue
+                if rpc_id is not None and rpc_rpc_id != rpc_id:
+                    continue
+
+                yield RecordedRPC(connection, rpc_start, duration, rpc_address, rpc_rpc_id, call, response,
+                                  None if status == -1 else status)
+
+    def latency_stats(self, **filters):
+        """Compute latency statistics for each address and rpc id.
+
+        Args:
+            **filters: The same filters accepted by iter_rpcs.
+
+        Returns:
+            dict: A map of (address, rpc_id) to a dict with count, min, max,
+                mean, median, p90 and p99 keys.  All times are in seconds.
+        """
+
+        durations = {}
+        for rpc in self.iter_rpcs(**filters):
+            key = (rpc.address, rpc.rpc_id)
+            if key not in durations:
+                durations[key] = array.array('d')
+
+            durations[key].append(rpc.duration)
+
+        stats = {}
+        for key, values in durations.items():
+            ordered = sorted(values)
+
+            stats[key] = {
+                'count': len(ordered),
+                'min': ordered[0],
+                'max': ordered[-1],
+                'mean': sum(ordered) / len(ordered),
+                'median': _percentile(ordered, 0.5),
+                'p90': _percentile(ordered, 0.9),
+                'p99': _percentile(ordered, 0.99)
+            }
+
+        return stats
+
+    def replay(self, device, **filters):
+        """Replay the recorded RPCs into a virtual device.
+
+        Each RPC is called on the device with its recorded payload.  The
+        status and response are compared with the recording for every RPC
+        that finished when it was recorded.
+
+        Args:
+            device (VirtualIOTileDevice): The device to replay RPCs into.
+            **filters: The same filters accepted by iter_rpcs.
+
+        Returns:
+            list of ReplayMismatch: The RPCs whose status or response did not
+                match the recording along with what the device returned.
+        """
+
+        mismatches = []
+        for rpc in self.iter_rpcs(**filters):
+            status, response = _call_virtual_rpc(device, rpc.address, rpc.rpc_id, rpc.call)
+            if rpc.status is None:
+                continue
+
+            if status != rpc.status or response != rpc.response:
+                mismatches.append(ReplayMismatch(rpc, status, response))
+
+        return mismatches
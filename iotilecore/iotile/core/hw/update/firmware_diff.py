@@ -0,0 +1,163 @@
+"""Routines for creating reflash records that only contain changed firmware pages."""
+
+from __future__ import (print_function, absolute_import, unicode_literals)
+import sys
+import logging
+from binascii import hexlify, unhexlify
+from iotile.core.exceptions import ArgumentError
+from .records import ReflashTileRecord, ReflashControllerRecord, ReflashDiffRecord
+from .records.reflash_diff import image_hash
+
+if sys.version_info >= (3, 0):
+    basestring = str  # pylint: disable=redefined-builtin,invalid-name
+
+DEFAULT_PAGE_SIZE = 256
+
+_logger = logging.getLogger(__name__)
+
+
+def load_firmware_image(image, padding=0xFF):
+    """Load a firmware image the same way it is embedded in a reflash record.
+
+    The image covers everything from the lowest to the highest address in
+    the hex file with any gaps filled by padding.
+
+    Args:
+        image (str or IntelHex): The path to an intel hex file or an already
+            loaded IntelHex object.
+        padding (int): The value to use for addresses inside the image that
+            are not present in the hex file.
+
+    Returns:
+        (int, bytearray): The offset at which the image starts and its data.
+    """
+
+    # IntelHex is only needed when building scripts, not when parsing them,
+    # so don't import it until then.
+    from iotile.core.utilities.intelhex import IntelHex
+
+    # Copy IntelHex objects so that we don't change their padding
+    image = IntelHex(image)
+    image.padding = padding
+
+    if len(image) == 0:
+        raise ArgumentError("Firmware image is empty")
+
+    offset = image.minaddr()
+    return offset, bytearray(image.tobinstr(start=offset, end=image.maxaddr()))
+
+
+def diff_firmware_images(base_data, new_data, page_size=DEFAULT_PAGE_SIZE):
+    """Find the pages of a firmware image that differ from a base image.
+
+    Both images must start at the same offset.  Pages of the new image that
+    extend past the end of the base image are always included.
+
+    Args:
+        base_data (bytearray): The base firmware image.
+        new_data (bytearray): The new firmware image.
+        page_size (int): The size of each page in bytes.
+
+    Returns:
+        list of (int, bytearray): The index and contents of each changed page
+            in the new image.
+    """
+
+    if page_size <= 0:
+        raise ArgumentError("Invalid page size", page_size=page_size)
+
+    base_view = memoryview(base_data)
+    new_view = memoryview(new_data)
+
+    pages = []
+    for index, start in enumerate(range(0, len(new_data), page_size)):
+        new_page = new_view[start:start + page_size]
+        if new_page != base_view[start:start + page_size]:
+            pages.append((index, bytearray(new_page)))
+
+    return pages
+
+
+def create_reflash_record(new_image, base_image=None, slot=None, controller=False, page_size=DEFAULT_PAGE_SIZE,
+                          expected_base_hash=None):
+    """Create the smallest record that reflashes a tile or controller with a new image.
+
+    If a base image is given, this creates a ReflashDiffRecord containing
+    only the pages that differ from the base image.  It falls back to a full
+    ReflashTileRecord or ReflashControllerRecord when a diff cannot be used or
+    would not be smaller:
+
+    - no base image is given.
+    - the base image does not match expected_base_hash, which should be the
+      hash of the image known to be running on the device.
+    - the base and new images do not start at the same offset.
+    - the encoded diff is not smaller than the full image.
+
+    A device that does not have the base image programmed refuses to execute
+    a ReflashDiffRecord, so scripts meant for devices with unknown firmware
+    should be created without a base image.
+
+    Args:
+        new_image (str or IntelHex): The new firmware as a path to an intel
+            hex file or an IntelHex object.
+        base_image (str or IntelHex): Optional firmware that is currently
+            programmed on the device, as a path or an IntelHex object.
+        slot (int): The slot of the tile to reflash.  Required unless
+            controller is True.
+        controller (bool): Reflash the controller instead of a tile.
+        page_size (int): The size of each page in the diff in bytes.
+        expected_base_hash (str or bytes): Optional image hash of the
+            firmware known to be running on the device, either the 16 raw
+            bytes returned by image_hash() or their hex representation.
+
+    Returns:
+        UpdateRecord: Either a ReflashDiffRecord or a full reflash record.
+    """
+
+    if not controller and slot is None:
+        raise ArgumentError("You must specify the slot to reflash unless you are reflashing the controller")
+
+    offset, new_data = load_firmware_image(new_image)
+
+    record = None
+    if base_image is not None:
+        record = _create_diff_record(offset, new_data, base_image, slot, controller, page_size, expected_base_hash)
+
+    if record is not None:
+        return record
+
+    if controller:
+        return ReflashControllerRecord(new_data, offset)
+
+    return ReflashTileRecord(slot, new_data, offset)
+
+
+def _create_diff_record(offset, new_data, base_image, slot, controller, page_size, expected_base_hash):
+    base_offset, base_data = load_firmware_image(base_image)
+    base_hash = image_hash(base_data)
+
+    if isinstance(expected_base_hash, basestring) and len(expected_base_hash) == 32:
+        expected_base_hash = unhexlify(expected_base_hash)
+
+    if expected_base_hash is not None and bytes(expected_base_hash) != base_hash:
+        _logger.info("Creating a full reflash record because base image %s does not match the expected hash %s",
+                     hexlify(base_hash), hexlify(expected_base_hash))
+        return None
+
+    if base_offset != offset:
+        _logger.info("Creating a full reflash record because the base image starts at 0x%X instead of 0x%X",
+                     base_offset, offset)
+        return None
+
+    pages = diff_firmware_images(base_data, new_data, page_size)
+    record = ReflashDiffRecord(slot, offset, len(new_data), len(base_data), base_hash, image_hash(new_data),
+                               page_size, pages, controller=controller)
+
+    # The full record has a 20 byte header for tiles and 8 bytes for controllers
+    full_length = len(new_data) + (ReflashControllerRecord.RecordHeaderLength if controller else ReflashTileRecord.RecordHeaderLength)
+    if len(record.encode_contents()) >= full_length:
+        _logger.info("Creating a full reflash record because the diff against base image %s is not smaller",
+                     hexlify(base_hash))
+        return None
+
+    return record
@@ -66,9 +66,23 @@ class UpdateRecord(object):
         contents = self.encode_contents()
         record_type = self.MatchType()
 
-        header = struct.pack("<LB3x", len(contents) + UpdateRecord.HEADER_LENGTH, record_type)
+        encoded = bytearray(struct.pack("<LB3x", len(contents) + UpdateRecord.HEADER_LENGTH, record_type))
+        encoded += contents
 
-        return bytearray(header) + contents
+        return encoded
+
+    def encoded_length(self):
+        """Calculate the length of this record once it is encoded, including its header.
+
+        The default implementation encodes the record.  Records that embed
+        large amounts of data should override it with something cheaper
+        since it is called to stream scripts without keeping them in memory.
+
+        Returns:
+            int: The length of the encoded record.
+        """
+
+        return len(self.encode())
 
     def encode_contents(self):
         """Encode the contents of this update record without including a record header.
@@ -184,12 +198,12 @@ class UpdateRecord(object):
         best_match = MatchQuality.NoMatch
         matching_class = None
 
-        for record_class in record_classes:
+        if record_count > 1:
+            match_data = record_data
+        else:
             match_data = record_data[UpdateRecord.HEADER_LENGTH:]
 
-            if record_count > 1:
-                match_data = record_data
-
+        for record_class in record_classes:
             quality = record_class.MatchQuality(match_data, record_count)
 
             if quality > best_match:
@@ -4,6 +4,7 @@ from .reflash_tile import ReflashTileRecord
 from .unknown import UnknownRecord
 from .send_rpc import SendRPCRecord, SendErrorCheckingRPCRecord
 from .reflash_controller import ReflashControllerRecord
+from .reflash_diff import ReflashDiffRecord
 from .reset_device import ResetDeviceRecord
 from .set_version import SetDeviceTagRecord
 from ..record import UpdateRecord
@@ -13,7 +14,8 @@ UpdateRecord.RegisterRecordType(ReflashTileRecord)
 UpdateRecord.RegisterRecordType(SendRPCRecord)
 UpdateRecord.RegisterRecordType(SendErrorCheckingRPCRecord)
 UpdateRecord.RegisterRecordType(ReflashControllerRecord)
+UpdateRecord.RegisterRecordType(ReflashDiffRecord)
 UpdateRecord.RegisterRecordType(ResetDeviceRecord)
 UpdateRecord.RegisterRecordType(SetDeviceTagRecord)
 
-__all__ = ['ReflashTileRecord', 'UnknownRecord', 'SendRPCRecord', 'SendErrorCheckingRPCRecord', 'ReflashControllerRecord', 'SetDeviceTagRecord']
+__all__ = ['ReflashTileRecord', 'UnknownRecord', 'SendRPCRecord', 'SendErrorCheckingRPCRecord', 'ReflashControllerRecord', 'ReflashDiffRecord', 'SetDeviceTagRecord']
@@ -0,0 +1,286 @@
+"""Update script record for patching the changed pages of a firmware image."""
+
+from __future__ import (print_function, absolute_import, unicode_literals)
+import struct
+import hashlib
+from binascii import hexlify
+from future.utils import python_2_unicode_compatible
+from iotile.core.exceptions import ArgumentError, DataError
+from ..record import UpdateRecord, MatchQuality
+from .reflash_tile import _create_target, _parse_target
+
+
+def image_hash(data):
+    """Calculate the hash that identifies a firmware image.
+
+    This is the same truncated sha256 hash that is used to check the
+    integrity of an entire update script.
+
+    Args:
+        data (bytearray): The binary firmware image.
+
+    Returns:
+        bytes: The 16 byte hash of the image.
+    """
+
+    sha = hashlib.sha256()
+    sha.update(data)
+    return sha.digest()[:16]
+
+
+@python_2_unicode_compatible
+class ReflashDiffRecord(UpdateRecord):
+    """Reflash a tile or the controller by patching only the pages that changed.
+
+    Unlike ReflashTileRecord and ReflashControllerRecord, this record does not
+    embed the entire new firmware image.  It contains only the pages of the
+    new image that differ from a base image that is identified by its length
+    and hash.  When this record is executed, the device must check that the
+    image currently programmed at offset matches the base image and refuse to
+    program anything if it does not, since the patched image would be
+    garbage.  After patching, the hash of the new image is checked as well.
+
+    The new image is split into pages of page_size bytes starting at offset.
+    The last page is shorter if the image length is not a multiple of
+    page_size.  If the new image is longer than the base image, every page
+    past the end of the base image must be included.
+
+    Args:
+        slot (int): The slot number that we should target for reflashing.
+            This is ignored if controller is True.
+        offset (int): The absolute memory offset at which both images start.
+        length (int): The length of the new image.
+        base_length (int): The length of the base image.
+        base_hash (bytes): The 16 byte image_hash() of the base image.
+        new_hash (bytes): The 16 byte image_hash() of the new image.
+        page_size (int): The size of each page in bytes.
+        pages (list of (int, bytearray)): The index and contents of each page
+            in the new image that differs from the base image, in order of
+            increasing index.
+        controller (bool): Reflash the controller rather than a tile.
+    """
+
+    RecordType = 6
+    RecordHeaderLength = 56
+
+    _HEADER = struct.Struct("<8sLLL16s16sHH")
+    _PAGE_INDEX = struct.Struct("<L")
+
+    def __init__(self, slot, offset, length, base_length, base_hash, new_hash, page_size, pages, controller=False):
+        if page_size <= 0 or page_size > 0xFFFF:
+            raise ArgumentError("Invalid page size, must be between 1 and 65535 bytes", page_size=page_size)
+
+        if len(base_hash) != 16 or len(new_hash) != 16:
+            raise ArgumentError("Image hashes must be 16 bytes long", base_hash=base_hash, new_hash=new_hash)
+
+        last_index = -1
+        for index, data in pages:
+            if index <= last_index:
+                raise ArgumentError("Pages must be listed in order of increasing index", index=index, previous=last_index)
+
+            if len(data) != self._page_length(index, page_size, length):
+                raise ArgumentError("Page has the wrong length", index=index, length=len(data),
+                                    expected=self._page_length(index, page_size, length))
+
+            last_index = index
+
+        self.slot = 0 if controller else slot
+        self.controller = controller
+        self.offset = offset
+        self.length = length
+        self.base_length = base_length
+        self.base_hash = bytes(base_hash)
+        self.new_hash = bytes(new_hash)
+        self.page_size = page_size
+        self.pages = [(index, bytearray(data)) for index, data in pages]
+
+    @classmethod
+    def _page_length(cls, index, page_size, length):
+        return max(0, min(page_size, length - index*page_size))
+
+    @property
+    def patch_length(self):
+        """The number of firmware bytes embedded in this record."""
+
+        return sum(len(data) for _index, data in self.pages)
+
+    def encode_contents(self):
+        """Encode the contents of this update record without including a record header.
+
+        Returns:
+            bytearary: The encoded contents.
+        """
+
+        target = _create_target(slot=self.slot, controller=self.controller)
+        header = self._HEADER.pack(target, self.offset, self.length, self.base_length, self.base_hash,
+                                   self.new_hash, self.page_size, len(self.pages))
+
+        contents = bytearray(header)
+        for index, data in self.pages:
+            contents += self._PAGE_INDEX.pack(index)
+            contents += data
+
+        return contents
+
+    def encoded_length(self):
+        """Calculate the length of this record once it is encoded, including its header.
+
+        Returns:
+            int: The length of the encoded record.
+        """
+
+        return (UpdateRecord.HEADER_LENGTH + ReflashDiffRecord.RecordHeaderLength
+                + len(self.pages)*self._PAGE_INDEX.size + self.patch_length)
+
+    @classmethod
+    def MatchType(cls):
+        """Return the record type that this record matches.
+
+        All records must match an 8-bit record type field that is used to
+        decode a binary script.  Note that multiple records may match the same
+        8-bit record type if they have different levels of specificity.
+
+        Returns:
+            int: The single record type that this record matches.
+        """
+
+        return ReflashDiffRecord.RecordType
+
+    @classmethod
+    def MatchQuality(cls, record_data, record_count=1):
+        """Check how well this record matches the given binary data.
+
+        This function will only be called if the record matches the type code
+        given by calling MatchType() and this functon should check how well
+        this record matches and return a quality score between 0 and 100, with
+        higher quality matches having higher scores.  The default value should
+        be MatchQuality.GenericMatch which is 50.  If this record does not
+        match at all, it should return MatchQuality.NoMatch.
+
+        Args:
+            record_data (bytearay): The raw record that we should check for
+                a match.
+            record_count (int): The number of binary records that are included
+                in record_data.
+
+        Returns:
+            int: The match quality between 0 and 100.  You should use the
+                constants defined in MatchQuality as much as possible.
+        """
+
+        if record_count > 1:
+            return MatchQuality.NoMatch
+
+        return MatchQuality.GenericMatch
+
+    @classmethod
+    def FromBinary(cls, record_data, record_count=1):
+        """Create an UpdateRecord subclass from binary record data.
+
+        This should be called with a binary record blob (NOT including the
+        record type header) and it will decode it into a ReflashDiffRecord.
+
+        Args:
+            record_data (bytearray): The raw record data that we wish to parse
+                into an UpdateRecord subclass NOT including its 8 byte record header.
+            record_count (int): The number of records included in record_data.
+
+        Raises:
+            ArgumentError: If the record_data is malformed and cannot be parsed.
+
+        Returns:
+            ReflashDiffRecord: The decoded reflash diff record.
+        """
+
+        if len(record_data) < ReflashDiffRecord.RecordHeaderLength:
+            raise ArgumentError("Record was too short to contain a full reflash diff record header",
+                                length=len(record_data), header_length=ReflashDiffRecord.RecordHeaderLength)
+
+        raw_target, offset, length, base_length, base_hash, new_hash, page_size, page_count = cls._HEADER.unpack_from(record_data)
+        target = _parse_target(raw_target)
+
+        if page_size == 0:
+            raise ArgumentError("Invalid page size of 0 in reflash diff record")
+
+        pages = []
+        curr = ReflashDiffRecord.RecordHeaderLength
+        for _i in range(0, page_count):
+            if len(record_data) - curr < cls._PAGE_INDEX.size:
+                raise ArgumentError("Reflash diff record ended in the middle of a page", page_count=page_count, found=len(pages))
+
+            index, = cls._PAGE_INDEX.unpack_from(record_data, curr)
+            curr += cls._PAGE_INDEX.size
+
+            page_length = cls._page_length(index, page_size, length)
+            if page_length == 0:
+                raise ArgumentError("Page index is past the end of the new firmware image", index=index, length=length)
+
+            data = record_data[curr:curr + page_length]
+            if len(data) != page_length:
+                raise ArgumentError("Reflash diff record ended in the middle of a page", page_count=page_count, found=len(pages))
+
+            pages.append((index, data))
+            curr += page_length
+
+        if curr != len(record_data):
+            raise ArgumentError("Reflash diff record contained extra data after its pages", length=len(record_data), used=curr)
+
+        return ReflashDiffRecord(target['slot'], offset, length, base_length, base_hash, new_hash, page_size, pages,
+                                 controller=target['controller'])
+
+    def apply(self, offset, base_data):
+        """Patch a base image to produce the new firmware image.
+
+        This is what a device does when it executes this record, checking
+        that it has the right base image before patching it and that the
+        patched image is correct afterwards.
+
+        Args:
+            offset (int): The absolute memory offset at which base_data starts.
+            base_data (bytearray): The firmware image currently programmed.
+
+        Raises:
+            DataError: If base_data is not the base image this record was
+                created against.  The caller must fall back to a full reflash.
+
+        Returns:
+            bytearray: The new firmware image, starting at offset.
+        """
+
+        if offset != self.offset or len(base_data) != self.base_length or image_hash(base_data) != self.base_hash:
+            raise DataError("Firmware image does not match the base image of a reflash diff record",
+                            offset=offset, expected_offset=self.offset, length=len(base_data),
+                            expected_length=self.base_length, expected_hash=hexlify(self.base_hash))
+
+        new_data = bytearray(base_data[:self.length])
+        if len(new_data) < self.length:
+            new_data += bytearray(b'\xff') * (self.length - len(new_data))
+
+        for index, data in self.pages:
+            start = index*self.page_size
+            new_data[start:start + len(data)] = data
+
+        if image_hash(new_data) != self.new_hash:
+            raise DataError("Patched firmware image has the wrong hash", expected_hash=hexlify(self.new_hash),
+                            calculated_hash=hexlify(image_hash(new_data)))
+
+        return new_data
+
+    def __eq__(self, other):
+        if not isinstance(other, ReflashDiffRecord):
+            return False
+
+        return (self.slot == other.slot and self.controller == other.controller and self.offset == other.offset
+                and self.length == other.length and self.base_length == other.base_length
+                and self.base_hash == other.base_hash and self.new_hash == other.new_hash
+                and self.page_size == other.page_size and self.pages == other.pages)
+
+    def __str__(self):
+        if self.controller:
+            target = "controller"
+        else:
+            target = "slot %d" % self.slot
+
+        return "Patch %s with %d changed %d byte pages (%d bytes) of a %d (0x%X) byte image starting at offset %d (0x%X) (base image: %s)" % (
+            target, len(self.pages), self.page_size, self.patch_length, self.length, self.length, self.offset,
+            self.offset, hexlify(self.base_hash).decode('utf-8'))
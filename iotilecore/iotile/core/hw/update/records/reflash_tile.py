@@ -44,6 +44,15 @@ class ReflashTileRecord(UpdateRecord):
         header = struct.pack("<LL8sBxxx", self.offset, len(self.raw_data), _create_target(slot=self.slot), self.hardware_type)
         return bytearray(header) + self.raw_data
 
+    def encoded_length(self):
+        """Calculate the length of this record once it is encoded, including its header.
+
+        Returns:
+            int: The length of the encoded record.
+        """
+
+        return UpdateRecord.HEADER_LENGTH + ReflashTileRecord.RecordHeaderLength + len(self.raw_data)
+
     @classmethod
     def MatchType(cls):
         """Return the record type that this record matches.
@@ -141,7 +150,7 @@ class ReflashTileRecord(UpdateRecord):
 _MATCH_SLOT = 1
 _MATCH_CONTROLLER = 2
 
-def _create_target(slot):
+def _create_target(slot, controller=False):
     """Create binary targetting information.
 
     This function implements a subset of the targetting supported
@@ -150,12 +159,17 @@ def _create_target(slot):
 
     Args:
         slot (int): The slot that we wish to target
+        controller (bool): Target the controller instead of a slot.  slot
+            is ignored if this is True.
 
     Returns:
         bytes: an 8-byte blob containing targeting information.
     """
 
-    return struct.pack("<B6xB", slot, 1)  # 1 is kTBMatchBySlot
+    if controller:
+        return struct.pack("<B6xB", 0, _MATCH_CONTROLLER)
+
+    return struct.pack("<B6xB", slot, _MATCH_SLOT)
 
 
 def _parse_target(target):
@@ -1,9 +1,12 @@
 """A list of update records that specify a script for updating a device."""
 
 from __future__ import (print_function, absolute_import, unicode_literals)
+import sys
+import zlib
 import struct
 import hashlib
 import logging
+import itertools
 from hmac import compare_digest
 from binascii import hexlify
 from collections import namedtuple
@@ -11,12 +14,26 @@ from iotile.core.exceptions import ArgumentError, DataError
 from .record import UpdateRecord, DeferMatching
 from .records import UnknownRecord, SendRPCRecord, SendErrorCheckingRPCRecord
 
+if sys.version_info >= (3, 0):
+    basestring = str  # pylint: disable=redefined-builtin,invalid-name
+
 ScriptHeader = namedtuple('ScriptHeader', ['header_length', 'authenticated', 'integrity_checked', 'encrypted'])
 
 
 class UpdateScript(object):
     """An update script that consists of a list of UpdateRecord objects.
 
+    Scripts can be parsed from memory with FromBinary() or from a file with
+    FromFile().  If you only need to look at each record once, IterRecords()
+    and IterFile() parse records lazily so that only one record is kept in
+    memory at a time.  Similarly, encode_to() and iter_encoded() produce the
+    encoded script without building the entire script in memory.
+
+    Scripts can also be sent to devices that support it in a compressed
+    container created by encode_compressed() or CompressBinary().  The
+    container has its own magic number so it is recognized and decompressed
+    automatically by all of the parsing functions.
+
     Args:
         records (list of UpdateRecord): The records that make up this script.
     """
@@ -24,6 +41,14 @@ class UpdateScript(object):
     SCRIPT_MAGIC = 0x1F2E3D4C
     SCRIPT_HEADER_LENGTH = 24
 
+    # hash, magic, total length, uncompressed length, compression method
+    COMPRESSED_SCRIPT_MAGIC = 0x1F2E3D4D
+    COMPRESSED_HEADER_LENGTH = 32
+    COMPRESSION_ZLIB = 1
+
+    # The size of the blocks that are read to check the hash of a script file
+    HASH_CHUNK_SIZE = 64*1024
+
     logger = logging.getLogger(__name__)
 
     def __init__(self, records):
@@ -48,26 +73,132 @@ class UpdateScript(object):
             ScriptHeader: The parsed script header information
         """
 
-        if len(script_data) < UpdateScript.SCRIPT_HEADER_LENGTH:
-            raise ArgumentError("Script is too short to contain a script header", length=len(script_data), header_length=UpdateScript.SCRIPT_HEADER_LENGTH)
+        return cls._parse_header(_MemoryScriptReader(script_data))
+
+    @classmethod
+    def _parse_header(cls, reader):
+        if reader.length < UpdateScript.SCRIPT_HEADER_LENGTH:
+            raise ArgumentError("Script is too short to contain a script header", length=reader.length, header_length=UpdateScript.SCRIPT_HEADER_LENGTH)
+
+        embedded_hash, magic, total_length = struct.unpack_from("<16sLL", reader.view(0, UpdateScript.SCRIPT_HEADER_LENGTH))
+        if magic == UpdateScript.COMPRESSED_SCRIPT_MAGIC:
+            raise ArgumentError("Script is compressed, it must be decompressed with DecompressBinary() first")
 
-        embedded_hash, magic, total_length = struct.unpack_from("<16sLL", script_data)
         if magic != UpdateScript.SCRIPT_MAGIC:
             raise ArgumentError("Script has invalid magic value", expected=UpdateScript.SCRIPT_MAGIC, found=magic)
 
-        if total_length != len(script_data):
-            raise ArgumentError("Script length does not match embedded length", embedded_length=total_length, length=len(script_data))
+        if total_length != reader.length:
+            raise ArgumentError("Script length does not match embedded length", embedded_length=total_length, length=reader.length)
 
-        hashed_data = script_data[16:]
+        cls._check_hash(reader, embedded_hash)
+
+        return ScriptHeader(UpdateScript.SCRIPT_HEADER_LENGTH, False, True, False)
 
+    @classmethod
+    def _check_hash(cls, reader, embedded_hash):
         sha = hashlib.sha256()
-        sha.update(hashed_data)
+        for offset in range(16, reader.length, cls.HASH_CHUNK_SIZE):
+            sha.update(reader.view(offset, min(cls.HASH_CHUNK_SIZE, reader.length - offset)))
+
         hash_value = sha.digest()[:16]
 
         if not compare_digest(embedded_hash, hash_value):
             raise ArgumentError("Script has invalid embedded hash", embedded_hash=hexlify(embedded_hash), calculated_hash=hexlify(hash_value))
 
-        return ScriptHeader(UpdateScript.SCRIPT_HEADER_LENGTH, False, True, False)
+    @classmethod
+    def IsCompressed(cls, script_data):
+        """Check if a binary script is in a compressed container.
+
+        Args:
+            script_data (bytearray): The binary script.
+
+        Returns:
+            bool: True if the script is compressed and must be passed to
+                DecompressBinary() before it can be executed.
+        """
+
+        if len(script_data) < UpdateScript.SCRIPT_HEADER_LENGTH:
+            return False
+
+        magic, = struct.unpack_from("<L", script_data, 16)
+        return magic == UpdateScript.COMPRESSED_SCRIPT_MAGIC
+
+    @classmethod
+    def CompressBinary(cls, script_data, level=9):
+        """Wrap an encoded script in a compressed container.
+
+        The container has the same integrity hash as a script followed by a
+        different magic number, its total length, the length of the
+        uncompressed script and the compression method.  The script is
+        compressed with zlib so that it can be inflated incrementally by
+        devices with little RAM.
+
+        Args:
+            script_data (bytearray): The encoded script to compress.
+            level (int): The zlib compression level to use.
+
+        Returns:
+            bytearray: The compressed container.
+        """
+
+        blob = bytearray(cls.COMPRESSED_HEADER_LENGTH)
+        blob += zlib.compress(bytes(script_data), level)
+
+        struct.pack_into("<LLLB3x", blob, 16, cls.COMPRESSED_SCRIPT_MAGIC, len(blob), len(script_data), cls.COMPRESSION_ZLIB)
+
+        sha = hashlib.sha256()
+        sha.update(memoryview(blob)[16:])
+        blob[:16] = sha.digest()[:16]
+
+        return blob
+
+    @classmethod
+    def DecompressBinary(cls, script_data):
+        """Extract the script from a compressed container.
+
+        The container's integrity hash and lengths are checked and the
+        uncompressed script is never allowed to grow past its declared
+        length.
+
+        Args:
+            script_data (bytearray): The compressed container created by
+                CompressBinary().
+
+        Raises:
+            ArgumentError: If the container is malformed or corrupt.
+
+        Returns:
+            bytearray: The encoded script, which still needs to be parsed.
+        """
+
+        reader = _MemoryScriptReader(script_data)
+        if reader.length < cls.COMPRESSED_HEADER_LENGTH:
+            raise ArgumentError("Compressed script is too short to contain a header", length=reader.length,
+                                header_length=cls.COMPRESSED_HEADER_LENGTH)
+
+        embedded_hash, magic, total_length, length, method = struct.unpack_from("<16sLLLB3x", reader.view(0, cls.COMPRESSED_HEADER_LENGTH))
+        if magic != cls.COMPRESSED_SCRIPT_MAGIC:
+            raise ArgumentError("Compressed script has invalid magic value", expected=cls.COMPRESSED_SCRIPT_MAGIC, found=magic)
+
+        if total_length != reader.length:
+            raise ArgumentError("Compressed script length does not match embedded length", embedded_length=total_length, length=reader.length)
+
+        if method != cls.COMPRESSION_ZLIB:
+            raise ArgumentError("Unsupported script compression method", method=method, supported=[cls.COMPRESSION_ZLIB])
+
+        cls._check_hash(reader, embedded_hash)
+
+        decompressor = zlib.decompressobj()
+        try:
+            decompressed = decompressor.decompress(reader.view(cls.COMPRESSED_HEADER_LENGTH, reader.length).tobytes(), length + 1)
+        except zlib.error as err:
+            raise ArgumentError("Compressed script could not be decompressed: %s" % str(err))
+
+        if len(decompressed) != length or len(decompressor.unconsumed_tail) > 0:
+            raise ArgumentError("Decompressed script length does not match embedded length", embedded_length=length,
+                                length=len(decompressed))
+
+        return bytearray(decompressed)
 
     @classmethod
     def FromBinary(cls, script_data, allow_unknown=True, show_rpcs=False):
@@ -88,33 +219,144 @@ class UpdateScript(object):
             UpdateScript: The parsed update script.
         """
 
-        curr = 0
-        records = []
+        return UpdateScript(list(cls.IterRecords(script_data, allow_unknown, show_rpcs)))
+
+    @classmethod
+    def FromFile(cls, path, allow_unknown=True, show_rpcs=False):
+        """Parse a binary update script from a file.
+
+        This reads the file one record at a time rather than loading it
+        into memory first.  See FromBinary() for a description of the
+        arguments and exceptions.
+
+        Args:
+            path (str): The path to the binary script file.
+
+        Returns:
+            UpdateScript: The parsed update script.
+        """
+
+        return UpdateScript(list(cls.IterFile(path, allow_unknown, show_rpcs)))
+
+    @classmethod
+    def IterRecords(cls, script_data, allow_unknown=True, show_rpcs=False):
+        """Lazily parse the records in a binary update script.
+
+        The script header and hash are checked immediately but each record is
+        only parsed when it is requested.  The script data is accessed through
+        a memoryview, so it can be anything that supports the buffer protocol,
+        including an mmap object, and is never copied as a whole.  See
+        FromBinary() for a description of the arguments and exceptions.
+
+        Args:
+            script_data (bytearray): The binary data containing the script.
+
+        Returns:
+            iterator of UpdateRecord: The records in the script.
+        """
+
+        if cls.IsCompressed(script_data):
+            script_data = cls.DecompressBinary(script_data)
+
+        reader = _MemoryScriptReader(script_data)
+        header = cls._parse_header(reader)
+
+        return cls._iter_records(reader, header, allow_unknown, show_rpcs)
+
+    @classmethod
+    def IterFile(cls, script_file, allow_unknown=True, show_rpcs=False):
+        """Lazily parse the records in a binary update script file.
+
+        The file is read in blocks to check the script header and hash
+        immediately and each record is only read and parsed when it is
+        requested, so memory use is bounded by the size of the largest
+        record.  Compressed scripts are the exception since they are
+        decompressed into memory first.  See FromBinary() for a description
+        of the arguments and exceptions.
+
+        Args:
+            script_file (str or file): The path to the binary script file or
+                a seekable file object opened in binary mode and positioned
+                at the start of the script, which must extend to the end of
+                the file.  If a path is passed, the file is closed once all
+                records have been returned.
+
+        Returns:
+            iterator of UpdateRecord: The records in the script.
+        """
+
+        if not isinstance(script_file, basestring):
+            reader = _FileScriptReader(script_file)
+            if cls._is_compressed_file(reader):
+                return cls.IterRecords(reader.read(0, reader.length), allow_unknown, show_rpcs)
 
-        header = cls.ParseHeader(script_data)
+            header = cls._parse_header(reader)
+            return cls._iter_records(reader, header, allow_unknown, show_rpcs)
+
+        infile = open(script_file, "rb")
+        try:
+            reader = _FileScriptReader(infile)
+            compressed = cls._is_compressed_file(reader)
+
+            if compressed:
+                script_data = reader.read(0, reader.length)
+            else:
+                header = cls._parse_header(reader)
+        except Exception:
+            infile.close()
+            raise
+
+        if compressed:
+            infile.close()
+            return cls.IterRecords(script_data, allow_unknown, show_rpcs)
+
+        return cls._iter_file_records(infile, reader, header, allow_unknown, show_rpcs)
+
+    @classmethod
+    def _is_compressed_file(cls, reader):
+        if reader.length < UpdateScript.SCRIPT_HEADER_LENGTH:
+            return False
+
+        return cls.IsCompressed(reader.view(0, UpdateScript.SCRIPT_HEADER_LENGTH))
+
+    @classmethod
+    def _iter_file_records(cls, infile, reader, header, allow_unknown, show_rpcs):
+        try:
+            for record in cls._iter_records(reader, header, allow_unknown, show_rpcs):
+                yield record
+        finally:
+            infile.close()
+
+    @classmethod
+    def _iter_records(cls, reader, header, allow_unknown, show_rpcs):
         curr = header.header_length
 
         cls.logger.debug("Parsed script header: %s, skipping %d bytes", header, curr)
 
+        # Records that are matched together are always contiguous so we just
+        # keep track of where the current group of records started
+        record_start = curr
         record_count = 0
-        record_data = bytearray()
         partial_match = None
         match_offset = 0
 
-        while curr < len(script_data):
-            if len(script_data) - curr < UpdateRecord.HEADER_LENGTH:
-                raise ArgumentError("Script ended with a partial record", remaining_length=len(script_data) - curr)
+        while curr < reader.length:
+            if reader.length - curr < UpdateRecord.HEADER_LENGTH:
+                raise ArgumentError("Script ended with a partial record", remaining_length=reader.length - curr)
 
             # Add another record to our current list of records that we're parsing
 
-            total_length, record_type = struct.unpack_from("<LB", script_data[curr:])
+            total_length, record_type = struct.unpack_from("<LB", reader.view(curr, UpdateRecord.HEADER_LENGTH))
             cls.logger.debug("Found record of type %d, length %d", record_type, total_length)
 
-            record_data += script_data[curr:curr+total_length]
-            record_count += 1
+            if total_length < UpdateRecord.HEADER_LENGTH or total_length > reader.length - curr:
+                raise ArgumentError("Script contained a record with an invalid length", length=total_length,
+                                    remaining_length=reader.length - curr, offset=curr)
 
+            record_count += 1
             curr += total_length
 
+            record_data = reader.read(record_start, curr - record_start)
 
             try:
                 if show_rpcs and record_type == SendRPCRecord.MatchType():
@@ -148,14 +390,21 @@ class UpdateScript(object):
                     record = UnknownRecord(record_type, record_data[UpdateRecord.HEADER_LENGTH:])
 
             # Reset our record accumulator since we successfully matched one or more records
+            record_start = curr
             record_count = 0
-            record_data = bytearray()
             partial_match = None
             match_offset = 0
 
-            records.append(record)
+            yield record
 
-        return UpdateScript(records)
+    def encoded_length(self):
+        """Calculate the length of this script once it is encoded.
+
+        Returns:
+            int: The length of the encoded script in bytes.
+        """
+
+        return self.SCRIPT_HEADER_LENGTH + sum(record.encoded_length() for record in self.records)
 
     def encode(self):
         """Encode this record into a binary blob.
@@ -166,19 +415,120 @@ class UpdateScript(object):
             bytearray: The binary encoded script.
         """
 
-        blob = bytearray()
+        blob = bytearray(self.SCRIPT_HEADER_LENGTH)
 
         for record in self.records:
             blob += record.encode()
 
-        header = struct.pack("<LL", self.SCRIPT_MAGIC, len(blob) + self.SCRIPT_HEADER_LENGTH)
-        blob = header + blob
+        struct.pack_into("<LL", blob, 16, self.SCRIPT_MAGIC, len(blob))
 
         sha = hashlib.sha256()
-        sha.update(blob)
-        hash_value = sha.digest()[:16]
+        sha.update(memoryview(blob)[16:])
+        blob[:16] = sha.digest()[:16]
+
+        return blob
+
+    def encode_compressed(self, level=9):
+        """Encode this script into a compressed container.
+
+        Only send compressed scripts to devices that are known to support
+        them.  See CompressBinary().
 
-        return bytearray(hash_value) + blob
+        Args:
+            level (int): The zlib compression level to use.
+
+        Returns:
+            bytearray: The compressed script.
+        """
+
+        return self.CompressBinary(self.encode(), level)
+
+    def encode_to(self, outfile):
+        """Encode this script directly into a file.
+
+        Each record is encoded and written separately so the entire encoded
+        script is never held in memory.  If outfile is seekable, each record
+        is only encoded once and the script hash is filled in at the end,
+        otherwise this writes the output of iter_encoded().
+
+        Args:
+            outfile (file): A file object opened for writing in binary mode.
+
+        Returns:
+            int: The number of bytes written.
+        """
+
+        try:
+            start = outfile.tell()
+        except (AttributeError, IOError, OSError):
+            start = None
+
+        if start is None:
+            written = 0
+            for chunk in self.iter_encoded():
+                outfile.write(chunk)
+                written += len(chunk)
+
+            return written
+
+        total_length = self.encoded_length()
+        script_info = struct.pack("<LL", self.SCRIPT_MAGIC, total_length)
+
+        sha = hashlib.sha256()
+        sha.update(script_info)
+
+        outfile.write(bytes(bytearray(16)))
+        outfile.write(script_info)
+
+        for record in self.records:
+            encoded = record.encode()
+            sha.update(encoded)
+            outfile.write(encoded)
+
+        end = outfile.tell()
+        outfile.seek(start)
+        outfile.write(sha.digest()[:16])
+        outfile.seek(end)
+
+        return total_length
+
+    def iter_encoded(self, chunk_size=None):
+        """Encode this script as a series of chunks.
+
+        This is meant for sending a script to a transport in pieces without
+        building the entire encoded script in memory.  Since the script hash
+        comes first, every record is encoded twice, once to calculate the
+        hash and once to return it.  If memory is not a concern, encode() is
+        faster.
+
+        Args:
+            chunk_size (int): Optional size of each chunk.  If given, every
+                chunk except the last will be exactly this long, otherwise
+                the header and each record are returned as separate chunks.
+
+        Returns:
+            iterator of bytearray: The chunks of the encoded script.
+        """
+
+        if chunk_size is not None and chunk_size <= 0:
+            raise ArgumentError("Invalid chunk size", chunk_size=chunk_size)
+
+        pieces = itertools.chain([self._encode_header()], (record.encode() for record in self.records))
+        if chunk_size is None:
+            return pieces
+
+        return _rechunk(pieces, chunk_size)
+
+    def _encode_header(self):
+        script_info = struct.pack("<LL", self.SCRIPT_MAGIC, self.encoded_length())
+
+        sha = hashlib.sha256()
+        sha.update(script_info)
+
+        for record in self.records:
+            sha.update(record.encode())
+
+        return bytearray(sha.digest()[:16]) + script_info
 
     def __eq__(self, other):
         if not isinstance(other, UpdateScript):
@@ -195,3 +545,71 @@ class UpdateScript(object):
 
     def __ne__(self, other):
         return not self == other
+
+
+def _rechunk(pieces, chunk_size):
+    """Regroup a series of byte strings into chunks of a fixed size."""
+
+    pending = bytearray()
+    for piece in pieces:
+        pending += piece
+
+        if len(pending) < chunk_size:
+            continue
+
+        end = len(pending) - (len(pending) % chunk_size)
+        for offset in range(0, end, chunk_size):
+            yield pending[offset:offset + chunk_size]
+
+        del pending[:end]
+
+    if len(pending) > 0:
+        yield pending
+
+
+class _MemoryScriptReader(object):
+    """Access parts of an in-memory script without copying all of it."""
+
+    def __init__(self, script_data):
+        try:
+            self._view = memoryview(script_data)
+        except TypeError:
+            # Python 2 objects like mmap only support the old buffer protocol
+            self._view = memoryview(bytearray(script_data))
+
+        self.length = len(self._view) * self._view.itemsize
+
+    def view(self, offset, length):
+        """Get a part of the script without copying it."""
+
+        return self._view[offset:offset + length]
+
+    def read(self, offset, length):
+        """Copy a part of the script."""
+
+        return bytearray(self._view[offset:offset + length])
+
+
+class _FileScriptReader(object):
+    """Read parts of a script that starts at the current position of a seekable file."""
+
+    def __init__(self, infile):
+        self._file = infile
+        self._start = infile.tell()
+
+        infile.seek(0, 2)
+        self.length = infile.tell() - self._start
+
+    def read(self, offset, length):
+        """Read a part of the script."""
+
+        self._file.seek(self._start + offset)
+
+        data = bytearray(length)
+        read_length = self._file.readinto(data)
+        if read_length != length:
+            raise DataError("Script file was truncated while reading it", offset=offset, length=length, read=read_length)
+
+        return data
+
+    view = read
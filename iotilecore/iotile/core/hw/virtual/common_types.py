@@ -1,5 +1,6 @@
 """Shared decorators and exceptions used in virtual tiles and devices."""
 
+import sys
 import struct
 import binascii
 import inspect
@@ -45,36 +46,94 @@ class AsynchronousRPCResponse(IOTileException):
         super(AsynchronousRPCResponse, self).__init__("RPC handler elected to return asynchronously")
 
 
-def _create_argcode(code, arg_bytes):
-    if not code.endswith('V'):
-        return "<" + code
+# Format codes where struct.pack can silently change a value so that packed
+# arguments must be unpacked again and compared to detect the change.  On
+# python 2, integer codes also accept (and truncate) floats.
+_LOSSY_CODES = "spfe?"
+_STRICT_INTEGERS = sys.version_info >= (3, 0)
 
-    code = code[:-1]
-    fixed_size = struct.calcsize("<" + code)
+# Variable length payloads can never be larger than this so we only cache
+# compiled structs up to this length.
+_MAX_CACHED_VARIABLE_LENGTH = 20
+_MAX_CACHED_FORMATS = 1024
+_FORMAT_CACHE = {}
+
+
+class _RPCFormat(object):
+    """A parsed RPC format code with its compiled struct objects.
+
+    RPC payloads are packed and unpacked very frequently with a small number
+    of distinct format codes, so each format is parsed once and the
+    struct.Struct objects it needs are cached.
+
+    Args:
+        code (str): A struct format code, without the <, that may end with V.
+    """
+
+    def __init__(self, code):
+        self.variable = code.endswith('V')
+        if self.variable:
+            code = code[:-1]
+
+        self.fixed_code = code
+        self.fixed = struct.Struct("<" + code)
+        self.lossy = not _STRICT_INTEGERS or any(x in code for x in _LOSSY_CODES)
+        self._variable = {}
+
+    def get_struct(self, var_length):
+        """Get the compiled struct for a payload with the given variable length."""
+
+        if not self.variable:
+            return self.fixed
+
+        compiled = self._variable.get(var_length)
+        if compiled is None:
+            compiled = struct.Struct("<%s%ds" % (self.fixed_code, var_length))
+            if var_length <= _MAX_CACHED_VARIABLE_LENGTH:
+                self._variable[var_length] = compiled
+
+        return compiled
+
+
+def _get_format(code):
+    rpc_format = _FORMAT_CACHE.get(code)
+    if rpc_format is None:
+        rpc_format = _RPCFormat(code)
+
+        if len(_FORMAT_CACHE) >= _MAX_CACHED_FORMATS:
+            _FORMAT_CACHE.clear()
+
+        _FORMAT_CACHE[code] = rpc_format
+
+    return rpc_format
+
+
+def _get_arg_struct(code, arg_bytes):
+    rpc_format = _get_format(code)
+    if not rpc_format.variable:
+        return rpc_format.fixed
+
+    fixed_size = rpc_format.fixed.size
     var_size = len(arg_bytes) - fixed_size
 
     if var_size < 0:
-        raise RPCInvalidArgumentsError("Argument was too small for variable size argument value", arg_format=code,
+        raise RPCInvalidArgumentsError("Argument was too small for variable size argument value", arg_format=rpc_format.fixed_code,
                                        minimum_size=fixed_size, actual_size=len(arg_bytes),
                                        payload=binascii.hexlify(arg_bytes))
 
-    return "<" + code + "%ds" % var_size
-
-
-def _create_respcode(code, resp):
-    if not code.endswith('V'):
-        return "<" + code
+    return rpc_format.get_struct(var_size)
 
-    code = code[:-1]
 
+def _get_resp_struct(rpc_format, resp):
     final_length = len(resp[-1])
-    fixed_size = struct.calcsize("<" + code)
+    fixed_size = rpc_format.fixed.size
 
     if fixed_size + final_length > 20:
         raise RPCInvalidReturnValueError("Variable length return value is too large for rpc response payload (20 bytes)",
-                                         fixed_code=code, fixed_length=fixed_size, variable_length=final_length,
+                                         fixed_code=rpc_format.fixed_code, fixed_length=fixed_size, variable_length=final_length,
                                          variable_payload=binascii.hexlify(resp[-1]))
-    return "<" + code + "%ds" % final_length
+
+    return rpc_format.get_struct(final_length)
 
 
 def pack_rpc_payload(arg_format, args):
@@ -90,13 +149,20 @@ def pack_rpc_payload(arg_format, args):
         bytes: The packed argument buffer.
     """
 
-    code = _create_respcode(arg_format, args)
+    rpc_format = _get_format(arg_format)
+    if rpc_format.variable:
+        packer = _get_resp_struct(rpc_format, args)
+    else:
+        packer = rpc_format.fixed
+
+    packed_result = packer.pack(*args)
+
+    if rpc_format.lossy:
+        unpacked_validation = packer.unpack(packed_result)
+        if tuple(args) != unpacked_validation:
+            raise RPCInvalidArgumentsError("Passed values would be truncated, please validate the size of your string",
+                                           code=arg_format, args=args)
 
-    packed_result = struct.pack(code, *args)
-    unpacked_validation = struct.unpack(code, packed_result)
-    if tuple(args) != unpacked_validation:
-        raise RPCInvalidArgumentsError("Passed values would be truncated, please validate the size of your string",
-                                       code=code, args=args)
     return packed_result
 
 
@@ -113,8 +179,7 @@ def unpack_rpc_payload(resp_format, payload):
         list: A list of the unpacked payload items.
     """
 
-    code = _create_argcode(resp_format, payload)
-    return struct.unpack(code, payload)
+    return _get_arg_struct(resp_format, payload).unpack(payload)
 
 
 def rpc(address, rpc_id, arg_format, resp_format=None):
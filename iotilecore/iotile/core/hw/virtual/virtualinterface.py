@@ -56,6 +56,74 @@ class IOTilePushChannel(object):
         self._interface._queue_traces((data, callback))
 
 
+class _ChunkCursor(object):
+    """Tracks our position in the report or trace that is being chunked.
+
+    The data being chunked is held in a memoryview so that each chunk only
+    copies the bytes that it contains, rather than re-slicing the remainder
+    of the data every time, which keeps chunking a large report linear in
+    its size.  A single chunk may gather data from several queued items.
+    """
+
+    def __init__(self):
+        self._data = None
+        self._offset = 0
+        self._callback = None
+
+    @property
+    def in_progress(self):
+        """Whether we are partway through sending an item."""
+
+        return self._data is not None
+
+    def clear(self):
+        """Forget about any item that is in progress."""
+
+        self._data = None
+        self._offset = 0
+        self._callback = None
+
+    def next_chunk(self, max_size, next_item):
+        """Build the next chunk of data.
+
+        Args:
+            max_size (int): The maximum size of the chunk to be returned
+            next_item (callable): A function that returns the next
+                (data, callback) tuple to be chunked or None if there is
+                no more data.
+
+        Returns:
+            bytearray: the chunk of raw data with size up to but not exceeding
+                max_size.
+        """
+
+        chunk = bytearray()
+
+        while len(chunk) < max_size:
+            if self._data is None:
+                item = next_item()
+                if item is None:
+                    break
+
+                data, callback = item
+                self._data = memoryview(bytes(data))
+                self._offset = 0
+                self._callback = callback
+
+            end = min(self._offset + max_size - len(chunk), len(self._data))
+            chunk += self._data[self._offset:end]
+            self._offset = end
+
+            if self._offset == len(self._data):
+                callback = self._callback
+                self.clear()
+
+                if callback is not None:
+                    callback(True)
+
+        return chunk
+
+
 class VirtualIOTileInterface(object):
     """A virtual interface that presents an IOTile device to the world
 
@@ -83,11 +151,9 @@ class VirtualIOTileInterface(object):
         self.reports = Queue()
         self.traces = Queue()
 
-        # Track whether we are chunking a report or a trace
-        self._in_progress_report = None
-        self._in_progress_report_callback = None
-        self._in_progress_trace = None
-        self._in_progress_trace_callback = None
+        # Track where we are in chunking a report or a trace
+        self._report_cursor = _ChunkCursor()
+        self._trace_cursor = _ChunkCursor()
 
     def start(self, device):
         """Begin allowing connections to a virtual IOTile device.
@@ -171,7 +237,7 @@ class VirtualIOTileInterface(object):
         except Empty:
             pass
 
-        self._in_progress_report = None
+        self._report_cursor.clear()
 
     def _clear_traces(self):
         """Clear all queued traces and any in progress traces.
@@ -188,7 +254,7 @@ class VirtualIOTileInterface(object):
         except Empty:
             pass
 
-        self._in_progress_trace = None
+        self._trace_cursor.clear()
 
     def _queue_reports(self, *reports):
         """Queue reports for transmission over the streaming interface.
@@ -252,35 +318,7 @@ class VirtualIOTileInterface(object):
                 max_size.
         """
 
-        chunk = bytearray()
-
-        while len(chunk) < max_size:
-            desired_size = max_size - len(chunk)
-
-            # If we don't have an in progress report at the moment, attempt to get one
-            if self._in_progress_report is None:
-                try:
-                    next_report, next_callback = self.reports.get_nowait()
-                except Empty:
-                    return chunk
-
-                self._audit('ReportStreamed', report=str(next_report))
-                self._in_progress_report = bytearray(next_report.encode())
-                self._in_progress_report_callback = next_callback
-
-            if len(self._in_progress_report) <= desired_size:
-                chunk += self._in_progress_report
-                self._in_progress_report = None
-                if self._in_progress_report_callback is not None:
-                    self._in_progress_report_callback(True)
-                    self._in_progress_report_callback = None
-            else:
-                remaining = self._in_progress_report[desired_size:]
-                chunk += self._in_progress_report[:desired_size]
-
-                self._in_progress_report = remaining
-
-        return chunk
+        return self._report_cursor.next_chunk(max_size, self._next_report_data)
 
     def _next_tracing_chunk(self, max_size):
         """Get the next chunk of data that should be traced
@@ -293,32 +331,34 @@ class VirtualIOTileInterface(object):
                 max_size.
         """
 
-        chunk = bytearray()
+        return self._trace_cursor.next_chunk(max_size, self._next_trace_data)
 
-        while len(chunk) < max_size:
-            desired_size = max_size - len(chunk)
-
-            # If we don't have an in progress report at the moment, attempt to get one
-            if self._in_progress_trace is None:
-                try:
-                    next_trace, next_callback = self.traces.get_nowait()
-                except Empty:
-                    return chunk
-
-                self._audit('TraceSent', trace=str(next_trace))
-                self._in_progress_trace = bytearray(next_trace)
-                self._in_progress_trace_callback = next_callback
-
-            if len(self._in_progress_trace) <= desired_size:
-                chunk += self._in_progress_trace
-                self._in_progress_trace = None
-                if self._in_progress_trace_callback is not None:
-                    self._in_progress_trace_callback(True)
-                    self._in_progress_trace_callback = None
-            else:
-                remaining = self._in_progress_trace[desired_size:]
-                chunk += self._in_progress_trace[:desired_size]
-
-                self._in_progress_trace = remaining
+    def _next_report_data(self):
+        """Dequeue and encode the next report to be streamed.
 
-        return chunk
+        Returns:
+            tuple: (data, callback) or None if there are no queued reports.
+        """
+
+        try:
+            next_report, next_callback = self.reports.get_nowait()
+        except Empty:
+            return None
+
+        self._audit('ReportStreamed', report=str(next_report))
+        return next_report.encode(), next_callback
+
+    def _next_trace_data(self):
+        """Dequeue the next trace to be sent.
+
+        Returns:
+            tuple: (data, callback) or None if there are no queued traces.
+        """
+
+        try:
+            next_trace, next_callback = self.traces.get_nowait()
+        except Empty:
+            return None
+
+        self._audit('TraceSent', trace=str(next_trace))
+        return next_trace, next_callback
@@ -1,6 +1,7 @@
 """A command line script to print the contents of an UpdateScript."""
 
 from __future__ import unicode_literals, absolute_import, print_function
+import os
 import sys
 import argparse
 import logging
@@ -65,14 +66,14 @@ def main(argv=None):
         root.addHandler(logging.NullHandler())
 
     try:
+        script = UpdateScript.FromFile(args.script, allow_unknown=args.allow_unknown, show_rpcs=args.show_rpcs)
+        script_length = os.path.getsize(args.script)
+
         with open(args.script, "rb") as infile:
-            binary_script = infile.read()
-    except IOError as exc:
+            compressed = UpdateScript.IsCompressed(infile.read(UpdateScript.SCRIPT_HEADER_LENGTH))
+    except (IOError, OSError) as exc:
         print("ERROR: Unable to read script file: %s" % str(exc))
         return 1
-
-    try:
-        script = UpdateScript.FromBinary(binary_script, allow_unknown=args.allow_unknown, show_rpcs=args.show_rpcs)
     except ArgumentError as err:
         print("ERROR: ArgumentError: could not parse script")
         print(str(err))
@@ -91,7 +92,10 @@ def main(argv=None):
         print("-------------")
         print("Path: %s" % args.script)
         print("Record Count: %d" % len(script.records))
-        print("Total length: %d bytes" % len(binary_script))
+        print("Total length: %d bytes" % script_length)
+
+        if compressed:
+            print("Uncompressed length: %d bytes" % script.encoded_length())
 
         print("\nActions")
         print("-------")
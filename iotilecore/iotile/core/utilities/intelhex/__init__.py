@@ -49,6 +49,11 @@ from bisect import bisect_right
 import os
 import sys
 
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:
+    from collections import Mapping, MutableMapping
+
 from .compat import (
     IntTypes,
     StrType,
@@ -72,6 +77,316 @@ class _DeprecatedParam(object):
 _DEPRECATED = _DeprecatedParam()
 
 
+class _SegmentBuffer(MutableMapping):
+    """Storage for IntelHex data as a sorted list of contiguous segments.
+
+    Behaves like the dict of address -> byte value that IntelHex used to
+    store its data in, but keeps each run of consecutive addresses in a
+    single bytearray.  Segments are kept sorted, never overlap and are never
+    adjacent, so every segment is a maximal run of used addresses.
+
+    Besides the mapping interface, there are bulk operations on address
+    ranges that IntelHex uses so that loading, converting and merging
+    firmware images costs a few slice operations per segment rather than a
+    dict operation per byte.  Values must be integers in [0, 255].
+    """
+
+    __slots__ = ('_starts', '_data')
+
+    def __init__(self, source=None):
+        self._starts = []
+        self._data = []
+
+        if source is not None:
+            self.update(source)
+
+    def _find(self, addr):
+        """Return the index of the segment containing addr or -1."""
+        i = bisect_right(self._starts, addr) - 1
+        if i >= 0 and addr - self._starts[i] < len(self._data[i]):
+            return i
+        return -1
+
+    def __getitem__(self, addr):
+        i = self._find(addr)
+        if i < 0:
+            raise KeyError(addr)
+        return self._data[i][addr - self._starts[i]]
+
+    def get(self, addr, default=None):
+        i = bisect_right(self._starts, addr) - 1
+        if i >= 0:
+            offset = addr - self._starts[i]
+            data = self._data[i]
+            if offset < len(data):
+                return data[offset]
+        return default
+
+    def __contains__(self, addr):
+        return self._find(addr) >= 0
+
+    def __setitem__(self, addr, value):
+        i = self._find(addr)
+        if i >= 0:
+            self._data[i][addr - self._starts[i]] = value
+        else:
+            self.write(addr, bytearray((value,)))
+
+    def __delitem__(self, addr):
+        if self._find(addr) < 0:
+            raise KeyError(addr)
+        self.delete(addr, addr + 1)
+
+    def __iter__(self):
+        for start, data in zip(self._starts, self._data):
+            for addr in range_g(start, start + len(data)):
+                yield addr
+
+    def __len__(self):
+        return sum(len(x) for x in self._data)
+
+    def __bool__(self):
+        return len(self._starts) > 0
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if isinstance(other, _SegmentBuffer):
+            return self._starts == other._starts and self._data == other._data
+        if isinstance(other, Mapping):
+            return len(self) == len(other) and dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __sizeof__(self):
+        n = object.__sizeof__(self)
+        n += sys.getsizeof(self._starts) + sys.getsizeof(self._data)
+        n += sum(sys.getsizeof(x) for x in self._starts)
+        n += sum(sys.getsizeof(x) for x in self._data)
+        return n
+
+    def keys(self):
+        return list(iter(self))
+
+    def items(self):
+        result = []
+        for start, data in zip(self._starts, self._data):
+            result.extend(zip(range_g(start, start + len(data)), data))
+        return result
+
+    def values(self):
+        result = []
+        for data in self._data:
+            result.extend(data)
+        return result
+
+    def copy(self):
+        """Return an independent copy of this buffer."""
+        other = _SegmentBuffer()
+        other._starts = list(self._starts)
+        other._data = [bytearray(x) for x in self._data]
+        return other
+
+    def clear(self):
+        self._starts = []
+        self._data = []
+
+    def update(self, other=(), **kw):
+        """Add the addresses and values from a mapping or (addr, value) pairs."""
+        if isinstance(other, _SegmentBuffer):
+            for start, data in zip(other._starts, other._data):
+                self.write(start, data)
+            return
+
+        if isinstance(other, Mapping):
+            pairs = sorted(other.items())
+        else:
+            pairs = sorted(other)
+        if kw:
+            raise TypeError('Addresses must be integers')
+
+        # Group consecutive addresses into runs that are written at once
+        run_start = None
+        run = bytearray()
+        for addr, value in pairs:
+            if run_start is not None and addr == run_start + len(run):
+                run.append(value)
+                continue
+            if run:
+                self.write(run_start, run)
+            run_start = addr
+            run = bytearray((value,))
+        if run:
+            self.write(run_start, run)
+
+    def minaddr(self):
+        """Return the lowest used address or None if empty."""
+        if not self._starts:
+            return None
+        return self._starts[0]
+
+    def maxaddr(self):
+        """Return the highest used address or None if empty."""
+        if not self._starts:
+            return None
+        return self._starts[-1] + len(self._data[-1]) - 1
+
+    def segments(self):
+        """Return the [start, stop) range of every segment in order."""
+        return [(start, start + len(data)) for start, data in zip(self._starts, self._data)]
+
+    def iter_segments(self, start=None, stop=None):
+        """Iterate over (address, data) for the used parts of [start, stop).
+
+        The data is a memoryview into the segment, it must not be kept
+        across modifications of this buffer.
+        """
+        if start is None:
+            start = 0
+        i = max(bisect_right(self._starts, start) - 1, 0)
+        for j in range_g(i, len(self._starts)):
+            seg_start = self._starts[j]
+            data = self._data[j]
+            seg_stop = seg_start + len(data)
+            if stop is not None and seg_start >= stop:
+                break
+            if seg_stop <= start:
+                continue
+            lo = max(start, seg_start)
+            hi = seg_stop if stop is None else min(stop, seg_stop)
+            yield lo, memoryview(data)[lo - seg_start:hi - seg_start]
+
+    def gaps(self, start, stop):
+        """Iterate over the unused [gap_start, gap_stop) ranges in [start, stop)."""
+        cur = start
+        for addr, data in self.iter_segments(start, stop):
+            if addr > cur:
+                yield cur, addr
+            cur = addr + len(data)
+        if cur < stop:
+            yield cur, stop
+
+    def first_used(self, start, stop):
+        """Return the first used address in [start, stop) or None."""
+        i = bisect_right(self._starts, start) - 1
+        if i >= 0 and start - self._starts[i] < len(self._data[i]):
+            return start
+        i += 1
+        if i < len(self._starts) and self._starts[i] < stop:
+            return self._starts[i]
+        return None
+
+    def write(self, addr, data):
+        """Store a run of bytes starting at addr, overwriting existing data."""
+        length = len(data)
+        if length == 0:
+            return
+        stop = addr + length
+        starts = self._starts
+        segments = self._data
+
+        # Find the segment that contains or directly precedes addr
+        i = bisect_right(starts, addr) - 1
+        if i >= 0 and starts[i] + len(segments[i]) >= addr:
+            seg = segments[i]
+            offset = addr - starts[i]
+            seg[offset:offset + length] = data
+        else:
+            i += 1
+            seg = bytearray(data)
+            starts.insert(i, addr)
+            segments.insert(i, seg)
+
+        # Absorb following segments that are now overlapped or adjacent
+        seg_start = starts[i]
+        j = i + 1
+        while j < len(starts) and starts[j] <= stop:
+            overlap = seg_start + len(seg) - starts[j]
+            if overlap < len(segments[j]):
+                seg += segments[j][overlap:]
+            j += 1
+        if j > i + 1:
+            del starts[i + 1:j]
+            del segments[i + 1:j]
+
+    def read(self, start, stop, pad):
+        """Return the bytes in [start, stop) with unused addresses set to pad.
+
+        pad only needs to be a valid byte if there are unused addresses.
+        """
+        if not 0 <= pad <= 255:
+            result = self.read_used(start, stop)
+            if result is None:
+                raise OverflowError("padding value 0x%X does not fit in a byte" % pad)
+            return result
+
+        result = bytearray((pad,)) * (stop - start)
+        for addr, data in self.iter_segments(start, stop):
+            offset = addr - start
+            result[offset:offset + len(data)] = data
+        return result
+
+    def read_used(self, start, stop):
+        """Return the bytes in [start, stop) or None if any address is unused."""
+        i = self._find(start)
+        if i < 0:
+            return None if stop > start else bytearray()
+        offset = start - self._starts[i]
+        data = self._data[i]
+        if stop - self._starts[i] > len(data):
+            return None
+        return data[offset:offset + stop - start]
+
+    def delete(self, start, stop):
+        """Remove all data in [start, stop)."""
+        if stop <= start:
+            return
+        starts = self._starts
+        segments = self._data
+
+        j = bisect_right(starts, start) - 1
+        if j < 0 or starts[j] + len(segments[j]) <= start:
+            j += 1
+        while j < len(starts) and starts[j] < stop:
+            seg_start = starts[j]
+            seg = segments[j]
+            seg_stop = seg_start + len(seg)
+            if seg_start < start and seg_stop > stop:
+                # Split the segment in two around the deleted range
+                starts.insert(j + 1, stop)
+                segments.insert(j + 1, seg[stop - seg_start:])
+                del seg[start - seg_start:]
+                return
+            elif seg_start < start:
+                del seg[start - seg_start:]
+                j += 1
+            elif seg_stop > stop:
+                del seg[:stop - seg_start]
+                starts[j] = stop
+                return
+            else:
+                del starts[j]
+                del segments[j]
+
+    def slice(self, start, stop):
+        """Return a new buffer with a copy of the data in [start, stop)."""
+        other = _SegmentBuffer()
+        for addr, data in self.iter_segments(start, stop):
+            other._starts.append(addr)
+            other._data.append(bytearray(data))
+        return other
+
+
 class IntelHex(object):
     ''' Intel HEX file reader. '''
 
@@ -89,7 +404,7 @@ class IntelHex(object):
         self.start_addr = None
 
         # private members
-        self._buf = {}
+        self._buf = _SegmentBuffer()
         self._offset = 0
 
         if source is not None:
@@ -106,6 +421,18 @@ class IntelHex(object):
             else:
                 raise ValueError("source: bad initializer type")
 
+    def _get_buf(self):
+        return self._segments
+
+    def _set_buf(self, buf):
+        if not isinstance(buf, _SegmentBuffer):
+            buf = _SegmentBuffer(buf)
+        self._segments = buf
+
+    # Data is stored as a _SegmentBuffer, which acts like the dict of
+    # address -> byte that was used before.  Assigning a dict converts it.
+    _buf = property(_get_buf, _set_buf)
+
     def _decode_record(self, s, line=0):
         '''Decode one record of HEX file.
 
@@ -120,7 +447,7 @@ class IntelHex(object):
 
         if s[0] == ':':
             try:
-                bin = array('B', unhexlify(asbytes(s[1:])))
+                bin = bytearray(unhexlify(asbytes(s[1:])))
             except (TypeError, ValueError):
                 # this might be raised by unhexlify when odd hexascii digits
                 raise HexRecordError(line=line)
@@ -148,13 +475,14 @@ class IntelHex(object):
         if record_type == 0:
             # data record
             addr += self._offset
-            for i in range_g(4, 4+record_length):
-                if not self._buf.get(addr, None) is None:
-                    raise AddressOverlapError(address=addr, line=line)
-                self._buf[addr] = bin[i]
-                addr += 1   # FIXME: addr should be wrapped
-                            # BUT after 02 record (at 64K boundary)
-                            # and after 04 record (at 4G boundary)
+            buf = self._segments
+            used = buf.first_used(addr, addr+record_length)
+            if used is not None:
+                raise AddressOverlapError(address=used, line=line)
+            buf.write(addr, bin[4:4+record_length])
+            # FIXME: addr should be wrapped
+            # BUT after 02 record (at 64K boundary)
+            # and after 04 record (at 4G boundary)
 
         elif record_type == 1:
             # end of file record
@@ -290,16 +618,14 @@ class IntelHex(object):
         """Load data from array or list of bytes.
         Similar to loadbin() method but works directly with iterable bytes.
         """
-        for b in bytes:
-            self._buf[offset] = b
-            offset += 1
+        self._buf.write(offset, bytearray(bytes))
 
     def _get_start_end(self, start=None, end=None, size=None):
         """Return default values for start and end if they are None.
         If this IntelHex object is empty then it's error to
         invoke this method with both start and end as None.
         """
-        if (start,end) == (None,None) and self._buf == {}:
+        if (start,end) == (None,None) and not self._buf:
             raise EmptyIntelHexError
         if size is not None:
             if None not in (start, end):
@@ -350,13 +676,12 @@ class IntelHex(object):
         if pad is None:
             pad = self.padding
         bin = array('B')
-        if self._buf == {} and None in (start, end):
+        if not self._buf and None in (start, end):
             return bin
         if size is not None and size <= 0:
             raise ValueError("tobinarray: wrong value for size")
         start, end = self._get_start_end(start, end, size)
-        for i in range_g(start, end+1):
-            bin.append(self._buf.get(i, pad))
+        bin.extend(self._buf.read(start, end+1, pad))
         return bin
 
     def tobinstr(self, start=None, end=None, pad=_DEPRECATED, size=None):
@@ -381,7 +706,14 @@ class IntelHex(object):
         return self._tobinstr_really(start, end, pad, size)
 
     def _tobinstr_really(self, start, end, pad, size):
-        return array_tobytes(self._tobinarray_really(start, end, pad, size))
+        if pad is None:
+            pad = self.padding
+        if not self._buf and None in (start, end):
+            return bytes()
+        if size is not None and size <= 0:
+            raise ValueError("tobinarray: wrong value for size")
+        start, end = self._get_start_end(start, end, size)
+        return bytes(self._buf.read(start, end+1, pad))
 
     def tobinfile(self, fobj, start=None, end=None, pad=_DEPRECATED, size=None):
         '''Convert to binary and write to file.
@@ -419,8 +751,7 @@ class IntelHex(object):
 
         @return         dict suitable for initializing another IntelHex object.
         '''
-        r = {}
-        r.update(self._buf)
+        r = dict(self._buf.items())
         if self.start_addr:
             r['start_addr'] = self.start_addr
         return r
@@ -429,29 +760,19 @@ class IntelHex(object):
         '''Returns all used addresses in sorted order.
         @return         list of occupied data addresses in sorted order.
         '''
-        aa = dict_keys(self._buf)
-        aa.sort()
-        return aa
+        return self._buf.keys()
 
     def minaddr(self):
         '''Get minimal address of HEX content.
         @return         minimal address or None if no data
         '''
-        aa = dict_keys(self._buf)
-        if aa == []:
-            return None
-        else:
-            return min(aa)
+        return self._buf.minaddr()
 
     def maxaddr(self):
         '''Get maximal address of HEX content.
         @return         maximal address or None if no data
         '''
-        aa = dict_keys(self._buf)
-        if aa == []:
-            return None
-        else:
-            return max(aa)
+        return self._buf.maxaddr()
 
     def __getitem__(self, addr):
         ''' Get requested byte from address.
@@ -465,17 +786,18 @@ class IntelHex(object):
                 raise TypeError('Address should be >= 0.')
             return self._buf.get(addr, self.padding)
         elif t == slice:
-            addresses = dict_keys(self._buf)
             ih = IntelHex()
-            if addresses:
-                addresses.sort()
-                start = addr.start or addresses[0]
-                stop = addr.stop or (addresses[-1]+1)
+            if self._buf:
+                start = addr.start or self._buf.minaddr()
+                stop = addr.stop or (self._buf.maxaddr()+1)
                 step = addr.step or 1
-                for i in range_g(start, stop, step):
-                    x = self._buf.get(i)
-                    if x is not None:
-                        ih[i] = x
+                if step == 1:
+                    ih._buf = self._buf.slice(start, stop)
+                else:
+                    for i in range_g(start, stop, step):
+                        x = self._buf.get(i)
+                        if x is not None:
+                            ih[i] = x
             return ih
         else:
             raise TypeError('Address has unsupported type: %s' % t)
@@ -508,6 +830,9 @@ class IntelHex(object):
                 raise TypeError('start address cannot be negative')
             if stop < 0:
                 raise TypeError('stop address cannot be negative')
+            if step == 1:
+                self._buf.write(start, bytearray(byte))
+                return
             j = 0
             for i in range_g(start, stop, step):
                 self._buf[i] = byte[j]
@@ -523,12 +848,13 @@ class IntelHex(object):
                 raise TypeError('Address should be >= 0.')
             del self._buf[addr]
         elif t == slice:
-            addresses = dict_keys(self._buf)
-            if addresses:
-                addresses.sort()
-                start = addr.start or addresses[0]
-                stop = addr.stop or (addresses[-1]+1)
+            if self._buf:
+                start = addr.start or self._buf.minaddr()
+                stop = addr.stop or (self._buf.maxaddr()+1)
                 step = addr.step or 1
+                if step == 1:
+                    self._buf.delete(start, stop)
+                    return
                 for i in range_g(start, stop, step):
                     x = self._buf.get(i)
                     if x is not None:
@@ -538,7 +864,7 @@ class IntelHex(object):
 
     def __len__(self):
         """Return count of bytes with real values."""
-        return len(dict_keys(self._buf))
+        return len(self._buf)
 
     def _get_eol_textfile(eolstyle, platform):
         if eolstyle == 'native':
@@ -631,86 +957,36 @@ class IntelHex(object):
                 raise InvalidStartAddressValueError(start_addr=self.start_addr)
 
         # data
-        addresses = dict_keys(self._buf)
-        addresses.sort()
-        addr_len = len(addresses)
-        if addr_len:
-            minaddr = addresses[0]
-            maxaddr = addresses[-1]
-
-            if maxaddr > 65535:
-                need_offset_record = True
-            else:
-                need_offset_record = False
-            high_ofs = 0
-
-            cur_addr = minaddr
-            cur_ix = 0
-
-            while cur_addr <= maxaddr:
-                if need_offset_record:
-                    bin = array('B', asbytes('\0'*7))
-                    bin[0] = 2      # reclen
-                    bin[1] = 0      # offset msb
-                    bin[2] = 0      # offset lsb
-                    bin[3] = 4      # rectyp
-                    high_ofs = int(cur_addr>>16)
-                    b = divmod(high_ofs, 256)
-                    bin[4] = b[0]   # msb of high_ofs
-                    bin[5] = b[1]   # lsb of high_ofs
-                    bin[6] = (-sum(bin)) & 0x0FF    # chksum
-                    fwrite(':' +
-                           asstr(hexlify(array_tobytes(bin)).translate(table)) +
-                           eol)
-
-                while True:
-                    # produce one record
+        if self._buf:
+            need_offset_record = self._buf.maxaddr() > 65535
+            high_ofs = None
+
+            # Records never cross a segment or a 64K boundary
+            for seg_addr, seg_data in self._buf.iter_segments():
+                seg_stop = seg_addr + len(seg_data)
+                cur_addr = seg_addr
+                while cur_addr < seg_stop:
+                    if need_offset_record and (cur_addr >> 16) != high_ofs:
+                        high_ofs = cur_addr >> 16
+                        bin = bytearray(7)
+                        bin[0] = 2      # reclen
+                        bin[3] = 4      # rectyp
+                        bin[4], bin[5] = divmod(high_ofs, 256)
+                        bin[6] = (-sum(bin)) & 0x0FF    # chksum
+                        fwrite(':' + asstr(hexlify(bytes(bin)).translate(table)) + eol)
+
                     low_addr = cur_addr & 0x0FFFF
-                    # chain_len off by 1
-                    chain_len = min(byte_count-1, 65535-low_addr, maxaddr-cur_addr)
-
-                    # search continuous chain
-                    stop_addr = cur_addr + chain_len
-                    if chain_len:
-                        ix = bisect_right(addresses, stop_addr,
-                                          cur_ix,
-                                          min(cur_ix+chain_len+1, addr_len))
-                        chain_len = ix - cur_ix     # real chain_len
-                        # there could be small holes in the chain
-                        # but we will catch them by try-except later
-                        # so for big continuous files we will work
-                        # at maximum possible speed
-                    else:
-                        chain_len = 1               # real chain_len
-
-                    bin = array('B', asbytes('\0'*(5+chain_len)))
-                    b = divmod(low_addr, 256)
-                    bin[1] = b[0]   # msb of low_addr
-                    bin[2] = b[1]   # lsb of low_addr
-                    bin[3] = 0          # rectype
-                    try:    # if there is small holes we'll catch them
-                        for i in range_g(chain_len):
-                            bin[4+i] = self._buf[cur_addr+i]
-                    except KeyError:
-                        # we catch a hole so we should shrink the chain
-                        chain_len = i
-                        bin = bin[:5+i]
+                    chain_len = min(byte_count, 65536-low_addr, seg_stop-cur_addr)
+
+                    offset = cur_addr - seg_addr
+                    bin = bytearray(4)
                     bin[0] = chain_len
-                    bin[4+chain_len] = (-sum(bin)) & 0x0FF    # chksum
-                    fwrite(':' +
-                           asstr(hexlify(array_tobytes(bin)).translate(table)) +
-                           eol)
-
-                    # adjust cur_addr/cur_ix
-                    cur_ix += chain_len
-                    if cur_ix < addr_len:
-                        cur_addr = addresses[cur_ix]
-                    else:
-                        cur_addr = maxaddr + 1
-                        break
-                    high_addr = int(cur_addr>>16)
-                    if high_addr > high_ofs:
-                        break
+                    bin[1], bin[2] = divmod(low_addr, 256)
+                    bin += seg_data[offset:offset+chain_len]
+                    bin.append((-sum(bin)) & 0x0FF)    # chksum
+                    fwrite(':' + asstr(hexlify(bytes(bin)).translate(table)) + eol)
+
+                    cur_addr += chain_len
 
         # end-of-file record
         fwrite(":00000001FF"+eol)
@@ -736,33 +1012,27 @@ class IntelHex(object):
         from addr through addr+length, a NotEnoughDataError exception will
         be raised. Padding is not used.
         """
-        a = array('B', asbytes('\0'*length))
-        try:
-            for i in range_g(length):
-                a[i] = self._buf[addr+i]
-        except KeyError:
+        data = self._buf.read_used(addr, addr+length)
+        if data is None:
             raise NotEnoughDataError(address=addr, length=length)
-        return array_tobytes(a)
+        return bytes(data)
 
     def puts(self, addr, s):
         """Put string of bytes at given address. Will overwrite any previous
         entries.
         """
-        a = array('B', asbytes(s))
-        for i in range_g(len(a)):
-            self._buf[addr+i] = a[i]
+        self._buf.write(addr, bytearray(asbytes(s)))
 
     def getsz(self, addr):
         """Get zero-terminated bytes string from given address. Will raise
         NotEnoughDataError exception if a hole is encountered before a 0.
         """
-        i = 0
-        try:
-            while True:
-                if self._buf[addr+i] == 0:
-                    break
-                i += 1
-        except KeyError:
+        i = -1
+        for seg_addr, seg_data in self._buf.iter_segments(addr):
+            if seg_addr == addr:
+                i = seg_data.tobytes().find(b'\0')
+            break
+        if i < 0:
             raise NotEnoughDataError(msg=('Bad access at 0x%X: '
                 'not enough data to read zero-terminated string') % addr)
         return self.gets(addr, i)
@@ -802,11 +1072,9 @@ class IntelHex(object):
             else:
                 tofile.write('start_addr = %r\n' % start_addr)
         # actual data
-        addresses = dict_keys(self._buf)
-        if addresses:
-            addresses.sort()
-            minaddr = addresses[0]
-            maxaddr = addresses[-1]
+        if self._buf:
+            minaddr = self._buf.minaddr()
+            maxaddr = self._buf.maxaddr()
             startaddr = (minaddr // width) * width
             endaddr = ((maxaddr // width) + 1) * width
             maxdigits = max(len(hex(endaddr)) - 2, 4)   # Less 2 to exclude '0x'
@@ -857,17 +1125,20 @@ class IntelHex(object):
         if overlap not in ('error', 'ignore', 'replace'):
             raise ValueError("overlap argument should be either "
                 "'error', 'ignore' or 'replace'")
-        # merge data
+        # merge data, one segment of other at a time
         this_buf = self._buf
-        other_buf = other._buf
-        for i in other_buf:
-            if i in this_buf:
-                if overlap == 'error':
+        for start, stop in other._buf.segments():
+            data = other._buf.read_used(start, stop)
+            if overlap == 'error':
+                i = this_buf.first_used(start, stop)
+                if i is not None:
                     raise AddressOverlapError(
                         'Data overlapped at address 0x%X' % i)
-                elif overlap == 'ignore':
-                    continue
-            this_buf[i] = other_buf[i]
+            elif overlap == 'ignore':
+                for gap_start, gap_stop in list(this_buf.gaps(start, stop)):
+                    this_buf.write(gap_start, data[gap_start-start:gap_stop-start])
+                continue
+            this_buf.write(start, data)
         # merge start_addr
         if self.start_addr != other.start_addr:
             if self.start_addr is None:     # set start addr from other
@@ -886,18 +1157,7 @@ class IntelHex(object):
         Each tuple has a length of two and follows the semantics of the range and xrange objects.
         The second entry of the tuple is always an integer greater than the first entry.
         """
-        addresses = self.addresses()
-        if not addresses:
-            return []
-        elif len(addresses) == 1:
-            return([(addresses[0], addresses[0]+1)])
-        adjacent_differences = [(b - a) for (a, b) in zip(addresses[:-1], addresses[1:])]
-        breaks = [i for (i, x) in enumerate(adjacent_differences) if x > 1]
-        endings = [addresses[b] for b in breaks]
-        endings.append(addresses[-1])
-        beginings = [addresses[b+1] for b in breaks]
-        beginings.insert(0, addresses[0])
-        return [(a, b+1) for (a, b) in zip(beginings, endings)]
+        return self._buf.segments()
 
     def get_memory_size(self):
         """Returns the approximate memory footprint for data."""
@@ -977,22 +1237,22 @@ class IntelHex16bit(IntelHex):
 
         @return         minimal address used in this object
         '''
-        aa = dict_keys(self._buf)
-        if aa == []:
+        addr = self._buf.minaddr()
+        if addr is None:
             return 0
         else:
-            return min(aa)>>1
+            return addr>>1
 
     def maxaddr(self):
         '''Get maximal address of HEX content in 16-bit mode.
 
         @return         maximal address used in this object
         '''
-        aa = dict_keys(self._buf)
-        if aa == []:
+        addr = self._buf.maxaddr()
+        if addr is None:
             return 0
         else:
-            return max(aa)>>1
+            return addr>>1
 
     def tobinarray(self, start=None, end=None, size=None):
         '''Convert this object to binary form as array (of 2-bytes word data).
@@ -1005,7 +1265,7 @@ class IntelHex16bit(IntelHex):
         '''
         bin = array('H')
 
-        if self._buf == {} and None in (start, end):
+        if not self._buf and None in (start, end):
             return bin
 
         if size is not None and size <= 0:
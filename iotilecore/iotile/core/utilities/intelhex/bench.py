@@ -40,7 +40,7 @@ import sys
 import time
 
 import intelhex
-from intelhex.compat import StringIO, range_g
+from intelhex.compat import BytesIO, StringIO, range_g
 
 def median(values):
     """Return median value for the list of values.
@@ -97,6 +97,20 @@ def run_writetest_N_times(func, n):
     t = median(times)
     return t, times
 
+def run_objtest_N_times(func, prepare, n):
+    """Run a test on a fresh object N times.
+    @param  func:       function for test, called with the prepared object.
+    @param  prepare:    function returning the object to test, not timed.
+    @param  n:          times to repeat.
+    @return:            (median time, times list)
+    """
+    assert n > 0
+    times = []
+    for i in range_g(n):
+        times.append(run_test(func, prepare()))
+    t = median(times)
+    return t, times
+
 def time_coef(tc, nc, tb, nb):
     """Return time coefficient relative to base numbers.
     @param  tc:     current test time
@@ -152,6 +166,21 @@ def get_0_100K():
 def get_1M():
     return get_test_data(1000000, 0, 0)
 
+def get_512K():
+    return get_test_data(512*1024, 0, 0)
+
+def get_256K_256K():
+    return get_test_data(256*1024, 0x100000, 256*1024)
+
+def split_halves(ih):
+    """Split an IntelHex object in two at the middle of its used addresses.
+    @param  ih:     IntelHex object to split.
+    @return:        (lower half, upper half) as IntelHex objects
+    """
+    addresses = ih.addresses()
+    middle = addresses[len(addresses) // 2]
+    return ih[:middle], ih[middle:]
+
 
 class Measure(object):
     """Measure execution time helper."""
@@ -163,26 +192,55 @@ class Measure(object):
         ('1M', get_1M),
         ('100K+100K', get_100K_100K),
         ('0+100K', get_0_100K),
+        ('512K', get_512K),
+        ('256K+256K', get_256K_256K),
         ]
 
-    def __init__(self, n=3, read=True, write=True):
+    # (operation name, attribute enabling it)
+    operations = [
+        ('Read', 'read'),
+        ('Write', 'write'),
+        ('Load bin', 'loadbin'),
+        ('Convert', 'convert'),
+        ('Merge', 'merge'),
+        ]
+
+    def __init__(self, n=3, read=True, write=True, loadbin=False, convert=False, merge=False):
         self.n = n
         self.read = read
         self.write = write
+        self.loadbin = loadbin
+        self.convert = convert
+        self.merge = merge
         self.results = []
 
     def measure_one(self, data):
-        """Do measuring of read and write operations.
+        """Do measuring of all enabled operations.
+
+        Read and write are loading the hex file and writing it back.
+        Load bin loads the contiguous binary image of the data, convert
+        produces it with tobinstr() and merge merges the upper half of
+        the data into a copy of the lower half.
+
         @param  data:   3-tuple from get_test_data
-        @return:        (time readhex, time writehex)
+        @return:        tuple of times, one per operation (0.0 if disabled)
         """
         _unused, hexstr, ih = data
-        tread, twrite = 0.0, 0.0
+        times = [0.0] * len(self.operations)
         if self.read:
-            tread = run_readtest_N_times(intelhex.IntelHex, hexstr, self.n)[0]
+            times[0] = run_readtest_N_times(intelhex.IntelHex, hexstr, self.n)[0]
         if self.write:
-            twrite = run_writetest_N_times(ih.write_hex_file, self.n)[0]
-        return tread, twrite
+            times[1] = run_writetest_N_times(ih.write_hex_file, self.n)[0]
+        if self.loadbin:
+            binstr = ih.tobinstr()
+            times[2] = run_objtest_N_times(lambda x: intelhex.IntelHex().loadbin(x),
+                                           lambda: BytesIO(binstr), self.n)[0]
+        if self.convert:
+            times[3] = run_objtest_N_times(lambda x: x.tobinstr(), lambda: ih, self.n)[0]
+        if self.merge:
+            lower, upper = split_halves(ih)
+            times[4] = run_objtest_N_times(lambda x: x.merge(upper), lambda: intelhex.IntelHex(lower), self.n)[0]
+        return tuple(times)
 
     def measure_all(self):
         for name, getter in self.data_set:
@@ -195,32 +253,23 @@ class Measure(object):
             to_file = sys.stdout
 
         base_title, base_times, base_n = self.results[0]
-        base_read, base_write = base_times
-        read_report = ['%-10s\t%7.3f' % (base_title, base_read)]
-        write_report = ['%-10s\t%7.3f' % (base_title, base_write)]
-
-        for item in self.results[1:]:
-            cur_title, cur_times, cur_n = item
-            cur_read, cur_write = cur_times
-            if self.read:
-                qread = time_coef(cur_read, cur_n,
-                                  base_read, base_n)
-                read_report.append('%-10s\t%7.3f\t%7.3f' % (cur_title,
-                                                           cur_read,
-                                                           qread))
-            if self.write:
-                qwrite = time_coef(cur_write, cur_n,
-                                   base_write, base_n)
-                write_report.append('%-10s\t%7.3f\t%7.3f' % (cur_title,
-                                                            cur_write,
-                                                            qwrite))
-        if self.read:
-            to_file.write('Read operation:\n')
-            to_file.write('\n'.join(read_report))
-            to_file.write('\n\n')
-        if self.write:
-            to_file.write('Write operation:\n')
-            to_file.write('\n'.join(write_report))
+
+        for i, (op_name, attr) in enumerate(self.operations):
+            if not getattr(self, attr):
+                continue
+
+            base_time = base_times[i]
+            report = ['%-10s\t%8.4f' % (base_title, base_time)]
+
+            for cur_title, cur_times, cur_n in self.results[1:]:
+                if base_time > 0:
+                    q = time_coef(cur_times[i], cur_n, base_time, base_n)
+                else:
+                    q = 0.0
+                report.append('%-10s\t%8.4f\t%7.3f' % (cur_title, cur_times[i], q))
+
+            to_file.write('%s operation:\n' % op_name)
+            to_file.write('\n'.join(report))
             to_file.write('\n\n')
 
 
@@ -230,10 +279,14 @@ Usage: python _bench.py [OPTIONS]
 Options:
     -h      this help
     -n N    repeat tests N times
-    -r      run only tests for read operation
-    -w      run only tests for write operation
-
-If option -r or -w is not specified then all tests will be run.
+    -r      run tests for read operation
+    -w      run tests for write operation
+    -b      run tests for loading binary data
+    -c      run tests for converting to binary (tobinstr)
+    -m      run tests for merging
+
+If none of the -r, -w, -b, -c or -m options is specified then all tests
+will be run.
 """
 
 
@@ -247,13 +300,16 @@ def main(argv=None):
     # default values
     test_read = None
     test_write = None
+    test_loadbin = None
+    test_convert = None
+    test_merge = None
     n = 3       # number of repeat
 
     if argv is None:
         argv = sys.argv[1:]
 
     try:
-        opts, args = getopt.getopt(argv, 'hn:rw', [])
+        opts, args = getopt.getopt(argv, 'hn:rwbcm', [])
 
         for o,a in opts:
             if o == '-h':
@@ -265,6 +321,12 @@ def main(argv=None):
                 test_read = True
             elif o == '-w':
                 test_write = True
+            elif o == '-b':
+                test_loadbin = True
+            elif o == '-c':
+                test_convert = True
+            elif o == '-m':
+                test_merge = True
 
         if args:
             raise getopt.GetoptError('Arguments are not used.')
@@ -274,10 +336,12 @@ def main(argv=None):
         print(txt)
         return 1
 
-    if (test_read, test_write) == (None, None):
-        test_read = test_write = True
+    selected = (test_read, test_write, test_loadbin, test_convert, test_merge)
+    if selected == (None,) * len(selected):
+        test_read = test_write = test_loadbin = test_convert = test_merge = True
 
-    m = Measure(n, test_read, test_write)
+    m = Measure(n, bool(test_read), bool(test_write), bool(test_loadbin),
+                bool(test_convert), bool(test_merge))
     m.measure_all()
     m.print_report()
 
@@ -365,4 +429,33 @@ base 10K          0.016
 100K+100K         0.344   1.075
 0+100K            0.156   0.975
 
+
+19/10/2026 segment storage (sorted bytearray segments instead of a dict)
+Python 3.6, seconds, median of 3 runs: dict storage -> segment storage
+
+Read operation:
+1M              0.705 -> 0.468
+512K            0.304 -> 0.189
+256K+256K       0.352 -> 0.236
+
+Write operation:
+1M              0.623 -> 0.269
+512K            0.335 -> 0.138
+256K+256K       0.388 -> 0.164
+
+Load bin operation:
+1M              0.169 -> 0.0003
+512K            0.068 -> 0.0001
+256K+256K       0.290 -> 0.0007
+
+Convert operation:
+1M              0.357 -> 0.0003
+512K            0.182 -> 0.0001
+256K+256K       0.474 -> 0.0003
+
+Merge operation:
+1M              0.074 -> 0.0002
+512K            0.038 -> 0.0001
+256K+256K       0.024 -> <0.0001
+
 """
\ No newline at end of file
@@ -6,15 +6,39 @@ import os.path
 import sys
 import os
 import platform
+import threading
+from contextlib import contextmanager
 from iotile.core.utilities.paths import settings_directory
 
+
+def _file_stamp(path):
+    """Summarize the identity and modification state of a file.
+
+    The stamp changes whenever the file is rewritten in place, since its
+    modification time or size changes, or replaced by renaming a new file
+    over it, since its inode changes.
+
+    Returns:
+        tuple: The inode, size and modification time of the file or None if
+            it does not exist.
+    """
+
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+
+    return (info.st_ino, info.st_size, info.st_mtime)
+
+
 class JSONKVStore(object):
     """A Key Value store based on flat json files with atomic write semantics
 
     This is intended as a drop in replacement for SQLiteKVStore.  Note that the
     implementation is not meant to be efficient in the sense of caching the file
     in memory.  Instead it has read-through and write-through semantics where the
-    file is reloaded every time a request is made.
+    file is reloaded every time a request is made.  See CachedJSONKVStore for
+    a version that keeps the file in memory.
 
     Args:
         name (string): The name of the file to use as a persistent store for this KVStore
@@ -61,21 +85,31 @@ class JSONKVStore(object):
 
         The goal is to make it difficult for a crash to corrupt our data file since
         the move operation can be made atomic if needed on mission critical filesystems.
+
+        Returns:
+            tuple: The _file_stamp of the saved file.
         """
 
         if platform.system() == 'Windows':
             with open(self.file, "w") as outfile:
                 json.dump(data, outfile)
-        else:
-            newpath = self.file + '.new'
 
-            with open(newpath, "w") as outfile:
-                json.dump(data, outfile)
+            return _file_stamp(self.file)
+
+        newpath = self.file + '.new'
 
-            os.rename(
-                os.path.realpath(newpath),
-                os.path.realpath(self.file)
-            )
+        with open(newpath, "w") as outfile:
+            json.dump(data, outfile)
+
+        # Stat before renaming so that we cannot pick up a later write by someone else
+        stamp = _file_stamp(newpath)
+
+        os.rename(
+            os.path.realpath(newpath),
+            os.path.realpath(self.file)
+        )
+
+        return stamp
 
     def get(self, key):
         """Get a value by its key
@@ -147,3 +181,229 @@ class JSONKVStore(object):
         """
 
         self._save_file({})
+
+    @contextmanager
+    def batch(self):
+        """Group writes together, see SQLiteKVStore.batch
+
+        Writes to this store are always saved immediately so this does nothing.
+        """
+
+        yield
+
+
+class _CachedJSONFile(object):
+    """The parsed contents of a json kv store file shared within a process."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.lock = threading.RLock()
+        self.data = None
+        self.stamp = None
+        self.pending = []
+        self.batch_depth = 0
+
+
+def _apply_change(data, change):
+    action = change[0]
+
+    if action == 'set':
+        data[change[1]] = change[2]
+    elif action == 'remove':
+        data.pop(change[1], None)
+    else:
+        data.clear()
+
+
+class CachedJSONKVStore(JSONKVStore):
+    """A JSONKVStore that keeps the parsed file in memory.
+
+    This stores data in exactly the same format as JSONKVStore and can be
+    used on the same file at the same time.  All stores for the same file in
+    a process share a single parsed copy of it.  Before each operation the
+    file is checked with a single stat call and it is only reloaded if its
+    inode, size or modification time changed, so changes saved by other
+    processes are still seen immediately.
+
+    Each write is saved immediately with the same atomic rename as
+    JSONKVStore unless it is made inside a batch(), in which case all of the
+    writes in the batch are saved with a single rewrite when it finishes.
+
+    Args:
+        name (string): The name of the file to use as a persistent store for this KVStore
+        folder (string): Optional folder to store the file.  If None, the system default
+            settings directory is used
+        respect_venv (bool): Make folder relative to the current virtual environment if there
+            is one.
+    """
+
+    _files = {}
+    _files_lock = threading.Lock()
+
+    def __init__(self, name, folder=None, respect_venv=False):
+        super(CachedJSONKVStore, self).__init__(name, folder, respect_venv)
+        self._cached = None
+
+    def _get_cached(self):
+        if self._cached is not None and self._cached.pid == os.getpid():
+            return self._cached
+
+        key = os.path.realpath(self.file)
+
+        with CachedJSONKVStore._files_lock:
+            cached = CachedJSONKVStore._files.get(key)
+
+            # Locks must not be used across a fork so each process starts its own cache
+            if cached is None or cached.pid != os.getpid():
+                cached = _CachedJSONFile()
+                CachedJSONKVStore._files[key] = cached
+
+        self._cached = cached
+        return cached
+
+    def _current(self, cached):
+        """Get the cached data, reloading it if the file changed.
+
+        Changes made in the current batch that have not been saved yet are
+        applied again on top of the reloaded data.
+        """
+
+        stamp = _file_stamp(self.file)
+        if cached.data is None or stamp != cached.stamp:
+            data = self._load_file()
+            for change in cached.pending:
+                _apply_change(data, change)
+
+            cached.data = data
+            cached.stamp = stamp
+
+        return cached.data
+
+    def _save_cached(self, cached):
+        try:
+            cached.stamp = self._save_file(cached.data)
+        except:
+            cached.data = None
+            raise
+        finally:
+            cached.pending = []
+
+    def _change(self, change):
+        cached = self._get_cached()
+
+        with cached.lock:
+            data = self._current(cached)
+            if change[0] == 'remove' and change[1] not in data:
+                raise KeyError(change[1])
+
+            _apply_change(data, change)
+
+            if cached.batch_depth > 0:
+                cached.pending.append(change)
+            else:
+                self._save_cached(cached)
+
+    def get(self, key):
+        """Get a value by its key
+
+        Args:
+            key (string): The key used to store this value
+
+        Returns:
+            value (string): The value associated to the key
+
+        Raises:
+            KeyError: if the key was not found
+        """
+
+        cached = self._get_cached()
+
+        with cached.lock:
+            return self._current(cached)[key]
+
+    def get_all(self):
+        """Return a list of all (key, value) tuples in the kv store
+
+        Returns:
+            list(string, string): A list of key, value pairs
+        """
+
+        cached = self._get_cached()
+
+        with cached.lock:
+            return list(self._current(cached).items())
+
+    def remove(self, key):
+        """Remove a key from the data store
+
+        Args:
+            key (string): The key to remove
+
+        Raises:
+            KeyError: if the key was not found
+        """
+
+        self._change(('remove', key))
+
+    def try_get(self, key):
+        """Try to get a value by its key, returning None if not found
+
+        Args:
+            key (string): The key used to store this value
+
+        Returns:
+            value (string): The value associated to the key or None
+        """
+
+        cached = self._get_cached()
+
+        with cached.lock:
+            return self._current(cached).get(key, None)
+
+    def set(self, key, value):
+        """Set the value of a key
+
+        Args:
+            key (string): The key used to store this value
+            value (string): The value to store
+        """
+
+        self._change(('set', key, value))
+
+    def clear(self):
+        """Clear all values from this kv store
+        """
+
+        self._change(('clear',))
+
+    @contextmanager
+    def batch(self):
+        """Save all writes made inside a with block with a single rewrite.
+
+        If the file is changed by another process during the batch, the
+        writes in the batch are applied on top of its new contents before
+        saving.  If an exception is raised, none of the writes are saved.
+        Batches may be nested, in which case the outermost one saves the
+        file.  Other threads in this process cannot use the store while a
+        batch is in progress.
+        """
+
+        cached = self._get_cached()
+
+        with cached.lock:
+            cached.batch_depth += 1
+
+            try:
+                yield
+            except:
+                cached.batch_depth -= 1
+                if cached.batch_depth == 0:
+                    cached.pending = []
+                    cached.data = None
+
+                raise
+
+            cached.batch_depth -= 1
+            if cached.batch_depth == 0 and len(cached.pending) > 0:
+                self._current(cached)
+                self._save_cached(cached)
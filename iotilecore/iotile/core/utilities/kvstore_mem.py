@@ -3,6 +3,8 @@
 # This file is copyright Arch Systems, Inc.
 # Except as otherwise provided in the relevant LICENSE file, all rights are reserved.
 
+from contextlib import contextmanager
+
 
 class InMemoryKVStore(object):
     """A Key Value store based on an in memory dict
@@ -85,3 +87,12 @@ class InMemoryKVStore(object):
         """Clear all values from this kv store."""
 
         InMemoryKVStore._shared_data = {}
+
+    @contextmanager
+    def batch(self):
+        """Group writes together, see SQLiteKVStore.batch.
+
+        Writes to this store are always applied immediately so this does nothing.
+        """
+
+        yield
@@ -3,20 +3,164 @@
 
 #Sqlite3 textual key value store
 from iotile.core.utilities.paths import settings_directory
+from contextlib import contextmanager
+import threading
+import logging
 import sqlite3
 import os.path
 import sys
 import os
 
+
+class _SharedConnection(object):
+    """A sqlite connection and cached table shared by all stores for a file in a process.
+
+    The connection is used in autocommit mode so that each write is committed
+    immediately unless it is part of a batch.  The cached copy of the table
+    is reloaded whenever PRAGMA data_version reports that another connection
+    has committed a change to the database.  SQLite versions before 3.8.8 do
+    not support PRAGMA data_version, so with them nothing is cached and the
+    table is read on every call.
+
+    Args:
+        path (str): The path to the database file.
+        timeout (float): How long to wait for other connections to release
+            their locks before failing.
+    """
+
+    def __init__(self, path, timeout):
+        self.pid = os.getpid()
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+
+        self._cache = None
+        self._data_version = None
+        self._batch_depth = 0
+        self._logger = logging.getLogger(__name__)
+
+        self._enable_wal(path)
+        self.setup_table()
+
+    def _enable_wal(self, path):
+        # WAL mode lets readers proceed while another process is writing.  It
+        # is not supported on all filesystems, e.g. network shares, so fall
+        # back to the default journal mode if it cannot be enabled.
+        try:
+            mode, = self.connection.execute('PRAGMA journal_mode=WAL').fetchone()
+        except sqlite3.OperationalError:
+            mode = None
+
+        if mode is None or mode.lower() != 'wal':
+            self._logger.debug("Could not enable WAL mode for %s, using journal mode %s", path, mode)
+            return
+
+        # In WAL mode, NORMAL never corrupts the database, it can only lose
+        # the last transactions after a power failure.
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+    def setup_table(self):
+        """Create the key value table if it does not exist."""
+
+        self.connection.execute('create table if not exists KVStore (key TEXT PRIMARY KEY, value TEXT);')
+
+    def items(self):
+        """Get the contents of the table from the cache, reloading it if needed.
+
+        Returns:
+            dict: The key value table.
+        """
+
+        row = self.connection.execute('PRAGMA data_version').fetchone()
+        if row is None:
+            # Unknown pragmas return nothing so we cannot tell whether the
+            # table changed since we last read it.
+            self._cache = None
+            return dict(self.connection.execute('select key, value from KVStore').fetchall())
+
+        version, = row
+        if self._cache is None or version != self._data_version:
+            self._cache = dict(self.connection.execute('select key, value from KVStore').fetchall())
+            self._data_version = version
+
+        return self._cache
+
+    def write(self, query, args):
+        """Execute a write query.
+
+        The caller must hold lock and update the cache returned by items()
+        to match the write.
+        """
+
+        self.connection.execute(query, args)
+
+    def clear(self):
+        """Remove all keys from the table."""
+
+        with self.batch():
+            self.connection.execute('drop table KVStore')
+            self.setup_table()
+
+        self._cache = {}
+
+    @contextmanager
+    def batch(self):
+        """Group writes into a single transaction that is committed at the end.
+
+        Batches may be nested, in which case only the outermost batch starts
+        and commits a transaction.  If an exception is raised the entire
+        transaction is rolled back.  Other threads in this process cannot use
+        the connection while a batch is in progress.
+        """
+
+        with self.lock:
+            if self._batch_depth == 0:
+                # IMMEDIATE takes the write lock up front so we wait for other
+                # writers here rather than failing when we first write.
+                self.connection.execute('BEGIN IMMEDIATE')
+
+            self._batch_depth += 1
+
+            try:
+                yield
+            except:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.connection.execute('ROLLBACK')
+                    self._cache = None
+
+                raise
+
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.connection.execute('COMMIT')
+
+
 class SQLiteKVStore(object):
     """
     A simple string - string persistent map backed by sqlite for concurrent access
 
     The KeyValueStore can be made to respect python virtual environments if desired
+
+    The database is put in WAL mode so that readers are not blocked while
+    another process writes, and processes wait up to BusyTimeout seconds for
+    each other rather than failing with 'database is locked'.  All stores
+    using the same file in a process share one connection and one cached copy
+    of the table, so repeated reads do not query the database.  The cache is
+    revalidated on each read with PRAGMA data_version, which changes whenever
+    another connection commits.
+
+    Each set, remove or clear is committed immediately unless it is made
+    inside a batch(), which commits all of its writes in one transaction.
     """
 
     DefaultFolder = settings_directory()
 
+    # How long in seconds to wait for other processes to finish writing
+    BusyTimeout = 60.0
+
+    _connections = {}
+    _connections_lock = threading.Lock()
+
     def __init__(self, name, folder=None, respect_venv=False):
         if folder is None:
             folder = SQLiteKVStore.DefaultFolder
@@ -32,43 +176,77 @@ class SQLiteKVStore(object):
             os.makedirs(folder, 0o755)
 
         dbfile = os.path.join(folder, name)
-        self.connection = sqlite3.connect(dbfile)
-        self.cursor = self.connection.cursor()
 
         self.file = dbfile
-        self._setup_table()
+        self._shared = self._get_shared_connection(dbfile)
+
+    @classmethod
+    def _get_shared_connection(cls, path):
+        key = os.path.realpath(path)
+
+        with cls._connections_lock:
+            shared = cls._connections.get(key)
 
-    def _setup_table(self):
-        query = 'create table if not exists KVStore (key TEXT PRIMARY KEY, value TEXT);'
-        self.cursor.execute(query)
-        self.connection.commit()
+            # Connections must not be used across a fork so each process opens its own
+            if shared is None or shared.pid != os.getpid():
+                shared = _SharedConnection(path, cls.BusyTimeout)
+                cls._connections[key] = shared
+
+            return shared
+
+    def _get_shared(self):
+        if self._shared.pid != os.getpid():
+            self._shared = self._get_shared_connection(self.file)
+
+        return self._shared
+
+    @property
+    def connection(self):
+        """The sqlite connection shared by all stores for this file in this process."""
+
+        return self._get_shared().connection
+
+    def batch(self):
+        """Commit all writes made inside a with block in a single transaction.
+
+        This is much faster than committing each write separately and other
+        processes see either all or none of the writes.  The write lock on
+        the database is held until the with block finishes.
+
+        Returns:
+            context manager: A context manager for the batch.
+        """
+
+        return self._get_shared().batch()
 
     def size(self):
-        query = 'select count(*) from KVStore'
-        self.cursor.execute(query)
-        return self.cursor.fetchone()[0]
+        shared = self._get_shared()
+
+        with shared.lock:
+            return len(shared.items())
 
     def get_all(self):
-        query = 'select key, value from KVStore'
-        self.cursor.execute(query)
+        shared = self._get_shared()
 
-        vals = self.cursor.fetchall()
-        return vals
+        with shared.lock:
+            return list(shared.items().items())
 
     def get(self, id):
-        query = 'select value from KVStore where key is ?'
-        self.cursor.execute(query, (id,))
+        shared = self._get_shared()
 
-        val = self.cursor.fetchone()
-        if val is None:
-            raise KeyError("id not in key-value store: %s" % str(id))
-
-        return val[0]
+        with shared.lock:
+            try:
+                return shared.items()[id]
+            except KeyError:
+                raise KeyError("id not in key-value store: %s" % str(id))
 
     def remove(self, key):
-        query = "delete from KVStore where key is ?"
-        self.cursor.execute(query, (key,))
-        self.connection.commit()
+        shared = self._get_shared()
+
+        with shared.lock:
+            items = shared.items()
+            shared.write("delete from KVStore where key is ?", (key,))
+            items.pop(key, None)
 
     def try_get(self, id):
         try:
@@ -77,13 +255,16 @@ class SQLiteKVStore(object):
             return None
 
     def set(self, key, value):
-        query = "insert or replace into KVStore values (?, ?)"
-        self.cursor.execute(query, (key, str(value)))
-        self.connection.commit()
+        shared = self._get_shared()
+        value = str(value)
+
+        with shared.lock:
+            items = shared.items()
+            shared.write("insert or replace into KVStore values (?, ?)", (key, value))
+            items[key] = value
 
     def clear(self):
-        query = 'drop table KVStore'
-        self.cursor.execute(query)
-        self.connection.commit()
+        shared = self._get_shared()
 
-        self._setup_table()
+        with shared.lock:
+            shared.clear()
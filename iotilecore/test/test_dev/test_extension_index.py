@@ -0,0 +1,240 @@
+"""Tests of the persistent extension index used by ComponentRegistry."""
+
+import os
+import sys
+import json
+import shutil
+import pytest
+import entrypoints
+from iotile.core.dev import ComponentRegistry
+from iotile.core.dev import extension_index
+from iotile.core.dev.extension_index import ExtensionIndex, distribution_fingerprint
+from iotile.core.hw.proxy.proxy import TileBusProxyObject
+
+PROXY_TEMPLATE = """
+from iotile.core.hw.proxy.proxy import TileBusProxyObject
+
+with open(%r, "a") as outfile:
+    outfile.write("%s\\n")
+
+class %sProxy(TileBusProxyObject):
+    @classmethod
+    def ModuleName(cls):
+        return %r
+"""
+
+
+def _write_proxy(folder, marker, name, module_name):
+    path = folder.join('tagged_%s.py' % name)
+    path.write(PROXY_TEMPLATE % (str(marker), name, name.capitalize(), module_name))
+    sys.modules.pop('tagged_%s' % name, None)
+    return path
+
+
+def _imported(marker):
+    if not marker.exists():
+        return []
+
+    imported = marker.read().split()
+    marker.remove()
+
+    for name in imported:
+        sys.modules.pop('tagged_%s' % name, None)
+
+    return sorted(imported)
+
+
+@pytest.fixture(scope="function")
+def proxy_component(tmpdir):
+    """A memory backed registry with a component that has two proxies."""
+
+    comp = tmpdir.mkdir('comp')
+    comp.join('module_settings.json').write(json.dumps({
+        'file_format': 'v2',
+        'module_name': 'tagged_test',
+        'products': {
+            'python/tagged_first.py': 'proxy_module',
+            'python/tagged_second.py': 'proxy_module'
+        }
+    }))
+
+    python = comp.mkdir('python')
+    marker = tmpdir.join('imported.txt')
+
+    _write_proxy(python, marker, 'first', 'prx001')
+    _write_proxy(python, marker, 'second', 'prx002')
+
+    ComponentRegistry.SetBackingStore('memory')
+
+    reg = ComponentRegistry()
+    reg.clear()
+    reg.add_component(str(comp))
+
+    yield reg, python, marker
+
+    reg.clear_components()
+    ComponentRegistry.SetBackingStore('sqlite')
+    _imported(marker)
+
+
+def tile_path(name):
+    parent = os.path.dirname(__file__)
+    return os.path.join(parent, name)
+
+
+def _add_distribution(folder, name, entry_points):
+    distro = folder.mkdir(name + '-1.0.0.dist-info')
+    distro.join('entry_points.txt').write(entry_points)
+    return distro
+
+
+def test_fingerprint(tmpdir):
+    """Make sure the fingerprint only changes when distributions change."""
+
+    site = tmpdir.mkdir('site')
+    empty = tmpdir.mkdir('empty')
+    path = [str(site), str(empty), str(tmpdir.join('missing'))]
+
+    assert distribution_fingerprint(path) == []
+
+    distro = _add_distribution(site, 'test_distro', '[iotile.test]\nvalue = os.path:join\n')
+    first = distribution_fingerprint(path)
+    assert len(first) == 2
+
+    empty.join('unrelated.txt').write('hello')
+    assert distribution_fingerprint(path) == first
+
+    distro.join('entry_points.txt').setmtime(0)
+    assert distribution_fingerprint(path) != first
+
+
+def test_entry_points_persisted(tmpdir, monkeypatch):
+    """Make sure entry points are saved and reused until distributions change."""
+
+    index_path = str(tmpdir.join('index.json'))
+    expected = sorted(x.name for x in entrypoints.get_group_all('iotile.proxy'))
+
+    index = ExtensionIndex(index_path)
+    assert sorted(x.name for x in index.entry_points('iotile.proxy')) == expected
+    assert index.entry_points('iotile.unknown_group') == []
+    assert os.path.isfile(index_path)
+
+    def _fail_dump(prefix):
+        raise AssertionError("Entry points should have been loaded from the index")
+
+    monkeypatch.setattr(extension_index, 'dump_entry_points', _fail_dump)
+
+    index = ExtensionIndex(index_path)
+    assert sorted(x.name for x in index.entry_points('iotile.proxy')) == expected
+
+    # A changed set of distributions rebuilds the entry points
+    monkeypatch.setattr(extension_index, 'distribution_fingerprint', lambda: [['changed', 1.0]])
+
+    index = ExtensionIndex(index_path)
+    with pytest.raises(AssertionError):
+        index.entry_points('iotile.proxy')
+
+
+def test_component_reindexed(tmpdir):
+    """Make sure components are only reparsed when they change."""
+
+    comp = str(tmpdir.join('comp'))
+    shutil.copytree(tile_path('comp_w_products'), comp)
+
+    index = ExtensionIndex(str(tmpdir.join('index.json')))
+    indexed = index.component(comp)
+
+    assert indexed.name == 'tile_1'
+    assert indexed.find_products('proxy_module') == [os.path.join(comp, 'python', 'proxy.py')]
+    assert len(indexed.find_products('proxy_plugin')) == 5
+    assert indexed.find_products('virtual_tile') == []
+
+    # Products that are not indexed are loaded from the component
+    assert indexed.find_products('linker_script') == [os.path.join(comp, 'build', 'output', 'linker', 'link.ld')]
+
+    index = ExtensionIndex(str(tmpdir.join('index.json')))
+    assert index.component(comp).find_products('app_module') == [os.path.join(comp, 'python', 'app.py')]
+
+    settings_path = os.path.join(comp, 'module_settings.json')
+    with open(settings_path, "r") as infile:
+        settings = json.load(infile)
+
+    settings['products']['python/proxy2.py'] = 'proxy_module'
+    with open(settings_path, "w") as outfile:
+        json.dump(settings, outfile)
+
+    index = ExtensionIndex(str(tmpdir.join('index.json')))
+    assert len(index.component(comp).find_products('proxy_module')) == 2
+
+
+def test_registry_product_name_filter(tmpdir):
+    """Make sure products that don't match a name filter are never imported."""
+
+    comp = tmpdir.mkdir('comp')
+    comp.join('module_settings.json').write(json.dumps({
+        'file_format': 'v2',
+        'module_name': 'index_test',
+        'products': {
+            'python/index_good_ext.py': 'proxy_module',
+            'python/index_other_ext.py': 'proxy_module'
+        }
+    }))
+
+    python = comp.mkdir('python')
+    python.join('index_good_ext.py').write('class GoodExtension(object):\n    pass\n')
+    marker = tmpdir.join('imported.txt')
+    python.join('index_other_ext.py').write('open(%r, "w").close()\n' % str(marker))
+
+    ComponentRegistry.SetBackingStore('memory')
+
+    reg = ComponentRegistry()
+    reg.clear()
+    try:
+        reg.add_component(str(comp))
+
+        found = reg.load_extensions('iotile.proxy', name_filter='index_good_ext', product_name='proxy_module')
+        assert [name for name, _ext in found] == ['index_good_ext']
+        assert hasattr(found[0][1], 'GoodExtension')
+        assert not marker.exists()
+    finally:
+        reg.clear_components()
+        ComponentRegistry.SetBackingStore('sqlite')
+
+
+def _module_names(proxy):
+    return [proxy.ModuleName()]
+
+
+def _find_tagged(reg, name):
+    found = reg.load_tagged_extensions('iotile.proxy', name, 'test_module_name', _module_names,
+                                       class_filter=TileBusProxyObject, product_name='proxy_module')
+    return [obj.ModuleName() for _name, obj in found]
+
+
+def test_tagged_extensions(proxy_component):
+    """Make sure only extensions with a cached tag are imported."""
+
+    reg, python, marker = proxy_component
+
+    # Nothing is cached at first so everything is imported
+    assert _find_tagged(reg, 'prx001') == ['prx001']
+    assert _imported(marker) == ['first', 'second']
+
+    assert _find_tagged(reg, 'prx002') == ['prx002']
+    assert _imported(marker) == ['second']
+
+    tags = reg.list_extension_tags('iotile.proxy', 'test_module_name', _module_names, class_filter=TileBusProxyObject,
+                                   product_name='proxy_module')
+    assert set(['prx001', 'prx002']) <= tags
+    assert _imported(marker) == []
+
+    # Changed extensions are tagged again
+    path = _write_proxy(python, marker, 'second', 'prx003')
+    path.setmtime(path.mtime() + 10)
+
+    assert _find_tagged(reg, 'prx003') == ['prx003']
+    assert _imported(marker) == ['second']
+
+    # Misses import everything again in case the cache is stale
+    assert _find_tagged(reg, 'prx999') == []
+    assert _imported(marker) == ['first', 'second']
@@ -1,8 +1,9 @@
 import pytest
 import os
 from iotile.core.dev.registry import ComponentRegistry, _check_registry_type
+from iotile.core.dev.iotileobj import IOTile
 from iotile.core.exceptions import ArgumentError
-from iotile.core.utilities.kvstore_json import JSONKVStore
+from iotile.core.utilities.kvstore_json import CachedJSONKVStore
 
 
 def tile_path(name):
@@ -52,6 +53,20 @@ def test_registry(registry):
         registry.get_config('devmode_component')
 
 
+def test_temporary_component(registry):
+    """Make sure a component registered both ways is only found once."""
+
+    path = os.path.normpath(os.path.abspath(tile_path('devmode_component')))
+    registry.add_component(path)
+    registry.add_component(path, temporary=True)
+
+    try:
+        folders = list(registry._iter_component_folders())
+        assert folders == [(IOTile(path).name, path)]
+    finally:
+        registry.clear_components()
+
+
 def test_backing_store_type(tmpdir):
     """Make sure we can properly interpret the backing store.
 
@@ -66,4 +81,4 @@ def test_backing_store_type(tmpdir):
 
     _check_registry_type(str(regdir))
 
-    assert ComponentRegistry.BackingType is JSONKVStore
+    assert ComponentRegistry.BackingType is CachedJSONKVStore
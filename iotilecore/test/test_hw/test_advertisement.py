@@ -0,0 +1,90 @@
+"""Tests of shared BLE advertisement decoding and deduplication."""
+
+import struct
+from iotile.core.hw.transport.advertisement import AdvertisementCache, format_address, decode_v1_advertisement, \
+                                                  decode_v2_advertisement, scan_content
+
+
+def test_format_address():
+    """Make sure addresses are reversed and formatted."""
+
+    assert format_address(b'\x55\x44\x33\x22\x11\x00') == '00:11:22:33:44:55'
+
+    cache = AdvertisementCache()
+    assert cache.address(b'\xff\xee\xdd\xcc\xbb\xaa') == 'AA:BB:CC:DD:EE:FF'
+    assert cache.address(b'\xff\xee\xdd\xcc\xbb\xaa') == 'AA:BB:CC:DD:EE:FF'
+
+
+def test_decode_v1():
+    """Make sure we decode v1 advertisement flags."""
+
+    info = decode_v1_advertisement(struct.pack("<LH", 0x1234, 0b101), 'addr', -60)
+
+    assert info['uuid'] == 0x1234
+    assert info['pending_data'] is True
+    assert info['low_voltage'] is False
+    assert info['user_connected'] is True
+    assert info['signal_strength'] == -60
+
+
+def test_decode_v2():
+    """Make sure we decode v2 advertisements and their broadcast readings."""
+
+    data = bytearray(7) + struct.pack("<LHBBLBBHLL", 0x10, 5, 0x01, 0b1, 100, 64, (2 << 5) | 3, (1 << 15) | 0x5001, 42, 0)
+    info, broadcast = decode_v2_advertisement(data, 'addr', -70)
+
+    assert info['uuid'] == 0x10
+    assert info['reboot_counter'] == (1 << 16) | 5
+    assert info['sequence'] == 3
+    assert info['broadcast_toggle'] == 1
+    assert info['battery'] == 2.0
+    assert broadcast == (0x5001, 42, 2)
+
+    data = bytearray(7) + struct.pack("<LHBBLBBHLL", 0x10, 5, 0x01, 0b1, 100, 64, 3, 0x7FFF, 42, 0)
+    _info, broadcast = decode_v2_advertisement(data, 'addr', -70)
+    assert broadcast is None
+
+
+def test_scan_dedup():
+    """Make sure unchanged scans are only reported on the refresh interval."""
+
+    cache = AdvertisementCache(refresh_interval=5.0)
+    info = decode_v1_advertisement(struct.pack("<LH", 1, 0), 'addr', -60)
+
+    assert cache.scan_changed('addr', scan_content(info), 0.0)
+
+    # Signal strength alone is not a change
+    info['signal_strength'] = -80
+    assert not cache.scan_changed('addr', scan_content(info), 1.0)
+
+    info['pending_data'] = True
+    assert cache.scan_changed('addr', scan_content(info), 2.0)
+    assert not cache.scan_changed('addr', scan_content(info), 6.0)
+    assert cache.scan_changed('addr', scan_content(info), 7.5)
+
+    cache = AdvertisementCache(refresh_interval=0)
+    assert cache.scan_changed('addr', scan_content(info), 0.0)
+    assert cache.scan_changed('addr', scan_content(info), 0.0)
+
+
+def test_broadcast_dedup():
+    """Make sure repeated broadcast readings are detected per channel."""
+
+    cache = AdvertisementCache()
+
+    assert cache.broadcast_changed('addr', 0, (1, 2))
+    assert not cache.broadcast_changed('addr', 0, (1, 2))
+    assert cache.broadcast_changed('addr', 1, (1, 2))
+    assert cache.broadcast_changed('addr', 0, (1, 3))
+
+
+def test_prune():
+    """Make sure devices we have not heard from are forgotten."""
+
+    cache = AdvertisementCache(refresh_interval=100.0, max_age=10.0)
+
+    assert cache.scan_changed('addr', (1,), 0.0)
+    assert not cache.scan_changed('addr', (1,), 5.0)
+    assert cache.scan_changed('other', (1,), 16.0)
+    assert cache.scan_changed('addr', (1,), 17.0)
+    assert not cache.scan_changed('other', (1,), 18.0)
@@ -48,3 +48,89 @@ class TestHardwareManager(unittest.TestCase):
         assert uuid_to_slug(0x9c400) == 'd--0000-0000-0009-c400'
         assert uuid_to_slug(0x0fffffff) == 'd--0000-0000-0fff-ffff'
 
+
+
+def test_lazy_proxies():
+    """Make sure proxies are only loaded when a tile with their name is seen."""
+
+    from iotile.core.dev import ComponentRegistry
+    from iotile.core.hw.proxy.proxy import TileBusProxyObject
+
+    class LazyProxy(TileBusProxyObject):
+        @classmethod
+        def ModuleName(cls):
+            return 'lazy01'
+
+    reg = ComponentRegistry()
+    reg.register_extension('iotile.proxy', 'lazy_proxy', LazyProxy)
+
+    try:
+        hw = HardwareManager('none')
+        assert 'lazy01' not in hw._name_map
+
+        assert hw.get_proxy('lazy01') is LazyProxy
+        assert hw._name_map['lazy01'] == [LazyProxy]
+        assert hw.get_proxy('unknwn') is None
+    finally:
+        reg.clear_extensions('iotile.proxy')
+
+
+def test_tile_identity_cache():
+    """Make sure tiles are only asked for their name once per connection."""
+
+    from iotile.core.dev import ComponentRegistry
+    from iotile.core.hw.proxy.proxy import TileBusProxyObject
+
+    class CachedProxy(TileBusProxyObject):
+        @classmethod
+        def ModuleName(cls):
+            return 'abcdef'
+
+    reg = ComponentRegistry()
+    reg.register_extension('iotile.proxy', 'cached_proxy', CachedProxy)
+
+    path = os.path.join(os.path.dirname(__file__), 'virtual_app_device.py')
+    hw = HardwareManager(port="virtual:%s" % path)
+
+    try:
+        hw.connect(1)
+
+        sent = []
+        send_rpc = hw.stream.send_rpc
+
+        def _counting_send_rpc(address, rpc_id, payload, **kwargs):
+            sent.append((address, rpc_id))
+            return send_rpc(address, rpc_id, payload, **kwargs)
+
+        hw.stream.send_rpc = _counting_send_rpc
+
+        for _i in range(0, 3):
+            tile = hw.get(8)
+            assert isinstance(tile, CachedProxy)
+
+        assert sent == [(8, 0x0004)]
+
+        hw.get(8, refresh=True)
+        assert len(sent) == 2
+
+        hw.clear_tile_cache()
+        hw.get(8)
+        assert len(sent) == 3
+
+        # Reconnecting clears the cache
+        hw.disconnect()
+        hw.connect(1)
+        hw.get(8)
+        hw.get(8)
+        assert len(sent) == 4
+
+        # Resetting a tile clears the cache
+        tile = hw.get(8)
+        with pytest.raises(UnsupportedCommandError):
+            tile.reset(wait=0)
+
+        hw.get(8)
+        assert sent[-2:] == [(8, 0x0001), (8, 0x0004)]
+    finally:
+        hw.close()
+        reg.clear_extensions('iotile.proxy')
@@ -0,0 +1,42 @@
+"""Tests of packing and unpacking RPC payloads with cached formats."""
+
+import pytest
+from iotile.core.hw.virtual import pack_rpc_payload, unpack_rpc_payload
+from iotile.core.hw.virtual.common_types import RPCInvalidArgumentsError, RPCInvalidReturnValueError
+
+
+def test_fixed_payloads():
+    """Make sure fixed formats round trip and are reused."""
+
+    for _i in range(0, 3):
+        payload = pack_rpc_payload("LH2x", [0x12345678, 0xABCD])
+        assert payload == b'\x78\x56\x34\x12\xcd\xab\x00\x00'
+        assert unpack_rpc_payload("LH2x", payload) == (0x12345678, 0xABCD)
+
+
+def test_variable_payloads():
+    """Make sure variable length formats work for each length."""
+
+    for length in range(0, 17):
+        data = bytes(bytearray(range(0, length)))
+        payload = pack_rpc_payload("LV", [1, data])
+        assert payload == b'\x01\x00\x00\x00' + data
+        assert unpack_rpc_payload("LV", payload) == (1, data)
+
+    with pytest.raises(RPCInvalidReturnValueError):
+        pack_rpc_payload("LV", [1, b'a'*17])
+
+    with pytest.raises(RPCInvalidArgumentsError):
+        unpack_rpc_payload("LV", b'\x01\x00')
+
+
+def test_truncation_detected():
+    """Make sure lossy formats are still validated."""
+
+    with pytest.raises(RPCInvalidArgumentsError):
+        pack_rpc_payload("4s", [b'abcdef'])
+
+    with pytest.raises(RPCInvalidArgumentsError):
+        pack_rpc_payload("?", [2])
+
+    assert pack_rpc_payload("4s", [b'abcd']) == b'abcd'
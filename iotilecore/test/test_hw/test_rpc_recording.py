@@ -0,0 +1,131 @@
+"""Tests of binary RPC recordings."""
+
+import struct
+import pytest
+from iotile.core.exceptions import DataError
+from iotile.core.hw.virtual import VirtualIOTileDevice
+from iotile.core.hw.virtual.virtualdevice import rpc
+from iotile.core.hw.transport import RPCRecording, BinaryRPCRecorder
+
+
+class ReplayDevice(VirtualIOTileDevice):
+    def __init__(self, offset=0):
+        super(ReplayDevice, self).__init__(1, 'Replay')
+        self.offset = offset
+
+    @rpc(8, 0x8000, "L", "L")
+    def add_one(self, value):
+        return [value + 1 + self.offset]
+
+    @rpc(11, 0x8001, "", "")
+    def nothing(self):
+        return []
+
+
+def _record(path, count=50, interval=4):
+    """Record count RPCs, alternating between two addresses and connections."""
+
+    recorder = BinaryRPCRecorder(path, index_interval=interval)
+
+    expected = []
+    for i in range(0, count):
+        connection = 'device_%d' % (i // 20)
+        if i % 2 == 0:
+            call = struct.pack("<L", i)
+            entry = (connection, 1000.0 + i, (i + 1) / 1024.0, 8, 0x8000, call, struct.pack("<L", i + 1), 0xC0)
+        else:
+            entry = (connection, 1000.0 + i, 0.5, 11, 0x8001, b'', b'', 0x40)
+
+        recorder.record(*entry)
+        expected.append(entry)
+
+    return recorder, expected
+
+
+def _check(recording, expected):
+    assert len(recording) == len(expected)
+    assert [tuple(x) for x in recording.iter_rpcs()] == expected
+
+    assert [tuple(x) for x in recording.iter_rpcs(address=11)] == [x for x in expected if x[3] == 11]
+    assert [tuple(x) for x in recording.iter_rpcs(rpc_id=0x8000)] == [x for x in expected if x[4] == 0x8000]
+    assert [tuple(x) for x in recording.iter_rpcs(start=1013.0, end=1027.0)] == expected[13:28]
+    assert list(recording.iter_rpcs(address=9)) == []
+
+
+def test_binary_recording(tmpdir):
+    """Make sure RPCs round trip through a binary recording and its index."""
+
+    path = str(tmpdir.join('recording.bin'))
+    recorder, expected = _record(path)
+    recorder.close()
+
+    with RPCRecording(path) as recording:
+        assert recording.indexed
+        assert recording.index_interval == 4
+        _check(recording, expected)
+
+
+def test_unindexed_recording(tmpdir):
+    """Make sure recordings that were not closed can still be loaded."""
+
+    path = str(tmpdir.join('recording.bin'))
+    recorder, expected = _record(path)
+    recorder._file.write(b'\x02\x00\x00')
+    recorder._file.flush()
+
+    with RPCRecording(path) as recording:
+        assert not recording.indexed
+        assert recording.truncated
+        _check(recording, expected)
+
+    recorder._file.close()
+
+    with open(path, "wb") as outfile:
+        outfile.write(b'not a recording')
+
+    with pytest.raises(DataError):
+        RPCRecording(path)
+
+
+def test_latency_stats(tmpdir):
+    """Make sure latency statistics are computed per address and rpc id."""
+
+    path = str(tmpdir.join('recording.bin'))
+    recorder, _expected = _record(path, count=100)
+    recorder.close()
+
+    with RPCRecording(path) as recording:
+        stats = recording.latency_stats()
+        assert sorted(stats) == [(8, 0x8000), (11, 0x8001)]
+
+        add_stats = stats[(8, 0x8000)]
+        assert add_stats['count'] == 50
+        assert add_stats['min'] == 1 / 1024.0
+        assert add_stats['max'] == 99 / 1024.0
+        assert add_stats['mean'] == 50 / 1024.0
+        assert add_stats['median'] == 49 / 1024.0
+        assert add_stats['p90'] == 89 / 1024.0
+        assert add_stats['p99'] == 99 / 1024.0
+
+        assert stats[(11, 0x8001)]['median'] == 0.5
+
+        stats = recording.latency_stats(address=8, end=1009.0)
+        assert stats[(8, 0x8000)]['count'] == 5
+
+
+def test_replay(tmpdir):
+    """Make sure recordings can be replayed into a virtual device."""
+
+    path = str(tmpdir.join('recording.bin'))
+    recorder, _expected = _record(path)
+    recorder.record('device_3', 2000.0, 0.1, 12, 0x8000, b'', b'', 0xFF)
+    recorder.close()
+
+    with RPCRecording(path) as recording:
+        assert recording.replay(ReplayDevice()) == []
+
+        mismatches = recording.replay(ReplayDevice(offset=1), rpc_id=0x8000, end=1010.0)
+        assert len(mismatches) == 6
+        assert mismatches[0].rpc.call == struct.pack("<L", 0)
+        assert mismatches[0].status == 0xC0
+        assert mismatches[0].response == struct.pack("<L", 2)
@@ -1,9 +1,20 @@
 """Test our update script generation and parsing."""
 
+import io
+import sys
+import mmap
+import subprocess
+import struct
+import random
+import hashlib
+from binascii import hexlify
 import pytest
 from iotile.core.exceptions import ArgumentError, DataError
 from iotile.core.hw.update.records import *
+from iotile.core.hw.update.records.reflash_diff import image_hash
+from iotile.core.hw.update.firmware_diff import create_reflash_record, load_firmware_image
 from iotile.core.hw import UpdateScript
+from iotile.core.utilities.intelhex import IntelHex
 
 
 def test_basic_script_parsing():
@@ -64,3 +75,275 @@ def test_set_version():
     assert str(script2.records[0]) == u'Set device app to (tag:12 version:3.4)'
     assert str(script2.records[1]) == u'Set device os to (tag:56, version:7.8)'
     assert str(script2.records[2]) == u'Set device os to (tag:12, version:3.4) and app to (tag:56, version:7.8)'
+
+
+def _random_image(seed, length, offset=0x1000):
+    rand = random.Random(seed)
+
+    image = IntelHex()
+    image.frombytes(bytearray(rand.getrandbits(8) for _i in range(0, length)), offset=offset)
+    return image
+
+
+def test_reflash_diff():
+    """Make sure diff records contain only changed pages and patch correctly."""
+
+    base = _random_image(1, 10000)
+
+    new = IntelHex(base)
+    new.puts(0x1000 + 300, b'changed')
+    new.puts(0x1000 + 10000, b'longer')
+
+    record = create_reflash_record(new, base, slot=2, page_size=256)
+    assert isinstance(record, ReflashDiffRecord)
+    assert [index for index, _data in record.pages] == [1, 39]
+    assert record.patch_length == 256 + (10006 - 39*256)
+
+    script = UpdateScript([record])
+    script2 = UpdateScript.FromBinary(script.encode())
+    assert script2 == script
+    assert str(script2.records[0]).startswith('Patch slot 2 with 2 changed 256 byte pages')
+
+    base_offset, base_data = load_firmware_image(base)
+    new_offset, new_data = load_firmware_image(new)
+    assert script2.records[0].apply(base_offset, base_data) == new_data
+
+    # A shorter image only needs its truncated last page
+    shorter = base[0x1000:0x1000 + 5000]
+    record = create_reflash_record(shorter, base, controller=True, page_size=1000)
+    assert record.pages == [] and record.controller
+    assert record.apply(base_offset, base_data) == base_data[:5000]
+
+    # Applying to the wrong base image fails
+    with pytest.raises(DataError):
+        record.apply(new_offset, new_data)
+
+    with pytest.raises(DataError):
+        record.apply(base_offset + 1, base_data)
+
+
+def test_intelhex_not_imported():
+    """Make sure importing the hw package does not load IntelHex."""
+
+    code = "import sys, iotile.core.hw; assert 'iotile.core.utilities.intelhex' not in sys.modules"
+    subprocess.check_call([sys.executable, '-c', code])
+
+
+def test_reflash_diff_fallback():
+    """Make sure we fall back to full reflash records when a diff is not possible or useful."""
+
+    base = _random_image(1, 1000)
+    new = _random_image(2, 1000)
+
+    assert isinstance(create_reflash_record(new, slot=1), ReflashTileRecord)
+    assert isinstance(create_reflash_record(new, base, controller=True), ReflashControllerRecord)
+
+    _offset, base_data = load_firmware_image(base)
+    same = IntelHex(base)
+    same[0x1000] = (same[0x1000] + 1) % 256
+
+    assert isinstance(create_reflash_record(same, base, slot=1, expected_base_hash=image_hash(base_data)), ReflashDiffRecord)
+    assert isinstance(create_reflash_record(same, base, slot=1, expected_base_hash=hexlify(image_hash(base_data)).decode('utf-8')), ReflashDiffRecord)
+    assert isinstance(create_reflash_record(same, base, slot=1, expected_base_hash=b'\0'*16), ReflashTileRecord)
+
+    moved = _random_image(1, 1000, offset=0x2000)
+    assert isinstance(create_reflash_record(moved, base, slot=1), ReflashTileRecord)
+
+    with pytest.raises(ArgumentError):
+        create_reflash_record(new, base)
+
+
+def test_reflash_diff_corrupt():
+    """Make sure malformed diff records are rejected."""
+
+    base = _random_image(1, 1000)
+    new = IntelHex(base)
+    new[0x1000 + 500] = (new[0x1000 + 500] + 1) % 256
+
+    record = create_reflash_record(new, base, slot=1)
+    encoded = record.encode_contents()
+
+    assert ReflashDiffRecord.FromBinary(encoded) == record
+
+    with pytest.raises(ArgumentError):
+        ReflashDiffRecord.FromBinary(encoded[:-1])
+
+    with pytest.raises(ArgumentError):
+        ReflashDiffRecord.FromBinary(encoded + b'\0')
+
+    with pytest.raises(ArgumentError):
+        ReflashDiffRecord.FromBinary(encoded[:ReflashDiffRecord.RecordHeaderLength - 1])
+
+    with pytest.raises(ArgumentError):
+        ReflashDiffRecord(1, 0, 100, 100, b'\0'*16, b'\0'*16, 64, [(1, bytearray(36)), (0, bytearray(64))])
+
+
+def _large_script():
+    records = [ReflashTileRecord(slot, bytearray(random.Random(slot).getrandbits(8) for _i in range(0, 5000)), 0x1000)
+               for slot in range(1, 4)]
+    records.insert(1, SetDeviceTagRecord(app_tag=12, app_version='3.4'))
+    records.append(UnknownRecord(128, bytearray(15)))
+
+    return UpdateScript(records)
+
+
+def test_lazy_parsing(tmpdir):
+    """Make sure records can be parsed lazily from memory and from files."""
+
+    script = _large_script()
+    encoded = script.encode()
+
+    records = UpdateScript.IterRecords(memoryview(bytes(encoded)))
+    assert next(records) == script.records[0]
+    assert list(records) == script.records[1:]
+
+    path = str(tmpdir.join('script.trub'))
+    with open(path, "wb") as outfile:
+        outfile.write(encoded)
+
+    assert list(UpdateScript.IterFile(path)) == script.records
+    assert UpdateScript.FromFile(path) == script
+
+    with open(path, "rb") as infile:
+        mapped = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            assert UpdateScript.FromBinary(mapped) == script
+        finally:
+            mapped.close()
+
+    # Scripts can be embedded in a larger file
+    with open(path, "wb") as outfile:
+        outfile.write(b'prefix')
+        outfile.write(encoded)
+
+    with open(path, "rb") as infile:
+        infile.seek(6)
+        assert list(UpdateScript.IterFile(infile)) == script.records
+
+    # Corrupt scripts are detected before any record is returned
+    corrupt = bytearray(encoded)
+    corrupt[-1] ^= 1
+    with pytest.raises(ArgumentError):
+        UpdateScript.IterRecords(corrupt)
+
+    with open(path, "wb") as outfile:
+        outfile.write(corrupt)
+
+    with pytest.raises(ArgumentError):
+        UpdateScript.IterFile(path)
+
+
+def _rehash(container):
+    sha = hashlib.sha256()
+    sha.update(container[16:])
+    container[:16] = sha.digest()[:16]
+    return container
+
+
+def test_invalid_record_length():
+    """Make sure records with impossible lengths are rejected."""
+
+    script = UpdateScript([UnknownRecord(128, bytearray(4)), UnknownRecord(128, bytearray(4))])
+
+    for length in (0, 7, 100):
+        encoded = script.encode()
+        struct.pack_into("<L", encoded, UpdateScript.SCRIPT_HEADER_LENGTH, length)
+
+        with pytest.raises(ArgumentError):
+            UpdateScript.FromBinary(_rehash(encoded))
+
+
+def test_streaming_encode():
+    """Make sure scripts can be encoded to files and chunks without building them in memory."""
+
+    script = _large_script()
+    encoded = script.encode()
+
+    assert script.encoded_length() == len(encoded)
+    assert UpdateScript([]).encode() == UpdateScript([]).encode() and len(UpdateScript([]).encode()) == 24
+
+    outfile = io.BytesIO()
+    outfile.write(b'prefix')
+    assert script.encode_to(outfile) == len(encoded)
+    assert outfile.getvalue() == b'prefix' + encoded
+
+    class _Unseekable(object):
+        def __init__(self):
+            self.chunks = []
+
+        def write(self, data):
+            self.chunks.append(bytes(data))
+
+    unseekable = _Unseekable()
+    assert script.encode_to(unseekable) == len(encoded)
+    assert b''.join(unseekable.chunks) == encoded
+
+    chunks = list(script.iter_encoded())
+    assert len(chunks) == len(script.records) + 1
+    assert bytearray().join(chunks) == encoded
+
+    chunks = list(script.iter_encoded(chunk_size=1000))
+    assert [len(x) for x in chunks[:-1]] == [1000]*(len(chunks) - 1)
+    assert 0 < len(chunks[-1]) <= 1000
+    assert bytearray().join(chunks) == encoded
+
+    with pytest.raises(ArgumentError):
+        list(script.iter_encoded(chunk_size=0))
+
+
+def test_compressed_script(tmpdir):
+    """Make sure compressed scripts are recognized and decompressed everywhere."""
+
+    script = UpdateScript([ReflashTileRecord(1, bytearray(range(0, 256))*64, 0x1000),
+                           SetDeviceTagRecord(app_tag=12, app_version='3.4')])
+    encoded = script.encode()
+    compressed = script.encode_compressed()
+
+    assert len(compressed) < len(encoded) // 10
+    assert UpdateScript.IsCompressed(compressed)
+    assert not UpdateScript.IsCompressed(encoded)
+    assert UpdateScript.DecompressBinary(compressed) == encoded
+
+    assert UpdateScript.FromBinary(compressed) == script
+    assert list(UpdateScript.IterRecords(memoryview(bytes(compressed)))) == script.records
+
+    path = str(tmpdir.join('compressed.trub'))
+    with open(path, "wb") as outfile:
+        outfile.write(compressed)
+
+    assert UpdateScript.FromFile(path) == script
+
+    with pytest.raises(ArgumentError):
+        UpdateScript.ParseHeader(compressed)
+
+
+def test_corrupt_compressed_script():
+    """Make sure malformed compressed containers are rejected."""
+
+    compressed = UpdateScript([ReflashTileRecord(1, bytearray(1000), 0)]).encode_compressed()
+
+    corrupt = bytearray(compressed)
+    corrupt[-1] ^= 1
+    with pytest.raises(ArgumentError):
+        UpdateScript.FromBinary(corrupt)
+
+    with pytest.raises(ArgumentError):
+        UpdateScript.FromBinary(compressed[:-1])
+
+    # The declared length limits how much is decompressed
+    for length in (10, 100000):
+        corrupt = bytearray(compressed)
+        struct.pack_into("<L", corrupt, 24, length)
+        with pytest.raises(ArgumentError):
+            UpdateScript.FromBinary(_rehash(corrupt))
+
+    corrupt = bytearray(compressed)
+    corrupt[28] = 2
+    with pytest.raises(ArgumentError):
+        UpdateScript.FromBinary(_rehash(corrupt))
+
+    corrupt = bytearray(compressed)
+    corrupt[UpdateScript.COMPRESSED_HEADER_LENGTH:] = bytearray(b'not zlib data')
+    struct.pack_into("<L", corrupt, 20, len(corrupt))
+    with pytest.raises(ArgumentError):
+        UpdateScript.FromBinary(_rehash(corrupt))
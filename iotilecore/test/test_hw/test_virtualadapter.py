@@ -7,6 +7,7 @@
 # are copyright Arch Systems Inc.
 
 from iotile.core.hw.hwmanager import HardwareManager
+from iotile.core.hw.transport import RPCRecording
 from iotile.core.hw.reports.signed_list_format import SignedListReport
 from iotile.core.hw.exceptions import *
 from iotile.core.exceptions import *
@@ -257,7 +258,7 @@ def test_recording_rpcs(tmpdir):
     assert record_path.exists()
 
     rpcs = record_path.readlines(cr=False)
-    assert len(rpcs) == 12
+    assert len(rpcs) == 10
     assert rpcs[:3] == ['# IOTile RPC Recording',
                         '# Format: 1.0',
                         '']
@@ -273,9 +274,43 @@ def test_recording_rpcs(tmpdir):
     rpc_lines = [",".join(x) for x in rpc_lines]
 
     assert rpc_lines == ['1,, 8,0x0004,0xc0,,                                        ,ffff74657374303101000003                ,',
-                         '1,, 8,0x0004,0xc0,,                                        ,ffff74657374303101000003                ,',
-                         '1,,11,0x0004,0xc0,,                                        ,ffff74657374303101000003                ,',
                          '1,,11,0x0004,0xc0,,                                        ,ffff74657374303101000003                ,',
                          '1,, 8,0x8001,0xc0,,                                        ,01000000                                ,',
                          '1,,11,0x8000,0xc0,,0300000005000000                        ,08000000                                ,',
                          '1,,11,0x8001,0xc0,,                                        ,01000000                                ,']
+
+
+def test_recording_rpcs_binary(tmpdir):
+    """Make sure we can record RPCs in the binary format."""
+
+    record_path = tmpdir.join('recording.bin')
+    conf_file = os.path.join(os.path.dirname(__file__), 'tile_config.json')
+
+    if '@' in conf_file or ',' in conf_file or ';' in conf_file:
+        pytest.skip('Cannot pass device config because path has [@,;] in it')
+
+    reg = ComponentRegistry()
+    reg.register_extension('iotile.proxy', 'vitual_tile', 'test/test_hw/virtual_tile.py')
+
+    try:
+        with HardwareManager('virtual:tile_based@%s' % conf_file, record=str(record_path)) as hw:
+            hw.connect(1)
+
+            con = hw.controller()
+            tile1 = hw.get(11)
+
+            con.count()
+            tile1.add(3, 5)
+            tile1.count()
+    finally:
+        reg.clear_extensions()
+
+    with RPCRecording(str(record_path)) as recording:
+        assert recording.indexed
+
+        rpcs = [(x.connection, x.address, x.rpc_id, x.status, x.call, x.response) for x in recording.iter_rpcs()]
+        assert rpcs == [('1', 8, 0x0004, 0xc0, b'', b'\xff\xfftest01\x01\x00\x00\x03'),
+                        ('1', 11, 0x0004, 0xc0, b'', b'\xff\xfftest01\x01\x00\x00\x03'),
+                        ('1', 8, 0x8001, 0xc0, b'', b'\x01\x00\x00\x00'),
+                        ('1', 11, 0x8000, 0xc0, b'\x03\x00\x00\x00\x05\x00\x00\x00', b'\x08\x00\x00\x00'),
+                        ('1', 11, 0x8001, 0xc0, b'', b'\x01\x00\x00\x00')]
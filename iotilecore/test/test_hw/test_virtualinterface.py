@@ -0,0 +1,65 @@
+"""Tests of report and trace chunking in VirtualIOTileInterface."""
+
+from iotile.core.hw.virtual.virtualinterface import VirtualIOTileInterface
+from iotile.core.hw.reports import IndividualReadingReport, IOTileReading
+
+
+def _build_report(value):
+    reading = IOTileReading(value, 0x1000, value)
+    return IndividualReadingReport.FromReadings(10, [reading])
+
+
+def _drain(next_chunk, size):
+    chunks = []
+
+    while True:
+        chunk = next_chunk(size)
+        if len(chunk) == 0:
+            break
+
+        chunks.append(chunk)
+
+    return chunks
+
+
+def test_report_chunking():
+    """Make sure reports are chunked across boundaries and callbacks are called."""
+
+    iface = VirtualIOTileInterface()
+    reports = [_build_report(i) for i in range(0, 5)]
+    finished = []
+
+    iface._queue_reports(*[(report, finished.append) for report in reports])
+
+    chunks = _drain(iface._next_streaming_chunk, 7)
+    expected = bytearray().join(report.encode() for report in reports)
+
+    assert all(len(chunk) == 7 for chunk in chunks[:-1])
+    assert bytearray().join(chunks) == expected
+    assert finished == [True]*5
+
+
+def test_trace_chunking():
+    """Make sure large traces are chunked in order."""
+
+    iface = VirtualIOTileInterface()
+    trace = bytearray(range(0, 256))*1024
+
+    iface._queue_traces(trace, b'', bytes(b'end'))
+
+    chunks = _drain(iface._next_tracing_chunk, 20)
+
+    assert len(chunks) == (len(trace) + 3 + 19) // 20
+    assert bytearray().join(chunks) == trace + b'end'
+
+
+def test_clear_in_progress():
+    """Make sure clearing drops a partially streamed report."""
+
+    iface = VirtualIOTileInterface()
+    iface._queue_reports(_build_report(1), _build_report(2))
+
+    iface._next_streaming_chunk(5)
+    iface._clear_reports()
+
+    assert len(iface._next_streaming_chunk(20)) == 0
@@ -0,0 +1,147 @@
+"""Tests of the segment based storage used by the bundled IntelHex class."""
+
+import random
+import pytest
+from iotile.core.utilities.intelhex import IntelHex, AddressOverlapError, NotEnoughDataError
+from iotile.core.utilities.intelhex.compat import StringIO
+
+
+def _random_ops(seed, count=500):
+    rand = random.Random(seed)
+    ops = []
+
+    for _i in range(0, count):
+        kind = rand.choice(['set', 'set', 'write', 'delete', 'delete_range'])
+        addr = rand.randint(0, 300)
+
+        if kind == 'set':
+            ops.append((kind, addr, rand.randint(0, 255)))
+        elif kind == 'write':
+            ops.append((kind, addr, [rand.randint(0, 255) for _j in range(0, rand.randint(0, 40))]))
+        elif kind == 'delete':
+            ops.append((kind, addr, None))
+        else:
+            ops.append((kind, addr, rand.randint(0, 40)))
+
+    return ops
+
+
+@pytest.mark.parametrize("seed", range(0, 10))
+def test_matches_dict_model(seed):
+    """Make sure random edits behave exactly like the old dict storage."""
+
+    ih = IntelHex()
+    model = {}
+
+    for kind, addr, arg in _random_ops(seed):
+        if kind == 'set':
+            ih[addr] = arg
+            model[addr] = arg
+        elif kind == 'write':
+            ih.puts(addr, bytes(bytearray(arg)))
+            for i, value in enumerate(arg):
+                model[addr + i] = value
+        elif kind == 'delete':
+            if addr in model:
+                del ih[addr]
+                del model[addr]
+            else:
+                with pytest.raises(KeyError):
+                    del ih[addr]
+        else:
+            if len(model) > 0:
+                del ih[addr:addr + arg]
+                for i in range(addr, addr + arg):
+                    model.pop(i, None)
+
+        assert len(ih) == len(model)
+
+    assert ih.todict() == model
+    assert ih.addresses() == sorted(model)
+
+    if len(model) > 0:
+        assert ih.minaddr() == min(model)
+        assert ih.maxaddr() == max(model)
+
+        expected = bytes(bytearray(model.get(i, ih.padding) for i in range(min(model), max(model) + 1)))
+        assert ih.tobinstr() == expected
+        assert ih[50:150].todict() == {key: value for key, value in model.items() if 50 <= key < 150}
+
+    # Segments are maximal runs of used addresses
+    segments = ih.segments()
+    assert sum(stop - start for start, stop in segments) == len(model)
+    for (_start1, stop1), (start2, _stop2) in zip(segments[:-1], segments[1:]):
+        assert stop1 < start2
+
+    # The hex file round trips
+    sio = StringIO()
+    ih.write_hex_file(sio)
+    assert IntelHex(StringIO(sio.getvalue())).todict() == model
+
+
+def test_hex_records():
+    """Make sure records are split at segments, byte counts and 64K boundaries."""
+
+    ih = IntelHex()
+    ih.frombytes(bytearray(range(0, 20)), offset=0xFFF8)
+    ih.frombytes(bytearray(b'\x01\x02'), offset=0x20000)
+
+    sio = StringIO()
+    ih.write_hex_file(sio)
+
+    lines = sio.getvalue().splitlines()
+    assert lines == [
+        ':020000040000FA',
+        ':08FFF8000001020304050607E5',
+        ':020000040001F9',
+        ':0C00000008090A0B0C0D0E0F1011121352',
+        ':020000040002F8',
+        ':020000000102FB',
+        ':00000001FF'
+    ]
+
+    assert IntelHex(StringIO(sio.getvalue())).tobinstr(start=0xFFF8, size=20) == bytes(bytearray(range(0, 20)))
+
+
+def test_merge():
+    """Make sure merging handles overlaps per segment."""
+
+    base = IntelHex()
+    base.puts(0, b'\x00' * 10)
+    base.puts(20, b'\x00' * 10)
+
+    other = IntelHex()
+    other.puts(5, b'\x01' * 20)
+
+    merged = IntelHex(base)
+    with pytest.raises(AddressOverlapError):
+        merged.merge(other)
+
+    merged = IntelHex(base)
+    merged.merge(other, overlap='ignore')
+    assert merged.tobinstr() == b'\x00' * 10 + b'\x01' * 10 + b'\x00' * 10
+
+    merged = IntelHex(base)
+    merged.merge(other, overlap='replace')
+    assert merged.tobinstr() == b'\x00' * 5 + b'\x01' * 20 + b'\x00' * 5
+    assert merged.segments() == [(0, 30)]
+
+    # Copies do not share data
+    assert base.tobinstr(start=0, end=9) == b'\x00' * 10
+
+
+def test_gets():
+    """Make sure reads across holes fail."""
+
+    ih = IntelHex()
+    ih.putsz(0, b'hello')
+    ih.puts(10, b'world')
+
+    assert ih.getsz(0) == b'hello'
+    assert ih.gets(10, 5) == b'world'
+
+    with pytest.raises(NotEnoughDataError):
+        ih.gets(4, 8)
+
+    with pytest.raises(NotEnoughDataError):
+        ih.getsz(10)
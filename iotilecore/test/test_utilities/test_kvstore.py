@@ -1,13 +1,18 @@
 import pytest
 import os
-from iotile.core.utilities.kvstore_json import JSONKVStore
+import sqlite3
+import json
+import multiprocessing
+from iotile.core.utilities.kvstore_json import JSONKVStore, CachedJSONKVStore
 from iotile.core.utilities.kvstore_sqlite import SQLiteKVStore
 
 
-@pytest.fixture(scope='function', params=['json', 'sqlite'])
+@pytest.fixture(scope='function', params=['json', 'cached_json', 'sqlite'])
 def kvstore(request):
     if request.param == 'json':
         store = JSONKVStore('testkv_store.json', respect_venv=True)
+    elif request.param == 'cached_json':
+        store = CachedJSONKVStore('testkv_store.json', respect_venv=True)
     else:
         store = SQLiteKVStore('testkv_store.db', respect_venv=True)
 
@@ -34,3 +39,217 @@ def test_json_kvstore(kvstore):
     kvstore.set('config:a', 'value2')
 
     assert kvstore.get('config:a') == 'value2'
+
+
+def _set_keys(args):
+    folder, worker, count = args
+
+    store = SQLiteKVStore('concurrent.db', folder=folder)
+    for i in range(0, count):
+        with store.batch():
+            store.set('worker_%d_%d' % (worker, i), i)
+            store.get_all()
+
+    return store.size()
+
+
+def test_batch(kvstore):
+    """Make sure batched writes are committed or rolled back together."""
+
+    with kvstore.batch():
+        kvstore.set('a', 'value')
+        with kvstore.batch():
+            kvstore.set('b', 'value2')
+
+        assert kvstore.get('b') == 'value2'
+
+    assert sorted(kvstore.get_all()) == [('a', 'value'), ('b', 'value2')]
+
+
+def test_sqlite_shared_connection(tmpdir):
+    """Make sure stores for the same file share a connection and cache."""
+
+    store1 = SQLiteKVStore('test.db', folder=str(tmpdir))
+    store2 = SQLiteKVStore('test.db', folder=str(tmpdir))
+    other = SQLiteKVStore('other.db', folder=str(tmpdir))
+
+    assert store1.connection is store2.connection
+    assert store1.connection is not other.connection
+
+    store1.set('a', 1)
+    assert store2.get('a') == '1'
+    assert other.try_get('a') is None
+
+    journal_mode, = store1.connection.execute('PRAGMA journal_mode').fetchone()
+    assert journal_mode == 'wal'
+
+
+def test_sqlite_cache_invalidation(tmpdir):
+    """Make sure cached values are reloaded when another connection writes."""
+
+    store = SQLiteKVStore('test.db', folder=str(tmpdir))
+    store.set('a', 'value')
+    assert store.get_all() == [('a', 'value')]
+
+    raw = sqlite3.connect(store.file)
+    raw.execute("insert or replace into KVStore values ('a', 'changed')")
+    raw.execute("insert or replace into KVStore values ('b', 'added')")
+    raw.commit()
+
+    assert store.get('a') == 'changed'
+    assert store.size() == 2
+
+    raw.execute("delete from KVStore where key is 'b'")
+    raw.commit()
+    raw.close()
+
+    assert store.try_get('b') is None
+
+
+class _OldSQLiteConnection(object):
+    """A connection that behaves like SQLite < 3.8.8 without PRAGMA data_version."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def execute(self, query, *args):
+        if query == 'PRAGMA data_version':
+            query = 'PRAGMA unsupported_pragma'
+
+        return self._connection.execute(query, *args)
+
+
+def test_sqlite_no_data_version(tmpdir, monkeypatch):
+    """Make sure we always reload the table when PRAGMA data_version is not supported."""
+
+    store = SQLiteKVStore('test.db', folder=str(tmpdir))
+    shared = store._get_shared()
+    monkeypatch.setattr(shared, 'connection', _OldSQLiteConnection(shared.connection))
+
+    store.set('a', 'value')
+    assert store.get_all() == [('a', 'value')]
+    assert shared._cache is None
+
+    raw = sqlite3.connect(store.file)
+    raw.execute("insert or replace into KVStore values ('a', 'changed')")
+    raw.commit()
+    raw.close()
+
+    assert store.get('a') == 'changed'
+
+    with store.batch():
+        store.set('b', 'value2')
+        store.remove('a')
+        assert store.get_all() == [('b', 'value2')]
+
+    assert store.get_all() == [('b', 'value2')]
+
+
+def test_sqlite_batch_rollback(tmpdir):
+    """Make sure a failed batch leaves no trace in the database or the cache."""
+
+    store = SQLiteKVStore('test.db', folder=str(tmpdir))
+    store.set('a', 'value')
+
+    with pytest.raises(ValueError):
+        with store.batch():
+            store.set('a', 'changed')
+            store.remove('a')
+            store.set('b', 'value2')
+            raise ValueError("fail")
+
+    assert store.get_all() == [('a', 'value')]
+
+    raw = sqlite3.connect(store.file)
+    assert raw.execute('select key, value from KVStore').fetchall() == [('a', 'value')]
+    raw.close()
+
+
+def test_sqlite_concurrent_writers(tmpdir):
+    """Make sure many processes can write to the same store without errors."""
+
+    folder = str(tmpdir)
+    store = SQLiteKVStore('concurrent.db', folder=folder)
+    store.set('initial', 'value')
+
+    pool = multiprocessing.Pool(4)
+    try:
+        pool.map(_set_keys, [(folder, i, 25) for i in range(0, 8)])
+    finally:
+        pool.close()
+        pool.join()
+
+    assert store.size() == 8*25 + 1
+    assert store.get('worker_7_24') == '24'
+
+
+def test_cached_json_change_detection(tmpdir):
+    """Make sure the cached json store sees writes made by other stores."""
+
+    store = CachedJSONKVStore('test.json', folder=str(tmpdir))
+    other = JSONKVStore('test.json', folder=str(tmpdir))
+
+    store.set('a', 'value')
+    assert other.get('a') == 'value'
+
+    other.set('b', 'value2')
+    assert sorted(store.get_all()) == [('a', 'value'), ('b', 'value2')]
+
+    # Rewrite the file in place with the same size
+    with open(store.file, "w") as outfile:
+        json.dump({'a': 'VALUE', 'b': 'VALUE2'}, outfile)
+
+    assert store.get('a') == 'VALUE'
+
+    os.remove(store.file)
+    assert store.get_all() == []
+
+    with pytest.raises(KeyError):
+        store.remove('a')
+
+
+def test_cached_json_batch(tmpdir, monkeypatch):
+    """Make sure batched writes are saved with a single rewrite."""
+
+    store = CachedJSONKVStore('test.json', folder=str(tmpdir))
+    other = CachedJSONKVStore('test.json', folder=str(tmpdir))
+    external = JSONKVStore('test.json', folder=str(tmpdir))
+    store.set('a', 'value')
+
+    saves = []
+    orig_save = CachedJSONKVStore._save_file
+
+    def _save_file(self, data):
+        saves.append(dict(data))
+        return orig_save(self, data)
+
+    monkeypatch.setattr(CachedJSONKVStore, '_save_file', _save_file)
+
+    with store.batch():
+        for i in range(0, 10):
+            store.set('key_%d' % i, i)
+
+        store.remove('a')
+
+        # Stores in the same process see the writes immediately, the file does not
+        assert other.get('key_9') == 9
+        assert external.try_get('key_9') is None
+
+        # Writes from other processes are merged with the batch
+        external.set('b', 'external')
+
+    assert len(saves) == 1
+    assert external.get('key_9') == 9
+    assert external.get('b') == 'external'
+    assert external.try_get('a') is None
+    assert not os.path.exists(store.file + '.new')
+
+    with pytest.raises(ValueError):
+        with store.batch():
+            store.set('b', 'changed')
+            store.clear()
+            raise ValueError("fail")
+
+    assert len(saves) == 1
+    assert store.get('b') == 'external'
+    assert len(store.get_all()) == 11
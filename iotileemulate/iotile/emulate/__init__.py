@@ -17,11 +17,14 @@ It includes:
   devices by just writing small classes that emulate the behavior of the
   peripheral tiles.  The ReferenceDevice class is the correct base class for
   these endeavors.
+- An EmulationHost that runs many emulated devices on a small number of
+  shared event loops for fleet-scale tests.
 - A device adapter that allows you to directly run an EmulatedDevice inside
   of the iotile tool for testing and demos.
 """
 
 from .virtual import EmulatedDevice, EmulatedTile, EmulatedPeripheralTile
+from .internal import EmulationHost
 from . import constants
 
-__all__ = ['EmulatedTile', 'EmulatedDevice', 'EmulatedPeripheralTile', 'constants']
+__all__ = ['EmulatedTile', 'EmulatedDevice', 'EmulatedPeripheralTile', 'EmulationHost', 'constants']
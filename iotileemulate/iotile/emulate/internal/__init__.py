@@ -5,7 +5,8 @@ main threads of tiles as well as dispatch rpcs between the tiles.
 """
 
 from .emulation_loop import EmulationLoop
+from .emulation_host import EmulationHost
 from .async_rpc import async_tile_rpc
 from .response import CrossThreadResponse, AwaitableResponse
 
-__all__ = ['EmulationLoop', 'async_tile_rpc', 'CrossThreadResponse', 'AwaitableResponse']
+__all__ = ['EmulationLoop', 'EmulationHost', 'async_tile_rpc', 'CrossThreadResponse', 'AwaitableResponse']
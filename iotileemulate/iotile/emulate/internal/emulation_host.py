@@ -0,0 +1,191 @@
+"""A shared set of event loops that can run many emulated devices at once."""
+
+import threading
+import logging
+import asyncio
+from monotonic import monotonic
+
+from iotile.core.exceptions import ArgumentError
+
+
+class HostedLoop:
+    """A single event loop and background thread owned by an EmulationHost.
+
+    Every EmulationLoop assigned to this HostedLoop runs its tasks and RPC
+    queue inside the same asyncio event loop.  Tick callbacks registered by
+    the devices on this loop are all driven by a single ticker task.
+
+    Args:
+        name (str): The name of the background thread.
+        tick_interval (float): The number of seconds between each tick.
+    """
+
+    def __init__(self, name, tick_interval):
+        self.loop = asyncio.new_event_loop()
+        self.thread_check = threading.local()
+        self.tick_interval = tick_interval
+        self.emulators = 0
+
+        self._name = name
+        self._thread = None
+        self._tickers = {}
+        self._ticker_task = None
+        self._logger = logging.getLogger(__name__)
+
+    def start(self):
+        """Start the background thread running this event loop."""
+
+        self._thread = threading.Thread(target=self._loop_thread_main, name=self._name)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the event loop and wait for the background thread to exit."""
+
+        if self._thread is None:
+            return
+
+        if self._thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join()
+
+        self._thread = None
+
+    def add_ticker(self, emulator, callback):
+        """Call callback every tick on behalf of an EmulationLoop.
+
+        This method is thread-safe.
+
+        Args:
+            emulator (EmulationLoop): The emulation loop whose device should
+                receive ticks.  After every tick, the ticker waits for it to
+                be idle before sending the next tick.
+            callback (callable): A function taking no arguments that is called
+                inside the event loop every tick.
+        """
+
+        self.loop.call_soon_threadsafe(self._tickers.__setitem__, emulator, callback)
+
+    def remove_ticker(self, emulator):
+        """Stop sending ticks on behalf of an EmulationLoop.
+
+        This method is thread-safe.
+        """
+
+        self.loop.call_soon_threadsafe(self._tickers.pop, emulator, None)
+
+    async def _tick_task(self):
+        start = monotonic()
+        counter = 0
+
+        while True:
+            tickers = list(self._tickers.items())
+
+            for emulator, callback in tickers:
+                try:
+                    callback()
+                except:  #pylint:disable=bare-except;One device's ticker must not stop all other devices
+                    self._logger.exception("Error running tick callback for %s", emulator)
+
+            if len(tickers) > 0:
+                results = await asyncio.gather(*[emulator.wait_idle() for emulator, _callback in tickers],
+                                               return_exceptions=True, loop=self.loop)
+                for result in results:
+                    if isinstance(result, Exception):
+                        self._logger.warning("Emulated device did not become idle after tick: %s", result)
+
+            counter += 1
+            next_tick = start + counter*self.tick_interval
+            delay = next_tick - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay, loop=self.loop)
+
+    def _loop_thread_main(self):
+        asyncio.set_event_loop(self.loop)
+        self.thread_check.is_rpc_thread = True
+
+        try:
+            self._ticker_task = self.loop.create_task(self._tick_task())
+            self.loop.run_forever()
+        except:  #pylint:disable=bare-except;This is a logging statement in a background thread
+            self._logger.exception("Exception raised from shared emulation loop thread")
+        finally:
+            self._ticker_task.cancel()
+            self.loop.run_until_complete(asyncio.gather(self._ticker_task, return_exceptions=True, loop=self.loop))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
+
+
+class EmulationHost:
+    """A small pool of event loops shared by many emulated devices.
+
+    Normally each EmulatedDevice creates an EmulationLoop that owns a private
+    event loop and background thread and each ReferenceDevice runs its own
+    ticker task.  That limits how many devices can be emulated in a single
+    process.  When an EmulationHost is passed to an EmulatedDevice, its
+    EmulationLoop is instead attached to one of the host's shared event loops
+    (assigned round robin) and ReferenceDevices receive their one second
+    ticks from a single ticker per shared loop.
+
+    Each device still has its own RPC queue, so RPCs to a single device are
+    still serialized while RPCs to different devices interleave on the
+    shared loop.
+
+    The host must be started before any of its devices are started and
+    should be stopped after all of them have been stopped.  It can be used
+    as a context manager.
+
+    Args:
+        loop_count (int): The number of event loops (and threads) to run.
+        tick_interval (float): The number of real seconds between each tick
+            sent to ReferenceDevices.  This is 1.0 for real time.
+    """
+
+    def __init__(self, loop_count=1, tick_interval=1.0):
+        if loop_count < 1:
+            raise ArgumentError("An EmulationHost needs at least one event loop", loop_count=loop_count)
+
+        self.tick_interval = tick_interval
+        self.loops = [HostedLoop("EmulationHost-%d" % i, tick_interval) for i in range(0, loop_count)]
+        self.started = False
+        self._next_loop = 0
+        self._lock = threading.Lock()
+
+    def assign_loop(self):
+        """Choose the shared loop that the next EmulationLoop should use.
+
+        Returns:
+            HostedLoop: The loop that was assigned.
+        """
+
+        with self._lock:
+            hosted = self.loops[self._next_loop]
+            self._next_loop = (self._next_loop + 1) % len(self.loops)
+            hosted.emulators += 1
+
+        return hosted
+
+    def start(self):
+        """Start all of the shared event loops."""
+
+        if self.started:
+            raise ArgumentError("EmulationHost.start() called multiple times")
+
+        for hosted in self.loops:
+            hosted.start()
+
+        self.started = True
+
+    def stop(self):
+        """Stop all of the shared event loops."""
+
+        for hosted in self.loops:
+            hosted.stop()
+
+        self.started = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
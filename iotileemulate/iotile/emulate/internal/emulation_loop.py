@@ -34,7 +34,8 @@ class EmulationLoop:
     `await_rpc` must always be called from a coroutine inside the event loop
     and returns an awaitable. `call_rpc_external` must never be called from
     the event loop and is designed to be used by external callers to inject
-    RPCs into the emulation.
+    RPCs into the emulation.  External callers that need to send many RPCs
+    in a row can use `call_rpcs_external` to send them in a single batch.
 
     Unlike a normal asyncio.EventLoop, which does not have an externally
     visible concept of being idle, there is a method `wait_idle()` on
@@ -50,20 +51,35 @@ class EmulationLoop:
     of the ripples of the RPC have settled down.  This allows for writing
     simple synchronous code that interacts with the EmulationLoop externally.
 
+    If an EmulationHost is passed, no background thread is created.
+    Instead, this EmulationLoop runs inside one of the host's shared event
+    loops alongside the EmulationLoops of other devices and stopping it only
+    cancels its own tasks.
+
     Args:
         rpc_handler (callable): The method that actually dispatches each RPC.
             This method will always be invoked inside of the event loop.
+        host (EmulationHost): Optional shared host to run inside of.
     """
 
-    def __init__(self, rpc_handler):
-        self._loop = asyncio.new_event_loop()
+    def __init__(self, rpc_handler, host=None):
+        self.host = host
+        self._hosted = None
+
+        if host is not None:
+            self._hosted = host.assign_loop()
+            self._loop = self._hosted.loop
+            self._thread_check = self._hosted.thread_check
+        else:
+            self._loop = asyncio.new_event_loop()
+            self._thread_check = threading.local()
+
         self._thread = None
         self._started = False
         self._tasks = {}
         self._rpc_queue = RPCQueue(self._loop, rpc_handler)
         self._work_queues = set([self._rpc_queue])
         self._events = set()
-        self._thread_check = threading.local()
         self._logger = logging.getLogger(__name__)
 
     def create_event(self, register=False):
@@ -164,8 +180,15 @@ class EmulationLoop:
         if self._started is True:
             raise ArgumentError("EmulationLoop.start() called multiple times")
 
-        self._thread = threading.Thread(target=self._loop_thread_main)
-        self._thread.start()
+        if self._hosted is not None:
+            if not self.host.started:
+                raise ArgumentError("The EmulationHost must be started before any of its devices")
+
+            self._loop.call_soon_threadsafe(self._rpc_queue.start)
+        else:
+            self._thread = threading.Thread(target=self._loop_thread_main)
+            self._thread.start()
+
         self._started = True
 
     def stop(self):
@@ -176,7 +199,10 @@ class EmulationLoop:
 
         self.verify_calling_thread(False, "Cannot call EmulationLoop.stop() from inside the event loop")
 
-        if self._thread.is_alive():
+        if self._hosted is not None:
+            self._hosted.remove_ticker(self)
+            asyncio.run_coroutine_threadsafe(self._clean_shutdown(), self._loop).result()
+        elif self._thread.is_alive():
             self._loop.call_soon_threadsafe(self._loop.create_task, self._clean_shutdown())
             self._thread.join()
 
@@ -258,6 +284,37 @@ class EmulationLoop:
 
         return response.wait(timeout)
 
+    def call_rpcs_external(self, rpcs, timeout=10.0):
+        """Call a list of RPCs from outside of the event loop in a single batch.
+
+        This is equivalent to calling call_rpc_external() once for each RPC
+        except that the whole batch is handed to the event loop at once and
+        the calling thread only wakes up when all of the RPCs have finished.
+        This avoids two thread switches per RPC, which dominate the cost of
+        short RPCs like those used to dump readings one at a time.
+
+        The RPCs are dispatched in order, each one after the previous one
+        finishes.  If an RPC raises an exception, the rest of the batch is
+        not sent and the exception is raised from this method.
+
+        Args:
+            rpcs (list of (int, int, bytes)): The address, rpc id and
+                argument payload of each RPC to call.
+            timeout (float): The maximum time to wait for the entire batch
+                to finish.
+
+        Returns:
+            list of bytes: The response payload from each RPC, in order.
+        """
+
+        self.verify_calling_thread(False, "call_rpcs_external is for use **outside** of the event loop")
+
+        response = CrossThreadResponse()
+
+        self._loop.call_soon_threadsafe(self._start_rpc_batch, list(rpcs), response)
+
+        return response.wait(timeout)
+
     async def await_rpc(self, address, rpc_id, *args, **kwargs):
         """Send an RPC from inside the EmulationLoop.
 
@@ -338,6 +395,24 @@ class EmulationLoop:
 
         raise InternalError(message)
 
+    def add_ticker(self, callback):
+        """Receive ticks from the shared ticker of our EmulationHost.
+
+        This is only possible if this EmulationLoop was created with an
+        EmulationHost.  The callback is invoked inside the event loop every
+        tick_interval seconds and the next tick is not sent until this
+        EmulationLoop is idle.  The ticker is removed automatically when this
+        EmulationLoop is stopped.
+
+        Args:
+            callback (callable): A function with no arguments to call each tick.
+        """
+
+        if self._hosted is None:
+            raise ArgumentError("Shared tickers are only available when running inside an EmulationHost")
+
+        self._hosted.add_ticker(self, callback)
+
     def add_task(self, tile_address, coroutine):
         """Add a task into the event loop.
 
@@ -435,7 +510,27 @@ class EmulationLoop:
 
         await self._rpc_queue.stop()
 
-        self._loop.stop()
+        if self._hosted is None:
+            self._loop.stop()
+
+    def _start_rpc_batch(self, rpcs, response):
+        self._loop.create_task(self._run_rpc_batch(rpcs, response))
+
+    async def _run_rpc_batch(self, rpcs, response):
+        results = []
+
+        try:
+            for address, rpc_id, arg_payload in rpcs:
+                rpc_response = AwaitableResponse()
+                self._rpc_queue.put_rpc(address, rpc_id, arg_payload, rpc_response)
+                results.append(await rpc_response.wait())
+        except asyncio.CancelledError:
+            raise
+        except:  #pylint:disable=bare-except;We want to send all exceptions to the caller.
+            response.capture_exception()
+            return
+
+        response.set_result(results)
 
     def _add_task(self, tile_address, coroutine):
         """Add a task from within the event loop.
@@ -2,5 +2,6 @@
 
 from .reference_device import ReferenceDevice
 from .reference_controller import ReferenceController
+from .snapshot import DeviceSnapshot
 
-__all__ = ['ReferenceDevice', 'ReferenceController']
+__all__ = ['ReferenceDevice', 'ReferenceController', 'DeviceSnapshot']
@@ -63,6 +63,16 @@ You are free to send the same periodic inputs to sensor-graph yourself using
 rpcs if you wish to control the passage of emulation time (as seen by your
 sensor-graph rules) in a fine-grained fashion.
 
+Virtual Time
+------------
+
+If you need to see what a device does over hours or days, you can create the
+ReferenceDevice with `virtual_time` set.  Its clock then only moves when you
+call ReferenceDevice.advance_time(), which jumps directly from one timer
+event to the next rather than stepping through every second.  The timer
+inputs sent to sensor-graph and the timestamps it assigns are exactly the
+same as if the time had passed normally.
+
 Handling Time When Loading Snapshots
 -----------------------------------
 
@@ -143,16 +153,52 @@ class ClockManagerSubsystem(ControllerSubsystemBase):
     def handle_tick(self):
         """Internal callback every time 1 second has passed."""
 
-        self.uptime += 1
+        self.advance(1)
+
+    def seconds_until_next_event(self):
+        """Get how long until the next timer input is sent to sensor_graph.
+
+        Returns:
+            int: The number of seconds until the next tick of any enabled
+                timer, which is always at least 1, or None if no timers
+                are enabled.
+        """
+
+        remaining = [interval - self.tick_counters[name] for name, interval in self.ticks.items() if interval != 0]
+        if len(remaining) == 0:
+            return None
+
+        return max(1, min(remaining))
+
+    def advance(self, seconds):
+        """Move device time forward without stopping at every second.
+
+        Every timer input that falls due is sent to sensor_graph stamped with
+        the uptime at which it was due, so there is no difference from calling
+        handle_tick() once per second, it is just faster.  This does not wait
+        for sensor_graph to process the inputs so if you are advancing by a
+        large amount, see ReferenceDevice.advance_time, which does.
+
+        Args:
+            seconds (int): The number of seconds to move forward.
+        """
+
+        while seconds > 0:
+            step = self.seconds_until_next_event()
+            if step is None or step > seconds:
+                step = seconds
+
+            self.uptime += step
+            seconds -= step
 
-        for name, interval in self.ticks.items():
-            if interval == 0:
-                continue
+            for name, interval in self.ticks.items():
+                if interval == 0:
+                    continue
 
-            self.tick_counters[name] += 1
-            if self.tick_counters[name] == interval:
-                self.graph_input(self.TICK_STREAMS[name], self.uptime)
-                self.tick_counters[name] = 0
+                self.tick_counters[name] += step
+                if self.tick_counters[name] >= interval:
+                    self.graph_input(self.TICK_STREAMS[name], self.uptime)
+                    self.tick_counters[name] = 0
 
     def set_tick(self, index, interval):
         """Update the a tick's interval.
@@ -2,7 +2,9 @@
 
 import base64
 from iotile.core.hw.virtual import tile_rpc
+from iotile.core.exceptions import ArgumentError
 from iotile.core.hw.update import UpdateScript
+from iotile.core.hw.update.records import ReflashTileRecord, ReflashControllerRecord, ReflashDiffRecord
 from ...virtual import SerializableState
 from .controller_system import ControllerSubsystemBase
 
@@ -25,6 +27,11 @@ class RemoteBridgeState(SerializableState, ControllerSubsystemBase):
     for looking at internal exceptions when executing scripts.  It does
     not reflect a real emulated device state and is not dumped or restored
     when dump() or restore() is called.
+
+    The firmware property holds the firmware image programmed into the
+    controller and each tile as a map of target names, either 'controller'
+    or 'slot X', to (offset, bytes) tuples.  It is only changed by reflash
+    records in scripts and persists across resets.
     """
 
     def __init__(self, emulator):
@@ -35,9 +42,11 @@ class RemoteBridgeState(SerializableState, ControllerSubsystemBase):
         self.error = 0
         self.parsed_script = None
         self.script_error = None
+        self.firmware = {}
 
         self.mark_ignored('initialized')
         self.mark_complex('parsed_script', self._dump_script, self._restore_script)
+        self.mark_complex('firmware', self._dump_firmware, self._restore_firmware)
 
     def clear_to_reset(self, config_vars):
         """Clear the RemoteBridge subsystem to its reset state."""
@@ -61,6 +70,43 @@ class RemoteBridgeState(SerializableState, ControllerSubsystemBase):
         encoded = base64.b64decode(b64encoded)
         return UpdateScript.FromBinary(encoded)
 
+    @classmethod
+    def _dump_firmware(cls, value):
+        return {target: [offset, base64.b64encode(data).decode('utf-8')] for target, (offset, data) in value.items()}
+
+    @classmethod
+    def _restore_firmware(cls, value):
+        if value is None:
+            return {}
+
+        return {target: (offset, base64.b64decode(data)) for target, (offset, data) in value.items()}
+
+    def program_firmware(self, record):
+        """Program the firmware image from a reflash record.
+
+        ReflashDiffRecords are applied to the image currently programmed in
+        their target and fail without changing it if it is not their base
+        image.
+
+        Args:
+            record (UpdateRecord): A ReflashTileRecord, ReflashControllerRecord
+                or ReflashDiffRecord.
+
+        Raises:
+            DataError: A ReflashDiffRecord did not match the current image.
+        """
+
+        if isinstance(record, ReflashControllerRecord):
+            self.firmware['controller'] = (record.offset, bytes(record.raw_data))
+        elif isinstance(record, ReflashTileRecord):
+            self.firmware['slot %d' % record.slot] = (record.offset, bytes(record.raw_data))
+        elif isinstance(record, ReflashDiffRecord):
+            target = 'controller' if record.controller else 'slot %d' % record.slot
+            offset, data = self.firmware.get(target, (None, b''))
+            self.firmware[target] = (record.offset, bytes(record.apply(offset, data)))
+        else:
+            raise ArgumentError("Record is not a reflash record", record=record)
+
 
 class RemoteBridgeMixin(object):
     """Reference controller subsystem for device updating.
@@ -109,11 +155,15 @@ class RemoteBridgeMixin(object):
         # This is asynchronous in real life so just cache the error
         try:
             self.remote_bridge.parsed_script = UpdateScript.FromBinary(self._device.script)
-            #FIXME: Actually run the script
+
+            #FIXME: Actually run the rest of the script
+            for record in self.remote_bridge.parsed_script.records:
+                if isinstance(record, (ReflashTileRecord, ReflashControllerRecord, ReflashDiffRecord)):
+                    self.remote_bridge.program_firmware(record)
 
             self.remote_bridge.status = BRIDGE_STATUS.IDLE
         except Exception as exc:
-            self._logger.exception("Error parsing script streamed to device")
+            self._logger.exception("Error processing script streamed to device")
             self.remote_bridge.script_error = exc
             self.remote_bridge.error = 1 # FIXME: Error code
 
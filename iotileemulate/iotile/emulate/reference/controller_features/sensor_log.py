@@ -33,9 +33,13 @@ class SensorLogSubsystem(ControllerSubsystemBase):
         self.next_id = 1
         self._logger = logging.getLogger(__name__)
 
-    def dump(self):
+    def dump(self, include_readings=True):
         """Serialize the state of this subsystem into a dict.
 
+        Args:
+            include_readings (bool): Include all stored readings.  If False
+                they must be saved separately with dump_readings().
+
         Returns:
             dict: The serialized state
         """
@@ -45,13 +49,36 @@ class SensorLogSubsystem(ControllerSubsystemBase):
             walker = walker.dump()
 
         state = {
-            'storage': self.storage.dump(),
+            'storage': self.storage.dump(include_readings),
             'dump_walker': walker,
             'next_id': self.next_id
         }
 
         return state
 
+    def dump_readings(self):
+        """Get all stored readings without serializing them.
+
+        Returns:
+            (tuple of IOTileReading, tuple of IOTileReading): The readings in the
+                storage and streaming buffers.
+        """
+
+        return self.engine.dump_readings()
+
+    def restore_readings(self, storage_data, streaming_data):
+        """Replace all stored readings.
+
+        This must be called before restore() if the state passed to restore()
+        was dumped without readings.
+
+        Args:
+            storage_data (iterable of IOTileReading): The readings in the storage buffer.
+            streaming_data (iterable of IOTileReading): The readings in the streaming buffer.
+        """
+
+        self.engine.restore_readings(storage_data, streaming_data)
+
     def prepare_for_restore(self):
         """Prepare the SensorLog subsystem for a restore.
 
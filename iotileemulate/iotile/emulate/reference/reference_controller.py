@@ -143,9 +143,14 @@ class ReferenceController(RawSensorLogMixin, RemoteBridgeMixin,
 
         self.initialized.set()
 
-    def dump_state(self):
+    def dump_state(self, include_readings=True):
         """Dump the current state of this emulated object as a dictionary.
 
+        Args:
+            include_readings (bool): Include all readings stored in the sensor
+                log.  If False, they must be saved separately using
+                sensor_log.dump_readings().
+
         Returns:
             dict: The current state of the object that could be passed to load_state.
         """
@@ -162,7 +167,7 @@ class ReferenceController(RawSensorLogMixin, RemoteBridgeMixin,
             'remote_bridge': self.remote_bridge.dump(),
             'tile_manager': self.tile_manager.dump(),
             'config_database': self.config_database.dump(),
-            'sensor_log': self.sensor_log.dump()
+            'sensor_log': self.sensor_log.dump(include_readings)
         })
 
         return superstate
@@ -8,6 +8,7 @@ from iotile.core.exceptions import ArgumentError, DataError
 from ..virtual import EmulatedDevice, EmulatedPeripheralTile
 from ..constants import rpcs, streams
 from .reference_controller import ReferenceController
+from .snapshot import DeviceSnapshot
 
 
 class ReferenceDevice(EmulatedDevice):
@@ -21,6 +22,11 @@ class ReferenceDevice(EmulatedDevice):
             supported are:
                 iotile_id (int or hex string): The id of this device. This
                 defaults to 1 if not specified.
+                emulation_host (EmulationHost): A shared host to run this
+                device inside of.  Unless accelerate_time is also set, the
+                device receives its ticks from the host's shared ticker.
+                virtual_time (bool): Do not tick in real time.  Device time
+                only passes when advance_time() is called.
     """
 
     __NO_EXTENSION__ = True
@@ -35,7 +41,7 @@ class ReferenceDevice(EmulatedDevice):
         if isinstance(iotile_id, str):
             iotile_id = int(iotile_id, 16)
 
-        super(ReferenceDevice, self).__init__(iotile_id, controller_name)
+        super(ReferenceDevice, self).__init__(iotile_id, controller_name, args.get('emulation_host'))
 
         self.controller = ReferenceController(8, {'name': controller_name}, device=self)
         self.add_tile(8, self.controller)
@@ -43,6 +49,7 @@ class ReferenceDevice(EmulatedDevice):
         self._logger = logging.getLogger(__name__)
         self._simulating_time = args.get('simulate_time', True)
         self._accelerating_time = args.get('accelerate_time', False)
+        self._virtual_time = args.get('virtual_time', False)
 
     async def _time_ticker(self):
         start = monotonic()
@@ -66,6 +73,46 @@ class ReferenceDevice(EmulatedDevice):
 
         self._logger.debug("Time ticker task stopped due to _simulating_time flag cleared")
 
+    def advance_time(self, seconds):
+        """Move this device's clock forward by a number of seconds.
+
+        Time jumps directly from one timer event to the next and waits for
+        the device to be idle after each one, so every timer input and every
+        reading timestamp is the same as if the time had actually passed.
+        This lets you simulate days of sensor_graph activity in seconds.
+
+        This can only be used if the device is not ticking in real time,
+        i.e. it was created with virtual_time or without simulate_time.
+
+        Args:
+            seconds (int): The number of seconds to move forward.
+
+        Returns:
+            int: The device's uptime after advancing.
+        """
+
+        if self._simulating_time and not self._virtual_time:
+            raise ArgumentError("Cannot advance time on a device that is ticking in real time",
+                                suggestion="Create the device with virtual_time set")
+
+        clock = self.controller.clock_manager
+
+        async def _advance():
+            remaining = int(seconds)
+            while remaining > 0:
+                step = clock.seconds_until_next_event()
+                if step is None or step > remaining:
+                    step = remaining
+
+                clock.advance(step)
+                remaining -= step
+
+                await self.emulator.wait_idle()
+
+            return clock.uptime
+
+        return self.emulator.run_task_external(_advance())
+
     def iter_tiles(self, include_controller=True):
         """Iterate over all tiles in this device in order.
 
@@ -129,8 +176,11 @@ class ReferenceDevice(EmulatedDevice):
 
             self.emulator.run_task_external(_launch_tiles())
 
-            if self._simulating_time:
-                self.emulator.add_task(None, self._time_ticker())
+            if self._simulating_time and not self._virtual_time:
+                if self.emulator.host is not None and not self._accelerating_time:
+                    self.emulator.add_ticker(self.controller.clock_manager.handle_tick)
+                else:
+                    self.emulator.add_task(None, self._time_ticker())
         except:
             self.stop()
             raise
@@ -179,18 +229,25 @@ class ReferenceDevice(EmulatedDevice):
             dict: The current state of the object that could be passed to load_state.
         """
 
-        # Dump the state of all of the tiles
-        def _background_dump():
-            state = super(ReferenceDevice, self).dump_state()
+        return self.synchronize_task(self._dump_device_state, True)
+
+    def _dump_device_state(self, include_readings):
+        """Dump the state of this device from inside the emulation thread."""
 
-            state['state_name'] = self.STATE_NAME
-            state['state_version'] = self.STATE_VERSION
-            state['reset_count'] = self.reset_count
-            state['received_script'] = base64.b64encode(self.script).decode('utf-8')
+        state = {'tile_states': {}}
 
-            return state
+        for address, tile in self._tiles.items():
+            if tile is self.controller:
+                state['tile_states'][address] = tile.dump_state(include_readings)
+            else:
+                state['tile_states'][address] = tile.dump_state()
 
-        return self.synchronize_task(_background_dump)
+        state['state_name'] = self.STATE_NAME
+        state['state_version'] = self.STATE_VERSION
+        state['reset_count'] = self.reset_count
+        state['received_script'] = base64.b64encode(self.script).decode('utf-8')
+
+        return state
 
     def restore_state(self, state):
         """Restore the current state of this emulated device.
@@ -205,6 +262,10 @@ class ReferenceDevice(EmulatedDevice):
             state (dict): A previously dumped state produced by dump_state.
         """
 
+        self._check_state_version(state)
+        self.synchronize_task(self._restore_device_state, state)
+
+    def _check_state_version(self, state):
         state_name = state.get('state_name')
         state_version = state.get('state_version')
 
@@ -212,11 +273,52 @@ class ReferenceDevice(EmulatedDevice):
             raise ArgumentError("Invalid emulated device state name or version", found=(state_name, state_version),
                                 expected=(self.STATE_NAME, self.STATE_VERSION))
 
-        def _background_restore():
-            # Restore the state of all of the tiles
-            super(ReferenceDevice, self).restore_state(state)
+    def _restore_device_state(self, state):
+        """Restore the state of this device from inside the emulation thread."""
+
+        # Restore the state of all of the tiles
+        super(ReferenceDevice, self).restore_state(state)
+
+        self.reset_count = state.get('reset_count', 0)
+        self.script = base64.b64decode(state.get('received_script'))
+
+    def save_snapshot(self):
+        """Take a compact snapshot of the current state of this device.
+
+        This is equivalent to dump_state() but much faster when the sensor
+        log holds many readings since they are not converted to dicts.  The
+        snapshot can be restored with load_snapshot() or encoded in a binary
+        format with DeviceSnapshot.encode().
+
+        Returns:
+            DeviceSnapshot: The snapshot.
+        """
+
+        def _background_snapshot():
+            storage, streaming = self.controller.sensor_log.dump_readings()
+            state = self._dump_device_state(False)
+            return DeviceSnapshot.FromState(state, storage, streaming)
 
-            self.reset_count = state.get('reset_count', 0)
-            self.script = base64.b64decode(state.get('received_script'))
+        return self.synchronize_task(_background_snapshot)
+
+    def load_snapshot(self, snapshot):
+        """Restore a snapshot previously taken with save_snapshot().
+
+        The same snapshot may be loaded any number of times.
+
+        Args:
+            snapshot (DeviceSnapshot or bytes): The snapshot or its binary encoding.
+        """
+
+        if isinstance(snapshot, (bytes, bytearray)):
+            snapshot = DeviceSnapshot.Decode(snapshot)
+
+        state = snapshot.state
+        self._check_state_version(state)
+
+        def _background_restore():
+            # Readings must be in place before the sensor log's stream walkers are restored
+            self.controller.sensor_log.restore_readings(snapshot.storage, snapshot.streaming)
+            self._restore_device_state(state)
 
         self.synchronize_task(_background_restore)
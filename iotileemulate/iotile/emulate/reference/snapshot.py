@@ -0,0 +1,144 @@
+"""A compact snapshot of a ReferenceDevice that can be restored quickly and often."""
+
+import json
+import struct
+from iotile.core.exceptions import ArgumentError, DataError
+from iotile.core.hw.reports import IOTileReading
+
+
+class DeviceSnapshot:
+    """An immutable snapshot of the state of a ReferenceDevice.
+
+    The output of ReferenceDevice.dump_state() is dominated by the readings
+    in the sensor log, each converted into a dict.  A DeviceSnapshot instead
+    keeps the small remainder of the state as a JSON document and the
+    readings themselves as IOTileReading objects, or as packed binary records
+    when encoded to bytes.
+
+    Since stored readings are never modified, restoring a snapshot shares
+    its reading objects with the device and only copies the lists holding
+    them, so the same snapshot can be restored many times cheaply.  The JSON
+    document is decoded again on every restore so the device never shares
+    mutable state with the snapshot.
+
+    Readings are encoded with a 16 bit stream and 32 bit timestamp, value and
+    reading id.  Their optional UTC reading_time is not preserved.
+
+    Args:
+        state (bytes): The JSON encoded state of the device, without readings.
+        storage (tuple of IOTileReading): The readings in the storage buffer.
+        streaming (tuple of IOTileReading): The readings in the streaming buffer.
+    """
+
+    MAGIC = b'IOTSNAP\x00'
+    FORMAT_VERSION = 1
+
+    # magic, format version, state length, storage count, streaming count
+    _HEADER = struct.Struct("<8sHLLL")
+
+    # stream, raw_time, value, reading_id
+    _READING = struct.Struct("<HLLL")
+
+    def __init__(self, state, storage, streaming):
+        self._state = state
+        self.storage = tuple(storage)
+        self.streaming = tuple(streaming)
+
+    @classmethod
+    def FromState(cls, state, storage, streaming):
+        """Create a snapshot from a state dictionary and its readings.
+
+        Args:
+            state (dict): The device state, dumped without readings.
+            storage (iterable of IOTileReading): The readings in the storage buffer.
+            streaming (iterable of IOTileReading): The readings in the streaming buffer.
+
+        Returns:
+            DeviceSnapshot: The snapshot.
+        """
+
+        return DeviceSnapshot(json.dumps(state, sort_keys=True).encode('utf-8'), storage, streaming)
+
+    @property
+    def state(self):
+        """A fresh copy of the device state, without readings."""
+
+        return json.loads(self._state.decode('utf-8'))
+
+    def encode(self):
+        """Encode this snapshot in its compact binary format.
+
+        Returns:
+            bytes: The encoded snapshot.
+        """
+
+        header = self._HEADER.pack(self.MAGIC, self.FORMAT_VERSION, len(self._state), len(self.storage), len(self.streaming))
+
+        data = bytearray(header)
+        data += self._state
+        data += self._pack_readings(self.storage)
+        data += self._pack_readings(self.streaming)
+
+        return bytes(data)
+
+    @classmethod
+    def Decode(cls, data):
+        """Decode a snapshot previously encoded with encode().
+
+        Args:
+            data (bytes): The encoded snapshot.
+
+        Returns:
+            DeviceSnapshot: The decoded snapshot.
+        """
+
+        if len(data) < cls._HEADER.size:
+            raise DataError("Snapshot is too short to contain a header", length=len(data))
+
+        magic, version, state_length, storage_count, streaming_count = cls._HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise DataError("Data is not an emulated device snapshot", magic=magic)
+
+        if version != cls.FORMAT_VERSION:
+            raise ArgumentError("Unsupported snapshot format version", version=version, supported=cls.FORMAT_VERSION)
+
+        expected = cls._HEADER.size + state_length + (storage_count + streaming_count)*cls._READING.size
+        if len(data) != expected:
+            raise DataError("Snapshot has an invalid length", length=len(data), expected=expected)
+
+        offset = cls._HEADER.size
+        state = bytes(data[offset:offset + state_length])
+        offset += state_length
+
+        storage_end = offset + storage_count*cls._READING.size
+        storage = cls._unpack_readings(data[offset:storage_end])
+        streaming = cls._unpack_readings(data[storage_end:])
+
+        return DeviceSnapshot(state, storage, streaming)
+
+    def save(self, path):
+        """Save this snapshot to a file in its binary format."""
+
+        with open(path, "wb") as outfile:
+            outfile.write(self.encode())
+
+    @classmethod
+    def Load(cls, path):
+        """Load a snapshot from a file previously written by save()."""
+
+        with open(path, "rb") as infile:
+            return cls.Decode(infile.read())
+
+    @classmethod
+    def _pack_readings(cls, readings):
+        packer = cls._READING.pack
+
+        try:
+            return b''.join(packer(x.stream, x.raw_time, x.value, x.reading_id or 0) for x in readings)
+        except struct.error as err:
+            raise DataError("Reading cannot be stored in a snapshot: %s" % str(err))
+
+    @classmethod
+    def _unpack_readings(cls, data):
+        return tuple(IOTileReading(raw_time, stream, value, reading_id=reading_id)
+                     for stream, raw_time, value, reading_id in cls._READING.iter_unpack(data))
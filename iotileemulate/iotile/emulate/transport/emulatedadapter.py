@@ -89,6 +89,8 @@ class EmulatedDeviceAdapter(VirtualDeviceAdapter):
             elif cmd_name == 'dump_changes':
                 outpath = cmd_args['path']
                 device.state_history.dump(outpath)
+            elif cmd_name == 'advance_time':
+                retval = device.advance_time(cmd_args['seconds'])
             else:
                 success = False
                 reason = "Unknown command %s" % cmd_name
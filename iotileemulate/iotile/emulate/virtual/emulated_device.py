@@ -1,7 +1,7 @@
 """Base class for virtual devices designed to emulate physical devices."""
 
 import logging
-from iotile.core.exceptions import DataError
+from iotile.core.exceptions import ArgumentError, DataError
 from iotile.core.hw.virtual import VirtualIOTileDevice
 from iotile.core.hw.virtual.common_types import pack_rpc_payload, unpack_rpc_payload, AsynchronousRPCResponse
 from .emulation_mixin import EmulationMixin
@@ -30,18 +30,20 @@ class EmulatedDevice(EmulationMixin, VirtualIOTileDevice):
             for this IOTile device.
         name (string): The 6 byte name that should be returned when anyone asks
             for the controller's name of this IOTile device using an RPC
+        host (EmulationHost): Optional shared event loop host that this device
+            should run inside of instead of creating its own thread.
     """
 
     __NO_EXTENSION__ = True
 
-    def __init__(self, iotile_id, name):
+    def __init__(self, iotile_id, name, host=None):
         self.state_history = EmulationStateLog()
 
         VirtualIOTileDevice.__init__(self, iotile_id, name)
         EmulationMixin.__init__(self, None, self.state_history)
 
         self._logger = logging.getLogger(__name__)
-        self.emulator = EmulationLoop(self._dispatch_rpc)
+        self.emulator = EmulationLoop(self._dispatch_rpc, host)
 
     def _dispatch_rpc(self, address, rpc_id, arg_payload):
         """Background work queue handler to dispatch RPCs."""
@@ -148,6 +150,52 @@ class EmulatedDevice(EmulationMixin, VirtualIOTileDevice):
             list: A list of the decoded response members from the RPC.
         """
 
+        arg_payload, resp_format, rpc_id = self._pack_rpc(address, rpc_id, args, kwargs)
+
+        resp_payload = self.call_rpc(address, rpc_id, arg_payload)
+        if resp_format is None:
+            return []
+
+        resp = unpack_rpc_payload(resp_format, resp_payload)
+        return resp
+
+    def rpc_batch(self, calls):
+        """Dispatch a batch of RPCs inside this EmulatedDevice.
+
+        This is equivalent to calling rpc() for each call in order, except
+        that all of the RPCs are handed to the emulation loop at once, which
+        is much faster when sending many small RPCs.  It has the same
+        restrictions on where it may be called from as rpc().
+
+        Each call must be a tuple whose first two members are the tile
+        address and an RPCDeclaration, followed by the arguments for the
+        RPC, for example ``(8, RSL_DUMP_STREAM_NEXT, 1)``.
+
+        Args:
+            calls (iterable of tuple): The RPCs to call.
+
+        Returns:
+            list of list: The decoded response members from each RPC.
+        """
+
+        packed = []
+        resp_formats = []
+
+        for call in calls:
+            address, rpc_id = call[:2]
+            if not isinstance(rpc_id, RPCDeclaration):
+                raise ArgumentError("Batched RPCs must be specified with an RPCDeclaration", address=address, rpc_id=rpc_id)
+
+            arg_payload, resp_format, rpc_id = self._pack_rpc(address, rpc_id, call[2:], {})
+            packed.append((address, rpc_id, arg_payload))
+            resp_formats.append(resp_format)
+
+        resp_payloads = self.call_rpcs(packed)
+
+        return [[] if resp_format is None else unpack_rpc_payload(resp_format, resp_payload)
+                for resp_format, resp_payload in zip(resp_formats, resp_payloads)]
+
+    def _pack_rpc(self, address, rpc_id, args, kwargs):
         if isinstance(rpc_id, RPCDeclaration):
             arg_format = rpc_id.arg_format
             resp_format = rpc_id.resp_format
@@ -162,13 +210,7 @@ class EmulatedDevice(EmulationMixin, VirtualIOTileDevice):
             arg_payload = pack_rpc_payload(arg_format, args)
 
         self._logger.debug("Sending rpc to %d:%04X, payload=%s", address, rpc_id, args)
-
-        resp_payload = self.call_rpc(address, rpc_id, arg_payload)
-        if resp_format is None:
-            return []
-
-        resp = unpack_rpc_payload(resp_format, resp_payload)
-        return resp
+        return arg_payload, resp_format, rpc_id
 
     def call_rpc(self, address, rpc_id, payload=b""):
         """Call an RPC by its address and ID.
@@ -187,6 +229,23 @@ class EmulatedDevice(EmulationMixin, VirtualIOTileDevice):
 
         return self.emulator.call_rpc_external(address, rpc_id, payload)
 
+    def call_rpcs(self, rpcs):
+        """Call a batch of RPCs by their address and ID.
+
+        All of the RPCs are sent to the background rpc dispatch thread at
+        once and this method synchronously waits for all of them to finish.
+        If any RPC raises an exception, the remaining RPCs are not sent.
+
+        Args:
+            rpcs (list of (int, int, bytes)): The address, rpc id and payload
+                of each RPC to call.
+
+        Returns:
+            list of bytes: The response payload from each RPC.
+        """
+
+        return self.emulator.call_rpcs_external(rpcs)
+
     def trace_sync(self, data, timeout=5.0):
         """Send tracing data and wait for it to finish.
 
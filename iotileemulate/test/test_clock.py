@@ -4,7 +4,7 @@ import datetime
 import pytest
 
 from iotile.core.hw import HardwareManager
-from iotile.core.exceptions import HardwareError
+from iotile.core.exceptions import HardwareError, ArgumentError
 from iotile.core.hw.proxy.external_proxy import find_proxy_plugin
 from iotile.emulate.reference import ReferenceDevice
 from iotile.emulate.transport import EmulatedDeviceAdapter
@@ -146,3 +146,75 @@ def test_utc_time(basic_device):
     assert (device_time & ~(1 << 31)) == int(y2k_delta)
     assert device_uptime == 1
     assert info == {'is_utc': True, 'offset': int(y2k_delta) - 1}
+
+
+@pytest.fixture(scope="function")
+def virtual_device():
+    """A basic sensorgraph on a device running in virtual time."""
+
+    device = ReferenceDevice({'virtual_time': True})
+    adapter = EmulatedDeviceAdapter(None, devices=[device])
+
+    nodes = [
+        "(system input 2 always) => output 1 using copy_latest_a",
+        "(system input 3 always) => output 2 using copy_latest_a",
+        "(system input 5 always) => output 3 using copy_latest_a",
+    ]
+
+    with HardwareManager(adapter=adapter) as hw:
+        hw.connect(1)
+
+        con = hw.get(8, basic=True)
+        sensor_graph = find_proxy_plugin('iotile_standard_library/lib_controller', 'SensorGraphPlugin')(con)
+
+        for node in nodes:
+            sensor_graph.add_node(node)
+
+        sensor_graph.enable()
+
+        yield hw, device, sensor_graph
+
+
+def test_advance_time(virtual_device):
+    """Make sure advancing virtual time generates the same inputs as ticking."""
+
+    hw, device, sensor_graph = virtual_device
+    clock_man = device.controller.clock_manager
+
+    sensor_graph.set_user_tick(0, 3)
+    sensor_graph.set_user_tick(1, 7)
+
+    assert device.advance_time(20) == 20
+    assert clock_man.uptime == 20
+
+    dump1 = sensor_graph.download_stream('output 1')
+    assert [(x.raw_time, x.value) for x in dump1] == [(10, 10), (20, 20)]
+
+    dump2 = sensor_graph.download_stream('output 2')
+    assert [(x.raw_time, x.value) for x in dump2] == [(x, x) for x in range(3, 21, 3)]
+
+    dump3 = sensor_graph.download_stream('output 3')
+    assert [(x.raw_time, x.value) for x in dump3] == [(7, 7), (14, 14)]
+
+    # Make sure we can advance time through the debug interface
+    assert hw.debug().advance_time(1) == 21
+    assert sensor_graph.count_stream('output 2') == 7
+
+
+def test_advance_time_fast(virtual_device):
+    """Make sure a day of device time passes quickly."""
+
+    hw, device, sensor_graph = virtual_device
+
+    device.advance_time(24*60*60)
+
+    assert device.controller.clock_manager.uptime == 24*60*60
+    assert sensor_graph.count_stream('output 1') == 24*60*6
+
+
+def test_advance_time_realtime():
+    """Make sure we cannot advance time on a device ticking in real time."""
+
+    device = ReferenceDevice({'accelerate_time': False})
+    with pytest.raises(ArgumentError):
+        device.advance_time(10)
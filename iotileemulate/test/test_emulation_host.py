@@ -0,0 +1,75 @@
+"""Tests to ensure that many emulated devices can share an EmulationHost."""
+
+import time
+import threading
+import pytest
+from iotile.core.exceptions import ArgumentError
+from iotile.emulate import EmulationHost
+from iotile.emulate.internal import EmulationLoop
+from iotile.emulate.reference import ReferenceDevice
+from iotile.emulate.constants import rpcs
+
+
+def test_hosted_eventloops():
+    """Make sure EmulationLoops can share a host and still dispatch their own RPCs."""
+
+    def _make_executor(index):
+        def _rpc_executor(_address, _rpc_id, arg_payload):
+            return arg_payload + bytes([index])
+
+        return _rpc_executor
+
+    with EmulationHost(loop_count=2) as host:
+        loops = [EmulationLoop(_make_executor(i), host) for i in range(0, 4)]
+
+        for loop in loops:
+            loop.start()
+
+        try:
+            for i, loop in enumerate(loops):
+                assert loop.call_rpc_external(8, 0x8000, b'ab') == b'ab' + bytes([i])
+        finally:
+            for loop in loops:
+                loop.stop()
+
+        assert [hosted.emulators for hosted in host.loops] == [2, 2]
+
+
+def test_unstarted_host():
+    """Make sure we cannot start devices in a host that is not running."""
+
+    host = EmulationHost()
+    loop = EmulationLoop(lambda address, rpc_id, payload: payload, host)
+
+    with pytest.raises(ArgumentError):
+        loop.start()
+
+    with pytest.raises(ArgumentError):
+        EmulationLoop(lambda address, rpc_id, payload: payload).add_ticker(lambda: None)
+
+
+def test_many_reference_devices():
+    """Make sure many reference devices run and tick on a couple of threads."""
+
+    with EmulationHost(loop_count=2, tick_interval=0.01) as host:
+        initial_threads = threading.active_count()
+
+        devices = [ReferenceDevice({'iotile_id': i + 1, 'emulation_host': host}) for i in range(0, 50)]
+        for device in devices:
+            device.start()
+
+        try:
+            assert threading.active_count() == initial_threads
+
+            time.sleep(0.2)
+            for device in devices:
+                uptime, = device.rpc(8, rpcs.GET_CURRENT_UPTIME)
+                assert uptime > 0
+        finally:
+            for device in devices:
+                device.stop()
+
+        # Stopped devices no longer receive ticks
+        uptime = devices[0].controller.clock_manager.uptime
+        time.sleep(0.05)
+        assert devices[0].controller.clock_manager.uptime == uptime
@@ -75,3 +75,33 @@ def test_rpc_timeout():
 
     finally:
         loop.stop()
+
+
+def test_rpc_batch():
+    """Make sure we can send a batch of RPCs in one call."""
+
+    calls = []
+
+    def _rpc_executor(_address, rpc_id, arg_payload):
+        calls.append(rpc_id)
+        if rpc_id == 0x8000:
+            raise ValueError("Error")
+
+        return arg_payload
+
+    loop = EmulationLoop(_rpc_executor)
+    loop.start()
+
+    try:
+        rpcs = [(8, 0x8001, bytes([i])) for i in range(0, 100)]
+        assert loop.call_rpcs_external(rpcs) == [bytes([i]) for i in range(0, 100)]
+        assert loop.call_rpcs_external([]) == []
+
+        # Make sure an error stops the rest of the batch
+        del calls[:]
+        with pytest.raises(ValueError):
+            loop.call_rpcs_external([(8, 0x8001, b''), (8, 0x8000, b''), (8, 0x8002, b'')])
+
+        assert calls == [0x8001, 0x8000]
+    finally:
+        loop.stop()
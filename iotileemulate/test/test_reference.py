@@ -1,12 +1,18 @@
 """Test coverage of the ReferenceDevice and ReferenceController emulated objects."""
 
 import sys
+import json
+import struct
 import pytest
 from iotile.core.hw import HardwareManager
-from iotile.core.exceptions import HardwareError
+from iotile.core.exceptions import ArgumentError, HardwareError, DataError
 from iotile.core.hw.proxy.external_proxy import find_proxy_plugin
+from iotile.core.hw.update import UpdateScript
+from iotile.core.hw.update.firmware_diff import create_reflash_record, load_firmware_image
+from iotile.core.hw.update.records import ReflashDiffRecord
+from iotile.core.utilities.intelhex import IntelHex
 from iotile.emulate.virtual import EmulatedPeripheralTile
-from iotile.emulate.reference import ReferenceDevice
+from iotile.emulate.reference import ReferenceDevice, DeviceSnapshot
 from iotile.emulate.constants import rpcs, Error
 from iotile.emulate.transport import EmulatedDeviceAdapter
 
@@ -259,6 +265,31 @@ def test_tile_manager(reference_hw):
     assert str(peri) == peri_str
 
 
+def test_discover_tiles(reference_hw):
+    """Make sure HardwareManager can list every tile from the tile_manager."""
+
+    hw, _device, _peripheral = reference_hw
+
+    tiles = hw.discover_tiles()
+    assert [(x['address'], x['name'], x['version'], x['slot']) for x in tiles] == [(8, 'refcn1', (1, 0, 0), 0),
+                                                                                    (11, 'noname', (1, 0, 0), 1)]
+
+    # The discovered names are cached so getting a tile sends no status RPC
+    sent = []
+    send_rpc = hw.stream.send_rpc
+
+    def _counting_send_rpc(address, rpc_id, payload, **kwargs):
+        sent.append((address, rpc_id))
+        return send_rpc(address, rpc_id, payload, **kwargs)
+
+    hw.stream.send_rpc = _counting_send_rpc
+
+    with pytest.raises(HardwareError):
+        hw.get(11)
+
+    assert sent == []
+
+
 def test_raw_sensor_log(reference_hw):
     """Test to ensure that the raw sensor log works."""
 
@@ -366,3 +397,141 @@ def test_rsl_dump_restore(reference_hw):
     for i, reading in enumerate(readings):
         assert reading.value == i
         assert reading.reading_id == i + 1
+
+
+def test_rpc_batch(reference):
+    """Make sure we can dump a stream with a batch of RPCs."""
+
+    device, _peripheral = reference
+
+    err, _count = device.rpc(8, rpcs.RSL_PUSH_MANY_READINGS, 0x5001, 50, 0x5001)
+    assert err == Error.NO_ERROR
+
+    err, _err2, count, _uptime = device.rpc(8, rpcs.RSL_DUMP_STREAM_BEGIN, 0x5001)
+    assert err == Error.NO_ERROR
+    assert count == 50
+
+    resps = device.rpc_batch([(8, rpcs.RSL_DUMP_STREAM_NEXT, 1)] * 51)
+    assert len(resps) == 51
+
+    for i, (packed, ) in enumerate(resps[:50]):
+        err, _timestamp, value, reading_id, stream = struct.unpack("<LLLLH2x", packed)
+        assert err == Error.NO_ERROR
+        assert value == 0x5001
+        assert reading_id == i + 1
+        assert stream == 0x5001
+
+    err, = struct.unpack_from("<L", resps[50][0])
+    assert err != Error.NO_ERROR
+
+    with pytest.raises(ArgumentError):
+        device.rpc_batch([(8, 0x2009, 1)])
+
+
+def test_binary_snapshot(reference_hw):
+    """Make sure binary snapshots of a full sensor log restore exactly."""
+
+    hw, device, _peripheral = reference_hw
+
+    con = hw.get(8, basic=True)
+    sensor_graph = find_proxy_plugin('iotile_standard_library/lib_controller', 'SensorGraphPlugin')(con)
+
+    sensor_graph.push_many('buffered 1', 15, 16000)
+    for i in range(0, 10):
+        sensor_graph.push_reading('output 1', i)
+
+    # Start a dump so that the dump walker is part of the snapshot
+    con.rpc(0x20, 0x08, 0x5001, result_format="LLLL")
+    err, _timestamp, reading, _unique_id, _act_stream = con.rpc(0x20, 0x09, 1, arg_format='B', result_format="LLLLH2x")
+    assert err == 0
+    assert reading == 0
+
+    state = json.loads(json.dumps(device.dump_state()))
+    snapshot = device.save_snapshot()
+    encoded = snapshot.encode()
+
+    assert len(encoded) < len(json.dumps(state)) // 4
+
+    decoded = DeviceSnapshot.Decode(encoded)
+    assert decoded.storage == snapshot.storage
+    assert decoded.streaming == snapshot.streaming
+
+    for restored in (encoded, snapshot, snapshot):
+        sensor_graph.push_many('buffered 1', 15, 100)
+        sensor_graph.push_reading('output 1', 100)
+
+        device.load_snapshot(restored)
+        assert json.loads(json.dumps(device.dump_state())) == state
+
+        err, _timestamp, reading, _unique_id, _act_stream = con.rpc(0x20, 0x09, 1, arg_format='B', result_format="LLLLH2x")
+        assert err == 0
+        assert reading == 1
+
+    with pytest.raises(DataError):
+        DeviceSnapshot.Decode(encoded[:-1])
+
+
+def test_reflash_diff_script(reference_hw):
+    """Make sure the remote bridge applies differential reflash records."""
+
+    hw, device, _peripheral = reference_hw
+
+    base = IntelHex()
+    base.frombytes(bytearray(range(0, 256)) * 16, offset=0x4000)
+    new = IntelHex(base)
+    new.puts(0x4000 + 1000, b'patched')
+
+    base_offset, base_data = load_firmware_image(base)
+    _offset, new_data = load_firmware_image(new)
+
+    updater = hw.app(name='device_updater')
+    updater.run_script(UpdateScript([create_reflash_record(base, slot=1)]), no_reboot=True)
+    assert device.controller.remote_bridge.firmware['slot 1'] == (base_offset, bytes(base_data))
+
+    record = create_reflash_record(new, base, slot=1)
+    assert isinstance(record, ReflashDiffRecord)
+    assert len(record.encode()) < len(new_data) // 4
+
+    updater.run_script(UpdateScript([record]), no_reboot=True)
+    assert device.controller.remote_bridge.firmware['slot 1'] == (base_offset, bytes(new_data))
+
+    # Programmed firmware survives dumping and restoring the device
+    state = device.dump_state()
+    device.controller.remote_bridge.firmware = {}
+    device.restore_state(state)
+    assert device.controller.remote_bridge.firmware['slot 1'] == (base_offset, bytes(new_data))
+
+    # The base image no longer matches so the record must not be applied again
+    with pytest.raises(HardwareError):
+        updater.run_script(UpdateScript([record]), force=True, no_reboot=True)
+
+    assert isinstance(device.controller.remote_bridge.script_error, DataError)
+    assert device.controller.remote_bridge.firmware['slot 1'] == (base_offset, bytes(new_data))
+
+
+def test_compressed_script(reference_hw):
+    """Make sure the remote bridge accepts compressed scripts."""
+
+    hw, device, _peripheral = reference_hw
+
+    image = IntelHex()
+    image.frombytes(bytearray(range(0, 256)) * 64, offset=0x4000)
+    offset, data = load_firmware_image(image)
+
+    script = UpdateScript([create_reflash_record(image, slot=1)])
+
+    sent = []
+    send_script = hw.stream.send_highspeed
+
+    def _recording_send_script(data, progress_callback):
+        sent.append(len(data))
+        return send_script(data, progress_callback)
+
+    hw.stream.send_highspeed = _recording_send_script
+
+    updater = hw.app(name='device_updater')
+    updater.run_script(script, no_reboot=True, compress=True)
+
+    assert sent[0] < len(script.encode()) // 10
+    assert device.controller.remote_bridge.parsed_script == script
+    assert device.controller.remote_bridge.firmware['slot 1'] == (offset, bytes(data))
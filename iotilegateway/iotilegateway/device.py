@@ -4,9 +4,11 @@ import datetime
 import tornado.ioloop
 import tornado.gen
 import uuid
+from monotonic import monotonic
 from future.utils import viewvalues, viewitems
 from iotile.core.hw.reports import BroadcastReport
 from iotile.core.exceptions import ArgumentError
+from .metrics import MetricsRegistry
 
 
 class DeviceManager(object):
@@ -23,6 +25,9 @@ class DeviceManager(object):
     of 'signal_strength' that is reported by each DeviceAdapter and used to rank which one
     has a better route to a given device.
 
+    DeviceManagers also keep counters of the activity on each adapter in a MetricsRegistry
+    available as the metrics attribute that can be exported by a gateway agent.
+
     Args:
         loop (tornado.ioloop.IOLoop): A tornado IOLoop object that this DeviceManager will run
             itself in.  It is up to the caller to make sure the loop is started and run.  The
@@ -35,6 +40,14 @@ class DeviceManager(object):
     DisconnectionStartedState = 4
     DisconnectedState = 5
 
+    _state_names = {
+        ConnectionIdleState: 'idle',
+        ConnectionRequestedState: 'connecting',
+        ConnectedState: 'connected',
+        DisconnectionStartedState: 'disconnecting',
+        DisconnectedState: 'disconnected'
+    }
+
     def __init__(self, loop):
         self.monitors = {}
         self._scanned_devices = {}
@@ -45,6 +58,17 @@ class DeviceManager(object):
         self._logger.setLevel(logging.DEBUG)
         self._next_conn_id = 0
 
+        self.metrics = MetricsRegistry()
+        self._scan_events = self.metrics.counter('iotile_gateway_scan_events_total', 'Scan events received from each adapter', ['adapter'])
+        self._reports_received = self.metrics.counter('iotile_gateway_reports_total', 'Reports received over connections on each adapter', ['adapter'])
+        self._report_bytes = self.metrics.counter('iotile_gateway_report_bytes_total', 'Bytes of reports received over connections on each adapter', ['adapter'])
+        self._broadcasts_received = self.metrics.counter('iotile_gateway_broadcast_reports_total', 'Broadcast reports received from all adapters')
+        self._dropped_reports = self.metrics.counter('iotile_gateway_dropped_reports_total', 'Reports that could not be routed to a device', ['reason'])
+        self._dropped_traces = self.metrics.counter('iotile_gateway_dropped_traces_total', 'Tracing data that could not be routed to a device', ['reason'])
+        self._rpc_latency = self.metrics.histogram('iotile_gateway_rpc_duration_seconds', 'Time taken by each RPC sent through each adapter', ['adapter'])
+        self._rpc_failures = self.metrics.counter('iotile_gateway_rpc_failures_total', 'RPCs on each adapter that did not get a response', ['adapter'])
+        self.metrics.gauge('iotile_gateway_connections', 'Connections on each adapter in each state', ['adapter', 'state'], self._count_connections)
+
         tornado.ioloop.PeriodicCallback(self.device_expiry_callback, 1000, self._loop).start()
 
     def add_adapter(self, man):
@@ -466,6 +490,7 @@ class DeviceManager(object):
 
         rpc_id = (feature << 8) | command
         adapter_id = self.connections[connection_id]['context']['adapter']
+        start_time = monotonic()
         result = yield tornado.gen.Task(
             self.adapters[adapter_id].send_rpc_async,
             connection_id,
@@ -479,9 +504,11 @@ class DeviceManager(object):
         resp = {'success': success}
 
         if success:
+            self._rpc_latency.observe(monotonic() - start_time, adapter_id)
             resp['status'] = status
             resp['payload'] = payload
         else:
+            self._rpc_failures.inc(adapter_id)
             resp['reason'] = failure_reason
 
         raise tornado.gen.Return(resp)
@@ -554,6 +581,21 @@ class DeviceManager(object):
 
         self.connections[conn_id]['state'] = new_state
 
+    def _count_connections(self):
+        """Count the connections on each adapter in each state.
+
+        Returns:
+            dict: A map of (adapter_id, state_name) tuples to connection counts.
+        """
+
+        counts = {}
+
+        for conn in viewvalues(self.connections):
+            key = (conn['context'].get('adapter'), self._state_names.get(conn['state'], 'unknown'))
+            counts[key] = counts.get(key, 0) + 1
+
+        return counts
+
     def _get_connection_string(self, uuid, adapter_id):
         """Return the connection string appropriate to connect to a device using a given adapter
 
@@ -596,6 +638,7 @@ class DeviceManager(object):
 
         def sync_device_found_callback(self, adapter, info, expires):
             uuid = info['uuid']
+            self._scan_events.inc(adapter)
 
             if expires > 0:
                 info['expires'] = datetime.datetime.now() + datetime.timedelta(seconds=expires)
@@ -646,12 +689,15 @@ class DeviceManager(object):
 
         def sync_trace_received_callback(self, connection_id, report):
             if connection_id not in self.connections:
-                self._logger.warn('Dropping tracing data for an unknown connection %d', connection_id)
+                self._dropped_traces.inc('unknown_connection')
+                self._logger.warn('Dropping tracing data for an unknown connection %s', connection_id)
+                return
 
             try:
                 dev_uuid = self._get_connection_data(connection_id, 'uuid')
                 self.call_monitor(dev_uuid, 'trace', report)
             except KeyError:
+                self._dropped_traces.inc('no_uuid')
                 self._logger.warn(
                     'Dropping tracing data for a connection that has no associated UUID %d',
                     connection_id
@@ -677,16 +723,25 @@ class DeviceManager(object):
         def sync_reported_received_callback(self, connection_id, report):
             """Properly forward on a received report."""
             if connection_id is None and isinstance(report, BroadcastReport):
+                self._broadcasts_received.inc()
                 self.call_monitor(None, 'broadcast', report)
                 return
 
             if connection_id not in self.connections:
-                self._logger.warn('Dropping report for an unknown connection %d', connection_id)
+                self._dropped_reports.inc('unknown_connection')
+                self._logger.warn('Dropping report for an unknown connection %s', connection_id)
+                return
+
+            context = self.connections[connection_id]['context']
+            adapter_id = context.get('adapter')
+            self._reports_received.inc(adapter_id)
+            self._report_bytes.add(len(report.raw_report), adapter_id)
 
             try:
-                dev_uuid = self._get_connection_data(connection_id, 'uuid')
+                dev_uuid = context['uuid']
                 self.call_monitor(dev_uuid, 'report', report)
             except KeyError:
+                self._dropped_reports.inc('no_uuid')
                 self._logger.warn('Dropping report for a connection that has no associated UUID %d', connection_id)
 
         self._loop.add_callback(sync_reported_received_callback, self, connection_id, report)
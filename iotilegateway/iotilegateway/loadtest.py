@@ -0,0 +1,418 @@
+"""A load generator for measuring the throughput and latency of an IOTileGateway.
+
+The load test starts an IOTileGateway serving a configurable number of virtual
+devices over the websockets agent and then runs a number of client threads,
+each with its own HardwareManager, that perform a random mix of scan, connect,
+rpc and stream operations against the gateway for a fixed duration.  The
+latency of every operation is recorded and summarized per operation type.
+"""
+
+from __future__ import unicode_literals, print_function
+import argparse
+import base64
+import json
+import logging
+import math
+import random
+import threading
+from monotonic import monotonic
+from future.utils import viewitems
+from iotile.core.exceptions import ArgumentError
+from iotile.core.hw import HardwareManager
+from iotile.core.hw.virtual.virtualdevice import VirtualIOTileDevice, rpc
+from .gateway import IOTileGateway
+
+
+DEFAULT_MIX = {'scan': 1, 'connect': 1, 'rpc': 10, 'stream': 2}
+
+
+class LoadTestDevice(VirtualIOTileDevice):
+    """A virtual device that answers controller RPCs and streams readings.
+
+    Args:
+        args (dict): The arguments used to create this device.  Supported
+            args are:
+
+                iotile_id (int)
+                    The UUID used for this device.  Default: 1
+
+                stream_interval (float)
+                    The interval in seconds between realtime readings streamed
+                    on stream 0x5001 while the streaming interface is open.
+                    Default: 0.01
+    """
+
+    def __init__(self, args):
+        super(LoadTestDevice, self).__init__(args.get('iotile_id', 1), 'LoadTs')
+
+        self.create_worker(self.stream_realtime, args.get('stream_interval', 0.01), 0x5001, 100)
+
+    @rpc(8, 0x0004, "", "H6sBBBB")
+    def controller_name(self):
+        """Return the name of the controller as a 6 byte string."""
+
+        status = (1 << 1) | (1 << 0)  # Configured and running
+
+        return [0xFFFF, self.name, 1, 0, 0, status]
+
+
+def percentile(sorted_values, percent):
+    """Find a percentile of a sorted list using the nearest-rank method.
+
+    Args:
+        sorted_values (list): A list of sorted numbers.
+        percent (float): The percentile to find in [0, 100].
+
+    Returns:
+        float: The percentile value or None if the list is empty.
+    """
+
+    if len(sorted_values) == 0:
+        return None
+
+    rank = int(math.ceil(percent / 100.0 * len(sorted_values))) - 1
+    rank = max(0, min(rank, len(sorted_values) - 1))
+
+    return sorted_values[rank]
+
+
+class LoadTestResults(object):
+    """The latencies and failures recorded during a load test.
+
+    Args:
+        duration (float): The number of seconds that the load was applied for.
+    """
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.latencies = {}
+        self.errors = {}
+        self.reports = 0
+        self._lock = threading.Lock()
+
+    def record(self, operation, latency):
+        """Record a successful operation.
+
+        Args:
+            operation (str): The operation type
+            latency (float): The number of seconds the operation took
+        """
+
+        with self._lock:
+            self.latencies.setdefault(operation, []).append(latency)
+
+    def record_error(self, operation):
+        """Record a failed operation.
+
+        Args:
+            operation (str): The operation type
+        """
+
+        with self._lock:
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def record_reports(self, count):
+        """Record that a number of reports were received.
+
+        Args:
+            count (int): The number of reports received
+        """
+
+        with self._lock:
+            self.reports += count
+
+    def summary(self):
+        """Summarize the results per operation type.
+
+        Returns:
+            dict: A map of operation name to a dictionary with count, errors,
+                throughput (operations per second), p50, p99 and max latency in
+                seconds.
+        """
+
+        summary = {}
+        operations = set(self.latencies) | set(self.errors)
+
+        for operation in operations:
+            latencies = sorted(self.latencies.get(operation, []))
+
+            info = {}
+            info['count'] = len(latencies)
+            info['errors'] = self.errors.get(operation, 0)
+            info['throughput'] = len(latencies) / self.duration if self.duration > 0 else 0.0
+            info['p50'] = percentile(latencies, 50)
+            info['p99'] = percentile(latencies, 99)
+            info['max'] = latencies[-1] if len(latencies) > 0 else None
+
+            summary[operation] = info
+
+        return summary
+
+    def format(self):
+        """Format the results as a human readable table.
+
+        Returns:
+            str: The formatted results.
+        """
+
+        def _ms(value):
+            if value is None:
+                return "-"
+
+            return "%.1f" % (value * 1000.0)
+
+        lines = []
+        lines.append("%-10s %8s %7s %10s %9s %9s %9s" % ('operation', 'count', 'errors', 'ops/sec', 'p50 ms', 'p99 ms', 'max ms'))
+
+        for operation, info in sorted(viewitems(self.summary())):
+            lines.append("%-10s %8d %7d %10.1f %9s %9s %9s" % (operation, info['count'], info['errors'], info['throughput'],
+                                                               _ms(info['p50']), _ms(info['p99']), _ms(info['max'])))
+
+        lines.append("")
+        lines.append("%d reports received in %.1f seconds (%.1f reports/sec)" % (self.reports, self.duration, self.reports / self.duration if self.duration > 0 else 0.0))
+        return "\n".join(lines)
+
+
+class GatewayLoadTest(object):
+    """Apply a mixed workload to an IOTileGateway with virtual devices.
+
+    Each client is assigned its own virtual device, so device_count must be
+    at least as large as client_count.  Clients stay connected to their device
+    and pick operations at random, weighted by mix:
+
+    - scan: scan for devices through the gateway
+    - connect: disconnect from and reconnect to the client's device
+    - rpc: send a controller status RPC to the client's device
+    - stream: wait for reports_per_stream reports from the client's device
+
+    Args:
+        device_count (int): The number of virtual devices to serve.
+        client_count (int): The number of concurrent websocket clients.
+        duration (float): The number of seconds to run the workload for.
+        mix (dict): A map of operation names to relative weights.  Defaults
+            to DEFAULT_MIX.
+        stream_interval (float): The interval in seconds between reports
+            streamed by each virtual device.
+        reports_per_stream (int): The number of reports to wait for in each
+            stream operation.
+        seed (int): An optional seed for the random operation mix.
+    """
+
+    def __init__(self, device_count=10, client_count=4, duration=10.0, mix=None, stream_interval=0.01,
+                 reports_per_stream=10, seed=None):
+        if mix is None:
+            mix = DEFAULT_MIX
+
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if len(unknown) > 0:
+            raise ArgumentError("Unknown operations in load test mix", unknown=sorted(unknown), known=sorted(DEFAULT_MIX))
+
+        if client_count > device_count:
+            raise ArgumentError("Each client needs its own device", client_count=client_count, device_count=device_count)
+
+        self.device_count = device_count
+        self.client_count = client_count
+        self.duration = duration
+        self.mix = mix
+        self.stream_interval = stream_interval
+        self.reports_per_stream = reports_per_stream
+        self.seed = seed
+
+        self._logger = logging.getLogger(__name__)
+
+    def build_gateway_config(self):
+        """Build the gateway configuration with our virtual devices.
+
+        Returns:
+            dict: A configuration dictionary suitable for IOTileGateway.
+        """
+
+        devices = []
+        for i in range(0, self.device_count):
+            device_config = {'iotile_id': i + 1, 'stream_interval': self.stream_interval}
+
+            enc = base64.b64encode(json.dumps(device_config).encode('utf-8')).decode('utf-8')
+            devices.append('gateway_load_test@#' + enc)
+
+        config = {
+            'agents': [{'name': 'websockets', 'args': {'port': 'unused'}}],
+            'adapters': [{'name': 'virtual', 'port': ";".join(devices)}]
+        }
+
+        return config
+
+    def run(self):
+        """Run the load test.
+
+        Returns:
+            LoadTestResults: The results of the load test.
+        """
+
+        gateway = IOTileGateway(self.build_gateway_config())
+        gateway.start()
+
+        try:
+            if not gateway.loaded.wait(10.0):
+                raise ArgumentError("Gateway did not start in time")
+
+            port = gateway.agents[0].port
+            results = LoadTestResults(self.duration)
+
+            threads = []
+            for i in range(0, self.client_count):
+                seed = None if self.seed is None else self.seed + i
+                thread = threading.Thread(target=self._client_main, args=(port, i + 1, results, seed))
+                threads.append(thread)
+
+            start = monotonic()
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+            results.duration = monotonic() - start
+        finally:
+            gateway.stop()
+
+        return results
+
+    def _client_main(self, port, device_uuid, results, seed):
+        """Run one client's workload until the test duration has elapsed."""
+
+        rand = random.Random(seed)
+        operations = sorted(self.mix)
+        weights = [self.mix[x] for x in operations]
+
+        hw = HardwareManager(port="ws:127.0.0.1:%d/iotile/v1" % port)
+
+        try:
+            self._timed(results, 'connect', hw.connect, device_uuid)
+            hw.enable_streaming()
+
+            end = monotonic() + self.duration
+            while monotonic() < end:
+                operation = _weighted_choice(rand, operations, weights)
+
+                if operation == 'scan':
+                    self._timed(results, 'scan', hw.scan)
+                elif operation == 'connect':
+                    if self._timed(results, 'disconnect', hw.disconnect):
+                        self._timed(results, 'connect', hw.connect, device_uuid)
+                        hw.enable_streaming()
+                elif operation == 'rpc':
+                    self._timed(results, 'rpc', hw.stream.send_rpc, 8, 0x0004, b'', timeout=1.0)
+                elif operation == 'stream':
+                    self._stream(hw, results)
+        except Exception:  # pylint: disable=W0703
+            self._logger.exception("Error in load test client for device %d", device_uuid)
+        finally:
+            hw.close()
+
+    def _stream(self, hw, results):
+        """Wait for a fixed number of reports and record how long it took."""
+
+        # Only count reports that arrive after we start waiting
+        for _report in hw.iter_reports():
+            pass
+
+        start = monotonic()
+        try:
+            reports = hw.wait_reports(self.reports_per_stream, timeout=max(1.0, self.reports_per_stream * self.stream_interval * 10))
+        except Exception:  # pylint: disable=W0703
+            results.record_error('stream')
+            return
+
+        results.record('stream', monotonic() - start)
+        results.record_reports(len(reports))
+
+    def _timed(self, results, operation, func, *args, **kwargs):
+        """Call a function and record how long it took.
+
+        Returns:
+            bool: Whether the function completed without raising an exception.
+        """
+
+        start = monotonic()
+        try:
+            func(*args, **kwargs)
+        except Exception:  # pylint: disable=W0703
+            self._logger.debug("Error performing %s operation", operation, exc_info=True)
+            results.record_error(operation)
+            return False
+
+        results.record(operation, monotonic() - start)
+        return True
+
+
+def _weighted_choice(rand, choices, weights):
+    """Pick a random item from choices with the given relative weights."""
+
+    total = sum(weights)
+    point = rand.uniform(0, total)
+
+    for choice, weight in zip(choices, weights):
+        if point < weight:
+            return choice
+
+        point -= weight
+
+    return choices[-1]
+
+
+def _parse_mix(mix_string):
+    """Parse a mix like scan=1,rpc=10 into a dictionary."""
+
+    mix = {}
+    for item in mix_string.split(','):
+        name, _sep, weight = item.partition('=')
+        mix[name.strip()] = float(weight) if weight else 1.0
+
+    return mix
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(description="Measure the throughput and latency of an iotile-gateway under load")
+
+    parser.add_argument('-d', '--devices', type=int, default=10, help="The number of virtual devices to serve")
+    parser.add_argument('-c', '--clients', type=int, default=4, help="The number of concurrent websocket clients")
+    parser.add_argument('-t', '--duration', type=float, default=10.0, help="The number of seconds to apply load for")
+    parser.add_argument('-m', '--mix', type=_parse_mix, default=None, help="Relative weights of each operation, e.g. scan=1,connect=1,rpc=10,stream=2")
+    parser.add_argument('-i', '--stream-interval', type=float, default=0.01, help="The interval in seconds between reports from each device")
+    parser.add_argument('-r', '--reports', type=int, default=10, help="The number of reports to wait for in each stream operation")
+    parser.add_argument('-s', '--seed', type=int, default=None, help="A seed to make the random operation mix repeatable")
+    parser.add_argument('-j', '--json', action='store_true', help="Print the results summary as json")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Log gateway and client activity while running")
+
+    return parser
+
+
+def main(argv=None):
+    """Main entry point for iotile-gateway-loadtest."""
+
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+
+    # The gateway logs every operation, which would drown out the results
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG, format='%(levelname)-.1s-%(asctime)-15s-%(module)-10s:%(lineno)-4s %(message)s')
+    else:
+        logging.disable(logging.CRITICAL)
+
+    try:
+        load_test = GatewayLoadTest(args.devices, args.clients, args.duration, args.mix, args.stream_interval, args.reports, args.seed)
+        results = load_test.run()
+    except ArgumentError as exc:
+        print(str(exc))
+        return 1
+
+    if args.json:
+        print(json.dumps(results.summary(), indent=4, sort_keys=True))
+    else:
+        print(results.format())
+
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Lightweight counters and histograms exported in the Prometheus text format.
+
+All metrics are plain python objects that are updated with a dictionary
+lookup and an addition, so they are cheap enough to leave enabled in
+production.  They are not thread-safe and must only be updated from the
+gateway's event loop, which is where DeviceManager already processes all
+adapter callbacks.
+"""
+
+import bisect
+from future.utils import viewitems
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra is not None:
+        pairs.append(extra)
+
+    if len(pairs) == 0:
+        return ""
+
+    escaped = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in pairs]
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float) and value == float('inf'):
+        return "+Inf"
+
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """A monotonically increasing value, optionally split by labels.
+
+    Args:
+        name (str): The name of the metric
+        description (str): A one line description of the metric
+        label_names (list of str): The names of the labels that each value
+            of this metric is identified by.
+    """
+
+    metric_type = 'counter'
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+
+    def inc(self, *label_values):
+        """Increment the counter by 1."""
+
+        self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def add(self, amount, *label_values):
+        """Increment the counter by a given amount."""
+
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        """Get the current value of the counter for the given labels."""
+
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        """Generate (name, labels, value) tuples for each value of this metric."""
+
+        for label_values, value in sorted(viewitems(self._values)):
+            yield self.name, _format_labels(self.label_names, label_values), value
+
+
+class Gauge(object):
+    """A value that is computed on demand when metrics are collected.
+
+    Args:
+        name (str): The name of the metric
+        description (str): A one line description of the metric
+        label_names (list of str): The names of the labels that each value
+            of this metric is identified by.
+        callback (callable): A function that returns a dict mapping tuples
+            of label values to the current value of the gauge.
+    """
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, description, label_names, callback):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._callback = callback
+
+    def samples(self):
+        """Generate (name, labels, value) tuples for each value of this metric."""
+
+        for label_values, value in sorted(viewitems(self._callback())):
+            yield self.name, _format_labels(self.label_names, label_values), value
+
+
+class Histogram(object):
+    """A distribution of observed values counted in fixed buckets.
+
+    Args:
+        name (str): The name of the metric
+        description (str): A one line description of the metric
+        label_names (list of str): The names of the labels that each value
+            of this metric is identified by.
+        buckets (list of float): The sorted upper bounds of each bucket.
+    """
+
+    metric_type = 'histogram'
+
+    DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._values = {}
+
+    def observe(self, value, *label_values):
+        """Record an observed value."""
+
+        data = self._values.get(label_values)
+        if data is None:
+            data = [[0]*(len(self.buckets) + 1), 0.0, 0]
+            self._values[label_values] = data
+
+        data[0][bisect.bisect_left(self.buckets, value)] += 1
+        data[1] += value
+        data[2] += 1
+
+    def count(self, *label_values):
+        """Get the number of observations for the given labels."""
+
+        data = self._values.get(label_values)
+        if data is None:
+            return 0
+
+        return data[2]
+
+    def samples(self):
+        """Generate (name, labels, value) tuples for each value of this metric."""
+
+        bounds = list(self.buckets) + [float('inf')]
+
+        for label_values, (bucket_counts, total, count) in sorted(viewitems(self._values)):
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, bucket_counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket", _format_labels(self.label_names, label_values, ('le', _format_value(float(bound)))), cumulative
+
+            labels = _format_labels(self.label_names, label_values)
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class MetricsRegistry(object):
+    """A collection of metrics that can be rendered together."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, description, label_names=()):
+        """Create and register a Counter."""
+
+        return self._register(Counter(name, description, label_names))
+
+    def gauge(self, name, description, label_names, callback):
+        """Create and register a Gauge computed by callback."""
+
+        return self._register(Gauge(name, description, label_names, callback))
+
+    def histogram(self, name, description, label_names=(), buckets=Histogram.DEFAULT_BUCKETS):
+        """Create and register a Histogram."""
+
+        return self._register(Histogram(name, description, label_names, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The rendered metrics.
+        """
+
+        lines = []
+        for metric in self._metrics:
+            lines.append("# HELP %s %s" % (metric.name, metric.description))
+            lines.append("# TYPE %s %s" % (metric.name, metric.metric_type))
+
+            for name, labels, value in metric.samples():
+                lines.append("%s%s %s" % (name, labels, _format_value(value)))
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,74 @@
+import tornado.web
+from tornado.httpserver import HTTPServer
+import logging
+from .ws_agent import bind_unused_port
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """Serve the current DeviceManager metrics in the Prometheus text format."""
+
+    def initialize(self, manager):
+        self._manager = manager  # pylint: disable=W0201
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(self._manager.metrics.render())
+
+
+class MetricsGatewayAgent(object):
+    """A gateway agent that exports DeviceManager metrics over HTTP.
+
+    The metrics are served from /metrics so that they can be scraped by
+    Prometheus or any compatible collector.  Rendering happens on the gateway's
+    event loop so it never races with metric updates.
+
+    Args:
+        manager (DeviceManager): A device manager provided
+            by iotile-gateway.
+        loop (IOLoop): A tornado IOLoop that this agent
+            should integrate into.
+        args (dict): A dictionary of arguments for configuring
+            this agent.  The only supported key is port, which
+            may be 'unused' to pick a random free port.
+    """
+
+    def __init__(self, args, manager, loop):
+        self._args = args
+        self.app = None
+        self.port = None
+        self._manager = manager
+        self._loop = loop
+        self._logger = logging.getLogger(__name__)
+        self._logger.addHandler(logging.NullHandler())
+        self._logger.setLevel(logging.INFO)
+
+    def start(self):
+        """Start this gateway agent
+
+        Called before the event loop is running
+        """
+
+        self.app = tornado.web.Application([
+            (r'/metrics', MetricsHandler, {'manager': self._manager}),
+        ])
+
+        port = self._args.get('port', 9410)
+
+        if port == 'unused':
+            sock, port = bind_unused_port()
+            server = HTTPServer(self.app, io_loop=self._loop)
+            server.add_sockets([sock])
+            server.start()
+        else:
+            self.app.listen(port)
+
+        self.port = port
+        self._logger.info("Started Metrics Agent on port %d" % port)
+
+    def stop(self):
+        """Stop this gateway agent
+
+        Called with the event loop running
+        """
+
+        pass
@@ -31,13 +31,18 @@ setup(
         'console_scripts': [
             'iotile-gateway = iotilegateway.main:main',
             'iotile-supervisor = iotilegateway.supervisor.main:main',
-            'iotile-send-rpc = iotilegateway.supervisor.send_rpc:main'
+            'iotile-send-rpc = iotilegateway.supervisor.send_rpc:main',
+            'iotile-gateway-loadtest = iotilegateway.loadtest:main'
         ],
         'iotile.gateway_agent': [
-            'websockets = iotilegateway.ws_agent:WebSocketGatewayAgent'
+            'websockets = iotilegateway.ws_agent:WebSocketGatewayAgent',
+            'metrics = iotilegateway.metrics_agent:MetricsGatewayAgent'
         ],
         'iotile.virtual_tile': [
             'service_delegate = iotilegateway.supervisor.service_tile:ServiceDelegateTile'
+        ],
+        'iotile.virtual_device': [
+            'gateway_load_test = iotilegateway.loadtest:LoadTestDevice'
         ]
     },
     description="IOTile Core Tools",
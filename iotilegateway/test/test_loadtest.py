@@ -0,0 +1,43 @@
+"""Tests of the gateway load generator."""
+
+import pytest
+from iotile.core.exceptions import ArgumentError
+from iotilegateway.loadtest import GatewayLoadTest, percentile
+
+
+def test_percentile():
+    """Make sure percentiles use the nearest rank."""
+
+    values = list(range(1, 101))
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([5], 99) == 5
+    assert percentile([], 50) is None
+
+
+def test_invalid_config():
+    """Make sure we reject invalid load test configurations."""
+
+    with pytest.raises(ArgumentError):
+        GatewayLoadTest(device_count=1, client_count=2)
+
+    with pytest.raises(ArgumentError):
+        GatewayLoadTest(mix={'unknown': 1})
+
+
+def test_load_test():
+    """Make sure we can run a short load test and get results for each operation."""
+
+    load_test = GatewayLoadTest(device_count=3, client_count=2, duration=1.0, reports_per_stream=2, seed=1)
+    results = load_test.run()
+    summary = results.summary()
+
+    for operation in ['scan', 'connect', 'rpc', 'stream']:
+        assert summary[operation]['count'] > 0
+        assert summary[operation]['errors'] == 0
+        assert summary[operation]['p50'] <= summary[operation]['p99']
+
+    assert results.reports > 0
+    assert 'rpc' in results.format()
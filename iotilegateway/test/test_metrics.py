@@ -0,0 +1,103 @@
+"""Tests of gateway metrics collection and export."""
+
+import pytest
+from tornado.httpclient import HTTPClient
+from iotilegateway import IOTileGateway
+from iotilegateway.metrics import MetricsRegistry
+from iotile.core.hw import HardwareManager
+
+
+@pytest.fixture(scope="function")
+def metrics_gateway():
+    """A gateway with a websockets agent and a metrics agent."""
+
+    config = {
+        'agents': [
+            {
+                "name": "websockets",
+                "args":
+                {
+                    "port": "unused"
+                }
+            },
+            {
+                "name": "metrics",
+                "args":
+                {
+                    "port": "unused"
+                }
+            }
+        ],
+
+        'adapters': [
+            {
+                "name": "virtual",
+                "port": "gateway_load_test"
+            }
+        ]
+    }
+
+    gateway = IOTileGateway(config)
+
+    gateway.start()
+    gateway.loaded.wait(2.0)
+
+    hw = HardwareManager(port="ws:127.0.0.1:%d/iotile/v1" % gateway.agents[0].port)
+
+    yield hw, gateway
+
+    hw.close()
+    gateway.stop()
+
+
+def test_registry_render():
+    """Make sure we render counters, gauges and histograms correctly."""
+
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', 'A test counter', ['adapter'])
+    registry.gauge('test_gauge', 'A test gauge', ['state'], lambda: {('connected',): 2})
+    hist = registry.histogram('test_seconds', 'A test histogram', buckets=[0.1, 1.0])
+
+    counter.inc('0')
+    counter.add(4, '0')
+    counter.inc('1')
+    hist.observe(0.05)
+    hist.observe(0.1)
+    hist.observe(5.0)
+
+    assert counter.value('0') == 5
+    assert counter.value('2') == 0
+    assert hist.count() == 3
+
+    lines = registry.render().splitlines()
+
+    assert '# TYPE test_total counter' in lines
+    assert 'test_total{adapter="0"} 5' in lines
+    assert 'test_total{adapter="1"} 1' in lines
+    assert 'test_gauge{state="connected"} 2' in lines
+    assert 'test_seconds_bucket{le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'test_seconds_count 3' in lines
+
+
+def test_metrics_agent(metrics_gateway):
+    """Make sure gateway activity is reflected in the exported metrics."""
+
+    hw, gateway = metrics_gateway
+
+    hw.connect(1)
+    hw.stream.send_rpc(8, 0x0004, b'', timeout=1.0)
+
+    client = HTTPClient()
+    try:
+        resp = client.fetch("http://127.0.0.1:%d/metrics" % gateway.agents[1].port)
+    finally:
+        client.close()
+
+    assert resp.headers['Content-Type'].startswith('text/plain')
+
+    lines = resp.body.decode('utf-8').splitlines()
+    assert 'iotile_gateway_connections{adapter="0",state="connected"} 1' in lines
+    assert 'iotile_gateway_rpc_duration_seconds_count{adapter="0"} 1' in lines
+    assert any(x.startswith('iotile_gateway_scan_events_total{adapter="0"}') for x in lines)
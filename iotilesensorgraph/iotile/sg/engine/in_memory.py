@@ -24,32 +24,80 @@ class InMemoryStorageEngine(object):
         self.streaming_data = []
         self.storage_data = []
 
-    def dump(self):
+    def dump(self, include_readings=True):
         """Serialize the state of this InMemoryStorageEngine to a dict.
 
+        Args:
+            include_readings (bool): Include the stored readings.  If this is
+                False, the readings should be saved separately using
+                dump_readings().
+
         Returns:
             dict: The serialized data.
         """
 
+        if not include_readings:
+            return {}
+
         return {
             u'storage_data': [x.asdict() for x in self.storage_data],
             u'streaming_data': [x.asdict() for x in self.streaming_data]
         }
 
     def restore(self, state):
-        """Restore the state of this InMemoryStorageEngine from a dict."""
+        """Restore the state of this InMemoryStorageEngine from a dict.
+
+        If the state was dumped without readings, the currently stored
+        readings are left untouched.
+        """
+
+        if u'storage_data' not in state and u'streaming_data' not in state:
+            return
 
         storage_data = state.get(u'storage_data', [])
         streaming_data = state.get(u'streaming_data', [])
 
-        if len(storage_data) > self.storage_length or len(streaming_data) > self.streaming_length:
-            raise ArgumentError("Cannot restore InMemoryStorageEngine, too many readings",
-                                storage_size=len(storage_data), storage_max=self.storage_length,
-                                streaming_size=len(streaming_data), streaming_max=self.streaming_length)
+        self._check_restore_size(len(storage_data), len(streaming_data))
 
         self.storage_data = [IOTileReading.FromDict(x) for x in storage_data]
         self.streaming_data = [IOTileReading.FromDict(x) for x in streaming_data]
 
+    def dump_readings(self):
+        """Get all stored readings without serializing them.
+
+        Readings are never modified once they are stored, so the returned
+        objects may be shared with a later call to restore_readings() rather
+        than copied.
+
+        Returns:
+            (tuple of IOTileReading, tuple of IOTileReading): The readings in the
+                storage and streaming buffers.
+        """
+
+        return tuple(self.storage_data), tuple(self.streaming_data)
+
+    def restore_readings(self, storage_data, streaming_data):
+        """Replace all stored readings with readings from dump_readings().
+
+        Args:
+            storage_data (iterable of IOTileReading): The readings in the storage buffer.
+            streaming_data (iterable of IOTileReading): The readings in the streaming buffer.
+        """
+
+        storage_data = list(storage_data)
+        streaming_data = list(streaming_data)
+
+        self._check_restore_size(len(storage_data), len(streaming_data))
+
+        self.storage_data = storage_data
+        self.streaming_data = streaming_data
+
+    def _check_restore_size(self, storage_size, streaming_size):
+        if storage_size > self.storage_length or streaming_size > self.streaming_length:
+            raise ArgumentError("Cannot restore InMemoryStorageEngine, too many readings",
+                                storage_size=storage_size, storage_max=self.storage_length,
+                                streaming_size=streaming_size, streaming_max=self.streaming_length)
+
     def count(self):
         """Count the number of readings.
 
@@ -72,7 +72,7 @@ class SensorLog(object):
 
         self.id_assigner = id_assigner
 
-    def dump(self):
+    def dump(self, include_readings=True):
         """Dump the state of this SensorLog.
 
         The purpose of this method is to be able to restore the same state
@@ -82,6 +82,11 @@ class SensorLog(object):
         restore, it looks through the current set of stream walkers and
         restores each one that existed when dump() was called to its state.
 
+        Args:
+            include_readings (bool): Include the readings held by the storage
+                engine.  If False, the engine's readings must be saved and
+                restored separately, before this state is restored.
+
         Returns:
             dict: The serialized state of this SensorLog.
         """
@@ -91,7 +96,7 @@ class SensorLog(object):
         walkers.update({str(walker.selector): walker.dump() for walker in self._virtual_walkers})
 
         return {
-            u'engine': self._engine.dump(),
+            u'engine': self._engine.dump(include_readings),
             u'rollover_storage': self._rollover_storage,
             u'rollover_streaming': self._rollover_streaming,
             u'last_values': {str(stream): reading.asdict() for stream, reading in viewitems(self._last_values)},
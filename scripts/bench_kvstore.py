@@ -0,0 +1,126 @@
+"""Benchmark SQLiteKVStore under contention from several processes.
+
+Each worker process repeatedly opens the store, as every new
+ComponentRegistry does, reads a few keys and occasionally writes one.  The
+same workload is run against a copy of the original store that opens a new
+connection per instance, uses the default rollback journal and commits after
+every write, so the two can be compared.
+
+Usage:
+    python scripts/bench_kvstore.py [--processes 8] [--iterations 500]
+"""
+
+from __future__ import unicode_literals, print_function, absolute_import
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from iotile.core.utilities.kvstore_sqlite import SQLiteKVStore
+
+
+class LegacySQLiteKVStore(object):
+    """The original store: one connection per instance, commit on every write."""
+
+    def __init__(self, name, folder):
+        self.file = os.path.join(folder, name)
+        self.connection = sqlite3.connect(self.file, timeout=SQLiteKVStore.BusyTimeout)
+        self.cursor = self.connection.cursor()
+        self.cursor.execute('create table if not exists KVStore (key TEXT PRIMARY KEY, value TEXT);')
+
+    def get(self, key):
+        self.cursor.execute('select value from KVStore where key is ?', (key,))
+        val = self.cursor.fetchone()
+        if val is None:
+            raise KeyError("id not in key-value store: %s" % str(key))
+
+        return val[0]
+
+    def try_get(self, key):
+        try:
+            return self.get(key)
+        except KeyError:
+            return None
+
+    def set(self, key, value):
+        self.cursor.execute('insert or replace into KVStore values (?, ?)', (key, str(value)))
+        self.connection.commit()
+
+    def batch(self):
+        return _NullBatch()
+
+
+class _NullBatch(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+STORES = {
+    'legacy': LegacySQLiteKVStore,
+    'current': SQLiteKVStore
+}
+
+
+def _worker(args):
+    kind, folder, worker, iterations, reads, write_every = args
+    factory = STORES[kind]
+
+    start = time.time()
+    for i in range(0, iterations):
+        store = factory('bench.db', folder=folder)
+
+        for j in range(0, reads):
+            store.try_get('key_%d' % j)
+
+        if i % write_every == 0:
+            with store.batch():
+                store.set('worker_%d' % worker, i)
+                store.set('worker_%d_last' % worker, time.time())
+
+    return time.time() - start
+
+
+def run(kind, processes, iterations, reads, write_every):
+    folder = tempfile.mkdtemp()
+
+    try:
+        store = STORES[kind]('bench.db', folder=folder)
+        for i in range(0, reads):
+            store.set('key_%d' % i, 'value_%d' % i)
+
+        pool = multiprocessing.Pool(processes)
+        try:
+            start = time.time()
+            durations = pool.map(_worker, [(kind, folder, i, iterations, reads, write_every) for i in range(0, processes)])
+            wall = time.time() - start
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        shutil.rmtree(folder)
+
+    ops = processes * iterations * (reads + 2.0 / write_every)
+    print("%-8s wall %.2f s, slowest worker %.2f s, %.0f ops/s" % (kind, wall, max(durations), ops / wall))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLiteKVStore with concurrent processes")
+    parser.add_argument('--processes', type=int, default=8, help="The number of worker processes")
+    parser.add_argument('--iterations', type=int, default=500, help="How many times each worker opens the store")
+    parser.add_argument('--reads', type=int, default=10, help="How many keys each iteration reads")
+    parser.add_argument('--write-every', type=int, default=5, help="Write two keys every N iterations")
+    parser.add_argument('--store', choices=['legacy', 'current', 'both'], default='both')
+    args = parser.parse_args()
+
+    kinds = ['legacy', 'current'] if args.store == 'both' else [args.store]
+    for kind in kinds:
+        run(kind, args.processes, args.iterations, args.reads, args.write_every)
+
+
+if __name__ == '__main__':
+    main()
@@ -86,6 +86,7 @@ class ConnectionManager(threading.Thread):
         self._connections = {}
         self._int_connections = {}
         self._data_lock = threading.Lock()
+        self._periodic_callbacks = []
 
         # Our thread should be a daemon so that we don't block exiting the program if we hang
         self.daemon = True
@@ -102,6 +103,7 @@ class ConnectionManager(threading.Thread):
 
                 # Check if we should time anything out
                 self._check_timeouts()
+                self._run_periodic_callbacks()
 
                 try:
                     action = self._actions.get(timeout=0.1)
@@ -258,6 +260,26 @@ class ConnectionManager(threading.Thread):
         data = table[key]
         return data['state']
 
+    def add_periodic_callback(self, callback):
+        """Call a function periodically from the connection manager thread.
+
+        The callback is called about every 100 ms, each time that we check
+        for timed out operations.  It must not block.  This must be called
+        before the connection manager is started.
+
+        Args:
+            callback (callable): The function to call with no arguments.
+        """
+
+        self._periodic_callbacks.append(callback)
+
+    def _run_periodic_callbacks(self):
+        for callback in self._periodic_callbacks:
+            try:
+                callback()
+            except Exception:
+                self._logger.exception('Exception in periodic callback %s', callback)
+
     def _check_timeouts(self):
         """Check if any operations in progress need to be timed out
 
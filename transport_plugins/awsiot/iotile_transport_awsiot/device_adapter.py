@@ -12,6 +12,7 @@ from iotile.core.dev.registry import ComponentRegistry
 from .mqtt_client import OrderedAWSIOTClient
 from .topic_validator import MQTTTopicValidator
 from .connection_manager import ConnectionManager
+from .report_batch import unpack_reports
 from . import messages
 from builtins import range
 
@@ -62,6 +63,9 @@ class AWSIOTDeviceAdapter(DeviceAdapter):
         self.prefix = port
 
         self.conns = ConnectionManager(self.id)
+
+        # Deliver packets waiting behind a lost packet even if no more packets arrive
+        self.conns.add_periodic_callback(self.client.check_timeouts)
         self.conns.start()
 
         self.client.subscribe(self.prefix + 'devices/+/data/advertisement', self._on_advertisement, ordered=False)
@@ -408,6 +412,10 @@ class AWSIOTDeviceAdapter(DeviceAdapter):
             return
 
         try:
+            if messages.ReportBatchNotification.matches(message):
+                self._on_report_batch(conn_id, message)
+                return
+
             rep_msg = messages.ReportNotification.verify(message)
 
             serialized_report = {}
@@ -420,6 +428,40 @@ class AWSIOTDeviceAdapter(DeviceAdapter):
         except Exception:
             self._logger.exception("Error processing report conn_id=%d", conn_id)
 
+    def _on_report_batch(self, conn_id, message):
+        """Process one fragment of a batch of reports received from a device.
+
+        Fragments are accumulated in the connection context until the last
+        one is received, at which point every report in the batch is
+        triggered in order.
+
+        Args:
+            conn_id (int): The connection id that the batch was received on
+            message (dict): The report_batch message itself
+        """
+
+        batch_msg = messages.ReportBatchNotification.verify(message)
+        context = self.conns.get_context(conn_id)
+
+        if batch_msg['fragment_index'] == 0:
+            context['report_batch'] = []
+
+        context.setdefault('report_batch', []).append(batch_msg['reports'])
+
+        if batch_msg['fragment_index'] != batch_msg['fragment_count'] - 1:
+            return
+
+        batch = b''.join(context['report_batch'])
+        context['report_batch'] = []
+
+        serialized_reports = unpack_reports(batch)
+        if len(serialized_reports) != batch_msg['report_count']:
+            self._logger.warn("Report batch count mismatch, expected=%d, received=%d", batch_msg['report_count'], len(serialized_reports))
+
+        for serialized_report in serialized_reports:
+            report = self.report_parser.deserialize_report(serialized_report)
+            self._trigger_callback('on_report', conn_id, report)
+
     def _on_trace(self, sequence, topic, message):
         """Process a trace received from a device.
 
@@ -1,8 +1,10 @@
 import logging
 import tornado.gen
+import base64
 import binascii
 import struct
 from . import messages
+from .report_batch import pack_report
 from monotonic import monotonic
 from .mqtt_client import OrderedAWSIOTClient
 from .topic_validator import MQTTTopicValidator
@@ -31,6 +33,18 @@ class AWSIOTGatewayAgent(object):
               in between this interval and only the last one is sent every interval unless
               the progres event indicates that the total operation has finished, in which
               case it is sent immediately.  Default: 2s
+            - report_batch_count (int): the maximum number of reports from a single
+              device that are combined into one report_batch message.  A value of 1
+              disables batching and sends each report in its own report message, which
+              is the only format understood by older clients.  Default: 1
+            - report_batch_bytes (int): the number of accumulated report bytes that
+              causes a batch to be sent immediately, even if it has fewer than
+              report_batch_count reports.  Default: 16384
+            - report_batch_interval (float): the maximum number of seconds that a
+              report is held waiting for more reports to fill its batch.  Default: 1s
+            - report_fragment_size (int): the maximum number of report bytes that are
+              placed in a single MQTT message.  Larger batches are split into multiple
+              fragments.  Default: 61440
 
     """
 
@@ -59,6 +73,10 @@ class AWSIOTGatewayAgent(object):
         self.throttle_trace = self._args.get('trace_throttle_interval', 5.0)
         self.throttle_progress = self._args.get('progress_throttle_interval', 2.0)
         self.client_timeout = self._args.get('client_timeout', 60.0)
+        self.report_batch_count = self._args.get('report_batch_count', 1)
+        self.report_batch_bytes = self._args.get('report_batch_bytes', 16*1024)
+        self.report_batch_interval = self._args.get('report_batch_interval', 1.0)
+        self.report_fragment_size = self._args.get('report_fragment_size', 60*1024)
 
     @classmethod
     def _build_device_slug(cls, device_id):
@@ -510,6 +528,9 @@ class AWSIOTGatewayAgent(object):
         self.client.reset_sequence(self.topics.gateway_topic(slug, 'control/connect'))
         self.client.reset_sequence(self.topics.gateway_topic(slug, 'control/action'))
 
+        # Make sure any reports that we were holding for a batch are not lost
+        self._send_accum_reports(uuid)
+
         try:
             resp = yield self._manager.disconnect(conn_id)
         except Exception as exc:
@@ -567,7 +588,8 @@ class AWSIOTGatewayAgent(object):
             conn_id = resp['connection_id']
             self._connections[uuid] = {'key': key, 'client': client, 'connection_id': conn_id, 'last_touch': monotonic(),
                                        'script': [], 'trace_accum': bytes(), 'last_trace': None, 'trace_scheduled': False,
-                                       'last_progress': None}
+                                       'last_progress': None, 'report_accum': [], 'report_accum_bytes': 0,
+                                       'report_scheduled': False}
         else:
             message['failure_reason'] = resp['reason']
             self._connections[uuid] = {}
@@ -588,12 +610,17 @@ class AWSIOTGatewayAgent(object):
             self._logger.debug("Dropping report for device without an active connection, uuid=0x%X", device_uuid)
             return
 
+        ser = report.serialize()
+
+        if self.report_batch_count > 1:
+            self._accumulate_report(device_uuid, ser)
+            return
+
         slug = self._build_device_slug(device_uuid)
         streaming_topic = self.topics.prefix + 'devices/{}/data/streaming'.format(slug)
 
         data = {'type': 'notification', 'operation': 'report'}
 
-        ser = report.serialize()
         data['received_time'] = ser['received_time'].strftime("%Y%m%dT%H:%M:%S.%fZ").encode()
         data['report_origin'] = ser['origin']
         data['report_format'] = ser['report_format']
@@ -603,6 +630,67 @@ class AWSIOTGatewayAgent(object):
         self._logger.debug("Publishing report: (topic=%s)", streaming_topic)
         self.client.publish(streaming_topic, data)
 
+    def _accumulate_report(self, device_uuid, serialized):
+        """Add a report to the pending batch for a device.
+
+        The batch is sent immediately once it holds report_batch_count reports
+        or report_batch_bytes bytes, otherwise it is sent at most
+        report_batch_interval seconds after the first report was added.
+        """
+
+        conn_data = self._connections[device_uuid]
+
+        entry = pack_report(serialized)
+        conn_data['report_accum'].append(entry)
+        conn_data['report_accum_bytes'] += len(entry)
+
+        if len(conn_data['report_accum']) >= self.report_batch_count or conn_data['report_accum_bytes'] >= self.report_batch_bytes:
+            self._send_accum_reports(device_uuid)
+        elif not conn_data['report_scheduled']:
+            self._loop.call_later(self.report_batch_interval, self._send_scheduled_reports, device_uuid)
+            conn_data['report_scheduled'] = True
+
+    def _send_scheduled_reports(self, device_uuid):
+        """Send a report batch whose time window has expired."""
+
+        conn_data = self._connections.get(device_uuid)
+        if not conn_data:
+            return
+
+        conn_data['report_scheduled'] = False
+        self._send_accum_reports(device_uuid)
+
+    def _send_accum_reports(self, device_uuid):
+        """Send whatever accumulated reports we have for the device as a batch.
+
+        The batch is split into fragments of at most report_fragment_size bytes
+        that are published in order on the device's streaming topic.
+        """
+
+        conn_data = self._connections.get(device_uuid)
+        if not conn_data or len(conn_data.get('report_accum', [])) == 0:
+            return
+
+        report_count = len(conn_data['report_accum'])
+        batch = b''.join(conn_data['report_accum'])
+
+        conn_data['report_accum'] = []
+        conn_data['report_accum_bytes'] = 0
+
+        slug = self._build_device_slug(device_uuid)
+        streaming_topic = self.topics.prefix + 'devices/{}/data/streaming'.format(slug)
+
+        fragment_count = max(1, (len(batch) + self.report_fragment_size - 1) // self.report_fragment_size)
+        for i in range(0, fragment_count):
+            start = i*self.report_fragment_size
+            fragment = batch[start:start + self.report_fragment_size]
+
+            data = {'type': 'notification', 'operation': 'report_batch', 'report_count': report_count,
+                    'fragment_count': fragment_count, 'fragment_index': i, 'reports': base64.standard_b64encode(fragment)}
+
+            self._logger.debug("Publishing report batch fragment %d/%d with %d reports: (topic=%s)", i + 1, fragment_count, report_count, streaming_topic)
+            self.client.publish(streaming_topic, data)
+
     def _notify_trace(self, device_uuid, event_name, trace):
         """Notify that we have received tracing data from a device.
 
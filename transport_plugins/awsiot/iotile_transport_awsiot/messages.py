@@ -164,6 +164,14 @@ ReportNotification.add_required('report', BytesVerifier(encoding='hex'))
 ReportNotification.add_required('report_origin', IntVerifier())
 ReportNotification.add_required('report_format', IntVerifier())
 
+ReportBatchNotification = DictionaryVerifier()  # pylint: disable=C0103
+ReportBatchNotification.add_required('type', LiteralVerifier('notification'))
+ReportBatchNotification.add_required('operation', LiteralVerifier('report_batch'))
+ReportBatchNotification.add_required('fragment_count', IntVerifier())
+ReportBatchNotification.add_required('fragment_index', IntVerifier())
+ReportBatchNotification.add_required('report_count', IntVerifier())
+ReportBatchNotification.add_required('reports', BytesVerifier(encoding='base64'))
+
 TracingNotification = DictionaryVerifier()  # pylint: disable=C0103
 TracingNotification.add_required('type', LiteralVerifier('notification'))
 TracingNotification.add_required('operation', LiteralVerifier('trace'))
@@ -2,6 +2,9 @@ import json
 import logging
 import AWSIoTPythonSDK.MQTTLib
 import re
+import threading
+import functools
+from collections import deque
 from AWSIoTPythonSDK.exception.operationError import operationError
 from iotile.core.exceptions import ArgumentError, ExternalError, InternalError
 from iotile.core.dev.registry import ComponentRegistry
@@ -14,7 +17,14 @@ class OrderedAWSIOTClient(object):
 
     Args:
         args (dict): A dictionary of arguments for setting up the
-            MQTT connection.
+            MQTT connection.  In addition to connection credentials,
+            the following keys control how out of order packets are
+            handled on ordered topics:
+            - missing_packet_timeout (float): The number of seconds to wait
+              for a missing packet before skipping it.  Default: 10s
+            - reorder_window (int): The maximum number of packets that a
+              received packet may be ahead of a missing one before we stop
+              waiting for the missing packet.  Default: 256
     """
 
     def __init__(self, args):
@@ -73,6 +83,15 @@ class OrderedAWSIOTClient(object):
         self.sequencer = TopicSequencer()
         self.queues = {}
         self.wildcard_queues = []
+        self.missing_timeout = args.get('missing_packet_timeout', 10.0)
+        self.reorder_window = args.get('reorder_window', 256)
+
+        # Queues are used from the MQTT receive thread and from check_timeouts.
+        # Packets that the queues release are passed to their callbacks by
+        # _deliver_packets after the lock is released, see _queue_packet.
+        self._queue_lock = threading.RLock()
+        self._deliveries = deque()
+        self._delivering = False
         self._logger = logging.getLogger(__name__)
 
     def connect(self, client_id):
@@ -152,6 +171,8 @@ class OrderedAWSIOTClient(object):
             packet['message']['trace'] = packet['message']['trace'].decode('utf8')
         if 'report' in packet['message']:
             packet['message']['report'] = packet['message']['report'].decode('utf8')
+        if 'reports' in packet['message']:
+            packet['message']['reports'] = packet['message']['reports'].decode('utf8')
         if 'received_time' in packet['message']:
             packet['message']['received_time'] = packet['message']['received_time'].decode('utf8')
 
@@ -184,7 +205,8 @@ class OrderedAWSIOTClient(object):
             regex = re.compile(topic.replace('+', '[^/]+').replace('#', '.*'))
             self.wildcard_queues.append((topic, regex, callback, ordered))
         else:
-            self.queues[topic] = PacketQueue(0, callback, ordered)
+            with self._queue_lock:
+                self.queues[topic] = self._create_queue(callback, ordered)
 
         try:
             self.client.subscribe(topic, 1, self._on_receive)
@@ -202,8 +224,47 @@ class OrderedAWSIOTClient(object):
             topic (string): The topic to reset the packet queue on
         """
 
-        if topic in self.queues:
-            self.queues[topic].reset()
+        with self._queue_lock:
+            if topic in self.queues:
+                self.queues[topic].reset()
+
+    def check_timeouts(self):
+        """Skip missing packets that have been waited for too long on all topics.
+
+        Packet queues only check for timeouts when they receive a packet, so
+        this must be called periodically to deliver packets that are waiting
+        behind a lost packet when no further packets arrive on their topic.
+        """
+
+        with self._queue_lock:
+            for queue in list(self.queues.values()):
+                queue.check_timeout()
+
+        self._deliver_packets()
+
+    def packet_statistics(self):
+        """Summarize reordering statistics for all ordered topics.
+
+        Returns:
+            dict: A dictionary with the total number of packets that were
+                received out of order (reordered), dropped as old or duplicate
+                (dropped) and given up on as missing (skipped), as well as the
+                number of packets currently waiting for a missing packet
+                (pending).
+        """
+
+        stats = {'reordered': 0, 'dropped': 0, 'skipped': 0, 'pending': 0}
+
+        with self._queue_lock:
+            queues = list(self.queues.values())
+
+        for queue in queues:
+            stats['reordered'] += queue.reordered_count
+            stats['dropped'] += queue.dropped_count
+            stats['skipped'] += queue.skipped_count
+            stats['pending'] += queue.pending_count
+
+        return stats
 
     def unsubscribe(self, topic):
         """Unsubscribe from messages on a given topic
@@ -212,7 +273,8 @@ class OrderedAWSIOTClient(object):
             topic (string): The MQTT topic to unsubscribe from
         """
 
-        del self.queues[topic]
+        with self._queue_lock:
+            del self.queues[topic]
 
         try:
             self.client.unsubscribe(topic)
@@ -246,16 +308,60 @@ class OrderedAWSIOTClient(object):
 
         # If we received a packet that does not fit into a queue, check our wildcard
         # queues
-        if topic not in self.queues:
-            found = False
-            for _, regex, callback, ordered in self.wildcard_queues:
-                if regex.match(topic):
-                    self.queues[topic] = PacketQueue(0, callback, ordered)
-                    found = True
-                    break
-
-            if not found:
-                self._logger.warn("Received message for unknown topic: %s", topic)
+        with self._queue_lock:
+            if topic not in self.queues:
+                found = False
+                for _, regex, callback, ordered in self.wildcard_queues:
+                    if regex.match(topic):
+                        self.queues[topic] = self._create_queue(callback, ordered)
+                        found = True
+                        break
+
+                if not found:
+                    self._logger.warn("Received message for unknown topic: %s", topic)
+                    return
+
+            self.queues[topic].receive(seq, [seq, topic, message_data])
+
+        self._deliver_packets()
+
+    def _create_queue(self, callback, ordered):
+        return PacketQueue(self.missing_timeout, functools.partial(self._queue_packet, callback), ordered, self.reorder_window)
+
+    def _queue_packet(self, callback, *args):
+        """Save a packet released by a PacketQueue for delivery.
+
+        PacketQueues are only used while holding _queue_lock, so their
+        callbacks must not be called directly.  A callback that published
+        through this client or waited on another thread that uses it could
+        otherwise deadlock.
+        """
+
+        self._deliveries.append((callback, args))
+
+    def _deliver_packets(self):
+        """Pass all saved packets to their callbacks without holding _queue_lock.
+
+        Only one thread delivers packets at a time so that they reach their
+        callbacks in the order that the queues released them.  If another
+        thread is already delivering, it also delivers the packets we saved.
+        """
+
+        with self._queue_lock:
+            if self._delivering:
                 return
 
-        self.queues[topic].receive(seq, [seq, topic, message_data])
+            self._delivering = True
+
+        while True:
+            with self._queue_lock:
+                if len(self._deliveries) == 0:
+                    self._delivering = False
+                    return
+
+                callback, args = self._deliveries.popleft()
+
+            try:
+                callback(*args)
+            except Exception:  #pylint:disable=broad-except;A bad callback must not stop delivery of other packets
+                self._logger.exception("Error delivering packet on topic %s", args[1])
@@ -1,18 +1,29 @@
-"""A packet queue for reordering out of order packets
+"""A packet queue for reordering out of order packets."""
 
-TODO:
-- Add timeout
-- replace list with a priority queue
-- Add maximum out of order window
-"""
+import heapq
+import logging
+from monotonic import monotonic
 
 
 class PacketQueue(object):
     """A queue for reordering out-of-order messages
 
+    Out of order packets are stored in a dictionary keyed by sequence number
+    with a heap of the pending sequence numbers so that the next packet to
+    deliver can always be found without sorting.
+
+    If a packet is missing for longer than missing_timeout seconds, or a
+    packet arrives whose sequence number is max_window or more packets ahead
+    of the next expected one, the hole is skipped and the pending packets are
+    delivered in order.  Timeouts are checked whenever a packet is received
+    but must also be checked periodically by calling check_timeout(),
+    otherwise packets behind a hole are not delivered until another packet
+    arrives.
+
     Args:
-        missing_timeout (int): The maximum time to wait for a missing packet
-            without triggering a timeout error
+        missing_timeout (float): The maximum time to wait for a missing packet
+            before skipping over it.  If this is None or 0, missing packets
+            are waited for indefinitely.
         callback (callable): A callback function that should be called for
             each received message with the signature:
             callback(*args) where args is the list passed to receive
@@ -21,23 +32,40 @@ class PacketQueue(object):
             channel or if each packet is independent and sequence numbers
             should not be checked.  True means sequence numbers are checked
             and packets are reordered.
-
+        max_window (int): The maximum distance between the next expected
+            sequence number and a received packet before we stop waiting for
+            the missing packets in between.  If None, there is no limit.
     """
-    def __init__(self, missing_timeout, callback, reorder=True):
-        self._out_of_order = []
+
+    def __init__(self, missing_timeout, callback, reorder=True, max_window=None):
+        self._pending = {}
+        self._pending_heap = []
         self._next_expected = None
+        self._hole_start = None
         self._callback = callback
         self._reorder = reorder
         self._missing_timeout = missing_timeout
+        self._max_window = max_window
+        self._logger = logging.getLogger(__name__)
+
+        self.reordered_count = 0
+        self.dropped_count = 0
+        self.skipped_count = 0
+
+    @property
+    def pending_count(self):
+        """The number of out of order packets waiting for a missing packet."""
+
+        return len(self._pending)
 
     def receive(self, sequence, args):
         """Receive one packet
 
         If the sequence number is one we've already seen before, it is dropped.
 
-        If it is not the next expected sequence number, it is put into the
-        _out_of_order queue to be processed once the holes in sequence number
-        are filled in.
+        If it is not the next expected sequence number, it is stored until the
+        holes in sequence number are filled in or skipped because of a timeout
+        or because the packet is too far outside of our reorder window.
 
         Args:
             sequence (int): The sequence number of the received packet
@@ -50,27 +78,82 @@ class PacketQueue(object):
             self._callback(*args)
             return
 
-        # If this packet is in the past, drop it
-        if self._next_expected is not None and sequence < self._next_expected:
-            print("Dropping out of order packet, seq=%d" % sequence)
+        # If this packet is in the past or a duplicate, drop it
+        if (self._next_expected is not None and sequence < self._next_expected) or sequence in self._pending:
+            self._logger.debug("Dropping old or duplicate packet, seq=%d", sequence)
+            self.dropped_count += 1
             return
 
-        self._out_of_order.append((sequence, args))
-        self._out_of_order.sort(key=lambda x: x[0])
+        if self._next_expected is None or sequence == self._next_expected:
+            self._deliver(sequence, args)
+            self._deliver_pending()
+        else:
+            self._pending[sequence] = args
+            heapq.heappush(self._pending_heap, sequence)
+            self.reordered_count += 1
 
-        # If we have received packets, attempt to process them in order
-        while len(self._out_of_order) > 0:
-            seq, args = self._out_of_order[0]
+            if self._hole_start is None:
+                self._hole_start = monotonic()
 
-            if self._next_expected is not None and seq != self._next_expected:
-                return
+            if self._max_window is not None:
+                while len(self._pending_heap) > 0 and (sequence - self._next_expected) >= self._max_window:
+                    self._skip_hole()
 
-            self._callback(*args)
-            self._out_of_order.pop(0)
-            self._next_expected = seq+1
+        self.check_timeout()
+
+    def check_timeout(self):
+        """Skip over any missing packets that we have waited too long for.
+
+        Returns:
+            bool: True if any missing packets were skipped.
+        """
+
+        if not self._missing_timeout or self._hole_start is None:
+            return False
+
+        skipped = False
+        while self._hole_start is not None and (monotonic() - self._hole_start) > self._missing_timeout:
+            self._skip_hole()
+            skipped = True
+
+        return skipped
 
     def reset(self):
         """Reset the expected next sequence number
+
+        Any pending out of order packets are discarded.
         """
 
+        self.dropped_count += len(self._pending)
+
         self._next_expected = None
+        self._pending = {}
+        self._pending_heap = []
+        self._hole_start = None
+
+    def _deliver(self, sequence, args):
+        self._callback(*args)
+        self._next_expected = sequence + 1
+
+    def _deliver_pending(self):
+        """Deliver all pending packets that are now in order."""
+
+        while len(self._pending_heap) > 0 and self._pending_heap[0] == self._next_expected:
+            sequence = heapq.heappop(self._pending_heap)
+            self._deliver(sequence, self._pending.pop(sequence))
+
+        if len(self._pending_heap) == 0:
+            self._hole_start = None
+        else:
+            self._hole_start = monotonic()
+
+    def _skip_hole(self):
+        """Give up on the packets missing before our oldest pending packet."""
+
+        first_pending = self._pending_heap[0]
+        missing = first_pending - self._next_expected
+
+        self._logger.debug("Skipping %d missing packets, seq=%d to %d", missing, self._next_expected, first_pending - 1)
+        self.skipped_count += missing
+        self._next_expected = first_pending
+        self._deliver_pending()
@@ -0,0 +1,73 @@
+"""Binary framing for batches of reports sent in a single MQTT message.
+
+Each report in a batch is prefixed with a fixed size header containing the
+report format, the report origin, the time the report was received by the
+gateway (in microseconds since the unix epoch) and the length of the encoded
+report that follows.  The packed batch is base64 encoded and split into
+fragments before being placed in a ``report_batch`` notification.
+"""
+
+import datetime
+import struct
+from iotile.core.exceptions import ArgumentError
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_HEADER = struct.Struct("<BLQL")
+
+HEADER_SIZE = _HEADER.size
+
+
+def pack_report(serialized):
+    """Pack a single serialized report into a batch entry.
+
+    Args:
+        serialized (dict): The result of calling serialize() on an IOTileReport.
+
+    Returns:
+        bytes: The packed report entry including its header.
+    """
+
+    delta = serialized['received_time'] - _EPOCH
+    received_us = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+    encoded = serialized['encoded_report']
+    header = _HEADER.pack(serialized['report_format'], serialized['origin'], received_us, len(encoded))
+    return header + encoded
+
+
+def unpack_reports(data):
+    """Unpack all of the reports contained in a batch.
+
+    Args:
+        data (bytes): The concatenated batch entries created by pack_report.
+
+    Returns:
+        list of dict: A list of serialized reports suitable for passing to
+            IOTileReportParser.deserialize_report.  Each dict also contains
+            the report origin.
+    """
+
+    view = memoryview(data)
+    reports = []
+    offset = 0
+
+    while offset < len(view):
+        if len(view) - offset < _HEADER.size:
+            raise ArgumentError("Truncated report batch header", offset=offset, length=len(view))
+
+        report_format, origin, received_us, length = _HEADER.unpack_from(view, offset)
+        offset += _HEADER.size
+
+        if len(view) - offset < length:
+            raise ArgumentError("Truncated report in report batch", offset=offset, expected=length, remaining=len(view) - offset)
+
+        serialized = {}
+        serialized['report_format'] = report_format
+        serialized['origin'] = origin
+        serialized['received_time'] = _EPOCH + datetime.timedelta(microseconds=received_us)
+        serialized['encoded_report'] = view[offset:offset + length].tobytes()
+        reports.append(serialized)
+
+        offset += length
+
+    return reports
@@ -183,3 +183,41 @@ def test_autodisconnect(gateway, hw_man, local_broker):
 
     # Make sure we can connect normally again
     hw_man.connect(3, wait=0.1)
+
+
+def test_streaming_batched(gateway, hw_man, local_broker):
+    """Make sure reports are coalesced into batches when configured."""
+
+    agent = gateway.agents[0]
+    agent.report_batch_count = 10
+    agent.report_batch_interval = 0.05
+
+    hw_man.connect(3, wait=0.1)
+    hw_man.enable_streaming()
+    reps = hw_man.wait_reports(100, timeout=1.0)
+
+    assert len(reps) == 100
+
+    readings = [x.visible_readings[0].value for x in reps]
+    assert readings == sorted(readings)
+
+    topic = 'devices/d--0000-0000-0000-0002/devices/d--0000-0000-0000-0003/data/streaming'
+    assert len(local_broker.messages[topic]) <= 11
+
+
+def test_streaming_batch_fragments(gateway, hw_man, local_broker):
+    """Make sure large report batches are fragmented and reassembled."""
+
+    agent = gateway.agents[0]
+    agent.report_batch_count = 100
+    agent.report_fragment_size = 64
+    agent.report_batch_interval = 0.05
+
+    hw_man.connect(3, wait=0.1)
+    hw_man.enable_streaming()
+    reps = hw_man.wait_reports(100, timeout=1.0)
+
+    assert len(reps) == 100
+
+    topic = 'devices/d--0000-0000-0000-0002/devices/d--0000-0000-0000-0003/data/streaming'
+    assert len(local_broker.messages[topic]) > 1
@@ -0,0 +1,187 @@
+import json
+import time
+import threading
+from iotile_transport_awsiot.packet_queue import PacketQueue
+from iotile_transport_awsiot.mqtt_client import OrderedAWSIOTClient
+from iotile_transport_awsiot.connection_manager import ConnectionManager
+
+
+def _build_queue(timeout=None, window=None):
+    received = []
+    queue = PacketQueue(timeout, lambda x: received.append(x), max_window=window)
+    return queue, received
+
+
+def test_in_order():
+    """Make sure in order packets are delivered immediately."""
+
+    queue, received = _build_queue()
+
+    for i in range(0, 10):
+        queue.receive(i, [i])
+
+    assert received == list(range(0, 10))
+    assert queue.reordered_count == 0
+    assert queue.pending_count == 0
+
+
+def test_reordering():
+    """Make sure out of order packets are reordered."""
+
+    queue, received = _build_queue()
+
+    for i in [0, 3, 2, 5, 1, 4]:
+        queue.receive(i, [i])
+
+    assert received == list(range(0, 6))
+    assert queue.reordered_count == 3
+    assert queue.pending_count == 0
+
+
+def test_drop_duplicates():
+    """Make sure old and duplicate packets are dropped."""
+
+    queue, received = _build_queue()
+
+    for i in [0, 1, 0, 3, 3, 1, 2]:
+        queue.receive(i, [i])
+
+    assert received == [0, 1, 2, 3]
+    assert queue.dropped_count == 3
+
+
+def test_window_skips_holes():
+    """Make sure we stop waiting for missing packets outside of our window."""
+
+    queue, received = _build_queue(window=4)
+
+    for i in [0, 2, 3, 4]:
+        queue.receive(i, [i])
+
+    assert received == [0]
+    assert queue.pending_count == 3
+
+    queue.receive(5, [5])
+    assert received == [0, 2, 3, 4, 5]
+    assert queue.skipped_count == 1
+
+    # The skipped packet is now in the past
+    queue.receive(1, [1])
+    assert received == [0, 2, 3, 4, 5]
+    assert queue.dropped_count == 1
+
+
+def test_timeout_skips_holes():
+    """Make sure we stop waiting for missing packets after a timeout."""
+
+    queue, received = _build_queue(timeout=0.05)
+
+    for i in [0, 3, 4]:
+        queue.receive(i, [i])
+
+    assert received == [0]
+    assert queue.check_timeout() is False
+
+    time.sleep(0.1)
+    assert queue.check_timeout() is True
+    assert received == [0, 3, 4]
+    assert queue.skipped_count == 2
+
+
+def test_reset():
+    """Make sure resetting clears pending packets."""
+
+    queue, received = _build_queue()
+
+    for i in [5, 7, 8]:
+        queue.receive(i, [i])
+
+    queue.reset()
+    assert queue.pending_count == 0
+    assert queue.dropped_count == 2
+
+    queue.receive(0, [0])
+    assert received == [5, 0]
+
+
+def test_unordered():
+    """Make sure unordered queues pass everything through."""
+
+    received = []
+    queue = PacketQueue(0, lambda x: received.append(x), False)
+
+    for i in [2, 1, 1, 0]:
+        queue.receive(i, [i])
+
+    assert received == [2, 1, 1, 0]
+
+
+class _FakeMQTTClient(object):
+    def subscribe(self, topic, qos, callback):
+        pass
+
+
+class _FakeMessage(object):
+    def __init__(self, topic, sequence):
+        self.topic = topic
+        self.payload = json.dumps({'sequence': sequence, 'message': {'index': sequence}})
+
+
+def test_periodic_timeout_check():
+    """Make sure packets behind a lost packet are delivered without receiving another packet."""
+
+    received = []
+
+    client = OrderedAWSIOTClient({'certificate': 'cert', 'private_key': 'key', 'root_certificate': 'root',
+                                  'endpoint': 'endpoint', 'missing_packet_timeout': 0.05})
+    client.client = _FakeMQTTClient()
+    client.subscribe('devices/test', lambda seq, topic, message: received.append(seq))
+
+    for i in [0, 2, 3]:
+        client._on_receive(None, None, _FakeMessage('devices/test', i))
+
+    assert received == [0]
+
+    manager = ConnectionManager(0)
+    manager.add_periodic_callback(client.check_timeouts)
+    manager.start()
+
+    try:
+        start = time.time()
+        while len(received) < 3 and time.time() - start < 2.0:
+            time.sleep(0.01)
+    finally:
+        manager.stop()
+
+    assert received == [0, 2, 3]
+    assert client.packet_statistics()['skipped'] == 1
+
+
+def test_timeout_callbacks_without_lock():
+    """Make sure expired packets are delivered without holding the queue lock."""
+
+    received = []
+
+    client = OrderedAWSIOTClient({'certificate': 'cert', 'private_key': 'key', 'root_certificate': 'root',
+                                  'endpoint': 'endpoint', 'missing_packet_timeout': 0.01})
+    client.client = _FakeMQTTClient()
+
+    def _on_packet(seq, topic, message):
+        # Another thread using the client must not block while we handle a packet
+        thread = threading.Thread(target=client.reset_sequence, args=('devices/other',))
+        thread.start()
+        thread.join(1.0)
+        received.append((seq, thread.is_alive()))
+
+        if seq == 2:
+            client._on_receive(None, None, _FakeMessage('devices/test', 4))
+
+    client.subscribe('devices/test', _on_packet)
+
+    for i in [0, 2, 3]:
+        client._on_receive(None, None, _FakeMessage('devices/test', i))
+
+    time.sleep(0.02)
+    client.check_timeouts()
+
+    assert received == [(0, False), (2, False), (3, False), (4, False)]
@@ -0,0 +1,41 @@
+import datetime
+import pytest
+from iotile.core.exceptions import ArgumentError
+from iotile.core.hw.reports import IndividualReadingReport, IOTileReading
+from iotile_transport_awsiot.report_batch import pack_report, unpack_reports
+
+
+def _make_report(value):
+    reading = IOTileReading(value, 0x1000, value)
+    report = IndividualReadingReport.FromReadings(10, [reading])
+    report.received_time = datetime.datetime(2019, 1, 2, 3, 4, 5, 678901)
+    return report
+
+
+def test_batch_roundtrip():
+    """Make sure we can pack and unpack a batch of reports."""
+
+    reports = [_make_report(i) for i in range(0, 5)]
+    batch = b''.join(pack_report(x.serialize()) for x in reports)
+
+    unpacked = unpack_reports(batch)
+    assert len(unpacked) == 5
+
+    for report, serialized in zip(reports, unpacked):
+        orig = report.serialize()
+        assert serialized['encoded_report'] == orig['encoded_report']
+        assert serialized['report_format'] == orig['report_format']
+        assert serialized['origin'] == orig['origin']
+        assert serialized['received_time'] == orig['received_time']
+
+
+def test_truncated_batch():
+    """Make sure we raise an error on truncated batches."""
+
+    batch = pack_report(_make_report(1).serialize())
+
+    with pytest.raises(ArgumentError):
+        unpack_reports(batch[:-1])
+
+    with pytest.raises(ArgumentError):
+        unpack_reports(batch[:5])
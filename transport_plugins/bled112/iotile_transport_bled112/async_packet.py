@@ -15,15 +15,27 @@ class AsyncPacketBuffer:
         Given an underlying file like object, synchronously read from it
         in a separate thread and communicate the data back to the buffer
         one packet at a time.
+
+        If notify is set to a callable, it is called from the reader thread
+        after every packet is queued so that consumers can sleep until there
+        is something to do instead of polling the queue.
         """
 
         self.queue = Queue()
         self.file = filelike
+        self.notify = None
         self._stop = Event()
 
-        self._thread = Thread(target=ReaderThread, args=(filelike, self.queue, header_length, length_function, self._stop))
+        self._thread = Thread(target=ReaderThread, args=(filelike, self._on_packet, header_length, length_function, self._stop))
         self._thread.start()
 
+    def _on_packet(self, packet):
+        self.queue.put(packet)
+
+        notify = self.notify
+        if notify is not None:
+            notify()
+
     def write(self, value):
         try:
             self.file.write(value)
@@ -52,7 +64,7 @@ class AsyncPacketBuffer:
             raise InternalTimeoutError("Timeout waiting for packet in AsyncPacketBuffer")
 
 
-def ReaderThread(filelike, read_queue, header_length, length_function, stop):
+def ReaderThread(filelike, on_packet, header_length, length_function, stop):
     logger = logging.getLogger(__name__)
 
     while not stop.is_set():
@@ -82,6 +94,6 @@ def ReaderThread(filelike, read_queue, header_length, length_function, stop):
 
             #We have a complete packet now, process it
             packet = header + remaining
-            read_queue.put(packet)
+            on_packet(packet)
         except:
             logger.exception("Error in reader thread")
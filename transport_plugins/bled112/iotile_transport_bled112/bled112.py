@@ -8,6 +8,7 @@ import threading
 import logging
 import datetime
 import copy
+import struct
 from future.utils import viewitems
 import serial
 import serial.tools.list_ports
@@ -17,11 +18,20 @@ from iotile.core.utilities.packed import unpack
 from iotile.core.exceptions import HardwareError
 from iotile.core.hw.reports import IOTileReportParser, IOTileReading, BroadcastReport
 from iotile.core.hw.transport.adapter import DeviceAdapter
+from iotile.core.hw.transport.advertisement import AdvertisementCache, decode_v1_advertisement, decode_v1_scan_response, \
+                                                  decode_v2_advertisement, scan_content, V1_ADVERT_MANU_OFFSET, \
+                                                  V1_SCAN_RESPONSE_MANU_OFFSET
 from .bled112_cmd import BLED112CommandProcessor
 from .tilebus import TileBusService, TileBusStreamingCharacteristic, TileBusTracingCharacteristic, TileBusHighSpeedCharacteristic
 from .async_packet import AsyncPacketBuffer
 
 
+# rssi, packet type, sender address, address type, bond
+ScanEventHeader = struct.Struct("<bB6sBB")
+
+TileBusServiceUUID = TileBusService.bytes_le
+
+
 def packet_length(header):
     """Find the BGAPI packet length given its header"""
 
@@ -35,11 +45,10 @@ class BLED112Adapter(DeviceAdapter):
     """Callback based BLED112 wrapper supporting multiple simultaneous connections.
 
     Optional Keyword Args:
-        stop_check_interval (float): When we close this adapter instance, we need to
-            notify our worker thread with a stop signal.  This is the interval at which
-            the worker thread checks for the signal.  It defaults to 0.5s but is set to
-            a faster value like 10 ms during testing to make tests run faster.  Lower
-            values increase CPU usage in production.
+        stop_check_interval (float): The longest time the worker thread sleeps
+            without checking for commands, packets or a stop signal.  It is woken
+            up as soon as any of these arrive, so this defaults to None, meaning
+            that an idle worker thread never wakes up.
     """
 
     ExpirationTime = 60  # Expire devices 60 seconds after seeing them
@@ -48,7 +57,7 @@ class BLED112Adapter(DeviceAdapter):
         super(BLED112Adapter, self).__init__()
 
         # Get optional configuration flags
-        stop_check_interval = kwargs.get('stop_check_interval', 0.1)
+        stop_check_interval = kwargs.get('stop_check_interval', None)
 
         # Make sure that if someone tries to connect to a device immediately after creating the adapter
         # we tell them we need time to accumulate device advertising packets first
@@ -84,13 +93,16 @@ class BLED112Adapter(DeviceAdapter):
         # in case a scanned device is seen immediately.
         self.partial_scan_responses = {}
 
-        self._broadcast_state = {}
+        self._advertisements = AdvertisementCache(config.get('bled112:scan-refresh-interval'))
         self._connections = {}
 
         self.count_lock = threading.Lock()
         self.connecting_count = 0
         self.maximum_connections = 0
 
+        # Statistics about the last script sent, see BLED112CommandProcessor._send_script
+        self.last_script_stats = None
+
         self._scan_event_count = 0
         self._v1_scan_count = 0
         self._v1_scan_response_count = 0
@@ -333,6 +345,9 @@ class BLED112Adapter(DeviceAdapter):
         else:
             failure = None
 
+        if success:
+            self.last_script_stats = retval
+
         callback(context['connection_id'], self.id, success, failure)
 
     def _send_rpc_finished(self, result):
@@ -554,20 +569,18 @@ class BLED112Adapter(DeviceAdapter):
         v2: There is only an advertisement and no scan response.
         """
 
-        payload = response.payload
-        length = len(payload) - 10
+        # On python 2 the payload may be a str, whose items are 1 character
+        # strings that would never compare equal to the ints we check below
+        payload = bytearray(response.payload)
 
-        if length < 0:
+        if len(payload) < ScanEventHeader.size:
             return
 
-        rssi, packet_type, sender, _addr_type, _bond, data = unpack("<bB6sBB%ds" % length, payload)
-        string_address = ':'.join([format(x, "02X") for x in bytearray(sender[::-1])])
+        rssi, packet_type, sender, _addr_type, _bond = ScanEventHeader.unpack_from(payload)
+        string_address = self._advertisements.address(bytes(sender))
 
         # Scan data is prepended with a length
-        if len(data) > 0:
-            data = bytearray(data[1:])
-        else:
-            data = bytearray([])
+        data = payload[ScanEventHeader.size + 1:]
 
         self._scan_event_count += 1
 
@@ -589,6 +602,12 @@ class BLED112Adapter(DeviceAdapter):
             self._v1_scan_response_count += 1
             self._parse_v1_scan_response(string_address, data)
 
+    def _report_scan(self, info):
+        """Report a scanned device unless it has not changed since we last reported it."""
+
+        if self._advertisements.scan_changed(info['connection_string'], scan_content(info), time.time()):
+            self._trigger_callback('on_scan', self.id, info, self.ExpirationTime)
+
     def _parse_v2_advertisement(self, rssi, sender, data):
         """ Parse the IOTile Specific advertisement packet"""
 
@@ -598,73 +617,24 @@ class BLED112Adapter(DeviceAdapter):
         # We have already verified that the device is an IOTile device
         # by checking its service data uuid in _process_scan_event so
         # here we just parse out the required information
+        info, broadcast = decode_v2_advertisement(data, sender, rssi)
 
-        device_id, reboot_low, reboot_high_packed, flags, timestamp, \
-        battery, counter_packed, broadcast_stream_packed, broadcast_value, \
-        _mac = unpack("<LHBBLBBHLL", data[7:])
-
-        reboots = (reboot_high_packed & 0xF) << 16 | reboot_low
-        counter = counter_packed & ((1 << 5) - 1)
-        broadcast_multiplex = counter_packed >> 5
-        broadcast_toggle = broadcast_stream_packed >> 15
-        broadcast_stream = broadcast_stream_packed & ((1 << 15) - 1)
-
-        # Flags for version 2 are:
-        #   bit 0: Has pending data to stream
-        #   bit 1: Low voltage indication
-        #   bit 2: User connected
-        #   bit 3: Broadcast data is encrypted
-        #   bit 4: Encryption key is device key
-        #   bit 5: Encryption key is user key
-        #   bit 6: broadcast data is time synchronized to avoid leaking
-        #   information about when it changes
-
-        self._device_scan_counts.setdefault(device_id, {'v1': 0, 'v2': 0})['v2'] += 1
-
-        info = {'connection_string': sender,
-                'uuid': device_id,
-                'pending_data': bool(flags & (1 << 0)),
-                'low_voltage': bool(flags & (1 << 1)),
-                'user_connected': bool(flags & (1 << 2)),
-                'signal_strength': rssi,
-                'reboot_counter': reboots,
-                'sequence': counter,
-                'broadcast_toggle': broadcast_toggle,
-                'timestamp': timestamp,
-                'battery': battery / 32.0,
-                'advertising_version':2}
-
-        self._trigger_callback('on_scan', self.id, info, self.ExpirationTime)
+        self._device_scan_counts.setdefault(info['uuid'], {'v1': 0, 'v2': 0})['v2'] += 1
+        self._report_scan(info)
 
         # If there is a valid reading on the advertising data, broadcast it
-        if broadcast_stream != 0xFFFF & ((1 << 15) - 1):
+        if broadcast is not None:
+            broadcast_stream, broadcast_value, broadcast_multiplex = broadcast
+            timestamp = info['timestamp']
+
             if self._throttle_broadcast and \
-               self._check_update_seen_broadcast(sender, timestamp, broadcast_stream, broadcast_value,
-                                                 broadcast_toggle, counter=counter, channel=broadcast_multiplex):
+               not self._advertisements.broadcast_changed(sender, broadcast_multiplex, (info['broadcast_toggle'], info['sequence'])):
                 return
 
             reading = IOTileReading(timestamp, broadcast_stream, broadcast_value, reading_time=datetime.datetime.utcnow())
             report = BroadcastReport.FromReadings(info['uuid'], [reading], timestamp)
             self._trigger_callback('on_report', None, report)
 
-    def _check_update_seen_broadcast(self, sender, device_time, stream, value, toggle=None, counter=None, channel=0):
-        key = (sender, channel)
-
-        info = self._broadcast_state.get(key)
-
-        if info is not None:
-            old_time, old_stream, old_value, old_toggle, old_counter = info
-
-            if toggle is not None and counter is not None:
-                if old_toggle == toggle and old_counter == counter:
-                    return True
-            else:
-                if old_value == value and old_stream == stream and old_time == device_time:
-                    return True
-
-        self._broadcast_state[key] = (device_time, stream, value, toggle, counter)
-        return False
-
     def _parse_v1_advertisement(self, rssi, sender, advert):
         if len(advert) != 31:
             return
@@ -673,34 +643,16 @@ class BLED112Adapter(DeviceAdapter):
         if advert[3] != 17 or advert[4] != 6:
             return
 
-
         # Make sure the uuid is our tilebus UUID
-        if advert[5:21] == TileBusService.bytes_le:
-            # Now parse out the manufacturer specific data
-            manu_data = advert[21:]
-
-            _length, _datatype, _manu_id, device_uuid, flags = unpack("<BBHLH", manu_data)
-
-            self._device_scan_counts.setdefault(device_uuid, {'v1': 0, 'v2': 0})['v1'] += 1
-
-            # Flags for version 1 are:
-            #   bit 0: whether we have pending data
-            #   bit 1: whether we are in a low voltage state
-            #   bit 2: whether another user is connected
-            #   bit 3: whether we support robust reports
-            #   bit 4: whether we allow fast writes
-            info = {'connection_string': sender,
-                    'uuid': device_uuid,
-                    'pending_data': bool(flags & (1 << 0)),
-                    'low_voltage': bool(flags & (1 << 1)),
-                    'user_connected': bool(flags & (1 << 2)),
-                    'signal_strength': rssi,
-                    'advertising_version': 1}
+        if advert[5:21] == TileBusServiceUUID:
+            info = decode_v1_advertisement(advert, sender, rssi, V1_ADVERT_MANU_OFFSET)
+
+            self._device_scan_counts.setdefault(info['uuid'], {'v1': 0, 'v2': 0})['v1'] += 1
 
             if self._active_scan:
                 self.partial_scan_responses[sender] = info
             else:
-                self._trigger_callback('on_scan', self.id, info, self.ExpirationTime)
+                self._report_scan(info)
 
     def _parse_v1_scan_response(self, sender, scan_data):
         if len(scan_data) != 31:
@@ -711,17 +663,17 @@ class BLED112Adapter(DeviceAdapter):
             return
 
         # Check if this is a scan response packet from an iotile based device
-        _length, _datatype, _manu_id, voltage, stream, reading, reading_time, curr_time = unpack("<BBHHHLLL11x", scan_data)
+        voltage, stream, reading, reading_time, curr_time = decode_v1_scan_response(scan_data, V1_SCAN_RESPONSE_MANU_OFFSET)
 
-        info['voltage'] = voltage / 256.0
+        info['voltage'] = voltage
         info['current_time'] = curr_time
         info['last_seen'] = datetime.datetime.now()
 
-        self._trigger_callback('on_scan', self.id, info, self.ExpirationTime)
+        self._report_scan(info)
 
         # If there is a valid reading on the advertising data, broadcast it
         if stream != 0xFFFF:
-            if self._throttle_broadcast and self._check_update_seen_broadcast(sender, reading_time, stream, reading):
+            if self._throttle_broadcast and not self._advertisements.broadcast_changed(sender, 0, (reading_time, stream, reading)):
                 return
 
             reading = IOTileReading(reading_time, stream, reading, reading_time=datetime.datetime.utcnow())
@@ -19,7 +19,12 @@ BGAPIPacket = namedtuple("BGAPIPacket", ["is_event", "command_class", "command",
 
 
 class BLED112CommandProcessor(threading.Thread):
-    def __init__(self, stream, commands, stop_check_interval=0.01):
+    BufferFullError = 0x182
+    MinScriptGap = 0.002
+    ScriptGapDecay = 0.875
+    MaxBufferFullRetries = 100
+
+    def __init__(self, stream, commands, stop_check_interval=None):
         super(BLED112CommandProcessor, self).__init__()
 
         self._stream = stream
@@ -32,49 +37,65 @@ class BLED112CommandProcessor(threading.Thread):
         self._current_callback = None
         self._stop_event_check_interval = stop_check_interval
 
+        self._wakeup = threading.Event()
+        self._stream.notify = self._wakeup.set
+
     def run(self):
         while not self._stop_event.is_set():
-            try:
+            # We are woken up whenever a packet arrives from the dongle, a
+            # command is queued or we are stopped, so there is no need to poll
+            # unless a stop_check_interval was explicitly given.
+            self._wakeup.wait(self._stop_event_check_interval)
+            self._wakeup.clear()
+
+            while not self._stop_event.is_set():
                 self._process_events()
-                cmdargs, callback, _, context = self._commands.get(timeout=self._stop_event_check_interval)
-                cmd = cmdargs[0]
 
-                if len(cmdargs) > 0:
-                    args = cmdargs[1:]
-                else:
-                    args = []
+                try:
+                    cmdargs, callback, _, context = self._commands.get_nowait()
+                except Empty:
+                    break
+
+                self._execute_command(cmdargs, callback, context)
+
+    def _execute_command(self, cmdargs, callback, context):
+        cmd = cmdargs[0]
 
-                self._current_context = context
-                self._current_callback = callback
+        try:
+            if len(cmdargs) > 0:
+                args = cmdargs[1:]
+            else:
+                args = []
+
+            self._current_context = context
+            self._current_callback = callback
 
-                if hasattr(self, cmd):
-                    res = getattr(self, cmd)(*args)
-                else:
-                    pass #FIXME: Log an error for an invalid command
+            if hasattr(self, cmd):
+                res = getattr(self, cmd)(*args)
+            else:
+                pass #FIXME: Log an error for an invalid command
 
-                inprogress = False
+            inprogress = False
 
-                if len(res) == 2:
-                    result, retval = res
-                else:
-                    result, retval, inprogress = res
+            if len(res) == 2:
+                result, retval = res
+            else:
+                result, retval, inprogress = res
 
-                self._current_context = None
-                self._current_callback = None
+            self._current_context = None
+            self._current_callback = None
 
-                result_obj = {}
-                result_obj['command'] = cmd
-                result_obj['result'] = bool(result)
-                result_obj['return_value'] = retval
-                result_obj['context'] = context
+            result_obj = {}
+            result_obj['command'] = cmd
+            result_obj['result'] = bool(result)
+            result_obj['return_value'] = retval
+            result_obj['context'] = context
 
-                if callback and inprogress is not True:
-                    callback(result_obj)
-            except Empty:
-                pass
-            except:
-                self._logger.exception("Error executing command: %s", cmd)
-                raise
+            if callback and inprogress is not True:
+                callback(result_obj)
+        except:
+            self._logger.exception("Error executing command: %s", cmd)
+            raise
 
     def _set_scan_parameters(self, interval=2100, window=2100, active=False):
         """
@@ -422,31 +443,106 @@ class BLED112CommandProcessor(threading.Thread):
 
         return True, None
 
-    def _send_script(self, conn, services, data, curr_loc, progress_callback):
-        hschar = services[TileBusService]['characteristics'][TileBusHighSpeedCharacteristic]['handle']
+    def _send_script(self, conn, services, data, curr_loc, progress_callback, burst_size=32, max_gap=0.1, state=None):
+        """Send a script to a device over the high speed characteristic.
 
-        chunk_size = 20
-        if len(data) - curr_loc < 20:
-            chunk_size = len(data) - curr_loc
+        Chunks are sent back to back as unacknowledged writes so that the
+        dongle always has packets buffered for the next connection event.
+        After each burst of up to burst_size chunks, this command puts itself
+        back on the command queue with the current offset and pacing state so
+        that commands for other connections on the same dongle are not held
+        up for the entire upload.
 
-        chunk = data[curr_loc:curr_loc+chunk_size]
-        success, reason = self._write_handle(conn, hschar, False, chunk)
+        If the dongle tells us its buffers are full (error 0x182), the burst
+        ends and the same chunk is retried after a gap that doubles on each
+        error up to max_gap.  The gap is also left between subsequent writes
+        and shrinks a little after each successful one, so the upload settles
+        at the rate that the link can actually sustain.  Other queued commands
+        are run while we wait for the gap to pass.
 
-        if not success:
-            if 'error_code' in reason and reason['error_code'] == 0x182: #If we are streaming too fast, back off and try again
-                time.sleep(0.1)
-                self.async_command(['_send_script', conn, services, data, curr_loc, progress_callback], self._current_callback, self._current_context)
-                return True, None, True
-            else:
-                return False, reason
+        Args:
+            conn (int): The connection handle for the device
+            services (dict): The services that were probed on the device
+            data (bytes): The script to send
+            curr_loc (int): The offset in data to start sending from
+            progress_callback (callable): Called as progress_callback(done, total)
+                with the number of 20 byte chunks sent so far
+            burst_size (int): The maximum number of chunks to send before
+                returning to the command queue and reporting progress
+            max_gap (float): The maximum time in seconds to wait between
+                writes when the dongle reports that its buffers are full
+            state (dict): The pacing state and statistics carried from the
+                previous burst.  This should be None when starting a script.
 
-        progress_callback(curr_loc // 20, len(data) // 20)
+        Returns:
+            (bool, dict): Whether the script was sent and either the reason it
+                was not or statistics about the transfer.
+        """
 
-        if curr_loc + chunk_size != len(data):
-            self.async_command(['_send_script', conn, services, data, curr_loc+chunk_size, progress_callback], self._current_callback, self._current_context)
+        hschar = services[TileBusService]['characteristics'][TileBusHighSpeedCharacteristic]['handle']
+        total_chunks = len(data) // 20
+
+        if state is None:
+            state = {'start_loc': curr_loc, 'start_time': time.time(), 'resume_time': 0.0, 'gap': 0.0,
+                     'retries': 0, 'consecutive_errors': 0}
+
+        def _continue():
+            self.async_command(['_send_script', conn, services, data, curr_loc, progress_callback, burst_size, max_gap, state],
+                               self._current_callback, self._current_context)
             return True, None, True
 
-        return True, None
+        # Wait out the gap left by the last burst, but let any other command
+        # that is queued in the meantime run first.  The run loop processes
+        # events and drains the queue after we return, so clearing the
+        # wakeup event here cannot lose a notification.
+        wait = state['resume_time'] - time.time()
+        if wait > 0:
+            self._wakeup.clear()
+            self._wakeup.wait(wait)
+
+            if time.time() < state['resume_time']:
+                return _continue()
+
+        sent_chunks = 0
+        while curr_loc < len(data) and sent_chunks < burst_size:
+            chunk = data[curr_loc:curr_loc+20]
+            success, reason = self._write_handle(conn, hschar, False, chunk)
+
+            if not success:
+                if reason.get('error_code') != self.BufferFullError:
+                    return False, reason
+
+                state['consecutive_errors'] += 1
+                if state['consecutive_errors'] > self.MaxBufferFullRetries:
+                    return False, {'reason': 'Too many buffer full errors sending script', 'error_code': self.BufferFullError}
+
+                state['retries'] += 1
+                state['gap'] = min(max(state['gap']*2, self.MinScriptGap), max_gap)
+                state['resume_time'] = time.time() + state['gap']
+                break
+
+            state['consecutive_errors'] = 0
+            curr_loc += len(chunk)
+            sent_chunks += 1
+
+            if state['gap'] > 0:
+                state['resume_time'] = time.time() + state['gap']
+                state['gap'] *= self.ScriptGapDecay
+                if state['gap'] < self.MinScriptGap:
+                    state['gap'] = 0.0
+                break
+
+        progress_callback(curr_loc // 20, total_chunks)
+
+        if curr_loc < len(data):
+            return _continue()
+
+        duration = time.time() - state['start_time']
+        sent = curr_loc - state['start_loc']
+        rate = sent / duration if duration > 0 else 0.0
+
+        self._logger.info("Sent script of %d bytes in %.2f seconds (%.0f bytes/s, %d retries)", sent, duration, rate, state['retries'])
+        return True, {'bytes_sent': sent, 'duration': duration, 'bytes_per_second': rate, 'retries': state['retries']}
 
     def _send_rpc(self, conn, services, address, rpc_id, payload, timeout=5.0):
         header_char = services[TileBusService]['characteristics'][TileBusSendHeaderCharacteristic]
@@ -725,6 +821,7 @@ class BLED112CommandProcessor(threading.Thread):
 
     def stop(self):
         self._stop_event.set()
+        self._wakeup.set()
         self.join()
 
     def sync_command(self, cmd):
@@ -736,6 +833,7 @@ class BLED112CommandProcessor(threading.Thread):
             done_event.set()
 
         self._commands.put((cmd, done_callback, True, None))
+        self._wakeup.set()
 
         done_event.wait()
 
@@ -748,23 +846,15 @@ class BLED112CommandProcessor(threading.Thread):
 
     def async_command(self, cmd, callback, context):
         self._commands.put((cmd, callback, False, context))
+        self._wakeup.set()
 
     def _process_events(self, return_filter=None, max_events=0):
         to_return = []
         try:
             while True:
-                event_data = self._stream.queue.get_nowait()
-                event = BGAPIPacket(is_event=(event_data[0] == 0x80), command_class=event_data[2],
-                                    command=event_data[3], payload=event_data[4:])
-
-                if not event.is_event:
-                    self._logger.error('Received response when we should have only received events, %s',event)
-                elif return_filter is not None and return_filter(event):
+                event = self._dispatch_event(self._stream.queue.get_nowait(), return_filter)
+                if event is not None:
                     to_return.append(event)
-                elif self.event_handler is not None:
-                    self.event_handler(event)
-                else:
-                    self._logger.info("Dropping event that had no evnt handler: %s", event)
 
                 if max_events > 0 and len(to_return) == max_events:
                     return to_return
@@ -773,9 +863,29 @@ class BLED112CommandProcessor(threading.Thread):
 
         return to_return
 
+    def _dispatch_event(self, event_data, return_filter):
+        """Process a single event, returning it if it matches return_filter."""
+
+        event = BGAPIPacket(is_event=(event_data[0] == 0x80), command_class=event_data[2],
+                            command=event_data[3], payload=event_data[4:])
+
+        if not event.is_event:
+            self._logger.error('Received response when we should have only received events, %s',event)
+        elif return_filter is not None and return_filter(event):
+            return event
+        elif self.event_handler is not None:
+            self.event_handler(event)
+        else:
+            self._logger.info("Dropping event that had no evnt handler: %s", event)
+
+        return None
+
     def _wait_process_events(self, total_time, return_filter, end_filter):
         """Synchronously process events until a specific event is found or we timeout
 
+        We block on the packet queue so we are woken up as soon as the reader
+        thread receives each event rather than polling for them.
+
         Args:
             total_time (float): The aproximate maximum number of seconds we should wait for the end event
             return_filter (callable): A function that returns True for events we should return and not process
@@ -788,20 +898,24 @@ class BLED112CommandProcessor(threading.Thread):
         """
 
         acc = []
-        delta = 0.01
+        end_time = time.time() + total_time
 
-        start_time = time.time()
-        end_time = start_time + total_time
+        while True:
+            remaining = end_time - time.time()
+            if remaining <= 0:
+                break
 
-        while time.time() < end_time:
-            events = self._process_events(lambda x: return_filter(x) or end_filter(x), max_events=1)
-            acc += events
+            try:
+                event_data = self._stream.queue.get(timeout=remaining)
+            except Empty:
+                break
 
-            for event in events:
-                if end_filter(event):
-                    return acc
+            event = self._dispatch_event(event_data, lambda x: return_filter(x) or end_filter(x))
+            if event is None:
+                continue
 
-            if len(events) == 0:
-                time.sleep(delta)
+            acc.append(event)
+            if end_filter(event):
+                return acc
 
         return acc
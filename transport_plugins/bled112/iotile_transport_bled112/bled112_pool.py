@@ -0,0 +1,344 @@
+# This file is copyright Arch Systems, Inc.
+# Except as otherwise provided in the relevant LICENSE file, all rights are reserved.
+
+from __future__ import unicode_literals, absolute_import, print_function
+import time
+import functools
+import threading
+import logging
+from future.utils import viewitems
+from iotile.core.hw.transport.adapter import DeviceAdapter
+from .bled112 import BLED112Adapter
+
+
+class BLED112PoolAdapter(DeviceAdapter):
+    """A single logical adapter that spreads its work across multiple BLED112 dongles.
+
+    Each dongle is managed by its own BLED112Adapter with its own command
+    thread, so RPCs, scripts and streaming to devices on different dongles
+    proceed in parallel.  Each new connection goes to the dongle with the most
+    free connection slots among those that heard the device within
+    rssi_margin dB of the strongest signal, so connections are spread evenly
+    without putting a device on a dongle that can barely hear it.
+
+    A BLED112 stops scanning while it has any connections, so when the pool
+    has more than one dongle the first one is used only for scanning by
+    default.  That keeps devices visible no matter how many connections the
+    other dongles are serving.
+
+    Args:
+        port (str): A ';' separated list of serial ports with one BLED112 on
+            each, or None or '<auto>' to use every BLED112 on this computer.
+
+    Optional Keyword Args:
+        dedicated_scanner (bool): Reserve the first dongle for scanning.
+            Defaults to True if there is more than one dongle.
+        rssi_margin (int): Dongles whose signal strength to a device is within
+            this many dB of the best one are considered equally good.
+        stop_check_interval (float): Passed to each BLED112Adapter.
+        passive (bool): Passed to each BLED112Adapter.
+    """
+
+    ExpirationTime = BLED112Adapter.ExpirationTime
+    UnknownSignalStrength = -128
+
+    def __init__(self, port, on_scan=None, on_disconnect=None, passive=None, **kwargs):
+        super(BLED112PoolAdapter, self).__init__()
+
+        self.set_config('minimum_scan_time', 2.0)
+
+        if on_scan is not None:
+            self.add_callback('on_scan', on_scan)
+
+        if on_disconnect is not None:
+            self.add_callback('on_disconnect', on_disconnect)
+
+        if port is None or port == '<auto>':
+            ports = BLED112Adapter.find_bled112_devices()
+        else:
+            ports = [x.strip() for x in port.split(';') if len(x.strip()) > 0]
+
+        if len(ports) == 0:
+            raise ValueError("Could not find any BLED112 adapters to use in the pool")
+
+        self._logger = logging.getLogger(__name__)
+        self._logger.addHandler(logging.NullHandler())
+
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._signal_strength = {}
+        self._rssi_margin = kwargs.get('rssi_margin', 10)
+
+        dedicated_scanner = kwargs.get('dedicated_scanner', len(ports) > 1)
+        self._first_connector = 1 if (dedicated_scanner and len(ports) > 1) else 0
+
+        dongle_args = {}
+        if 'stop_check_interval' in kwargs:
+            dongle_args['stop_check_interval'] = kwargs['stop_check_interval']
+
+        self.dongles = []
+        self._assigned = []
+
+        try:
+            for i, dongle_port in enumerate(ports):
+                # Dongles start scanning as soon as they are created so the scan
+                # callback must be bound to the dongle's index up front.
+                on_scan = functools.partial(self._on_dongle_scan, i)
+                dongle = BLED112Adapter(dongle_port, on_scan, self._on_dongle_disconnect, passive=passive, **dongle_args)
+                dongle.set_id(i)
+                dongle.add_callback('on_report', self._on_dongle_report)
+                dongle.add_callback('on_trace', self._on_dongle_trace)
+
+                self.dongles.append(dongle)
+                self._assigned.append(0)
+        except:
+            for dongle in self.dongles:
+                dongle.stop_sync()
+            raise
+
+        self._logger.info("Started BLED112 pool with %d dongles (%d for connections)", len(self.dongles), len(self.dongles) - self._first_connector)
+
+    @property
+    def maximum_connections(self):
+        """The total number of connections that the pool can hold."""
+
+        return sum(dongle.maximum_connections for dongle in self.dongles[self._first_connector:])
+
+    def connection_counts(self):
+        """Get the number of connections assigned to each dongle.
+
+        Returns:
+            list of int: The number of connections on each dongle, in order.
+        """
+
+        with self._lock:
+            return list(self._assigned)
+
+    def can_connect(self):
+        """Check if any of our dongles can take another connection
+
+        Returns:
+            bool: whether there is room for one more connection
+        """
+
+        with self._lock:
+            return any(self._free_slots(i) > 0 for i in range(self._first_connector, len(self.dongles)))
+
+    def stop_sync(self):
+        """Safely stop all of the dongles in this pool."""
+
+        for dongle in self.dongles:
+            dongle.stop_sync()
+
+        with self._lock:
+            self._connections = {}
+
+    def periodic_callback(self):
+        """Periodic cleanup tasks to maintain each dongle, should be called every second
+        """
+
+        for dongle in self.dongles:
+            dongle.periodic_callback()
+
+    def connect_async(self, connection_id, connection_string, callback):
+        """Connect to a device using the best dongle for it
+
+        See BLED112Adapter.connect_async for more details.
+
+        Args:
+            connection_id (int): A unique integer set by the caller for referring to this connection
+                once created
+            connection_string (string): A BLE address is XX:YY:ZZ:AA:BB:CC format
+            callback (callable): A callback function called when the connection has succeeded or
+                failed
+        """
+
+        with self._lock:
+            index = self._choose_dongle(connection_string)
+            if index is not None:
+                self._assigned[index] += 1
+                self._connections[connection_id] = index
+
+        if index is None:
+            callback(connection_id, self.id, False, 'No free connection slots on any BLED112 in the pool')
+            return
+
+        self._logger.debug("Connecting to %s using dongle %d", connection_string, index)
+
+        def _on_connect_finished(conn_id, _adapter_id, success, failure_reason):
+            if not success:
+                self._release_connection(conn_id)
+
+            callback(conn_id, self.id, success, failure_reason)
+
+        self.dongles[index].connect_async(connection_id, connection_string, _on_connect_finished)
+
+    def disconnect_async(self, conn_id, callback):
+        """Asynchronously disconnect from a device that has previously been connected
+
+        Args:
+            conn_id (int): a unique identifier for this connection on the DeviceManager
+                that owns this adapter.
+            callback (callable): A function called as callback(conn_id, adapter_id, success, failure_reason)
+            when the disconnection finishes.  Disconnection can only either succeed or timeout.
+        """
+
+        dongle = self._find_dongle(conn_id)
+        if dongle is None:
+            callback(conn_id, self.id, False, 'Invalid connection_id')
+            return
+
+        def _on_disconnect_finished(conn_id, _adapter_id, success, failure_reason):
+            self._release_connection(conn_id)
+            callback(conn_id, self.id, success, failure_reason)
+
+        dongle.disconnect_async(conn_id, _on_disconnect_finished)
+
+    def open_interface_async(self, conn_id, interface, callback, connection_string=None):
+        """Open an interface on the dongle that holds this connection
+
+        See DeviceAdapter.open_interface_async for more details.
+        """
+
+        dongle = self._find_dongle(conn_id)
+        if dongle is None:
+            callback(conn_id, self.id, False, 'Invalid connection_id')
+            return
+
+        dongle.open_interface_async(conn_id, interface, self._translate_callback(callback), connection_string)
+
+    def send_rpc_async(self, conn_id, address, rpc_id, payload, timeout, callback):
+        """Send an RPC using the dongle that holds this connection
+
+        See BLED112Adapter.send_rpc_async for more details.
+        """
+
+        dongle = self._find_dongle(conn_id)
+        if dongle is None:
+            callback(conn_id, self.id, False, 'Invalid connection_id', None, None)
+            return
+
+        dongle.send_rpc_async(conn_id, address, rpc_id, payload, timeout, self._translate_callback(callback))
+
+    def send_script_async(self, conn_id, data, progress_callback, callback):
+        """Send a script using the dongle that holds this connection
+
+        See BLED112Adapter.send_script_async for more details.
+        """
+
+        dongle = self._find_dongle(conn_id)
+        if dongle is None:
+            callback(conn_id, self.id, False, 'Invalid connection_id')
+            return
+
+        dongle.send_script_async(conn_id, data, progress_callback, self._translate_callback(callback))
+
+    def _translate_callback(self, callback):
+        """Wrap a dongle callback so that it reports our adapter id instead of the dongle's."""
+
+        def _translated(conn_id, _adapter_id, *args):
+            callback(conn_id, self.id, *args)
+
+        return _translated
+
+    def _find_dongle(self, conn_id):
+        with self._lock:
+            index = self._connections.get(conn_id)
+
+        if index is None:
+            return None
+
+        return self.dongles[index]
+
+    def _release_connection(self, conn_id):
+        with self._lock:
+            index = self._connections.pop(conn_id, None)
+            if index is not None:
+                self._assigned[index] -= 1
+
+    def _free_slots(self, index):
+        return self.dongles[index].maximum_connections - self._assigned[index]
+
+    def _choose_dongle(self, connection_string):
+        """Pick the dongle that a new connection should be made on.
+
+        Must be called with self._lock held.
+
+        Returns:
+            int: The index of the dongle to use or None if all dongles are full.
+        """
+
+        now = time.time()
+        heard = self._signal_strength.get(connection_string, {})
+
+        candidates = []
+        for i in range(self._first_connector, len(self.dongles)):
+            free = self._free_slots(i)
+            if free <= 0:
+                continue
+
+            rssi, seen = heard.get(i, (self.UnknownSignalStrength, 0))
+            if now - seen > self.ExpirationTime:
+                rssi = self.UnknownSignalStrength
+
+            candidates.append((i, rssi, free))
+
+        if len(candidates) == 0:
+            return None
+
+        best_rssi = max(rssi for _, rssi, _ in candidates)
+        close_enough = [x for x in candidates if x[1] >= best_rssi - self._rssi_margin]
+
+        index, _rssi, _free = max(close_enough, key=lambda x: (x[2], x[1]))
+        return index
+
+    def _on_dongle_scan(self, dongle_id, _adapter_id, info, expiry):
+        connection_string = info.get('connection_string')
+        rssi = info.get('signal_strength')
+
+        if connection_string is not None and rssi is not None:
+            with self._lock:
+                self._signal_strength.setdefault(connection_string, {})[dongle_id] = (rssi, time.time())
+
+        self._trigger_callback('on_scan', self.id, info, expiry)
+
+    def _on_dongle_disconnect(self, _dongle_id, connection_id):
+        self._release_connection(connection_id)
+        self._trigger_callback('on_disconnect', self.id, connection_id)
+
+    def _on_dongle_report(self, connection_id, report):
+        self._trigger_callback('on_report', connection_id, report)
+
+    def _on_dongle_trace(self, connection_id, trace):
+        self._trigger_callback('on_trace', connection_id, trace)
+
+    def get_scan_stats(self):
+        """Return the combined scan event statistics for all dongles
+
+        See BLED112Adapter.get_scan_stats for the meaning of each value.
+        """
+
+        totals = [0, 0, 0, 0]
+        device_counts = {}
+        elapsed = 0.0
+
+        for dongle in self.dongles:
+            stats = dongle.get_scan_stats()
+
+            for i in range(0, 4):
+                totals[i] += stats[i]
+
+            for device, counts in viewitems(stats[4]):
+                dev_totals = device_counts.setdefault(device, {'v1': 0, 'v2': 0})
+                dev_totals['v1'] += counts['v1']
+                dev_totals['v2'] += counts['v2']
+
+            elapsed = max(elapsed, stats[5])
+
+        return totals[0], totals[1], totals[2], totals[3], device_counts, elapsed
+
+    def reset_scan_stats(self):
+        """Clear the scan event statistics on all dongles"""
+
+        for dongle in self.dongles:
+            dongle.reset_scan_stats()
@@ -8,5 +8,6 @@ def get_variables():
     conf_vars = []
     conf_vars.append(["active-scan", "bool", "Probe devices during scan for uptime, voltage and broadcast data", "false"])
     conf_vars.append(["throttle-broadcast", "bool", "Only report changing broadcast values, not all values", "false"])
+    conf_vars.append(["scan-refresh-interval", "float", "Seconds between scan results for a device whose advertisement has not changed, 0 reports every advertisement", "5.0"])
 
     return prefix, conf_vars
@@ -80,7 +80,7 @@ class BLED112VirtualInterface(VirtualIOTileInterface):
         self._serial_port = serial.Serial(port, 256000, timeout=0.01, rtscts=True)
         self._stream = AsyncPacketBuffer(self._serial_port, header_length=4, length_function=packet_length)
         self._commands = Queue()
-        self._command_task = BLED112CommandProcessor(self._stream, self._commands, stop_check_interval=0.01)
+        self._command_task = BLED112CommandProcessor(self._stream, self._commands)
         self._command_task.event_handler = self._handle_event
         self._command_task.start()
 
@@ -418,6 +418,8 @@ class BLED112VirtualInterface(VirtualIOTileInterface):
                     self.rpc_payload += bytearray(20 - len(self.rpc_payload))
             elif handle == self.SendHeaderHandle:
                 self._defer(self._call_rpc, [bytearray(value)])
+            elif handle == self.HighspeedHandle:
+                self.device.push_script_chunk(bytearray(value))
 
     def _call_rpc(self, header):
         """Call an RPC given a header and possibly a previously sent payload
@@ -13,7 +13,8 @@ setup(
         "pyserial>=3.1.1"
     ],
 
-    entry_points={'iotile.device_adapter': ['bled112 = iotile_transport_bled112.bled112:BLED112Adapter'],
+    entry_points={'iotile.device_adapter': ['bled112 = iotile_transport_bled112.bled112:BLED112Adapter',
+                                           'bled112_pool = iotile_transport_bled112.bled112_pool:BLED112PoolAdapter'],
                   'iotile.virtual_interface': ['bled112 = iotile_transport_bled112.virtual_bled112:BLED112VirtualInterface'],
                   'iotile.config_variables': ['bled112 = iotile_transport_bled112.config_variables:get_variables']},
     description="IOTile BLED112 Transport Plugin",
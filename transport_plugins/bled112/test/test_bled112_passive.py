@@ -1,12 +1,14 @@
 from __future__ import unicode_literals, absolute_import, print_function
 import unittest
 import threading
+import time
 import serial
-from util.mock_bled112 import MockBLED112
+from util.mock_bled112 import MockBLED112, BGAPIPacket as MockBGAPIPacket
 from iotile.mock.mock_ble import MockBLEDevice
 from iotile.mock.mock_iotile import MockIOTileDevice
 import util.dummy_serial
 from iotile_transport_bled112.bled112 import BLED112Adapter
+from iotile_transport_bled112.bled112_cmd import BGAPIPacket
 
 class TestBLED112AdapterPassive(unittest.TestCase):
     """
@@ -51,3 +53,35 @@ class TestBLED112AdapterPassive(unittest.TestCase):
         self._scanned_devices_seen.wait(timeout=1.0)
         assert self.num_scanned_devices == 1
         assert 'voltage' not in self.scanned_devices[0]
+
+    def test_scanning_bytes_payload(self):
+        """Make sure advertisements are decoded when packets arrive as bytes.
+
+        On python 2 pyserial returns str, which indexes as 1 character
+        strings rather than ints.
+        """
+
+        self._scanned_devices_seen.wait(timeout=1.0)
+        count = self.bled._v1_scan_count
+
+        for info in self.adapter.advertise():
+            raw = bytes(MockBGAPIPacket.GeneratePacket(info))
+            event = BGAPIPacket(is_event=True, command_class=6, command=0, payload=raw[4:])
+            self.bled._handle_event(event)
+
+        assert self.bled._v1_scan_count == count + 1
+
+    def test_scanning_without_polling(self):
+        """Make sure the command processor wakes up for events and commands instead of polling."""
+
+        self.bled.stop_sync()
+        self._scanned_devices_seen.clear()
+
+        bled = BLED112Adapter('test', self._on_scan_callback, self._on_disconnect_callback)
+        assert self._scanned_devices_seen.wait(timeout=1.0)
+
+        start = time.time()
+        bled.stop_sync()
+        assert time.time() - start < 1.0
+
+        self.bled = BLED112Adapter('test', self._on_scan_callback, self._on_disconnect_callback, stop_check_interval=0.01)
@@ -0,0 +1,117 @@
+from __future__ import unicode_literals, absolute_import, print_function
+import unittest
+import threading
+import time
+import serial
+from util.mock_bled112 import MockBLED112
+from iotile.mock.mock_ble import MockBLEDevice
+from iotile.mock.mock_iotile import MockIOTileDevice
+import util.dummy_serial
+from iotile_transport_bled112.bled112_pool import BLED112PoolAdapter
+
+
+class TestBLED112Pool(unittest.TestCase):
+    """
+    Test to make sure that the BLED112PoolAdapter spreads work across dongles
+    """
+
+    def setUp(self):
+        self.old_serial = serial.Serial
+        serial.Serial = util.dummy_serial.Serial
+
+        self.dev1 = MockIOTileDevice(100, 'TestCN')
+        self.dev2 = MockIOTileDevice(101, 'TestCN')
+
+        self.mocks = {'scanner': MockBLED112(3), 'dongle1': MockBLED112(1), 'dongle2': MockBLED112(1)}
+
+        # Each dongle hears the devices with a different signal strength
+        self.rssi = {'scanner': (-50, -50), 'dongle1': (-40, -85), 'dongle2': (-80, -45)}
+
+        for name, mock in self.mocks.items():
+            ble1 = MockBLEDevice("00:11:22:33:44:55", self.dev1)
+            ble2 = MockBLEDevice("00:11:22:33:44:66", self.dev2)
+            ble1.rssi, ble2.rssi = self.rssi[name]
+            mock.add_device(ble1)
+            mock.add_device(ble2)
+
+        util.dummy_serial.RESPONSE_GENERATOR = {name: mock.generate_response for name, mock in self.mocks.items()}
+
+        self.scanned_devices = []
+        self.pool = BLED112PoolAdapter('scanner;dongle1;dongle2', self._on_scan_callback, self._on_disconnect_callback,
+                                       stop_check_interval=0.01)
+        self.pool.set_id(5)
+
+        self._wait_for_scans()
+
+    def tearDown(self):
+        self.pool.stop_sync()
+        serial.Serial = self.old_serial
+
+    def _wait_for_scans(self):
+        end = time.time() + 2.0
+        while time.time() < end:
+            heard = self.pool._signal_strength
+            if all(len(heard.get(x, {})) == 3 for x in ["00:11:22:33:44:55", "00:11:22:33:44:66"]):
+                return
+
+            time.sleep(0.01)
+
+    def _on_scan_callback(self, ad_id, info, expiry):
+        self.scanned_devices.append((ad_id, info))
+
+    def _on_disconnect_callback(self, *args, **kwargs):
+        pass
+
+    def test_scanning(self):
+        """Make sure scan results from every dongle are forwarded by the pool."""
+
+        uuids = [info['uuid'] for _ad_id, info in self.scanned_devices]
+        assert uuids.count(100) == 3
+        assert uuids.count(101) == 3
+        assert self.pool.maximum_connections == 2
+
+    def test_connection_placement(self):
+        """Make sure connections go to the dongle with the best signal and free slots."""
+
+        result = self.pool.connect_sync(1, "00:11:22:33:44:66")
+        assert result['success'] is True
+        assert self.pool.connection_counts() == [0, 0, 1]
+
+        result = self.pool.connect_sync(2, "00:11:22:33:44:55")
+        assert result['success'] is True
+        assert self.pool.connection_counts() == [0, 1, 1]
+
+        assert not self.pool.can_connect()
+
+        result = self.pool.connect_sync(3, "00:11:22:33:44:55")
+        assert result['success'] is False
+
+        result = self.pool.disconnect_sync(1)
+        assert result['success'] is True
+        assert self.pool.connection_counts() == [0, 1, 0]
+        assert self.pool.can_connect()
+
+    def test_parallel_rpcs(self):
+        """Make sure we can send RPCs to devices on different dongles at the same time."""
+
+        assert self.pool.connect_sync(1, "00:11:22:33:44:55")['success'] is True
+        assert self.pool.connect_sync(2, "00:11:22:33:44:66")['success'] is True
+
+        assert self.pool.open_interface_sync(1, 'rpc')['success'] is True
+        assert self.pool.open_interface_sync(2, 'rpc')['success'] is True
+
+        results = {}
+
+        def _send_rpcs(conn_id):
+            results[conn_id] = [self.pool.send_rpc_sync(conn_id, 8, 0x0004, bytearray([]), timeout=1.0) for _ in range(5)]
+
+        threads = [threading.Thread(target=_send_rpcs, args=(conn_id,)) for conn_id in (1, 2)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        for conn_id in (1, 2):
+            assert len(results[conn_id]) == 5
+            assert all(x['success'] is True for x in results[conn_id])
@@ -59,6 +59,27 @@ class TestBLED112RPCs(unittest.TestCase):
         assert result['success'] is True
         assert self._current == self._total
         assert self._total == (1027 // 20)
+        assert self.bled.last_script_stats['bytes_sent'] == len(script)
+        assert self.bled.last_script_stats['bytes_per_second'] > 0
+
+    def test_send_script_buffer_full(self):
+        """Make sure we retry chunks the dongle could not buffer without corrupting the script."""
+
+        self.adapter.buffer_full_every = 7
+
+        result = self.bled.connect_sync(1, "00:11:22:33:44:55")
+        assert result['success'] is True
+
+        result = self.bled.open_interface_sync(1, 'script')
+        assert result['success'] is True
+
+        script = bytes(bytearray(x % 256 for x in range(0, 2000)))
+        result = self.bled.send_script_sync(1, script, self._script_progress)
+
+        assert result['success'] is True
+        assert self.adapter.buffer_full_count > 0
+        assert self.dev1.script == script
+        assert self._current == self._total
 
     def _script_progress(self, current, total):
         self._current = current
@@ -36,3 +36,45 @@ class TestBLED112Loopback(unittest.TestCase):
 
         self.hw.enable_streaming()
         assert self.hw.count_reports() == 11
+
+
+
+@pytest.mark.skipif(not can_loopback, reason='You need two BLED112 adapters for loopback tests')
+class TestBLED112ScriptLoopback(unittest.TestCase):
+    """Send a script over a real link to a device served by virtual_bled112."""
+
+    def setUp(self):
+        self.vdev = subprocess.Popen(['virtual_device', 'bled112', 'report_test'])
+
+        self.scanned_devices = {}
+        bleds = BLED112Adapter.find_bled112_devices()
+        self.bled = BLED112Adapter(bleds[1], on_scan=self._on_scan_callback)
+
+    def tearDown(self):
+        self.bled.stop_sync()
+        self.vdev.terminate()
+
+    def _on_scan_callback(self, ad_id, info, expiry):
+        self.scanned_devices[info['uuid']] = info
+
+    def test_send_script(self):
+        time.sleep(2)
+        assert 1 in self.scanned_devices
+
+        result = self.bled.connect_sync(1, self.scanned_devices[1]['connection_string'])
+        assert result['success'] is True
+
+        result = self.bled.open_interface_sync(1, 'script')
+        assert result['success'] is True
+
+        script = bytes(bytearray(x % 256 for x in range(0, 20000)))
+        result = self.bled.send_script_sync(1, script, lambda done, total: None)
+        assert result['success'] is True
+
+        stats = self.bled.last_script_stats
+        assert stats['bytes_sent'] == len(script)
+        assert stats['bytes_per_second'] == pytest.approx(len(script) / stats['duration'])
+
+        # Even at the slowest connection interval we request (125 ms), at
+        # least one 20 byte write fits in every connection event
+        assert stats['bytes_per_second'] > 20 / 0.125
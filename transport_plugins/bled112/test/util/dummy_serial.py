@@ -162,8 +162,13 @@ class Serial():
             raise IOError('Dummy_serial: Trying to write, but the port is not open. Given:' + repr(inputdata))
 
         # Look up which data that should be waiting for subsequent read commands
+        # RESPONSE_GENERATOR may also be a dict of generators keyed by port name
+        generator = RESPONSE_GENERATOR
+        if isinstance(generator, dict):
+            generator = generator[self.initial_port_name]
+
         try:
-            response = RESPONSE_GENERATOR(inputstring)
+            response = generator(inputstring)
         except:
             self._logger.exception("Error generating response")
             raise
@@ -121,7 +121,7 @@ class BGAPIPacket(object):
             if code == 'X':
                 code = '6s'
                 val = val.replace(':', '')
-                val = binascii.unhexlify(val)
+                val = binascii.unhexlify(val)[::-1]  # BLE addresses are sent little endian
             elif code == 'A':
                 arrlen = len(val)
                 code = '%ds' % (arrlen+1)
@@ -181,6 +181,9 @@ class MockBLED112(object):
         self.active_scan = False
         self.scanning = False
         self.connecting = False
+        self.buffer_full_every = 0
+        self.buffer_full_count = 0
+        self._write_commands = 0
         self._logger = logging.getLogger(__name__)
 
     def add_device(self, device):
@@ -298,6 +301,13 @@ class MockBLED112(object):
             resp = {'type': bgapi_resp(4, 6), 'handle': handle, 'result': 0x186} #0x186 is handle not connected
             return [resp]
 
+        # Simulate the dongle running out of transmit buffers periodically
+        self._write_commands += 1
+        if self.buffer_full_every > 0 and self._write_commands % self.buffer_full_every == 0:
+            self.buffer_full_count += 1
+            resp = {'type': bgapi_resp(4, 6), 'handle': handle, 'result': 0x182} #0x182 is out of buffers
+            return [resp]
+
         packets = []
         resp = {'type': bgapi_resp(4, 6), 'handle': handle, 'result': 0}
         packets.append(resp)
@@ -5,6 +5,7 @@
 
 from __future__ import (unicode_literals, absolute_import, print_function)
 import logging
+import threading
 import pylink
 from future.utils import viewkeys
 from typedargs.exceptions import ArgumentError
@@ -201,7 +202,7 @@ class JLinkAdapter(DeviceAdapter):
             finally:
                 callback(self.id, True, None)
 
-        self._control_thread.command(JLinkControlThread.FIND_CONTROL, _on_finished, self._device_info.ram_start, self._device_info.ram_size)
+        self._control_thread.command(JLinkControlThread.VERIFY_CONTROL, _on_finished, self._device_info, self._control_info)
 
     def debug_async(self, conn_id, cmd_name, cmd_args, progress_callback, callback):
         """Asynchronously complete a named debug command.
@@ -341,9 +342,66 @@ class JLinkAdapter(DeviceAdapter):
 
             callback(conn_id, self.id, True, None, retval['status'], retval['payload'])
 
-        # Default to polling for the response every 1 millisecond
-        # FIXME, add an exponential polling backoff so that we wait 1, 2, 4, 8, etc ms
-        self._control_thread.command(JLinkControlThread.SEND_RPC, _on_finished, self._device_info, self._control_info, address, rpc_id, payload, 0.001, timeout)
+        self._control_thread.command(JLinkControlThread.SEND_RPC, _on_finished, self._device_info, self._control_info, address, rpc_id, payload, timeout)
+
+    def send_rpcs_async(self, conn_id, rpcs, timeout, callback):
+        """Asynchronously send a batch of RPCs to this IOTile device.
+
+        The RPCs are sent one after another by the jlink control thread
+        without returning to the caller in between, which avoids a thread
+        handoff and callback per RPC when many RPCs need to be sent at once.
+        The batch stops at the first RPC that fails.
+
+        Args:
+            conn_id (int): A unique identifer that will refer to this connection
+            rpcs (list of (int, int, bytearray)): The address, rpc_id and payload of
+                each RPC to send, in order.
+            timeout (float): the number of seconds to wait for each RPC to execute
+            callback (callable): A callback for when we have finished all of the RPCs.
+                The callback will be called as"
+                callback(connection_id, adapter_id, success, failure_reason, responses)
+                'connection_id': the connection id
+                'adapter_id': this adapter's id
+                'success': a bool indicating whether we received a response to every RPC
+                'failure_reason': a string with the reason for the failure if success == False
+                'responses': a list of (status, payload) tuples for each RPC if success == True
+                    else None
+        """
+
+        def _on_finished(_name, retval, exception):
+            if exception is not None:
+                callback(conn_id, self.id, False, str(exception), None)
+                return
+
+            callback(conn_id, self.id, True, None, [(x['status'], x['payload']) for x in retval])
+
+        self._control_thread.command(JLinkControlThread.SEND_RPCS, _on_finished, self._device_info, self._control_info, rpcs, timeout)
+
+    def send_rpcs_sync(self, conn_id, rpcs, timeout):
+        """Synchronously send a batch of RPCs to this IOTile device.
+
+        See send_rpcs_async for more details.
+
+        Returns:
+            dict: A dictionary with three elements
+                'success': a bool indicating whether every RPC succeeded
+                'failure_reason': a string with the reason for the failure if success == False
+                'responses': a list of (status, payload) tuples for each RPC
+        """
+
+        done = threading.Event()
+        result = {}
+
+        def _send_rpcs_done(_conn_id, _adapter_id, success, reason, responses):
+            result['success'] = success
+            result['failure_reason'] = reason
+            result['responses'] = responses
+            done.set()
+
+        self.send_rpcs_async(conn_id, rpcs, timeout, _send_rpcs_done)
+        done.wait()
+
+        return result
 
     def send_script_async(self, conn_id, data, progress_callback, callback):
         """Asynchronously send a a script to this IOTile device
@@ -19,6 +19,10 @@ logger.addHandler(logging.NullHandler())
 
 JLinkCommand = namedtuple("JLinkCommand", ['name', 'args', 'callback'])
 
+# Where the control structure was last found, keyed by device type and firmware fingerprint.
+# Entries are always revalidated before use so a stale entry only costs one small read.
+_control_cache = {}
+
 
 class JLinkControlThread(threading.Thread):
     """A class that synchronously executes long-running commands on a jlink.
@@ -35,13 +39,15 @@ class JLinkControlThread(threading.Thread):
     DUMP_ALL_RAM = 5
     PROGRAM_FLASH = 6
     SEND_SCRIPT = 7
+    SEND_RPCS = 8
 
     KNOWN_COMMANDS = {
         STOP: None,
         READ_MEMORY: "_read_memory",
         FIND_CONTROL: "_find_control_structure",
         VERIFY_CONTROL: "_verify_control_structure",  # Takes device_info, (optional) control_info parameters
-        SEND_RPC: "_send_rpc",  # Takes control_info, address, rpc_id, payload, poll_interval, timeout
+        SEND_RPC: "_send_rpc",  # Takes device_info, control_info, address, rpc_id, payload, timeout
+        SEND_RPCS: "_send_rpcs",  # Takes device_info, control_info, rpcs, timeout
         SEND_SCRIPT: "_send_script",  # Takes  device_info, control_info, script, progress_callback
 
         # Debug commands
@@ -49,6 +55,19 @@ class JLinkControlThread(threading.Thread):
         PROGRAM_FLASH: "_program_flash" # Takes device_info, control_info (ignored), args {'data': binary}
     }
 
+    # How many bytes of RAM to read at a time while searching for the control structure
+    SEARCH_BLOCK_SIZE = 4096
+
+    # How many bytes at the start of flash identify a firmware build
+    FINGERPRINT_LENGTH = 32
+
+    # How long to poll continuously for an RPC response before backing off
+    RPC_SPIN_TIME = 0.002
+
+    # The first and largest delays between polls once we start backing off
+    MIN_POLL_INTERVAL = 0.0005
+    MAX_POLL_INTERVAL = 0.032
+
     def __init__(self, jlink):
         super(JLinkControlThread, self).__init__()
 
@@ -110,7 +129,7 @@ class JLinkControlThread(threading.Thread):
         """Tell this thread to stop, do not wait for it to finish."""
         self._commands.put(JLinkCommand(JLinkControlThread.STOP, None, None))
 
-    def _send_rpc(self, device_info, control_info, address, rpc_id, payload, poll_interval, timeout):
+    def _send_rpc(self, device_info, control_info, address, rpc_id, payload, timeout):
         """Write and trigger an RPC."""
 
         write_address, write_data = control_info.format_rpc(address, rpc_id, payload)
@@ -118,27 +137,60 @@ class JLinkControlThread(threading.Thread):
 
         self._trigger_rpc(device_info)
 
-        start = monotonic()
-        now = start
+        return self._wait_rpc_response(control_info, timeout)
 
-        poll_address, poll_mask = control_info.poll_info()
+    def _send_rpcs(self, device_info, control_info, rpcs, timeout):
+        """Send a list of RPCs back to back.
 
-        while (now - start) < timeout:
-            time.sleep(poll_interval)
-            value, = self._jlink.memory_read8(poll_address, 1)
+        Each RPC is written to the device as soon as the previous one
+        finishes, without going back through the command queue in between.
 
-            if value & poll_mask:
-                break
+        Args:
+            rpcs (list of (int, int, bytes)): The address, rpc_id and payload of each RPC.
+            timeout (float): The maximum time to wait for each RPC.
 
-            now = monotonic()
+        Returns:
+            list of dict: The response to each RPC, see ControlStructure.format_response.
+        """
+
+        responses = []
+        for address, rpc_id, payload in rpcs:
+            try:
+                responses.append(self._send_rpc(device_info, control_info, address, rpc_id, payload, timeout))
+            except HardwareError as exc:
+                raise HardwareError("Error sending RPC %d of %d in batch: %s" % (len(responses) + 1, len(rpcs), exc.msg),
+                                    address=address, rpc_id=rpc_id, completed=len(responses))
 
-        if (now - start) >= timeout:
-            raise HardwareError("Timeout waiting for RPC response", timeout=timeout, poll_interval=poll_interval)
+        return responses
+
+    def _wait_rpc_response(self, control_info, timeout):
+        """Poll until the device finishes an RPC and return its response.
+
+        Most RPCs finish within a few milliseconds so we poll continuously at
+        first and then back off exponentially so that long running RPCs do
+        not keep the jlink busy.  Each poll reads the entire response block,
+        so the response is already in hand when the completion flag is seen.
+        """
 
         read_address, read_length = control_info.response_info()
-        read_data = self._read_memory(read_address, read_length, join=True)
+        poll_address, poll_mask = control_info.poll_info()
+        flag_offset = poll_address - read_address
+
+        start = monotonic()
+        interval = self.MIN_POLL_INTERVAL
 
-        return control_info.format_response(read_data)
+        while True:
+            read_data = self._read_memory(read_address, read_length)
+            if bytearray(read_data)[flag_offset] & poll_mask:
+                return control_info.format_response(read_data)
+
+            elapsed = monotonic() - start
+            if elapsed >= timeout:
+                raise HardwareError("Timeout waiting for RPC response", timeout=timeout)
+
+            if elapsed >= self.RPC_SPIN_TIME:
+                time.sleep(min(interval, timeout - elapsed))
+                interval = min(interval * 2, self.MAX_POLL_INTERVAL)
 
     def _send_script(self, device_info, control_info, script, progress_callback):
         """Send a script by repeatedly sending it as a bunch of RPCs.
@@ -147,9 +199,9 @@ class JLinkControlThread(threading.Thread):
         with each chunk of the script until it's finished.
         """
 
-        for i in xrange(0, len(script), 20):
+        for i in range(0, len(script), 20):
             chunk = script[i:i+20]
-            self._send_rpc(device_info, control_info, 8, 0x2101, chunk, 0.001, 1.0)
+            self._send_rpc(device_info, control_info, 8, 0x2101, chunk, 1.0)
             if progress_callback is not None:
                 progress_callback(i + len(chunk), len(script))
 
@@ -214,49 +266,89 @@ class JLinkControlThread(threading.Thread):
     def _find_control_structure(self, start_address, search_length):
         """Find the control structure in RAM for this device.
 
+        The search window is read in large blocks and searched for the
+        control structure's magic numbers with bytes.find, stopping as soon
+        as they are found.
+
         Returns:
             ControlStructure: The decoded contents of the shared memory control structure
                 used for communication with this IOTile device.
         """
 
-        words = self._read_memory(start_address, search_length, chunk_size=4, join=False)
+        magic = ControlStructure.CONTROL_MAGIC
+        data = b''
+        search_start = 0
         found_offset = None
 
-        for i, word in enumerate(words):
-            if word == ControlStructure.CONTROL_MAGIC_1:
-                if (len(words) - i) < 4:
-                    continue
+        for block_start in range(0, search_length, self.SEARCH_BLOCK_SIZE):
+            block_length = min(self.SEARCH_BLOCK_SIZE, search_length - block_start)
+            data += self._read_memory(start_address + block_start, block_length)
 
-                if words[i + 1] == ControlStructure.CONTROL_MAGIC_2 and words[i + 2] == ControlStructure.CONTROL_MAGIC_3 and words[i + 3] == ControlStructure.CONTROL_MAGIC_4:
-                    found_offset = i
-                    break
+            offset = data.find(magic, search_start)
+            while offset >= 0 and offset % 4 != 0:
+                offset = data.find(magic, offset + 1)
+
+            if offset >= 0:
+                found_offset = offset
+                break
+
+            # Leave enough of the block behind to match magic that spans two blocks
+            search_start = max(0, len(data) - len(magic) + 1)
 
         if found_offset is None:
             raise HardwareError("Could not find control structure magic value in search area")
 
-        struct_info = words[found_offset + 4]
-        _version, _flags, length = struct.unpack("<BBH", struct.pack("<L", struct_info))
+        address = start_address + found_offset
+        header = self._read_memory(address, ControlStructure.HEADER_LENGTH)
+        length = ControlStructure.decode_length(header)
 
-        if length % 4 != 0:
-            raise HardwareError("Invalid control structure length that was not a multiple of 4", length=length)
+        control_info = self._read_control_structure(address, length)
+        logger.info("Found control stucture at address 0x%08X, length=%d", address, length)
+        return control_info
 
-        word_length = length // 4
-        control_data = struct.pack("<%dL" % word_length, *words[found_offset:found_offset + word_length])
+    def _read_control_structure(self, address, length):
+        """Read and decode a control structure at a known address."""
 
-        logger.info("Found control stucture at address 0x%08X, word_length=%d", start_address + 4*found_offset, word_length)
+        control_data = self._read_memory(address, length)
+        return ControlStructure(address, control_data)
 
-        return ControlStructure(start_address + 4*found_offset, control_data)
+    def _firmware_fingerprint(self, device_info):
+        """Read a few bytes that identify the firmware image loaded on the device.
+
+        The start of flash holds the vector table, which changes whenever a
+        different firmware build is loaded.
+        """
+
+        return self._read_memory(device_info.flash_start, self.FINGERPRINT_LENGTH)
 
     def _verify_control_structure(self, device_info, control_info=None):
         """Verify that a control structure is still valid or find one.
 
+        If we do not already have a control structure, we look for the
+        address where it was last found on this type of device running this
+        firmware build.  A known address is checked by rereading just the
+        control structure there.  Only if that fails is all of RAM searched.
+
         Returns:
             ControlStructure: The verified or discovered control structure.
         """
 
-        if control_info is None:
-            control_info = self._find_control_structure(device_info.ram_start, device_info.ram_size)
+        fingerprint = None
+        if control_info is not None:
+            known = (control_info.base_address, control_info.length)
+        else:
+            fingerprint = self._firmware_fingerprint(device_info)
+            known = _control_cache.get((device_info.jlink_name, fingerprint))
 
-        #FIXME: Actually reread the memory here to verify that the control structure is still valid
-        return control_info
+        if known is not None:
+            try:
+                return self._read_control_structure(*known)
+            except HardwareError:
+                logger.info("Control structure at cached address 0x%08X is no longer valid", known[0])
 
+        if fingerprint is None:
+            fingerprint = self._firmware_fingerprint(device_info)
+
+        control_info = self._find_control_structure(device_info.ram_start, device_info.ram_size)
+        _control_cache[(device_info.jlink_name, fingerprint)] = (control_info.base_address, control_info.length)
+        return control_info
@@ -18,6 +18,12 @@ class ControlStructure(object):
     CONTROL_MAGIC_3 = 0x4e43656c
     CONTROL_MAGIC_4 = 0xBBBBBBBB
 
+    # The magic numbers as they appear in little endian device memory
+    CONTROL_MAGIC = struct.pack("<LLLL", CONTROL_MAGIC_1, CONTROL_MAGIC_2, CONTROL_MAGIC_3, CONTROL_MAGIC_4)
+
+    # The magic numbers followed by the version, flags and length
+    HEADER_LENGTH = 20
+
     KNOWN_VERSIONS = frozenset([1])
 
     # The offset from the start of our debug info to where the tb_fabric_tls_t structure is located
@@ -33,6 +39,7 @@ class ControlStructure(object):
 
         self.version = version
         self.flags = flags
+        self.length = length
 
         if len(raw_data) < length:
             raise HardwareError("Control structure raw data is too short for encoded length", encoded_length=length, received_length=len(raw_data))
@@ -44,6 +51,27 @@ class ControlStructure(object):
 
         self._parse_control_structure(raw_data)
 
+    @classmethod
+    def decode_length(cls, header):
+        """Get the total length of a control structure from its header.
+
+        Args:
+            header (bytes): At least the first HEADER_LENGTH bytes of the
+                control structure.
+
+        Returns:
+            int: The length of the control structure in bytes.
+        """
+
+        _version, _flags, length = struct.unpack_from("<BBH", header, len(cls.CONTROL_MAGIC))
+        if length % 4 != 0:
+            raise HardwareError("Invalid control structure length that was not a multiple of 4", length=length)
+
+        if length < cls.HEADER_LENGTH + 4:
+            raise HardwareError("Invalid control structure length that was too short", length=length)
+
+        return length
+
     def _parse_control_structure(self, data):
         # Skip the header information
         data = data[20:]
@@ -0,0 +1,107 @@
+"""Tests of control structure discovery and caching over jlink."""
+
+import pytest
+from iotile.core.exceptions import HardwareError
+from iotile_transport_jlink.devices import NRF52
+from iotile_transport_jlink.jlink_background import JLinkControlThread
+import iotile_transport_jlink.jlink_background as jlink_background
+from util.fake_jlink import FakeJLink
+
+
+@pytest.fixture
+def fake_jlink():
+    """Create a fake jlink with a control structure and an empty cache."""
+
+    jlink_background._control_cache.clear()
+
+    jlink = FakeJLink(NRF52)
+    jlink.load_firmware(b'firmware build 1' * 4)
+
+    yield jlink
+
+    jlink_background._control_cache.clear()
+
+
+def test_find_control_structure(fake_jlink):
+    """Make sure we find the control structure without reading all of RAM."""
+
+    address = fake_jlink.place_control_structure(0x1800, 0x1234)
+    thread = JLinkControlThread(fake_jlink)
+
+    control = thread._find_control_structure(NRF52.ram_start, NRF52.ram_size)
+    assert control.base_address == address
+    assert control.uuid == 0x1234
+    assert control.length == 64
+    assert fake_jlink.bytes_read() < NRF52.ram_size // 4
+
+
+def test_find_control_structure_across_blocks(fake_jlink):
+    """Make sure magic numbers split between two search blocks are found."""
+
+    offset = JLinkControlThread.SEARCH_BLOCK_SIZE - 8
+    address = fake_jlink.place_control_structure(offset, 0x55)
+
+    # Unaligned copies of the magic number should be ignored
+    fake_jlink.ram[0x101:0x111] = bytearray(16)
+    fake_jlink.ram[0x102:0x112] = fake_jlink.ram[offset:offset + 16]
+
+    thread = JLinkControlThread(fake_jlink)
+    control = thread._find_control_structure(NRF52.ram_start, NRF52.ram_size)
+    assert control.base_address == address
+
+
+def test_find_control_structure_missing(fake_jlink):
+    """Make sure we raise an error if there is no control structure."""
+
+    thread = JLinkControlThread(fake_jlink)
+
+    with pytest.raises(HardwareError):
+        thread._find_control_structure(NRF52.ram_start, NRF52.ram_size)
+
+
+def test_cached_control_structure(fake_jlink):
+    """Make sure a second connection reuses the discovered address."""
+
+    address = fake_jlink.place_control_structure(0x8000, 0x1234)
+    thread = JLinkControlThread(fake_jlink)
+
+    control = thread._verify_control_structure(NRF52)
+    assert control.base_address == address
+
+    del fake_jlink.reads[:]
+    control = JLinkControlThread(fake_jlink)._verify_control_structure(NRF52)
+    assert control.base_address == address
+    assert control.uuid == 0x1234
+    assert fake_jlink.reads == [(NRF52.flash_start, JLinkControlThread.FINGERPRINT_LENGTH), (address, 64)]
+
+    # If we already have a control structure, only that is reread
+    del fake_jlink.reads[:]
+    control = thread._verify_control_structure(NRF52, control)
+    assert control.base_address == address
+    assert fake_jlink.reads == [(address, 64)]
+
+
+def test_stale_control_structure(fake_jlink):
+    """Make sure we search again when the control structure moves."""
+
+    old_address = fake_jlink.place_control_structure(0x8000, 0x1234)
+    thread = JLinkControlThread(fake_jlink)
+    control = thread._verify_control_structure(NRF52)
+    assert control.base_address == old_address
+
+    # The same firmware build moved its control structure, e.g. after a reset
+    fake_jlink.ram[0x8000:0x8040] = bytearray(64)
+    new_address = fake_jlink.place_control_structure(0x9000, 0x1234)
+
+    control = thread._verify_control_structure(NRF52, control)
+    assert control.base_address == new_address
+
+    control = JLinkControlThread(fake_jlink)._verify_control_structure(NRF52)
+    assert control.base_address == new_address
+
+    # A different firmware build does not use the cached address
+    fake_jlink.load_firmware(b'firmware build 2' * 4)
+    del fake_jlink.reads[:]
+    control = JLinkControlThread(fake_jlink)._verify_control_structure(NRF52)
+    assert control.base_address == new_address
+    assert fake_jlink.bytes_read() > 64 + JLinkControlThread.FINGERPRINT_LENGTH
@@ -0,0 +1,104 @@
+"""Tests of sending RPCs over jlink using a fake memory-backed jlink."""
+
+import time
+import pytest
+from iotile.core.exceptions import HardwareError
+from iotile_transport_jlink.devices import NRF52
+from iotile_transport_jlink.jlink import JLinkAdapter
+from iotile_transport_jlink.jlink_background import JLinkControlThread
+from util.fake_jlink import FakeJLink
+
+
+@pytest.fixture
+def control():
+    """Create a control thread talking to a fake device."""
+
+    jlink = FakeJLink(NRF52)
+    jlink.place_control_structure(0x1000, 0x10)
+
+    thread = JLinkControlThread(jlink)
+    control_info = thread._find_control_structure(NRF52.ram_start, NRF52.ram_size)
+
+    del jlink.reads[:]
+    return jlink, thread, control_info
+
+
+def test_send_rpc(control):
+    """Make sure a quick RPC only needs a single read."""
+
+    jlink, thread, control_info = control
+
+    resp = thread._send_rpc(NRF52, control_info, 8, 0x0004, b'abc', 1.0)
+    assert resp == {'status': 0, 'payload': b'abc'}
+    assert jlink.rpcs == [(8, 0x0004, b'abc')]
+    assert len(jlink.reads) == 1
+
+
+def test_slow_rpc_backoff(control):
+    """Make sure we back off while polling a slow RPC without adding much latency."""
+
+    jlink, thread, control_info = control
+    jlink.rpc_delay = 0.1
+    thread.RPC_SPIN_TIME = 0.0
+
+    start = time.time()
+    resp = thread._send_rpc(NRF52, control_info, 8, 0x8000, b'', 1.0)
+    elapsed = time.time() - start
+
+    assert resp['status'] == 0
+    assert elapsed < 0.1 + thread.MAX_POLL_INTERVAL + 0.05
+    assert len(jlink.reads) < 15
+
+
+def test_rpc_timeout(control):
+    """Make sure we give up on RPCs that never finish."""
+
+    jlink, thread, control_info = control
+    jlink.rpc_delay = None
+
+    start = time.time()
+    with pytest.raises(HardwareError):
+        thread._send_rpc(NRF52, control_info, 8, 0x8000, b'', 0.1)
+
+    assert time.time() - start < 0.2
+
+
+def test_send_rpcs(control):
+    """Make sure batches of RPCs are sent in order and stop on failure."""
+
+    jlink, thread, control_info = control
+    jlink.rpc_handler = lambda address, rpc_id, payload: (rpc_id & 0xFF, payload + b'!')
+
+    rpcs = [(8, 0x8000 + i, bytes(bytearray([i]))) for i in range(5)]
+    resps = thread._send_rpcs(NRF52, control_info, rpcs, 1.0)
+    assert [x['status'] for x in resps] == [0, 1, 2, 3, 4]
+    assert [x['payload'] for x in resps] == [bytes(bytearray([i])) + b'!' for i in range(5)]
+    assert [x[1] for x in jlink.rpcs] == [x[1] for x in rpcs]
+
+    jlink.rpc_delay = None
+    with pytest.raises(HardwareError) as exc:
+        thread._send_rpcs(NRF52, control_info, rpcs, 0.01)
+
+    assert exc.value.params['completed'] == 0
+
+
+def test_adapter_send_rpcs(control):
+    """Make sure the adapter sends batches of RPCs through its control thread."""
+
+    jlink, thread, control_info = control
+
+    adapter = JLinkAdapter("device=nrf52")
+    adapter._device_info = NRF52
+    adapter._control_info = control_info
+    adapter._control_thread = thread
+    thread.start()
+
+    try:
+        result = adapter.send_rpc_sync(1, 8, 0x0004, b'', 1.0)
+        assert result['success'] is True
+
+        result = adapter.send_rpcs_sync(1, [(8, 0x0004, b''), (9, 0x0005, b'\x01')], 1.0)
+        assert result['success'] is True
+        assert result['responses'] == [(0, b''), (0, b'\x01')]
+    finally:
+        adapter.stop_sync()
@@ -0,0 +1,108 @@
+"""A stand-in for pylink.JLink that is backed by a python bytearray."""
+
+import struct
+import threading
+from iotile_transport_jlink.structures import ControlStructure
+
+
+class FakeJLink(object):
+    """A memory-backed JLink that records the reads made through it.
+
+    Once a control structure has been placed in RAM, triggering an RPC runs
+    rpc_handler(address, rpc_id, payload), which should return a status and
+    response payload, and writes the response back after rpc_delay seconds.
+    If rpc_delay is None, RPCs never finish.
+
+    Args:
+        device_info (DeviceInfo): The device whose RAM and flash should be simulated.
+    """
+
+    def __init__(self, device_info):
+        self.device_info = device_info
+        self.ram = bytearray(device_info.ram_size)
+        self.flash = bytearray(device_info.flash_size)
+        self.reads = []
+
+        self.control_address = None
+        self.rpc_handler = lambda address, rpc_id, payload: (0, payload)
+        self.rpc_delay = 0.0
+        self.rpcs = []
+
+    def place_control_structure(self, offset, uuid, length=64):
+        """Write a valid control structure into RAM at the given offset."""
+
+        header = ControlStructure.CONTROL_MAGIC + struct.pack("<BBHL", 1, 0, length, uuid)
+        self.ram[offset:offset + length] = header + b'\0'*(length - len(header))
+        self.control_address = self.device_info.ram_start + offset
+        return self.control_address
+
+    def load_firmware(self, image):
+        """Write a firmware image to the start of flash."""
+
+        self.flash[:len(image)] = image
+
+    def _locate(self, address, length):
+        if self.device_info.ram_start <= address and address + length <= self.device_info.ram_start + self.device_info.ram_size:
+            return self.ram, address - self.device_info.ram_start
+
+        if self.device_info.flash_start <= address and address + length <= self.device_info.flash_start + self.device_info.flash_size:
+            return self.flash, address - self.device_info.flash_start
+
+        raise ValueError("Invalid memory access at 0x%08X, length %d" % (address, length))
+
+    def _read(self, address, num_units, size, fmt):
+        memory, offset = self._locate(address, num_units*size)
+        self.reads.append((address, num_units*size))
+        return list(struct.unpack_from("<%d%s" % (num_units, fmt), memory, offset))
+
+    def _write(self, address, data, size, fmt):
+        if address == self.device_info.rpc_trigger.register:
+            self._start_rpc()
+            return
+
+        memory, offset = self._locate(address, len(data)*size)
+        struct.pack_into("<%d%s" % (len(data), fmt), memory, offset, *data)
+
+    def _rpc_offset(self):
+        return self.control_address - self.device_info.ram_start + ControlStructure.RPC_TLS_OFFSET + 8
+
+    def _start_rpc(self):
+        offset = self._rpc_offset()
+        addr_word, send_length, _reserved, payload = struct.unpack_from("<LLL20s", self.ram, offset)
+
+        address = (addr_word >> 16) & 0xFF
+        rpc_id = addr_word & 0xFFFF
+        payload = payload[:send_length]
+        self.rpcs.append((address, rpc_id, payload))
+
+        if self.rpc_delay is None:
+            return
+
+        status, response = self.rpc_handler(address, rpc_id, payload)
+        if self.rpc_delay == 0:
+            self._finish_rpc(status, response)
+        else:
+            threading.Timer(self.rpc_delay, self._finish_rpc, args=(status, response)).start()
+
+    def _finish_rpc(self, status, response):
+        struct.pack_into("<HxBL4x20s", self.ram, self._rpc_offset(), status, 1 << 2, len(response), response)
+
+    def memory_read8(self, address, num_units):
+        return self._read(address, num_units, 1, "B")
+
+    def memory_read16(self, address, num_units):
+        return self._read(address, num_units, 2, "H")
+
+    def memory_read32(self, address, num_units):
+        return self._read(address, num_units, 4, "L")
+
+    def memory_write8(self, address, data):
+        self._write(address, data, 1, "B")
+
+    def memory_write32(self, address, data):
+        self._write(address, data, 4, "L")
+
+    def bytes_read(self):
+        """The total number of bytes read so far."""
+
+        return sum(length for _address, length in self.reads)
@@ -7,7 +7,9 @@ def get_variables():
     prefix = "ble"
 
     conf_vars = [
-        ["active-scan", "bool", "Probe devices during scan for uptime, voltage and broadcast data", "false"]
+        ["active-scan", "bool", "Probe devices during scan for uptime, voltage and broadcast data", "false"],
+        ["scan-refresh-interval", "float", "Seconds between scan results for a device whose advertisement has not "
+                                           "changed, 0 reports every advertisement", "5.0"]
     ]
 
     return prefix, conf_vars
@@ -9,7 +9,8 @@ import bable_interface
 from iotile.core.dev.config import ConfigManager
 from iotile.core.hw.reports import IOTileReportParser, IOTileReading, BroadcastReport
 from iotile.core.hw.transport.adapter import DeviceAdapter
-from iotile.core.utilities.packed import unpack
+from iotile.core.hw.transport.advertisement import AdvertisementCache, decode_v1_advertisement, decode_v1_scan_response, \
+                                                  scan_content
 from iotile.core.exceptions import ArgumentError, ExternalError
 from .connection_manager import ConnectionManager
 from .tilebus import *
@@ -74,6 +75,9 @@ class NativeBLEDeviceAdapter(DeviceAdapter):
         # To register advertising packets waiting for a scan response (only if active scan)
         self.partial_scan_responses = {}
 
+        # To only report scanned devices when their advertisements change
+        self._advertisements = AdvertisementCache(ConfigManager().get('ble:scan-refresh-interval'))
+
         # To manage multiple connections
         self.connections = ConnectionManager(self.id)
         self.connections.start()
@@ -170,24 +174,12 @@ class NativeBLEDeviceAdapter(DeviceAdapter):
                                        "(expected=6, received=%d)", len(device['manufacturer_data']))
                     return
 
-                device_uuid, flags = unpack("<LH", device['manufacturer_data'])
-
-                pending = bool(flags & (1 << 0))
-                low_voltage = bool(flags & (1 << 1))
-                user_connected = bool(flags & (1 << 2))
-
-                info = {
-                    'user_connected': user_connected,
-                    'connection_string': '{},{}'.format(device['address'], device['address_type']),
-                    'uuid': device_uuid,
-                    'pending_data': pending,
-                    'low_voltage': low_voltage,
-                    'signal_strength': device['rssi']
-                }
+                connection_string = '{},{}'.format(device['address'], device['address_type'])
+                info = decode_v1_advertisement(device['manufacturer_data'], connection_string, device['rssi'])
 
                 if not self._active_scan:
                     # If scan is not active, we won't receive a scan response so we trigger the `on_scan` callback
-                    self._trigger_callback('on_scan', self.id, info, self.get_config('expiration_time'))
+                    self._report_scan(info)
                 else:
                     # Else we register the information to get them on scan response received
                     self.partial_scan_responses[device['address']] = info
@@ -199,10 +191,10 @@ class NativeBLEDeviceAdapter(DeviceAdapter):
                                    "(expected=16, received=%d)", len(device['manufacturer_data']))
                 return
 
-            voltage, stream, reading, reading_time, curr_time = unpack("<HHLLL", device['manufacturer_data'])
+            voltage, stream, reading, reading_time, curr_time = decode_v1_scan_response(device['manufacturer_data'])
 
             info = self.partial_scan_responses[device['address']]
-            info['voltage'] = voltage / 256.0
+            info['voltage'] = voltage
             info['current_time'] = curr_time
             info['last_seen'] = datetime.datetime.now()
 
@@ -213,6 +205,12 @@ class NativeBLEDeviceAdapter(DeviceAdapter):
                 self._trigger_callback('on_report', None, report)
 
             del self.partial_scan_responses[device['address']]
+            self._report_scan(info)
+
+    def _report_scan(self, info):
+        """Report a scanned device unless it has not changed since we last reported it."""
+
+        if self._advertisements.scan_changed(info['connection_string'], scan_content(info), time.time()):
             self._trigger_callback('on_scan', self.id, info, self.get_config('expiration_time'))
 
     def stop_scan(self):